@@ -0,0 +1,67 @@
+"""
+Benchmark for automatic crop detection.
+
+Detects the crop of a letterboxed video, then converts the same segment with and without
+it through ConversionManager.construct_ffmpeg_command and reports the pixel savings and
+the encoding fps of both runs.
+
+Usage:
+    python benchmarks/autocrop_bench.py input.mkv [--start 600] [--seconds 20] [--filter 1]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from utils import detect_crop, get_video_properties, get_crop_saving, format_crop_filter
+from conversion import ConversionManager
+
+
+def convert_segment(manager, input_path, properties, filter_index, start, seconds, crop):
+    """Convert `seconds` of the video starting at `start` and return the encoding fps."""
+    output_path = os.path.join(tempfile.gettempdir(), 'autocrop_bench.mp4')
+    cmd = manager.construct_ffmpeg_command(input_path, output_path, 1.0, properties, False,
+                                           filter_index, crop=crop)
+    input_index = cmd.index('-i')
+    cmd[input_index:input_index] = ['-ss', str(start), '-t', str(seconds)]
+    started = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - started
+    os.remove(output_path)
+    return seconds * properties['frame_rate'] / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input')
+    parser.add_argument('--start', type=float, default=None, help="Segment start (default: a third in)")
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--filter', type=int, default=1, help="Index into FFMPEG_FILTER")
+    args = parser.parse_args()
+
+    properties = get_video_properties(args.input)
+    start = args.start if args.start is not None else properties['duration'] / 3
+
+    started = time.perf_counter()
+    crop = detect_crop(args.input)
+    print(f"Detection took {time.perf_counter() - started:.2f} s")
+    if not crop:
+        print("No bars detected; nothing to compare.")
+        return
+
+    manager = ConversionManager()
+    full_fps = convert_segment(manager, args.input, properties, args.filter, start, args.seconds, None)
+    crop_fps = convert_segment(manager, args.input, properties, args.filter, start, args.seconds, crop)
+
+    print(f"Crop {format_crop_filter(crop)} removes {get_crop_saving(crop, properties):.1%} "
+          f"of {properties['width']}x{properties['height']}")
+    print(f"{'uncropped':<10} {full_fps:7.1f} fps")
+    print(f"{'cropped':<10} {crop_fps:7.1f} fps   ({crop_fps / full_fps:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
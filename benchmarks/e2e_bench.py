@@ -0,0 +1,256 @@
+"""
+End-to-end benchmark on synthetic HDR10 and HLG clips.
+
+Generates deterministic test media with FFmpeg's lavfi sources (testsrc2 for PQ, gradients
+for HLG, a sine tone for audio), converted to 10-bit BT.2020 HEVC. PQ clips carry mastering
+display and content light level metadata. The clips are cached in --media-dir and reused.
+The suite then times:
+
+  - probe latency: utils.get_video_properties, cold (probe cache cleared) and warm
+  - preview refresh latency: utils.extract_frame_with_conversion, seeking to spread positions
+  - conversion fps: every filter x tonemapper x codec, through ConversionManager's command
+
+and writes the results, with the commit and host they came from, as JSON. Pass --compare
+with an earlier result file to print the change of every measurement.
+
+Usage:
+    python benchmarks/e2e_bench.py [--sizes 1080p 2160p] [--transfers pq hlg] [--codecs h264 h265]
+                                   [--seconds 5] [--output bench.json] [--compare baseline.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import utils
+from utils import FFMPEG_EXECUTABLE, TONEMAP, extract_frame_with_conversion, get_video_properties
+from conversion import ConversionManager
+
+SIZES = {'1080p': (1920, 1080), '2160p': (3840, 2160)}
+FRAME_RATE = 24
+FILTERS = ['Static', 'Dynamic']
+CODECS = ['h264', 'h265']
+# BT.2020 primaries and D65 white in 0.00002 units, 1000/0.0001 nits in 0.0001 units
+MASTER_DISPLAY = 'G(8500,39850)B(6550,2300)R(35400,14600)WP(15635,16450)L(10000000,1)'
+MAX_CLL = '1000,400'
+TRANSFERS = {
+    # SDR test pattern mapped onto PQ, with diffuse white at 203 nits as BT.2408 recommends
+    'pq': {
+        'source': 'testsrc2=size={width}x{height}:rate={rate}:duration={seconds}',
+        'transfer': 'smpte2084',
+        'x265': f'hdr10=1:hdr10-opt=1:master-display={MASTER_DISPLAY}:max-cll={MAX_CLL}',
+    },
+    'hlg': {
+        'source': 'gradients=size={width}x{height}:rate={rate}:duration={seconds}:seed=1:speed=0.02',
+        'transfer': 'arib-std-b67',
+        'x265': '',
+    },
+}
+
+
+def generate_clip(path, transfer, size, seconds):
+    """Encode a synthetic 10-bit BT.2020 clip with the transfer's tags and metadata."""
+    spec = TRANSFERS[transfer]
+    source = spec['source'].format(width=size[0], height=size[1], rate=FRAME_RATE, seconds=seconds)
+    x265_params = ':'.join(filter(None, [
+        f"log-level=error:colorprim=bt2020:transfer={spec['transfer']}:colormatrix=bt2020nc:repeat-headers=1",
+        spec['x265'],
+    ]))
+    cmd = [
+        FFMPEG_EXECUTABLE, '-v', 'error',
+        '-f', 'lavfi', '-i', source,
+        '-f', 'lavfi', '-i', f'sine=frequency=1000:sample_rate=48000:duration={seconds}',
+        # Float RGB in, so zscale needs no matrix for the lavfi source whatever format it has
+        '-vf', f"format=gbrpf32le,zscale=tin=bt709:pin=bt709:rin=full:t={spec['transfer']}:p=bt2020:"
+               "m=bt2020nc:r=tv:npl=203,format=yuv420p10le",
+        '-c:v', 'libx265', '-preset', 'ultrafast', '-x265-params', x265_params,
+        '-color_primaries', 'bt2020', '-color_trc', spec['transfer'], '-colorspace', 'bt2020nc',
+        '-c:a', 'aac', '-b:a', '128k',
+        '-shortest', path, '-y',
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def prepare_media(media_dir, sizes, transfers, seconds):
+    """Return {name: path} of the test clips, generating the ones not cached yet."""
+    os.makedirs(media_dir, exist_ok=True)
+    media = {}
+    for transfer in transfers:
+        for size_name in sizes:
+            name = f'{transfer}_{size_name}'
+            path = os.path.join(media_dir, f'{name}_{seconds}s.mkv')
+            if not os.path.exists(path):
+                print(f"Generating {name} ({seconds} s)...")
+                generate_clip(path + '.tmp.mkv', transfer, SIZES[size_name], seconds)
+                os.replace(path + '.tmp.mkv', path)
+            media[name] = path
+    return media
+
+
+def summarize(samples):
+    """Return mean, median and p95 of samples in milliseconds."""
+    samples_ms = sorted(s * 1000 for s in samples)
+    return {
+        'mean_ms': statistics.mean(samples_ms),
+        'median_ms': statistics.median(samples_ms),
+        'p95_ms': samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))],
+        'samples': len(samples_ms),
+    }
+
+
+def time_call(function, iterations, before=None):
+    samples = []
+    for index in range(iterations):
+        if before:
+            before()
+        started = time.perf_counter()
+        function(index)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_probe(path, iterations):
+    cold = time_call(lambda _: get_video_properties(path), iterations, before=utils._probe_cache.clear)
+    warm = time_call(lambda _: get_video_properties(path), iterations)
+    return {'cold': summarize(cold), 'warm': summarize(warm)}
+
+
+def bench_preview(path, duration, iterations):
+    """Time tonemapped frame extraction, as a preview refresh does, at spread positions."""
+    positions = [duration * (index % 5 + 1) / 6 for index in range(iterations)]
+    results = {}
+    for fast in (False, True):
+        samples = time_call(lambda index: extract_frame_with_conversion(
+            path, 1.0, 1, 'mobius', time_position=positions[index], fast=fast), iterations)
+        results['fast' if fast else 'full'] = summarize(samples)
+    return results
+
+
+def bench_conversion(manager, path, properties, filter_index, tonemapper, codec, use_gpu):
+    """Convert the whole clip and return its fps, or the error if FFmpeg failed."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, 'bench.mp4')
+        cmd = manager.construct_ffmpeg_command(path, output_path, 1.0, properties, use_gpu, filter_index,
+                                               tonemapper=tonemapper, selected_codec=codec)
+        started = time.perf_counter()
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                                errors='replace')
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            errors = [line for line in lines if 'error' in line.lower() or 'invalid' in line.lower()]
+            return {'error': ' | '.join((errors or lines)[:3]) or f"exit code {result.returncode}"}
+        frames = properties['duration'] * properties['frame_rate']
+        return {'fps': frames / elapsed, 'seconds': elapsed, 'bytes': os.path.getsize(output_path)}
+
+
+def git_revision():
+    try:
+        root = os.path.join(os.path.dirname(__file__), '..')
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def ffmpeg_version():
+    output = subprocess.run([FFMPEG_EXECUTABLE, '-version'], capture_output=True, text=True).stdout
+    return output.splitlines()[0] if output else None
+
+
+def compare(results, baseline):
+    """Print the relative change of every measurement present in both result files."""
+    def change(new, old, higher_is_better):
+        if not old:
+            return "n/a"
+        ratio = new / old
+        better = ratio > 1 if higher_is_better else ratio < 1
+        return f"{(ratio - 1) * 100:+6.1f}% {'better' if better else 'worse'}"
+
+    print(f"\nAgainst {baseline.get('commit', 'unknown')[:10]}:")
+    for name, probe in results['probe'].items():
+        old = baseline.get('probe', {}).get(name)
+        if old:
+            for phase in ('cold', 'warm'):
+                print(f"  probe {name} {phase:<5} {change(probe[phase]['median_ms'], old[phase]['median_ms'], False)}")
+    for name, preview in results['preview'].items():
+        old = baseline.get('preview', {}).get(name)
+        if old:
+            for mode in ('full', 'fast'):
+                print(f"  preview {name} {mode:<5} {change(preview[mode]['median_ms'], old[mode]['median_ms'], False)}")
+    old_runs = {(run['media'], run['filter'], run['tonemapper'], run['codec']): run
+                for run in baseline.get('conversions', [])}
+    for run in results['conversions']:
+        old = old_runs.get((run['media'], run['filter'], run['tonemapper'], run['codec']))
+        if old and 'fps' in run and 'fps' in old:
+            print(f"  convert {run['media']} {run['filter']}/{run['tonemapper']}/{run['codec']} "
+                  f"{change(run['fps'], old['fps'], True)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    parser.add_argument('--transfers', nargs='+', choices=list(TRANSFERS), default=list(TRANSFERS))
+    parser.add_argument('--codecs', nargs='+', choices=CODECS, default=CODECS)
+    parser.add_argument('--seconds', type=int, default=5, help="Length of the generated clips")
+    parser.add_argument('--iterations', type=int, default=10, help="Repetitions of the latency timings")
+    parser.add_argument('--gpu', action='store_true', help="Convert with NVENC instead of libx264")
+    parser.add_argument('--media-dir', default=os.path.join(tempfile.gettempdir(), 'hdr_bench_media'))
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    media = prepare_media(args.media_dir, args.sizes, args.transfers, args.seconds)
+    commit, dirty = git_revision()
+    results = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'host': {'node': platform.node(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+                 'python': platform.python_version(), 'ffmpeg': ffmpeg_version()},
+        'settings': {'seconds': args.seconds, 'iterations': args.iterations, 'gpu': args.gpu},
+        'probe': {},
+        'preview': {},
+        'conversions': [],
+    }
+
+    manager = ConversionManager()
+    for name, path in media.items():
+        results['probe'][name] = bench_probe(path, args.iterations)
+        properties = get_video_properties(path)
+        results['preview'][name] = bench_preview(path, properties['duration'], args.iterations)
+        print(f"{name}: probe {results['probe'][name]['cold']['median_ms']:.1f} ms cold, "
+              f"preview {results['preview'][name]['full']['median_ms']:.1f} ms")
+
+        for filter_index, filter_name in enumerate(FILTERS):
+            for tonemapper in TONEMAP:
+                for codec in args.codecs:
+                    run = bench_conversion(manager, path, properties, filter_index, tonemapper.lower(),
+                                           codec, args.gpu)
+                    run.update(media=name, filter=filter_name, tonemapper=tonemapper, codec=codec)
+                    results['conversions'].append(run)
+                    outcome = f"{run['fps']:7.1f} fps" if 'fps' in run else f"failed: {run['error']}"
+                    print(f"  {filter_name:<8} {tonemapper:<9} {codec:<5} {outcome}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark of the cost of logging FFmpeg's stderr on the thread that drains the pipe.
+
+Several threads, one per simulated job, each push synthetic FFmpeg progress lines through
+the logging setups below and the time per line is reported:
+
+    off       debug logging disabled, as with LOGGING_ENABLED = False
+    sync      the previous setup: logging.debug on every line, written to one file by the
+              calling thread
+    queue     logqueue.start_logging with every line logged through JobLog
+    sampled   logqueue.start_logging with JobLog.ffmpeg_line sampling progress lines
+
+The queue setups enqueue only; the time the listener thread spends writing is reported
+separately as the time to drain the queue after the last line.
+
+Usage:
+    python benchmarks/logging_bench.py [--jobs 4] [--lines 20000]
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from logqueue import JobLog, start_logging, stop_logging
+
+PROGRESS_LINE = ("frame= {0:5d} fps= 48 q=28.0 size=   {1:6d}kB time=00:00:{2:05.2f} "
+                 "bitrate=8123.4kbits/s speed=1.98x")
+
+
+def reset_logging():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def run_jobs(jobs, lines, log_line):
+    """Feed lines progress lines per job from jobs threads; returns the mean seconds per line."""
+    timings = []
+
+    def job(index):
+        started = time.perf_counter()
+        for number in range(lines):
+            log_line(index, PROGRESS_LINE.format(number, number * 4, number / 24 % 60))
+        timings.append((time.perf_counter() - started) / lines)
+
+    threads = [threading.Thread(target=job, args=(index,)) for index in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--lines', type=int, default=20000)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    log_path = os.path.join(directory, 'debug.log')
+    results = []
+    try:
+        reset_logging()
+        logging.basicConfig(level=logging.WARNING)
+        results.append(('off', run_jobs(args.jobs, args.lines, lambda job, line: logging.debug(line)), 0.0))
+
+        reset_logging()
+        logging.basicConfig(level=logging.DEBUG, filename=log_path, filemode='w',
+                            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        results.append(('sync', run_jobs(args.jobs, args.lines, lambda job, line: logging.debug(line)), 0.0))
+
+        for name, sampled in (('queue', False), ('sampled', True)):
+            reset_logging()
+            listener = start_logging(log_path, console_level=logging.WARNING)
+            job_logs = [JobLog(f"{name}-{index}") for index in range(args.jobs)]
+            if sampled:
+                log_line = lambda job, line: job_logs[job].ffmpeg_line(line, progress=True)
+            else:
+                log_line = lambda job, line: job_logs[job].debug(line)
+            per_line = run_jobs(args.jobs, args.lines, log_line)
+            drain_started = time.perf_counter()
+            stop_logging(listener)
+            results.append((name, per_line, time.perf_counter() - drain_started))
+    finally:
+        reset_logging()
+        shutil.rmtree(directory)
+
+    print(f"{args.jobs} jobs x {args.lines} progress lines")
+    for name, per_line, drain in results:
+        print(f"{name:<8} {per_line * 1e6:8.2f} us per line on the reading thread"
+              + (f"   queue drained in {drain * 1000:.0f} ms" if drain else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark for the preview refresh path.
+
+Times HDRConverterGUI.show_preview_images with synthetic frames, so FFmpeg decode time
+is excluded and only the display layer (scaling, gamma, PhotoImage updates) is measured.
+The legacy path (full-resolution LANCZOS resize and a new PhotoImage per pane on every
+refresh) is timed alongside for comparison.
+
+Usage:
+    python benchmarks/preview_refresh_bench.py [--width 3840] [--height 2160] [--iterations 50]
+
+Requires a display, since PhotoImage needs a Tk interpreter.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from PIL import Image, ImageTk
+from tkinterdnd2 import TkinterDnD
+from gui import HDRConverterGUI
+
+
+def summarize(name, samples):
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))]
+    print(f"{name:<10} mean {statistics.mean(samples_ms):7.2f} ms   "
+          f"median {statistics.median(samples_ms):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def legacy_refresh(app, original, converted, gamma):
+    original_photo = ImageTk.PhotoImage(original.resize((960, 540), Image.LANCZOS))
+    app.original_image_label.config(image=original_photo)
+    app.original_image_label.image = original_photo
+    adjusted = app.adjust_gamma(converted, gamma)
+    converted_photo = ImageTk.PhotoImage(adjusted.resize((960, 540), Image.LANCZOS))
+    app.converted_image_label.config(image=converted_photo)
+    app.converted_image_label.image = converted_photo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    root = TkinterDnD.Tk()
+    root.withdraw()
+    app = HDRConverterGUI(root)
+    app.input_path_var.set('benchmark.mkv')
+
+    original = Image.linear_gradient('L').resize((args.width, args.height)).convert('RGB')
+    converted = Image.radial_gradient('L').resize((args.width, args.height)).convert('RGB')
+    gammas = [0.5 + (i % 20) / 10 for i in range(args.iterations)]
+
+    legacy = []
+    for gamma in gammas:
+        started = time.perf_counter()
+        legacy_refresh(app, original, converted, gamma)
+        root.update_idletasks()
+        legacy.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    app.show_preview_images(original, converted)
+    root.update_idletasks()
+    first = time.perf_counter() - started
+
+    current = []
+    for gamma in gammas:
+        app.gamma_var.set(gamma)
+        started = time.perf_counter()
+        app.show_preview_images(original, converted)
+        root.update_idletasks()
+        current.append(time.perf_counter() - started)
+
+    print(f"Source {args.width}x{args.height}, pane {app.preview_size[0]}x{app.preview_size[1]}, "
+          f"{args.iterations} refreshes")
+    summarize('legacy', legacy)
+    print(f"{'first':<10} {first * 1000:7.2f} ms (layout + working copies)")
+    summarize('refresh', current)
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
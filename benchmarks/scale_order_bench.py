@@ -0,0 +1,93 @@
+"""
+Benchmark for scale-before-tonemap filter ordering.
+
+Runs the same segment through the legacy graph (tonemap at source size, scale last) and the
+graph from utils.build_filter_graph (16-bit downscale first), reports the filtering fps of
+both, and compares the two outputs with FFmpeg's ssim and psnr filters to confirm they are
+equivalent within tolerance.
+
+Usage:
+    python benchmarks/scale_order_bench.py input.mkv [--resolution 1080p] [--seconds 10] [--filter 1]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from utils import (FFMPEG_EXECUTABLE, FFMPEG_FILTER, build_filter_graph, get_maxfall,
+                   get_video_properties, plan_output_size)
+
+MIN_SSIM = 0.98
+MIN_PSNR = 38.0
+
+
+def run_graph(input_path, start, seconds, graph, output_path=None):
+    """Filter the segment with `graph` and return the elapsed time; keeps lossless output if asked."""
+    cmd = [FFMPEG_EXECUTABLE, '-v', 'error', '-ss', str(start), '-t', str(seconds), '-i', input_path,
+           '-vf', f'{graph},format=yuv444p', '-an', '-sn']
+    cmd += ['-c:v', 'ffv1', output_path, '-y'] if output_path else ['-f', 'null', '-']
+    started = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    return time.perf_counter() - started
+
+
+def compare(reference, candidate):
+    """Return (ssim, psnr) of candidate against reference."""
+    cmd = [FFMPEG_EXECUTABLE, '-i', candidate, '-i', reference,
+           '-lavfi', '[0:v][1:v]ssim;[0:v][1:v]psnr', '-f', 'null', '-']
+    log = subprocess.run(cmd, capture_output=True, text=True, check=True).stderr
+    ssim = float(re.search(r'SSIM .*All:(\d+\.\d+)', log).group(1))
+    psnr = re.search(r'PSNR .*average:(\S+)', log).group(1)
+    return ssim, float('inf') if psnr == 'inf' else float(psnr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input')
+    parser.add_argument('--resolution', default='1080p')
+    parser.add_argument('--start', type=float, default=None, help="Segment start (default: a third in)")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--filter', type=int, default=1, help="Index into FFMPEG_FILTER")
+    args = parser.parse_args()
+
+    properties = get_video_properties(args.input)
+    start = args.start if args.start is not None else properties['duration'] / 3
+    source_size = (properties['width'], properties['height'])
+    output_size = plan_output_size(*source_size, args.resolution)
+    if output_size == source_size:
+        print(f"{args.resolution} does not downscale {source_size[0]}x{source_size[1]}; nothing to compare.")
+        return
+
+    npl = get_maxfall(args.input) if args.filter == 1 else None
+    legacy = (FFMPEG_FILTER[args.filter].format(gamma=1.0, npl=npl, tonemapper='mobius')
+              + f',scale={output_size[0]}:{output_size[1]}')
+    planned = build_filter_graph(args.filter, 1.0, 'mobius', npl=npl,
+                                 source_size=source_size, output_size=output_size)
+
+    frames = args.seconds * properties['frame_rate']
+    legacy_fps = frames / run_graph(args.input, start, args.seconds, legacy)
+    planned_fps = frames / run_graph(args.input, start, args.seconds, planned)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_out = os.path.join(tmp, 'legacy.mkv')
+        planned_out = os.path.join(tmp, 'planned.mkv')
+        run_graph(args.input, start, args.seconds, legacy, legacy_out)
+        run_graph(args.input, start, args.seconds, planned, planned_out)
+        ssim, psnr = compare(legacy_out, planned_out)
+
+    print(f"{source_size[0]}x{source_size[1]} -> {output_size[0]}x{output_size[1]}, {frames:.0f} frames")
+    print(f"{'legacy':<10} {legacy_fps:7.1f} fps")
+    print(f"{'planned':<10} {planned_fps:7.1f} fps   ({planned_fps / legacy_fps:.2f}x)")
+    equivalent = ssim >= MIN_SSIM and psnr >= MIN_PSNR
+    print(f"SSIM {ssim:.4f}, PSNR {psnr:.2f} dB: {'equivalent' if equivalent else 'NOT equivalent'} "
+          f"(thresholds {MIN_SSIM}, {MIN_PSNR} dB)")
+    sys.exit(0 if equivalent else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import threading
+from utils import FFMPEG_EXECUTABLE, run_ffmpeg_command, get_cache_dir
+from proof import get_proof_ranges
+
+AUTOTUNE_SAMPLES = 2
+AUTOTUNE_SAMPLE_SECONDS = 3
+AUTOTUNE_CACHE_FILE = 'autotune.json'
+# Presets from fastest to slowest and CRF (-cq for NVENC) from best quality to smallest files
+ENCODER_LADDERS = {
+    'libx264': {
+        'presets': ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow'],
+        'crf': [18, 20, 23, 26],
+    },
+    'libx265': {
+        'presets': ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow'],
+        'crf': [22, 25, 28, 31],
+    },
+    'h264_nvenc': {
+        'presets': ['p1', 'p2', 'p3', 'p4', 'p5', 'p6', 'p7'],
+        'crf': [16, 20, 24, 28],
+    },
+}
+
+_cache_lock = threading.Lock()
+
+
+def get_encoder_name(selected_codec, use_gpu):
+    """Return the FFmpeg encoder ConversionManager.encoder_args uses for the codec."""
+    if selected_codec == 'h265':
+        return 'libx265'
+    return 'h264_nvenc' if use_gpu else 'libx264'
+
+
+def map_encoder_settings(settings, from_encoder, to_encoder):
+    """
+    Carry a preset and CRF tuned for from_encoder over to the same steps of to_encoder's
+    ladder, e.g. NVENC p5 to x264 fast. Values off the ladder are dropped, so to_encoder's
+    defaults apply.
+    """
+    if not settings or from_encoder == to_encoder:
+        return settings
+    source, target = ENCODER_LADDERS.get(from_encoder), ENCODER_LADDERS.get(to_encoder)
+    mapped = {}
+    for name, ladder_key in (('preset', 'presets'), ('crf', 'crf')):
+        if source and target and settings.get(name) in source[ladder_key]:
+            step = source[ladder_key].index(settings[name]) / max(len(source[ladder_key]) - 1, 1)
+            mapped[name] = target[ladder_key][round(step * (len(target[ladder_key]) - 1))]
+    return mapped or None
+
+
+def get_host_id():
+    return f"{platform.node()}/{platform.machine()}/{os.cpu_count()}"
+
+
+def get_cache_key(size, encoder, target_fps=None, min_ssim=None):
+    """Key tuned settings by output size, encoder, host and target; other hosts tune differently."""
+    target = f"fps>={target_fps}" if target_fps is not None else f"ssim>={min_ssim}"
+    return f"{size[0]}x{size[1]}|{encoder}|{get_host_id()}|{target}"
+
+
+def _cache_path():
+    return os.path.join(get_cache_dir(), AUTOTUNE_CACHE_FILE)
+
+
+def load_cached_settings(key, cache_path=None):
+    try:
+        with open(cache_path or _cache_path(), 'r', encoding='utf-8') as f:
+            return json.load(f).get(key)
+    except (OSError, ValueError):
+        return None
+
+
+def store_cached_settings(key, result, cache_path=None):
+    cache_path = cache_path or _cache_path()
+    with _cache_lock:
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        cache[key] = result
+        temp_path = cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(temp_path, cache_path)
+
+
+def measure_quality(encoded_path, reference_path, cancel_event=None):
+    """Return the (ssim, psnr) of an encode against its lossless reference."""
+    cmd = [FFMPEG_EXECUTABLE, '-hide_banner', '-i', encoded_path, '-i', reference_path,
+           '-lavfi', '[0:v][1:v]ssim;[0:v][1:v]psnr', '-f', 'null', '-']
+    _, err = run_ffmpeg_command(cmd, cancel_event, capture_stderr=True)
+    log = err.decode('utf-8', errors='replace')
+    ssim = float(re.search(r'SSIM .*All:(\d+(?:\.\d+)?)', log).group(1))
+    psnr = re.search(r'PSNR .*average:(\S+)', log).group(1)
+    return ssim, float('inf') if psnr == 'inf' else float(psnr)
+
+
+class EncoderTuner:
+    """
+    Measures encoder settings on lossless references of a few sample segments.
+
+    The tonemap filter graph runs once per sample, to build the references; each trial then
+    only encodes them, so the search costs little more than the encodes themselves. A trial's
+    overall fps combines the filter and encoder throughput as if they ran one after the other,
+    which errs on the slow side of FFmpeg's threaded filtering and encoding.
+    """
+
+    def __init__(self, build_reference_command, build_encode_command, ranges, frame_rate,
+                 cancel_event=None):
+        self.build_reference_command = build_reference_command
+        self.build_encode_command = build_encode_command
+        self.ranges = ranges
+        self.frames = sum(end - start for start, end in ranges) * frame_rate
+        self.cancel_event = cancel_event
+        self.temp_dir = None
+        self.references = []
+        self.filter_fps = None
+        self.trials = {}
+
+    def __enter__(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='hdr_autotune_')
+        started = time.perf_counter()
+        for index, (start, end) in enumerate(self.ranges):
+            path = os.path.join(self.temp_dir, f'reference_{index:02d}.mkv')
+            run_ffmpeg_command(self.build_reference_command(path, start, end), self.cancel_event)
+            self.references.append(path)
+        self.filter_fps = self.frames / (time.perf_counter() - started)
+        logging.info(f"Autotune references tonemapped at {self.filter_fps:.1f} fps")
+        return self
+
+    def __exit__(self, *exc_info):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def measure(self, preset, crf):
+        """Encode every reference with the settings; return fps, mean ssim and psnr (memoized)."""
+        if (preset, crf) in self.trials:
+            return self.trials[(preset, crf)]
+        settings = {'preset': preset, 'crf': crf}
+        elapsed, ssims, psnrs = 0.0, [], []
+        for index, reference in enumerate(self.references):
+            encoded = os.path.join(self.temp_dir, f'trial_{index:02d}.mp4')
+            started = time.perf_counter()
+            run_ffmpeg_command(self.build_encode_command(reference, encoded, settings), self.cancel_event)
+            elapsed += time.perf_counter() - started
+            ssim, psnr = measure_quality(encoded, reference, self.cancel_event)
+            ssims.append(ssim)
+            psnrs.append(psnr)
+        encode_fps = self.frames / elapsed
+        result = dict(settings,
+                      fps=1 / (1 / self.filter_fps + 1 / encode_fps),
+                      ssim=sum(ssims) / len(ssims),
+                      psnr=min(psnrs))
+        logging.info(f"Autotune {preset}/{crf}: {result['fps']:.1f} fps, "
+                     f"SSIM {result['ssim']:.4f}, PSNR {result['psnr']:.2f} dB")
+        self.trials[(preset, crf)] = result
+        return result
+
+
+def search_for_speed(measure, ladder, target_fps):
+    """Return the highest quality trial reaching target_fps, or the fastest setting if none does."""
+    presets, crfs = ladder['presets'], ladder['crf']
+    middle_crf = crfs[len(crfs) // 2]
+
+    # Slower presets are slower at any CRF, so bisect for the slowest one fast enough
+    low, high, slowest = 0, len(presets) - 1, None
+    while low <= high:
+        index = (low + high) // 2
+        if measure(presets[index], middle_crf)['fps'] >= target_fps:
+            slowest, low = index, index + 1
+        else:
+            high = index - 1
+    if slowest is None:
+        return dict(measure(presets[0], crfs[-1]), meets_target=False)
+
+    # The next faster preset may afford a lower CRF; keep whichever scores better
+    candidates = []
+    for preset in presets[max(slowest - 1, 0):slowest + 1]:
+        for crf in crfs:
+            trial = measure(preset, crf)
+            if trial['fps'] >= target_fps:
+                candidates.append(trial)
+                break
+    return dict(max(candidates, key=lambda trial: trial['ssim']), meets_target=True)
+
+
+def search_for_quality(measure, ladder, min_ssim):
+    """Return the fastest trial scoring at least min_ssim, or the best quality setting if none does."""
+    best = None
+    for preset in ladder['presets']:
+        for crf in reversed(ladder['crf']):
+            trial = measure(preset, crf)
+            if best is not None and trial['fps'] <= best['fps']:
+                # Slower presets and lower CRFs only get slower from here
+                return dict(best, meets_target=True)
+            if trial['ssim'] >= min_ssim:
+                best = trial
+                break
+    if best is None:
+        return dict(measure(ladder['presets'][-1], ladder['crf'][0]), meets_target=False)
+    return dict(best, meets_target=True)
+
+
+def autotune_encoder(build_reference_command, build_encode_command, encoder, duration, frame_rate, size,
+                     target_fps=None, min_ssim=None, samples=AUTOTUNE_SAMPLES,
+                     sample_seconds=AUTOTUNE_SAMPLE_SECONDS, cancel_event=None, use_cache=True,
+                     cache_path=None):
+    """
+    Pick the encoder preset and CRF for a throughput or quality target.
+
+    With target_fps, returns the highest quality (SSIM) setting whose estimated overall speed
+    reaches it; with min_ssim, the fastest setting that scores at least that. Results are
+    cached per output size, encoder, host and target.
+    Args:
+        build_reference_command (callable): (output_path, start, end) -> command tonemapping the
+            range to a lossless file (ConversionManager.construct_reference_command).
+        build_encode_command (callable): (reference_path, output_path, settings) -> command
+            encoding a reference with the {'preset', 'crf'} settings.
+        encoder (str): A key of ENCODER_LADDERS.
+        duration (float): Length of the video in seconds.
+        frame_rate (float): Frames per second.
+        size (tuple): The (width, height) of the output.
+        target_fps (float, optional): Required overall conversion speed.
+        min_ssim (float, optional): Required SSIM against the tonemapped frames.
+    Returns:
+        dict: 'preset', 'crf', the measured 'fps', 'ssim' and 'psnr', and 'meets_target'.
+    """
+    if (target_fps is None) == (min_ssim is None):
+        raise ValueError("Set exactly one of target_fps and min_ssim.")
+    if encoder not in ENCODER_LADDERS:
+        raise ValueError(f"No preset ladder for encoder {encoder}.")
+
+    key = get_cache_key(size, encoder, target_fps, min_ssim)
+    if use_cache:
+        cached = load_cached_settings(key, cache_path)
+        if cached:
+            logging.info(f"Autotune cache hit for {key}: {cached['preset']}/{cached['crf']}")
+            return cached
+
+    ranges = get_proof_ranges(duration, None, sample_seconds, samples)
+    with EncoderTuner(build_reference_command, build_encode_command, ranges, frame_rate,
+                      cancel_event) as tuner:
+        if target_fps is not None:
+            result = search_for_speed(tuner.measure, ENCODER_LADDERS[encoder], target_fps)
+        else:
+            result = search_for_quality(tuner.measure, ENCODER_LADDERS[encoder], min_ssim)
+        logging.info(f"Autotune chose {result['preset']}/{result['crf']} after {len(tuner.trials)} trials")
+
+    if use_cache and result['meets_target']:
+        store_cached_settings(key, result, cache_path)
+    return result
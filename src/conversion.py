@@ -5,8 +5,29 @@ import webbrowser
 import multiprocessing
 import re
 import logging
+import tempfile
+import time
 from tkinter import messagebox
-from utils import get_video_properties, FFMPEG_FILTER, FFMPEG_EXECUTABLE, FFPROBE_EXECUTABLE, get_maxfall
+from utils import (get_video_properties, FFMPEG_FILTER, FFMPEG_EXECUTABLE, FFPROBE_EXECUTABLE, get_maxfall,
+                   get_hdr_peak, HDR_DEFAULT_PEAK_NITS,
+                   format_crop_filter, get_crop_saving, plan_output_size, build_filter_graph, range_args,
+                   MUXING_ARGS, choose_muxing)
+from pipeline import FramePipeline, PIPELINE_OPERATORS, PIPELINE_TRANSFERS
+from mezzanine import MezzanineCache, MEZZANINE_ARGS
+from proof import ProofRender, PROOF_CLIP_SECONDS, get_proof_path, get_proof_ranges
+from estimator import estimate_conversion
+from autotune import autotune_encoder, get_encoder_name, map_encoder_settings
+from history import job_history, safe_history, resolution_class
+from logqueue import JobLog
+from verification import verify_output
+from resume import ResumeJob, make_resume_params
+from governor import (DEFAULT_RESOURCE_POLICY, get_policy, apply_resource_policy, priority_creationflags,
+                      io_phases, record_policy_throughput)
+from scheduler import PauseClock, estimate_remaining, new_session_kwargs, suspend_process, resume_process
+from tracing import traced
+from metrics import ConversionProgress, gpu_fallbacks, record_job_outcome
+from streaming import (GrowingFile, follow_input_args, follow_input_url, is_stream_output,
+                       normalize_output_path, stream_output_args)
 from tkinterdnd2 import DND_FILES
 import sys
 import platform  # Add this import at the top
@@ -17,40 +38,449 @@ class ConversionManager:
         self.cancelled = False
         self.cpu_count = multiprocessing.cpu_count()
         self.filter_options = ['Static', 'Dynamic']  # Add filter options to ConversionManager
+        self.pipeline_stats = None  # Per-stage throughput of the last NumPy pipeline conversion
+        self.conversion_fps = None  # Encoding speed FFmpeg last reported
+        self.conversion_crop = None  # Crop applied to the current conversion
+        self.conversion_crop_saving = 0.0  # Fraction of pixels that crop removes
+        self.conversion_resolution = None  # Resolution target of the current conversion
+        self.mezzanine_cache = MezzanineCache()
+        self.mezzanine_key = None  # Key of the mezzanine the current conversion is writing
+        self.conversion_range = (None, None)  # (start, end) seconds the current conversion renders
+        self.conversion_muxing = 'auto'  # Muxing mode the current conversion was asked for
+        self.conversion_started = None  # perf_counter() at the start of the current conversion
+        self.finalize_started = None  # perf_counter() when FFmpeg began the faststart rewrite
+        self.growing_input = None  # GrowingFile watching a followed input
+        self.resume_job = None  # ResumeJob of a resumable conversion
+        self.conversion_settings = None  # Tonemap and encoder settings of the current conversion, for a GPU fallback
+        self.progress_offset = 0.0  # Source seconds a resumed conversion had already encoded
+        self.pause_clock = PauseClock()  # Running and paused time of the current conversion
+        self.resource_policy = DEFAULT_RESOURCE_POLICY  # governor.RESOURCE_POLICIES key FFmpeg runs under
+        self.conversion_size = None  # Output (width, height) of the current conversion
+        self.encode_started = None  # perf_counter() when FFmpeg was started for the current conversion
+        self.history_id = None  # history.job_history row of the current conversion
+        self.expected_speed = None  # Speed factor of similar earlier jobs, for the ETA before FFmpeg reports one
+        self.finished_history_id = None  # history.job_history row of the last conversion that ended
+        self.verify = False  # Verify the current conversion's output once it succeeds
+        self.conversion_input = None  # Source and properties of the current conversion, for verification
+        self.conversion_properties = None
 
+    @traced(category='conversion')
     def start_conversion(self, input_path, output_path, gamma, use_gpu, selected_filter_index,
                          progress_var, interactable_elements, gui_instance,
-                         open_after_conversion, cancel_button, tonemapper='reinhard', selected_codec='h264'):
+                         open_after_conversion, cancel_button, tonemapper='reinhard', selected_codec='h264',
+                         pipeline_operator=None, crop=None, resolution=None, keep_mezzanine=False,
+                         start=None, end=None, encoder_settings=None, muxing='auto',
+                         follow=False, declared_size=None, resumable=False, resource_policy=None,
+                         verify=False):
+        """
+        Start converting input_path to output_path in the background.
+
+        With pipeline_operator set to a key of PIPELINE_OPERATORS, frames are tonemapped by
+        that NumPy operator in a FramePipeline instead of FFmpeg's tonemap filter. A crop from
+        utils.detect_crop is applied before tonemapping, and resolution (a RESOLUTION_PRESETS key
+        or a (width, height) box) downscales ahead of it; otherwise the output keeps the
+        (cropped) source size.
+
+        If the mezzanine cache holds this source tonemapped with the same settings, only the
+        encode runs, from the mezzanine. Otherwise keep_mezzanine stores the tonemapped frames
+        as a lossless mezzanine for later re-deliveries. Pipeline conversions bypass the cache.
+
+        start and end (seconds) limit the conversion to that range of the source; range
+        conversions bypass the mezzanine cache too. encoder_settings overrides the encoder
+        preset and CRF (see encoder_args). muxing is a utils.MUXING_MODES entry; 'auto' picks
+        fragmented MP4 for large or network outputs to avoid the faststart rewrite.
+
+        With follow, input_path may still be growing: FFmpeg tails it until it stops growing
+        and progress is estimated against declared_size (bytes) when given. output_path may
+        also be '-' (stdout), a FIFO or a URL such as tcp://127.0.0.1:9000?listen=1, so the
+        next stage can read while the conversion runs; see streaming.stream_output_args.
+
+        A resumable conversion is written as segments next to the output (see resume.ResumeJob);
+        after a cancel, crash or failure, starting it again with the same settings only encodes
+        the segments that are missing. Ranges, followed inputs, stream outputs and pipeline
+        conversions always run in one go. If the GPU fails a resumable conversion, the CPU retry
+        only encodes the segments the GPU did not finish.
+
+        resource_policy names a governor.RESOURCE_POLICIES entry (CPU affinity, nice, I/O
+        priority) for this and later conversions; None keeps the current one.
+
+        With verify, a successful output is checked in the background (see
+        verification.verify_output) and the result is added to its job history record.
+        Followed inputs and stream outputs are not verified.
+        """
         if not self.verify_paths(input_path, output_path):
             return
 
         input_path = os.path.abspath(input_path)
-        output_path = os.path.abspath(output_path)
+        output_path = normalize_output_path(output_path)
         self.cancelled = False
         self.use_gpu = use_gpu  # Store the use_gpu state
 
+        probe_started = time.perf_counter()
         properties = get_video_properties(input_path)
         if properties is None:
             messagebox.showwarning("Warning", "Failed to retrieve video properties.")
             return
+        probe_seconds = time.perf_counter() - probe_started
+        transfer = properties.get('color_transfer') or 'smpte2084'  # Untagged HDR sources are taken as PQ
+        if pipeline_operator and transfer not in PIPELINE_TRANSFERS:
+            messagebox.showwarning("Warning", f"The {pipeline_operator} operator only handles PQ (SMPTE ST 2084) "
+                                              f"sources, not {transfer}. Use an FFmpeg tonemapper instead.")
+            return
+
+        self.conversion_fps = None
+        self.conversion_crop = crop
+        self.conversion_resolution = resolution
+        if resource_policy is not None:
+            self.set_resource_policy(resource_policy)
+        self.conversion_range = (start, end)
+        self.conversion_muxing = muxing
+        self.conversion_started = time.perf_counter()
+        self.pause_clock = PauseClock()
+        self.finalize_started = None
+        self.encode_started = None
+        self.history_id = None
+        self.finished_history_id = None
+        self.expected_speed = None
+        self.verify = verify and not follow and not is_stream_output(output_path)
+        self.conversion_input = input_path
+        self.conversion_properties = properties
+        self.growing_input = None
+        self.resume_job = None
+        self.conversion_settings = dict(
+            selected_filter_index=selected_filter_index, tonemapper=tonemapper, selected_codec=selected_codec,
+            encoder_settings=encoder_settings, keep_mezzanine=keep_mezzanine)
+        self.progress_offset = 0.0
+        if follow:
+            self.growing_input = GrowingFile(input_path, properties, declared_size).start()
+        try:
+            # The source size scaled to the range is a rough upper bound for the output size
+            expected_size = (os.path.getsize(input_path) * self.get_range_duration(properties, start, end)
+                             / max(properties['duration'], 0.001))
+        except OSError:
+            expected_size = None
+        if declared_size:
+            expected_size = declared_size
+        muxing = choose_muxing(output_path, expected_size, muxing)
+        if not is_stream_output(output_path):
+            logging.info(f"Muxing {os.path.basename(output_path)} as {muxing}")
+        self.conversion_crop_saving = get_crop_saving(crop, properties)
+        if crop:
+            logging.info(f"Cropping to {format_crop_filter(crop)}: "
+                         f"{self.conversion_crop_saving:.1%} fewer pixels to tonemap and encode")
+        source_size = (crop['width'], crop['height']) if crop else (properties['width'], properties['height'])
+        self.conversion_size = plan_output_size(*source_size, resolution)
 
         self.disable_ui(interactable_elements)
         cancel_button.config(command=lambda: self.cancel_conversion(
             gui_instance, interactable_elements, cancel_button))
         cancel_button.grid()
+        if hasattr(gui_instance, 'show_pause_button'):
+            gui_instance.show_pause_button()
 
-        cmd = self.construct_ffmpeg_command(
-            input_path, output_path, gamma, properties, use_gpu, selected_filter_index,
-            tonemapper=tonemapper, selected_codec=selected_codec
+        if pipeline_operator:
+            self.start_pipeline(input_path, output_path, gamma, properties, use_gpu, selected_codec,
+                                pipeline_operator, progress_var, gui_instance, interactable_elements,
+                                cancel_button, open_after_conversion, crop=crop, resolution=resolution,
+                                start=start, end=end, encoder_settings=encoder_settings, muxing=muxing,
+                                follow=follow, probe_seconds=probe_seconds)
+            return
+
+        analysis_started = time.perf_counter()
+        mezzanine_key = self.mezzanine_cache.make_key(
+            input_path, filter=selected_filter_index, tonemapper=tonemapper.lower(), gamma=gamma,
+            crop=crop, output_size=self.conversion_size
         )
-        self.process = self.start_ffmpeg_process(cmd)
+        # A followed input changes under the cache key, so it neither reads nor writes the cache
+        is_range = bool(start) or end is not None or follow
+        mezzanine_path = None if is_range or resumable else self.mezzanine_cache.lookup(mezzanine_key)
+        if resumable and not is_range and not is_stream_output(output_path):
+            # Segmented output; the mezzanine tee would only ever hold the last run's part
+            cmd = self.start_resume_job(
+                input_path, output_path, gamma, properties, use_gpu, selected_filter_index, tonemapper,
+                selected_codec, crop, resolution, encoder_settings, muxing)
+        elif mezzanine_path:
+            cmd = self.construct_mezzanine_command(
+                mezzanine_path, input_path, output_path, properties, use_gpu, selected_codec,
+                encoder_settings=encoder_settings, muxing=muxing)
+        else:
+            self.mezzanine_key = mezzanine_key if keep_mezzanine and not is_range else None
+            cmd = self.construct_ffmpeg_command(
+                input_path, output_path, gamma, properties, use_gpu, selected_filter_index,
+                tonemapper=tonemapper, selected_codec=selected_codec, crop=crop, resolution=resolution,
+                mezzanine_path=self.mezzanine_cache.partial_path_for(self.mezzanine_key) if self.mezzanine_key else None,
+                start=start, end=end, encoder_settings=encoder_settings, muxing=muxing, follow=follow
+            )
+        analysis_seconds = time.perf_counter() - analysis_started
+
+        duration = self.get_range_duration(properties, start, end)
+        params = {'gamma': gamma, 'use_gpu': use_gpu, 'filter': selected_filter_index,
+                  'tonemapper': tonemapper.lower(), 'codec': selected_codec, 'crop': crop, 'resolution': resolution,
+                  'start': start, 'end': end, 'encoder_settings': encoder_settings, 'muxing': muxing,
+                  'resource_policy': self.resource_policy}
+        self.record_job_start(params, input_path, output_path, cmd, get_encoder_name(selected_codec, use_gpu),
+                              None if follow else duration - self.progress_offset, probe_seconds, analysis_seconds)
+        # FFmpeg writes stdout output straight to ours
+        self.encode_started = time.perf_counter()
+        self.process = self.start_ffmpeg_process(cmd, stdout=None if output_path == '-' else subprocess.PIPE)
 
+        if self.growing_input is not None and end is None:
+            growing = self.growing_input
+            duration = lambda: max(growing.estimate_duration() - (start or 0), 0.001)
         thread = threading.Thread(target=self.monitor_progress, args=(
-            progress_var, properties['duration'], gui_instance, interactable_elements,
+            progress_var, duration, gui_instance, interactable_elements,
             cancel_button, output_path, open_after_conversion, gamma))
         thread.daemon = True
         thread.start()
 
+    def start_resume_job(self, input_path, output_path, gamma, properties, use_gpu, selected_filter_index,
+                         tonemapper, selected_codec, crop, resolution, encoder_settings, muxing):
+        """Set up self.resume_job and return the command that encodes its missing segments or joins them."""
+        # use_gpu and the encoder settings are left out so a GPU-to-CPU fallback, whose preset
+        # is on the CPU encoder's ladder, continues from the GPU's segments
+        params = make_resume_params(
+            input_path, filter=selected_filter_index, tonemapper=tonemapper.lower(), gamma=gamma,
+            crop=crop, resolution=resolution, codec=selected_codec)
+        job = self.resume_job = ResumeJob(input_path, output_path, params, muxing=muxing).prepare()
+        if job.encoded:
+            logging.info(f"All segments of {os.path.basename(output_path)} are encoded; joining them")
+            return job.concat_command()
+
+        offset, start_number = job.resume_point()
+        self.progress_offset = offset
+        list_name = job.start_run(offset, start_number)
+        cmd = self.construct_ffmpeg_command(
+            input_path, output_path, gamma, properties, use_gpu, selected_filter_index,
+            tonemapper=tonemapper, selected_codec=selected_codec, crop=crop, resolution=resolution,
+            start=offset or None, encoder_settings=encoder_settings)
+        # Swap the single output for keyframe-aligned segments
+        output_index = cmd.index(os.path.normpath(output_path))
+        muxing_args = MUXING_ARGS[muxing]
+        if cmd[output_index - len(muxing_args):output_index] == muxing_args:
+            output_index -= len(muxing_args)
+        encoder_index = cmd.index('-c:v')
+        return (cmd[:encoder_index] + job.input_args() + cmd[encoder_index:output_index]
+                + job.output_args(list_name, start_number) + ['-y'])
+
+    def finish_resume_job(self, success):
+        """
+        After a resumable run: join the segments once all are encoded, and keep them otherwise.
+        Returns False if joining failed.
+        """
+        job = self.resume_job
+        if job is None or not success:
+            if job is not None and not self.cancelled:
+                logging.info(f"Kept the completed segments in {job.directory}; converting again resumes")
+            return True
+        if job.encoded:
+            # The run that just finished was the join itself
+            job.cleanup()
+            return True
+        job.mark_encoded()
+        with io_phases.phase('segment join'):
+            concat = self.start_ffmpeg_process(job.concat_command())
+            self.process = concat
+            _, err = concat.communicate()
+        if concat.returncode != 0:
+            logging.error(f"Joining segments failed: {err}")
+            return False
+        job.cleanup()
+        return True
+
+    def start_pipeline(self, input_path, output_path, gamma, properties, use_gpu, selected_codec,
+                       pipeline_operator, progress_var, gui_instance, interactable_elements,
+                       cancel_button, open_after_conversion, crop=None, resolution=None,
+                       start=None, end=None, encoder_settings=None, muxing='faststart', follow=False,
+                       probe_seconds=None):
+        """
+        Run the conversion through a FramePipeline with the given NumPy operator. The source
+        must be PQ (start_conversion checks its transfer); its peak comes from its MaxCLL or
+        mastering display metadata.
+        """
+        try:
+            peak_nits = get_hdr_peak(input_path)
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            logging.warning(f"Could not read the HDR metadata of {input_path}, assuming {HDR_DEFAULT_PEAK_NITS:g} nits: {e}")
+            peak_nits = HDR_DEFAULT_PEAK_NITS
+        operator = PIPELINE_OPERATORS[pipeline_operator](gamma=gamma, peak_nits=peak_nits)
+        logging.info(f"Tonemapping with {pipeline_operator} from a {operator.peak_nits:g} nit peak")
+        source_size = (crop['width'], crop['height']) if crop else (properties['width'], properties['height'])
+        duration = self.get_range_duration(properties, start, end)
+        if self.growing_input is not None and end is None:
+            duration = max(self.growing_input.estimate_duration() - (start or 0), 0.001)
+        total_frames = max(1, int(duration * properties['frame_rate']))
+        report_every = max(1, int(properties['frame_rate']))
+
+        def on_progress(frames):
+            if frames % report_every == 0:
+                progress = min(frames / total_frames * 100, 100)
+                gui_instance.root.after(0, lambda p=progress: progress_var.set(p))
+
+        pipeline = FramePipeline(input_path, output_path, properties, operator,
+                                 self.encoder_args(properties, use_gpu, selected_codec, encoder_settings),
+                                 progress_callback=on_progress, crop=crop,
+                                 output_size=plan_output_size(*source_size, resolution),
+                                 start=start, end=end, muxing=muxing, follow=follow,
+                                 resource_policy=get_policy(self.resource_policy))
+        params = {'gamma': gamma, 'use_gpu': use_gpu, 'tonemapper': pipeline_operator,
+                  'pipeline_operator': pipeline_operator, 'codec': selected_codec, 'crop': crop,
+                  'resolution': resolution, 'start': start, 'end': end, 'encoder_settings': encoder_settings,
+                  'muxing': muxing, 'resource_policy': self.resource_policy}
+        self.record_job_start(params, input_path, output_path,
+                              pipeline.decoder_command() + ['|'] + pipeline.encoder_command(),
+                              get_encoder_name(selected_codec, use_gpu), None if follow else duration,
+                              probe_seconds, None)
+        self.encode_started = time.perf_counter()
+        self.process = pipeline.start()
+
+        thread = threading.Thread(target=self.monitor_pipeline, args=(
+            pipeline, gui_instance, interactable_elements, cancel_button,
+            output_path, open_after_conversion))
+        thread.daemon = True
+        thread.start()
+
+    def monitor_pipeline(self, pipeline, gui_instance, interactable_elements, cancel_button,
+                         output_path, open_after_conversion):
+        pipeline.wait()
+        self.pipeline_stats = {name: stage.fps for name, stage in pipeline.stats.items()}
+        self.pipeline_stats['overall'] = pipeline.fps
+        self.conversion_fps = pipeline.fps
+        if self.process is pipeline:
+            self.record_job_finish('success' if pipeline.returncode == 0 else 'failed',
+                                   output_path, list(pipeline.error_lines))
+            self.handle_completion(gui_instance, interactable_elements, cancel_button,
+                                   output_path, open_after_conversion, list(pipeline.error_lines))
+
+    def get_range_duration(self, properties, start=None, end=None):
+        """Return the length in seconds of the part of the video a conversion renders."""
+        end = properties['duration'] if end is None else min(end, properties['duration'])
+        return max(end - (start or 0), 0.001)
+
+    @traced(category='conversion')
+    def start_proof(self, input_path, output_path, gamma, use_gpu, selected_filter_index,
+                    progress_var, interactable_elements, gui_instance, open_after_conversion,
+                    cancel_button, tonemapper='reinhard', selected_codec='h264', crop=None,
+                    resolution=None, positions=None, clip_seconds=PROOF_CLIP_SECONDS, concatenate=True,
+                    encoder_settings=None, resource_policy=None):
+        """
+        Render short proof clips of input_path with the current settings for review.
+
+        Clips of clip_seconds start at positions (seconds; defaults to the preview frame
+        positions) and are encoded in parallel. With concatenate they are joined into a single
+        <output>_proof file, otherwise each is kept as <output>_proof_NN. The delivery
+        output_path itself is never written.
+        """
+        if not self.verify_paths(input_path, output_path):
+            return None
+
+        input_path = os.path.abspath(input_path)
+        output_path = os.path.abspath(output_path)
+        self.cancelled = False
+        self.use_gpu = use_gpu
+
+        properties = get_video_properties(input_path)
+        if properties is None:
+            messagebox.showwarning("Warning", "Failed to retrieve video properties.")
+            return None
+
+        ranges = get_proof_ranges(properties['duration'], positions, clip_seconds)
+        proof_path = get_proof_path(output_path) if concatenate else None
+        temp_dir = tempfile.mkdtemp(prefix='hdr_proof_') if concatenate else None
+        ext = os.path.splitext(output_path)[1]
+        clip_paths = [
+            os.path.join(temp_dir, f'clip_{index:02d}{ext}') if concatenate else get_proof_path(output_path, index)
+            for index in range(1, len(ranges) + 1)
+        ]
+        clip_commands = [
+            self.construct_ffmpeg_command(
+                input_path, clip_path, gamma, properties, use_gpu, selected_filter_index,
+                tonemapper=tonemapper, selected_codec=selected_codec, crop=crop, resolution=resolution,
+                start=start, end=end, encoder_settings=encoder_settings)
+            for clip_path, (start, end) in zip(clip_paths, ranges)
+        ]
+        logging.info(f"Rendering {len(ranges)} proof clips of {clip_seconds}s at "
+                     f"{', '.join(f'{start:.1f}s' for start, _ in ranges)}")
+
+        def on_progress(completed, total):
+            progress = completed / total * 100
+            gui_instance.root.after(0, lambda p=progress: progress_var.set(p))
+
+        self.disable_ui(interactable_elements)
+        cancel_button.config(command=lambda: self.cancel_conversion(
+            gui_instance, interactable_elements, cancel_button))
+        cancel_button.grid()
+        if hasattr(gui_instance, 'show_pause_button'):
+            gui_instance.show_pause_button()
+
+        proof = ProofRender(clip_commands, clip_paths, self.start_ffmpeg_process,
+                            output_path=proof_path, progress_callback=on_progress, temp_dir=temp_dir)
+        self.conversion_fps = None
+        self.pause_clock = PauseClock()
+        if resource_policy is not None:
+            self.set_resource_policy(resource_policy)
+        self.process = proof.start()
+        result_path = proof_path or os.path.dirname(output_path)
+
+        def monitor():
+            proof.wait()
+            if self.process is proof:
+                self.handle_completion(gui_instance, interactable_elements, cancel_button,
+                                       result_path, open_after_conversion, proof.error_lines)
+
+        threading.Thread(target=monitor, daemon=True).start()
+        return proof
+
+    def estimate_conversion(self, input_path, output_path, gamma, use_gpu, selected_filter_index,
+                            tonemapper='reinhard', selected_codec='h264', crop=None, resolution=None,
+                            cancel_event=None, encoder_settings=None):
+        """
+        Estimate how long converting input_path will take and how large the output will be.
+        Blocks while samples are encoded; see estimator.estimate_conversion for the result.
+        """
+        properties = get_video_properties(input_path)
+        if properties is None:
+            raise ValueError("Failed to retrieve video properties.")
+
+        def build_command(sample_path, start, end):
+            return self.construct_ffmpeg_command(
+                input_path, sample_path, gamma, properties, use_gpu, selected_filter_index,
+                tonemapper=tonemapper, selected_codec=selected_codec, crop=crop, resolution=resolution,
+                start=start, end=end, encoder_settings=encoder_settings)
+
+        return estimate_conversion(build_command, properties['duration'], cancel_event=cancel_event,
+                                   extension=os.path.splitext(output_path)[1] or '.mp4')
+
+    def autotune_encoder(self, input_path, gamma, use_gpu, selected_filter_index, tonemapper='reinhard',
+                         selected_codec='h264', crop=None, resolution=None, target_fps=None,
+                         target_seconds=None, min_ssim=None, cancel_event=None):
+        """
+        Search encoder presets and CRFs on samples of input_path for a speed or quality target.
+        target_seconds is a wall time budget for the whole conversion, turned into a target fps.
+        Blocks while trials run; returns the autotune.autotune_encoder result, whose 'preset'
+        and 'crf' can be passed on as encoder_settings.
+        """
+        properties = get_video_properties(input_path)
+        if properties is None:
+            raise ValueError("Failed to retrieve video properties.")
+        if target_seconds:
+            target_fps = properties['duration'] * properties['frame_rate'] / target_seconds
+        source_size = (crop['width'], crop['height']) if crop else (properties['width'], properties['height'])
+
+        def build_reference_command(reference_path, start, end):
+            return self.construct_reference_command(
+                input_path, reference_path, gamma, properties, selected_filter_index,
+                tonemapper=tonemapper, crop=crop, resolution=resolution, start=start, end=end)
+
+        def build_encode_command(reference_path, encoded_path, settings):
+            return ([FFMPEG_EXECUTABLE, '-loglevel', 'error', '-i', reference_path]
+                    + self.encoder_args(properties, use_gpu, selected_codec, settings)
+                    + ['-pix_fmt', 'yuv420p', encoded_path, '-y'])
+
+        return autotune_encoder(
+            build_reference_command, build_encode_command, get_encoder_name(selected_codec, use_gpu),
+            properties['duration'], properties['frame_rate'], plan_output_size(*source_size, resolution),
+            target_fps=target_fps, min_ssim=min_ssim, cancel_event=cancel_event)
+
     def verify_paths(self, input_path, output_path):
         if not input_path or not output_path:
             messagebox.showwarning(
@@ -67,7 +497,9 @@ class ConversionManager:
             element.config(state="normal")
 
     def construct_ffmpeg_command(self, input_path, output_path, gamma, properties, use_gpu, 
-                               selected_filter_index, tonemapper='reinhard', selected_codec='h264'):
+                               selected_filter_index, tonemapper='reinhard', selected_codec='h264',
+                               crop=None, resolution=None, mezzanine_path=None, start=None, end=None,
+                               encoder_settings=None, muxing='faststart', follow=False):
         cmd = [
             FFMPEG_EXECUTABLE,
             '-loglevel', 'info',
@@ -85,30 +517,25 @@ class ConversionManager:
                 messagebox.showwarning("Warning", "GPU acceleration is not supported on this platform.")
                 use_gpu = False
 
-        # Input file
-        cmd += ['-i', os.path.normpath(input_path)]
+        # Input file; a range is applied as input options so seeking skips decoding the rest
+        cmd += range_args(start, end)
+        if follow:
+            cmd += follow_input_args() + ['-i', follow_input_url(input_path)]
+        else:
+            cmd += ['-i', os.path.normpath(input_path)]
 
         # The filter must be applied before mapping streams
-        tonemapper = tonemapper.lower()
-        if selected_filter_index == 1:
-            maxfall = get_maxfall(input_path)
-            filter_str = FFMPEG_FILTER[selected_filter_index].format(
-                gamma=gamma, width=properties["width"], height=properties["height"],
-                npl=maxfall, tonemapper=tonemapper
-            )
-            cmd += [
-                '-filter_complex', f'[0:v:0]{filter_str}[vout]',
-                '-map', '[vout]'  # Map the filtered video output
-            ]
-        else:
-            filter_str = FFMPEG_FILTER[selected_filter_index].format(
-                gamma=gamma, width=properties["width"], height=properties["height"],
-                tonemapper=tonemapper
-            )
-            cmd += [
-                '-filter_complex', f'[0:v:0]{filter_str}[vout]',
-                '-map', '[vout]'  # Map the filtered video output
-            ]
+        filter_str = self.conversion_filter(input_path, gamma, properties, selected_filter_index,
+                                            tonemapper, crop, resolution)
+        video_outputs = '[vout]'
+        if mezzanine_path:
+            # Tee the tonemapped frames into a second, lossless output
+            filter_str += ',split=2'
+            video_outputs = '[vout][vmez]'
+        cmd += [
+            '-filter_complex', f'[0:v:0]{filter_str}{video_outputs}',
+            '-map', '[vout]'  # Map the filtered video output
+        ]
 
         # Map remaining streams
         cmd += [
@@ -117,55 +544,128 @@ class ConversionManager:
         ]
 
         # Encoding settings
+        cmd += self.encoder_args(properties, use_gpu, selected_codec, encoder_settings)
+
+        # Common settings
+        cmd += [
+            '-r', str(properties['frame_rate']),
+            '-pix_fmt', 'yuv420p', # Moved back to common settings
+            '-strict', '-2',
+            '-c:a', 'copy',      # Copy all audio streams as-is
+            '-c:s', 'copy',      # Copy all subtitle streams as-is
+            '-map_metadata', '0', # Copy all metadata
+        ]
+        if is_stream_output(output_path):
+            cmd += stream_output_args(output_path) + ['-y']
+        else:
+            cmd += MUXING_ARGS[muxing]  # Index placement for streaming playback; see utils.choose_muxing
+            cmd += [
+                os.path.normpath(output_path),
+                '-y'
+            ]
+        if mezzanine_path:
+            cmd += ['-map', '[vmez]'] + MEZZANINE_ARGS + [os.path.normpath(mezzanine_path)]
+
+        logging.debug(f"Constructed ffmpeg command: {' '.join(cmd)}")
+        return cmd
+
+    def conversion_filter(self, input_path, gamma, properties, selected_filter_index,
+                          tonemapper='reinhard', crop=None, resolution=None):
+        """Return the crop, scale and tonemap filter graph of a conversion."""
+        # Cropping and downscaling come first so the tonemap stages only touch output pixels
+        source_size = (crop['width'], crop['height']) if crop else (properties["width"], properties["height"])
+        output_size = plan_output_size(*source_size, resolution)
+        maxfall = get_maxfall(input_path) if selected_filter_index == 1 else None
+        return build_filter_graph(
+            selected_filter_index, gamma, tonemapper, npl=maxfall, crop=crop,
+            source_size=source_size, output_size=output_size
+        )
+
+    def construct_reference_command(self, input_path, output_path, gamma, properties, selected_filter_index,
+                                    tonemapper='reinhard', crop=None, resolution=None, start=None, end=None):
+        """Tonemap a range of input_path to a lossless video, the reference encoder trials are scored against."""
+        filter_str = self.conversion_filter(input_path, gamma, properties, selected_filter_index,
+                                            tonemapper, crop, resolution)
+        cmd = [FFMPEG_EXECUTABLE, '-loglevel', 'error'] + range_args(start, end) + [
+            '-i', os.path.normpath(input_path),
+            '-filter_complex', f'[0:v:0]{filter_str}[vout]',
+            '-map', '[vout]'
+        ] + MEZZANINE_ARGS + [os.path.normpath(output_path), '-y']
+        return cmd
+
+    def construct_mezzanine_command(self, mezzanine_path, input_path, output_path, properties, use_gpu,
+                                    selected_codec='h264', encoder_settings=None, muxing='faststart'):
+        """Encode a cached mezzanine to the output, taking audio, subtitles and metadata from the source."""
+        cmd = [
+            FFMPEG_EXECUTABLE,
+            '-loglevel', 'info',
+            '-i', os.path.normpath(mezzanine_path),
+            '-i', os.path.normpath(input_path),
+            '-map', '0:v:0',
+            '-map', '1:a?',
+            '-map', '1:s?'
+        ]
+        cmd += self.encoder_args(properties, use_gpu, selected_codec, encoder_settings)
+        cmd += [
+            '-r', str(properties['frame_rate']),
+            '-pix_fmt', 'yuv420p',
+            '-strict', '-2',
+            '-c:a', 'copy',
+            '-c:s', 'copy',
+            '-map_metadata', '1',
+        ]
+        if is_stream_output(output_path):
+            cmd += stream_output_args(output_path) + ['-y']
+        else:
+            cmd += MUXING_ARGS[muxing] + [os.path.normpath(output_path), '-y']
+        logging.debug(f"Constructed mezzanine encode command: {' '.join(cmd)}")
+        return cmd
+
+    def encoder_args(self, properties, use_gpu, selected_codec='h264', encoder_settings=None):
+        """
+        Return the video encoder arguments for the selected codec. encoder_settings may
+        override the 'preset' and 'crf' (the -cq level for NVENC), e.g. with a result of
+        autotune.autotune_encoder.
+        """
+        settings = encoder_settings or {}
+        args = []
         if selected_codec == 'h264':
             if use_gpu:
-                cmd += [
+                args += [
                     '-c:v', 'h264_nvenc',
-                    '-preset', 'p4',
+                    '-preset', settings.get('preset', 'p4'),
                     '-tune', 'hq',
                     '-rc', 'vbr',
-                    '-cq', '20',
+                    '-cq', str(settings.get('crf', 20)),
                     '-b:v', str(properties['bit_rate']),
                     '-maxrate', str(int(properties['bit_rate'] * 1)),
                     '-bufsize', str(int(properties['bit_rate'] * 2))
                 ]
             else:
-                cmd += [
+                args += [
                     '-c:v', 'libx264',
-                    '-preset', 'veryfast',  # Reverted to veryfast
+                    '-preset', settings.get('preset', 'veryfast'),  # Reverted to veryfast
                     '-tune', 'film',
-                    '-crf', '23',
+                    '-crf', str(settings.get('crf', 23)),
                     '-b:v', str(properties['bit_rate'])
                 ]
         elif selected_codec == 'h265':
             # HEVC (H.265) CPU encoding
-            cmd += [
+            args += [
                 '-c:v', 'libx265',
-                '-preset', 'medium',
-                '-crf', '28',
+                '-preset', settings.get('preset', 'medium'),
+                '-crf', str(settings.get('crf', 28)),
                 '-tune', 'film',
                 '-pix_fmt', 'yuv420p', # 8-bit
                 '-x265-params', 'keyint=240:min-keyint=24:scenecut=40'
             ]
+        return args
 
-        # Common settings
-        cmd += [
-            '-r', str(properties['frame_rate']),
-            '-pix_fmt', 'yuv420p', # Moved back to common settings
-            '-strict', '-2',
-            '-c:a', 'copy',      # Copy all audio streams as-is
-            '-c:s', 'copy',      # Copy all subtitle streams as-is
-            '-map_metadata', '0', # Copy all metadata
-            '-movflags', '+faststart',  # Optimize for streaming playback
-            os.path.normpath(output_path),
-            '-y'
-        ]
-
-        logging.debug(f"Constructed ffmpeg command: {' '.join(cmd)}")
-        return cmd
-
-    def start_ffmpeg_process(self, cmd):
-        """Start the FFmpeg process without showing a console window."""
+    def start_ffmpeg_process(self, cmd, stdout=subprocess.PIPE):
+        """
+        Start the FFmpeg process without showing a console window. Pass stdout=None to let
+        FFmpeg write to this process's stdout.
+        """
         startupinfo = None
         creationflags = 0
         if sys.platform == "win32":
@@ -173,66 +673,211 @@ class ConversionManager:
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
             startupinfo.wShowWindow = subprocess.SW_HIDE
             creationflags = subprocess.CREATE_NO_WINDOW
+            creationflags |= priority_creationflags(get_policy(self.resource_policy))
 
         process = subprocess.Popen(
             cmd,
             stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
+            stdout=stdout,
             universal_newlines=True,
             startupinfo=startupinfo,
             creationflags=creationflags,
             encoding='utf-8',
-            errors='replace'
+            errors='replace',
+            **new_session_kwargs()
         )
+        apply_resource_policy(process, get_policy(self.resource_policy))
         logging.debug(f"Started FFmpeg process with command: {' '.join(cmd)}")
         return process
 
+    def set_resource_policy(self, name):
+        """Run FFmpeg under the named governor.RESOURCE_POLICIES entry from the next process on."""
+        policy = get_policy(name)
+        self.resource_policy = name
+        io_phases.set_limit(policy.get('io_slots'))
+        logging.info(f"Resource policy: {name}")
+
+    def record_throughput(self):
+        """Add the finished conversion's speed to the statistics of its resource policy."""
+        if self.conversion_fps is None:
+            return
+        try:
+            entry = record_policy_throughput(self.resource_policy, self.conversion_fps, self.conversion_size)
+        except OSError as e:
+            logging.warning(f"Could not record throughput: {e}")
+            return
+        logging.info(f"Resource policy {self.resource_policy}: {entry['fps']:.1f} fps "
+                     f"on average over {entry['runs']} conversions")
+
+    def record_job_start(self, params, input_path, output_path, cmd, encoder, source_seconds,
+                         probe_seconds, analysis_seconds):
+        """Add the conversion to the job history and look up how fast similar earlier jobs ran."""
+        self.history_id = safe_history(
+            job_history.add_job, params, input_path=input_path, output_path=output_path, argv=cmd,
+            output_size=self.conversion_size, source_seconds=source_seconds, probe_seconds=probe_seconds,
+            analysis_seconds=analysis_seconds, encoder=encoder)
+        self.expected_speed = safe_history(job_history.expected_speed, encoder,
+                                           resolution_class(*self.conversion_size))
+        if self.expected_speed:
+            logging.info(f"Similar conversions ran at {self.expected_speed:.2f}x real time")
+
+    def record_job_finish(self, outcome, output_path=None, error_messages=None):
+        """Record how the current conversion ended, with its encode and faststart times, in the job history."""
+        history_id, self.history_id = self.history_id, None
+        self.finished_history_id = history_id
+        if history_id is None:
+            return
+        phases = {}
+        if self.encode_started is not None:
+            finished = time.perf_counter()
+            encode_finished = self.finalize_started or finished
+            phases['encode'] = (encode_finished - self.encode_started
+                                - self.pause_clock.paused_seconds(encode_finished))
+            phases['mux'] = finished - self.finalize_started if self.finalize_started else 0.0
+        if output_path is not None and is_stream_output(output_path):
+            output_path = None
+        safe_history(job_history.finish_job, history_id, outcome, phases, fps=self.conversion_fps,
+                     output_path=output_path, error_lines=error_messages)
+
+    def history_remaining(self, done, total):
+        """Seconds left to convert at the speed of similar earlier jobs, or None without any."""
+        if not self.expected_speed:
+            return None
+        return max(total - done, 0) / self.expected_speed
+
     def monitor_progress(self, progress_var, duration, gui_instance, interactable_elements,
                          cancel_button, output_path, open_after_conversion, gamma):
         progress_pattern = re.compile(r'time=(\d+:\d+:\d+\.\d+)')
+        fps_pattern = re.compile(r'fps=\s*(\d+(?:\.\d+)?)')
         error_messages = []
         gpu_error_detected = False
+        progress_metrics = ConversionProgress()
+        job_log = JobLog(f"{time.strftime('%Y%m%d-%H%M%S')}-{os.path.basename(output_path)}")
+        if hasattr(gui_instance, 'show_remaining') and not callable(duration):
+            # Until FFmpeg's own rate is known, estimate from the history
+            remaining = self.history_remaining(0, duration - self.progress_offset)
+            gui_instance.root.after(0, lambda r=remaining: gui_instance.show_remaining(r))
 
         for line in self.process.stderr:
             if self.process is None:
+                progress_metrics.finish()
                 return
             decoded_line = line.strip()
-            logging.debug(decoded_line)
             error_messages.append(decoded_line)
             match = progress_pattern.search(decoded_line)
+            job_log.ffmpeg_line(decoded_line, progress=match is not None)
             if match:
                 elapsed_time = self.parse_time(match.group(1))
-                progress = (elapsed_time / duration) * 100
+                # A followed input's duration is re-estimated as it grows
+                total = duration() if callable(duration) else duration
+                progress = min(((self.progress_offset + elapsed_time) / total) * 100, 100)
                 gui_instance.root.after(0, lambda p=progress: progress_var.set(p))
                 gui_instance.root.after(0, gui_instance.root.update_idletasks)
+                if hasattr(gui_instance, 'show_remaining'):
+                    # Rate of this run only, so a resumed conversion's head start doesn't skew it
+                    remaining = estimate_remaining(elapsed_time, total - self.progress_offset,
+                                                   self.pause_clock.active_seconds())
+                    if remaining is None:
+                        remaining = self.history_remaining(elapsed_time, total - self.progress_offset)
+                    gui_instance.root.after(0, lambda r=remaining: gui_instance.show_remaining(r))
+            fps_match = fps_pattern.search(decoded_line)
+            if fps_match:
+                self.conversion_fps = float(fps_match.group(1))
+            if match or fps_match:
+                progress_metrics.update(decoded_line, self.conversion_fps if fps_match else None)
 
             if 'cuda' in decoded_line.lower() or 'nvcuda.dll' in decoded_line.lower():
                 gpu_error_detected = True
+            if 'moving the moov atom' in decoded_line:
+                # Encoding is done; +faststart now rewrites the whole file without reporting progress
+                self.finalize_started = time.perf_counter()
+                logging.info("Encoding finished; moving the MP4 index to the front of the file")
+                if hasattr(gui_instance, 'show_finalizing'):
+                    gui_instance.root.after(0, gui_instance.show_finalizing)
 
+        progress_metrics.finish()  # FFmpeg closed its output, so it is done or about to be
         if self.process is not None:
             self.process.wait()
+            self.log_phase_timing()
+            self.finish_growing_input()
+            self.finish_mezzanine(self.process.returncode == 0 and not self.cancelled)
+            self.finish_resume_job(self.process.returncode == 0 and not self.cancelled)
+            if self.process is None:
+                return
+            if not self.cancelled:
+                self.record_job_finish('success' if self.process.returncode == 0 else 'failed',
+                                       output_path, error_messages)
             if self.process.returncode != 0 and self.use_gpu and gpu_error_detected and not self.cancelled:
                 logging.warning("GPU acceleration failed. Retrying with CPU encoding.")
+                gpu_fallbacks.inc()
                 # Untick GPU checkbox
                 gui_instance.gpu_accel_var.set(False)
                 messagebox.showwarning("GPU Acceleration Failed",
                                      "GPU acceleration failed. Switching to CPU encoding.")
+                # The same settings as the GPU run, so a resumable one keeps the segments the GPU finished
+                settings = dict(self.conversion_settings)
+                codec = settings['selected_codec']
+                settings['encoder_settings'] = map_encoder_settings(
+                    settings['encoder_settings'], get_encoder_name(codec, True), get_encoder_name(codec, False))
                 self.start_conversion(
-                    input_path=gui_instance.input_path_var.get(),
-                    output_path=gui_instance.output_path_var.get(),
+                    input_path=self.conversion_input,
+                    output_path=output_path,
                     gamma=gamma,
                     use_gpu=False,  # Force CPU encoding
-                    selected_filter_index=self.filter_options.index(gui_instance.filter_var.get()),
                     progress_var=progress_var,
                     interactable_elements=interactable_elements,
                     gui_instance=gui_instance,
                     open_after_conversion=open_after_conversion,
-                    cancel_button=cancel_button
+                    cancel_button=cancel_button,
+                    crop=self.conversion_crop,
+                    resolution=self.conversion_resolution,
+                    start=self.conversion_range[0],
+                    end=self.conversion_range[1],
+                    muxing=self.conversion_muxing,
+                    follow=self.growing_input is not None,
+                    declared_size=self.growing_input.declared_size if self.growing_input else None,
+                    resumable=self.resume_job is not None,
+                    verify=self.verify,
+                    **settings
                 )
             else:
                 self.handle_completion(gui_instance, interactable_elements, cancel_button,
                                     output_path, open_after_conversion, error_messages)
 
+    def finish_mezzanine(self, success):
+        """Commit the mezzanine the conversion wrote, or discard it if the conversion didn't finish."""
+        key, self.mezzanine_key = self.mezzanine_key, None
+        if key is None:
+            return
+        if success:
+            self.mezzanine_cache.commit(key)
+        else:
+            self.mezzanine_cache.discard(key)
+
+    def finish_growing_input(self):
+        """Stop watching a followed input and warn if its transfer ended early."""
+        if self.growing_input is None:
+            return
+        self.growing_input.stop()
+        if self.growing_input.truncated:
+            logging.warning(f"{self.growing_input.path} stopped at {self.growing_input.size} of "
+                            f"{self.growing_input.declared_size} declared bytes; the output is truncated")
+
+    def log_phase_timing(self):
+        """Log how long encoding and, if it ran, the faststart rewrite took."""
+        if self.conversion_started is None:
+            return
+        finished = time.perf_counter()
+        # Pauses are left out and counted against encoding
+        paused = self.pause_clock.paused_seconds(finished)
+        paused_note = f" ({paused:.1f} s paused not counted)" if paused else ""
+        if self.finalize_started is None:
+            logging.info(f"Conversion took {finished - self.conversion_started - paused:.1f} s{paused_note}")
+            return
+        logging.info(f"Encoding took {self.finalize_started - self.conversion_started - paused:.1f} s; "
+                     f"the faststart rewrite took a further {finished - self.finalize_started:.1f} s"
+                     f"{paused_note}")
+
     def parse_time(self, time_str):
         hours, minutes, seconds = map(float, time_str.split(':'))
         return hours * 3600 + minutes * 60 + seconds
@@ -242,37 +887,110 @@ class ConversionManager:
         def _handle():
             if self.process and self.process.returncode == 0:
                 logging.info("Conversion completed successfully.")
+                record_job_outcome('success')
+                self.log_conversion_speed()
+                self.record_throughput()
+                if self.verify:
+                    self.start_verification(gui_instance, output_path)
                 messagebox.showinfo(
                     "Success", f"Conversion complete! Output saved to: {output_path}")
-                if open_after_conversion:
+                if open_after_conversion and not is_stream_output(output_path):
                     webbrowser.open(output_path)
             elif not self.cancelled:
                 error_message = '\n'.join(error_messages)
                 logging.error(f"Conversion failed with code {self.process.returncode}: {error_message}")
+                record_job_outcome('failed')
                 messagebox.showerror(
                     "Error", f"Conversion failed with code {self.process.returncode}\n{error_message}")
 
             self.enable_ui(interactable_elements)
             cancel_button.grid_remove()
+            if hasattr(gui_instance, 'hide_pause_button'):
+                gui_instance.hide_pause_button()
+            if hasattr(gui_instance, 'hide_finalizing'):
+                gui_instance.hide_finalizing()
 
             if hasattr(gui_instance, 'register_drop_target'):
                 gui_instance.register_drop_target()
 
         gui_instance.root.after(0, _handle)
 
+    def start_verification(self, gui_instance, output_path):
+        """Verify the finished output in the background and add the result to its job record."""
+        input_path, properties, history_id = self.conversion_input, self.conversion_properties, self.finished_history_id
+        expected_duration = self.get_range_duration(properties, *self.conversion_range)
+
+        def verify():
+            result = verify_output(output_path, input_path, expected_duration, properties['frame_rate'])
+            if history_id is not None:
+                safe_history(job_history.update_job, history_id, verification=result)
+            if not result['ok']:
+                failures = '\n'.join(f"{name}: {check['detail']}"
+                                     for name, check in result['checks'].items() if not check['ok'])
+                gui_instance.root.after(0, lambda: messagebox.showwarning(
+                    "Verification Failed", f"{output_path} may be corrupt:\n{failures}"))
+
+        threading.Thread(target=verify, daemon=True).start()
+
+    def log_conversion_speed(self):
+        """Log the encoding speed and, for cropped conversions, the gain the crop allows."""
+        if self.conversion_fps is None:
+            return
+        message = f"Converted at {self.conversion_fps:.1f} fps"
+        if self.conversion_crop_saving > 0:
+            # Per-pixel stages dominate, so throughput scales with the inverse of the pixel count
+            speedup = 1 / (1 - self.conversion_crop_saving)
+            message += (f"; cropping removed {self.conversion_crop_saving:.1%} of the pixels, "
+                        f"an estimated {speedup:.2f}x over the uncropped {self.conversion_fps / speedup:.1f} fps")
+        logging.info(message)
+
     def cancel_conversion(self, gui_instance, interactable_elements, cancel_button):
         self.cancelled = True
         if self.process:
+            if self.pause_clock.paused:
+                # A stopped process only acts on the termination once continued
+                self.resume_conversion()
             self.process.terminate()
+            self.finish_mezzanine(False)
             self.process = None
+            record_job_outcome('cancelled')
+            self.record_job_finish('cancelled')
             gui_instance.root.after(0, lambda: messagebox.showinfo(
                 "Cancelled", "Video conversion has been cancelled."))
             self.enable_ui(interactable_elements)
             cancel_button.grid_remove()
+            if hasattr(gui_instance, 'hide_pause_button'):
+                gui_instance.hide_pause_button()
 
             if hasattr(gui_instance, 'register_drop_target'):
                 gui_instance.register_drop_target()
 
+    @property
+    def is_paused(self):
+        return self.process is not None and self.pause_clock.paused
+
+    def pause_conversion(self):
+        """
+        Suspend the running conversion in place, freeing the CPU or GPU for other work; nothing
+        encoded so far is lost. Progress and the remaining-time estimate leave out the pause.
+        Returns False if nothing is running or it is paused already.
+        """
+        if self.process is None or self.pause_clock.paused or self.process.poll() is not None:
+            return False
+        suspend_process(self.process)
+        self.pause_clock.pause()
+        logging.info("Conversion paused")
+        return True
+
+    def resume_conversion(self):
+        """Continue a conversion suspended by pause_conversion. Returns False if none is paused."""
+        if self.process is None or not self.pause_clock.paused:
+            return False
+        resume_process(self.process)
+        self.pause_clock.resume()
+        logging.info(f"Conversion resumed after {self.pause_clock.paused_total:.1f} s paused in total")
+        return True
+
     def extract_frame(self, video_path, time=None):
         properties = get_video_properties(video_path)
         if not properties or properties['duration'] == 0:
@@ -0,0 +1,542 @@
+"""
+Distributed segment encoding: one coordinator, any number of worker nodes.
+
+The coordinator splits the source into segments whose boundaries sit on source keyframes,
+so each worker's seek lands on a keyframe and decodes nothing it throws away. Each segment
+is encoded with the command construct_ffmpeg_command builds for the whole conversion and
+comes out video-only and starting with a keyframe. Failed segments are retried on other
+workers. Finished segments are joined by stream copy, with the audio and subtitles of the
+source (as resume.ResumeJob does).
+
+Input and output go either through shared storage (--shared-dir, with the source at the
+same path on every node) or over the network: workers read the source from the
+coordinator with HTTP range requests, and stream the encoded segment back over their
+connection.
+
+Workers execute FFmpeg with arguments the coordinator sends. Run them on trusted networks
+only, and set a shared token (--token or HDR_CONVERTER_WORKER_TOKEN) on both sides; a worker
+refuses to listen on anything but a loopback address without one.
+
+Usage:
+    python src/distributed.py worker [--host 127.0.0.1] [--port 9100] [--slots 1] [--token T]
+    python src/distributed.py convert INPUT OUTPUT --workers host:port [host:port ...]
+                              [--shared-dir DIR] [--segment-seconds 30] [--filter dynamic]
+                              [--tonemapper mobius] [--codec h264] [--token T]
+"""
+import os
+import sys
+import hmac
+import ipaddress
+import json
+import struct
+import shutil
+import socket
+import logging
+import argparse
+import secrets
+import tempfile
+import threading
+import subprocess
+import socketserver
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils import FFMPEG_EXECUTABLE, FFPROBE_EXECUTABLE, get_video_properties, range_args, TONEMAP
+from conversion import ConversionManager
+from resume import segment_concat_command
+
+WORKER_HOST = '127.0.0.1'
+WORKER_PORT = 9100
+WORKER_TOKEN_ENV_VAR = 'HDR_CONVERTER_WORKER_TOKEN'
+DISTRIBUTED_SEGMENT_SECONDS = 30
+DISTRIBUTED_MAX_ATTEMPTS = 3  # Tries per segment, each on a different worker where possible
+CONNECT_TIMEOUT = 10
+CHUNK_SIZE = 1024 * 1024
+ERROR_LINES = 10
+SEGMENT_NAME = 'segment_{:05d}.mkv'
+# Every segment starts with a keyframe and repeats its parameter sets, so they concatenate
+SEGMENT_OUTPUT_ARGS = ['-an', '-sn', '-bsf:v', 'dump_extra=freq=keyframe']
+_CHUNK_HEADER = struct.Struct('>I')
+
+
+class WorkerError(RuntimeError):
+    """Raised when a worker ran a segment and FFmpeg failed."""
+
+
+def get_keyframe_times(video_path):
+    """
+    Return the presentation times of the video keyframes, read from packet flags without
+    decoding, or None if they can't be read.
+    """
+    command = [FFPROBE_EXECUTABLE, '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', os.path.normpath(video_path)]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            times.append(float(pts_time))
+    return sorted(times) or None
+
+
+def plan_segments(duration, frame_rate, segment_seconds=DISTRIBUTED_SEGMENT_SECONDS, keyframes=None):
+    """
+    Return the segments as (first frame, frame count), covering the whole output.
+    Each boundary is the keyframe nearest to a multiple of segment_seconds, if one lies within
+    half a segment of it, on the output frame grid.
+    """
+    total_frames = max(1, round(duration * frame_rate))
+    boundaries = [0]
+    target = segment_seconds
+    while target < duration - segment_seconds / 2:
+        boundary_time = target
+        if keyframes:
+            nearest = min(keyframes, key=lambda t: abs(t - target))
+            if abs(nearest - target) <= segment_seconds / 2:
+                boundary_time = nearest
+        frame = round(boundary_time * frame_rate)
+        if boundaries[-1] < frame < total_frames:
+            boundaries.append(frame)
+        target += segment_seconds
+    boundaries.append(total_frames)
+    return [(start, end - start) for start, end in zip(boundaries, boundaries[1:])]
+
+
+# Wire format: one JSON line per request and reply. A streamed segment follows its reply
+# header as length-prefixed chunks ended by an empty chunk, then a JSON line with the result.
+
+def send_message(sock_file, message):
+    sock_file.write(json.dumps(message).encode('utf-8') + b'\n')
+    sock_file.flush()
+
+
+def read_message(sock_file):
+    line = sock_file.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    return json.loads(line)
+
+
+def send_chunk(sock_file, data):
+    sock_file.write(_CHUNK_HEADER.pack(len(data)) + data)
+
+
+def read_chunks(sock_file):
+    while True:
+        header = sock_file.read(_CHUNK_HEADER.size)
+        if len(header) < _CHUNK_HEADER.size:
+            raise ConnectionError("Connection closed mid-segment")
+        size, = _CHUNK_HEADER.unpack(header)
+        if size == 0:
+            return
+        data = sock_file.read(size)
+        if len(data) < size:
+            raise ConnectionError("Connection closed mid-segment")
+        yield data
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = read_message(self.rfile)
+        except (ConnectionError, ValueError):
+            return
+        server = self.server
+        if server.token and not hmac.compare_digest(str(request.get('token', '')), server.token):
+            send_message(self.wfile, {'error': 'Invalid token'})
+            return
+        if request.get('type') == 'hello':
+            send_message(self.wfile, {'slots': server.slots})
+            return
+        args = request.get('args')
+        if request.get('type') != 'encode' or not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+            send_message(self.wfile, {'error': 'Malformed request'})
+            return
+        with server.slot_semaphore:
+            self.encode(args, request.get('output'))
+
+    def encode(self, args, output_path):
+        streamed = output_path is None
+        output = ['-f', 'matroska', 'pipe:1'] if streamed else [os.path.normpath(output_path), '-y']
+        process = subprocess.Popen([FFMPEG_EXECUTABLE] + args + output, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE if streamed else subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE)
+        error_lines = deque(maxlen=ERROR_LINES)
+        # Drained alongside stdout so a chatty FFmpeg can't block on a full stderr pipe
+        reader = threading.Thread(target=lambda: error_lines.extend(
+            line.decode('utf-8', 'replace').rstrip() for line in process.stderr), daemon=True)
+        reader.start()
+        try:
+            if streamed:
+                send_message(self.wfile, {'stream': True})
+                for data in iter(lambda: process.stdout.read(CHUNK_SIZE), b''):
+                    send_chunk(self.wfile, data)
+                send_chunk(self.wfile, b'')
+            process.wait()
+            reader.join()
+            send_message(self.wfile, {'returncode': process.returncode, 'error': '\n'.join(error_lines)})
+        except OSError:
+            # The coordinator went away; it retries the segment elsewhere
+            process.kill()
+            process.wait()
+
+
+def is_loopback_host(host):
+    """Whether every address host resolves to is a loopback address; '' and 0.0.0.0 are not."""
+    if not host:
+        return False
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(address.split('%')[0]).is_loopback
+                                   for address in addresses)
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    """
+    A node's worker: encodes up to `slots` segments at once for any coordinator that connects.
+    Raises ValueError for a host other than loopback without a token, since whoever can connect
+    can have FFmpeg read and write any file the worker can.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host=WORKER_HOST, port=WORKER_PORT, slots=1, token=None):
+        if not token and not is_loopback_host(host):
+            raise ValueError(f"Listening on {host or 'all interfaces'} needs a token "
+                             f"(--token or {WORKER_TOKEN_ENV_VAR})")
+        super().__init__((host, port), _WorkerHandler)
+        self.slots = max(1, slots)
+        self.slot_semaphore = threading.BoundedSemaphore(self.slots)
+        self.token = token
+
+
+class _SourceHandler(BaseHTTPRequestHandler):
+    """Serves the source file with byte ranges, so workers' FFmpeg can seek in it over HTTP."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.send_source(body=False)
+
+    def do_GET(self):
+        self.send_source(body=True)
+
+    def send_source(self, body):
+        if self.path != self.server.source_url_path:
+            self.send_error(404)
+            return
+        size = os.path.getsize(self.server.source_path)
+        start, end = 0, size - 1
+        range_header = self.headers.get('Range', '')
+        if range_header.startswith('bytes='):
+            first, _, last = range_header[6:].split(',')[0].partition('-')
+            start = int(first) if first else max(size - int(last), 0)
+            end = min(int(last), size - 1) if first and last else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if not body:
+            return
+        try:
+            with open(self.server.source_path, 'rb') as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    data = f.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    remaining -= len(data)
+        except (ConnectionError, BrokenPipeError):
+            pass  # FFmpeg drops the connection when it seeks elsewhere
+
+    def log_message(self, format, *args):
+        logging.debug(f"Source request from {self.address_string()}: {format % args}")
+
+
+def serve_source(source_path, host):
+    """Serve source_path to the workers; the URL carries a random path so only they can fetch it."""
+    server = ThreadingHTTPServer((host, 0), _SourceHandler)
+    server.daemon_threads = True
+    server.source_path = source_path
+    server.source_url_path = f'/source/{secrets.token_urlsafe(16)}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url_host = host if host not in ('0.0.0.0', '') else socket.gethostname()
+    return server, f'http://{url_host}:{server.server_address[1]}{server.source_url_path}'
+
+
+class Segment:
+    def __init__(self, index, start_frame, frames):
+        self.index = index
+        self.start_frame = start_frame
+        self.frames = frames
+        self.attempts = 0
+        self.failed_on = set()  # Workers this segment failed on
+        self.path = None
+        self.error = None
+
+
+class Coordinator:
+    """
+    Encodes one conversion across workers given as 'host:port'.
+
+    settings are the start_conversion parameters: gamma, use_gpu, filter_index, tonemapper,
+    codec, crop, resolution and encoder_settings. With shared_dir, workers read the source at
+    input_path and write segments into shared_dir; otherwise the source is served over HTTP
+    from source_host (an address the workers can reach) and segments come back over the
+    worker connections.
+    """
+
+    def __init__(self, workers, input_path, output_path, settings, segment_seconds=DISTRIBUTED_SEGMENT_SECONDS,
+                 shared_dir=None, token=None, source_host=WORKER_HOST, properties=None, muxing='faststart',
+                 max_attempts=DISTRIBUTED_MAX_ATTEMPTS, progress_callback=None):
+        self.workers = list(workers)
+        self.input_path = os.path.abspath(input_path)
+        self.output_path = os.path.abspath(output_path)
+        self.settings = settings
+        self.segment_seconds = segment_seconds
+        self.shared_dir = shared_dir
+        self.token = token
+        self.source_host = source_host
+        self.properties = properties
+        self.muxing = muxing
+        self.max_attempts = max_attempts
+        self.progress_callback = progress_callback
+
+        self.segments = []
+        self.pending = []
+        self.in_flight = 0
+        self.completed = 0
+        self.alive = set()
+        self.condition = threading.Condition()
+        self.manager = ConversionManager()
+        self.input_url = None
+
+    def segment_args(self, segment):
+        """FFmpeg arguments of one segment, without the executable and the output."""
+        properties = self.properties
+        settings = self.settings
+        start = segment.start_frame / properties['frame_rate']
+        placeholder = os.path.join(tempfile.gettempdir(), 'segment.mkv')
+        cmd = self.manager.construct_ffmpeg_command(
+            self.input_path, placeholder, settings.get('gamma', 1.0), properties, settings.get('use_gpu', False),
+            settings.get('filter_index', 1), tonemapper=settings.get('tonemapper', 'mobius'),
+            selected_codec=settings.get('codec', 'h264'), crop=settings.get('crop'),
+            resolution=settings.get('resolution'), encoder_settings=settings.get('encoder_settings'),
+            muxing='plain')
+        cmd = cmd[1:cmd.index(os.path.normpath(placeholder))]
+        input_index = cmd.index('-i')
+        # Seek as an input option and count frames, so segments meet frame-exactly
+        cmd[input_index + 1] = self.input_url
+        cmd[input_index:input_index] = range_args(start or None)
+        return cmd + ['-frames:v', str(segment.frames)] + SEGMENT_OUTPUT_ARGS
+
+    def run(self):
+        """Encode every segment and join them; raises RuntimeError if a segment can't be encoded."""
+        if self.properties is None:
+            self.properties = get_video_properties(self.input_path)
+            if self.properties is None:
+                raise RuntimeError(f"Failed to retrieve video properties of {self.input_path}")
+        keyframes = get_keyframe_times(self.input_path)
+        plan = plan_segments(self.properties['duration'], self.properties['frame_rate'], self.segment_seconds,
+                             keyframes)
+        self.segments = [Segment(index, start, frames) for index, (start, frames) in enumerate(plan)]
+        self.pending = list(self.segments)
+        logging.info(f"Encoding {len(self.segments)} segments of {os.path.basename(self.input_path)} "
+                     f"on {len(self.workers)} workers")
+
+        work_dir = tempfile.mkdtemp(prefix='hdr_distributed_', dir=self.shared_dir)
+        source_server = None
+        if self.shared_dir:
+            self.input_url = os.path.normpath(self.input_path)
+        else:
+            source_server, self.input_url = serve_source(self.input_path, self.source_host)
+        try:
+            threads = []
+            for worker in self.workers:
+                slots = self.hello(worker)
+                if not slots:
+                    continue
+                self.alive.add(worker)
+                for _ in range(slots):
+                    thread = threading.Thread(target=self.dispatch, args=(worker, work_dir), daemon=True)
+                    thread.start()
+                    threads.append(thread)
+            if not threads:
+                raise RuntimeError("No worker is reachable")
+            for thread in threads:
+                thread.join()
+
+            failed = [segment for segment in self.segments if segment.path is None]
+            if failed:
+                raise RuntimeError(f"{len(failed)} segments failed; segment {failed[0].index}: {failed[0].error}")
+            cmd = segment_concat_command([segment.path for segment in self.segments],
+                                         os.path.join(work_dir, 'concat.txt'), self.input_path, self.output_path,
+                                         self.muxing)
+            result = subprocess.run(cmd, capture_output=True, text=True, errors='replace')
+            if result.returncode != 0:
+                raise RuntimeError(f"Joining segments failed: {result.stderr.strip()[-500:]}")
+        finally:
+            if source_server:
+                source_server.shutdown()
+                source_server.server_close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return self.output_path
+
+    def connect(self, worker):
+        host, _, port = worker.rpartition(':')
+        return socket.create_connection((host, int(port)), timeout=CONNECT_TIMEOUT)
+
+    def hello(self, worker):
+        """Return the worker's slot count, or None if it can't be reached."""
+        try:
+            with self.connect(worker) as sock, sock.makefile('rwb') as sock_file:
+                send_message(sock_file, {'type': 'hello', 'token': self.token})
+                reply = read_message(sock_file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Worker {worker} is not reachable: {e}")
+            return None
+        if 'error' in reply:
+            logging.warning(f"Worker {worker} refused: {reply['error']}")
+            return None
+        return reply.get('slots', 1)
+
+    def next_segment(self, worker):
+        """
+        Take the next segment for worker, preferring segments that haven't failed on it.
+        Blocks while segments are running elsewhere; returns None once nothing is left.
+        """
+        with self.condition:
+            while True:
+                if worker not in self.alive:
+                    return None
+                for segment in self.pending:
+                    if worker not in segment.failed_on or self.alive <= segment.failed_on:
+                        self.pending.remove(segment)
+                        self.in_flight += 1
+                        return segment
+                if not self.pending and not self.in_flight:
+                    return None
+                self.condition.wait()
+
+    def dispatch(self, worker, work_dir):
+        while True:
+            segment = self.next_segment(worker)
+            if segment is None:
+                return
+            try:
+                self.encode(worker, segment, work_dir)
+            except (OSError, ValueError, WorkerError) as e:
+                lost = not isinstance(e, WorkerError)
+                logging.warning(f"Segment {segment.index} failed on {worker}: {e}")
+                with self.condition:
+                    self.in_flight -= 1
+                    segment.attempts += 1
+                    segment.failed_on.add(worker)
+                    segment.error = str(e)
+                    if lost:
+                        # An unreachable node takes no more segments; the others pick up its work
+                        self.alive.discard(worker)
+                    if segment.attempts < self.max_attempts and self.alive:
+                        self.pending.insert(0, segment)
+                    self.condition.notify_all()
+                if lost:
+                    return
+                continue
+            with self.condition:
+                self.in_flight -= 1
+                self.completed += 1
+                completed = self.completed
+                self.condition.notify_all()
+            if self.progress_callback:
+                self.progress_callback(completed, len(self.segments))
+
+    def encode(self, worker, segment, work_dir):
+        path = os.path.join(work_dir, SEGMENT_NAME.format(segment.index))
+        request = {'type': 'encode', 'token': self.token, 'args': self.segment_args(segment),
+                   'output': path if self.shared_dir else None}
+        with self.connect(worker) as sock, sock.makefile('rwb') as sock_file:
+            sock.settimeout(None)  # A segment can take minutes
+            send_message(sock_file, request)
+            reply = read_message(sock_file)
+            if reply.get('stream'):
+                with open(path + '.part', 'wb') as f:
+                    for data in read_chunks(sock_file):
+                        f.write(data)
+                reply = read_message(sock_file)
+        if reply.get('returncode') != 0:
+            raise WorkerError(reply.get('error') or f"FFmpeg exited with {reply.get('returncode')}")
+        if not self.shared_dir:
+            os.replace(path + '.part', path)
+        segment.path = path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker = commands.add_parser('worker', help="Run a worker node")
+    worker.add_argument('--host', default=WORKER_HOST)
+    worker.add_argument('--port', type=int, default=WORKER_PORT)
+    worker.add_argument('--slots', type=int, default=1, help="Segments encoded at once")
+    worker.add_argument('--token', default=os.environ.get(WORKER_TOKEN_ENV_VAR))
+    convert = commands.add_parser('convert', help="Coordinate a conversion")
+    convert.add_argument('input')
+    convert.add_argument('output')
+    convert.add_argument('--workers', nargs='+', required=True, metavar='HOST:PORT')
+    convert.add_argument('--shared-dir', help="Directory every node sees at the same path")
+    convert.add_argument('--source-host', default=WORKER_HOST,
+                         help="Address the workers reach this machine at, to read the source")
+    convert.add_argument('--segment-seconds', type=float, default=DISTRIBUTED_SEGMENT_SECONDS)
+    convert.add_argument('--filter', choices=['static', 'dynamic'], default='dynamic')
+    convert.add_argument('--tonemapper', choices=[name.lower() for name in TONEMAP], default='mobius')
+    convert.add_argument('--codec', choices=['h264', 'h265'], default='h264')
+    convert.add_argument('--gamma', type=float, default=1.0)
+    convert.add_argument('--token', default=os.environ.get(WORKER_TOKEN_ENV_VAR))
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO)
+
+    if args.command == 'worker':
+        try:
+            server = WorkerServer(args.host, args.port, args.slots, args.token)
+        except ValueError as e:
+            parser.error(str(e))
+        # Printed for whoever started the worker, which matters with --port 0
+        print(f"Worker listening on {server.server_address[0]}:{server.server_address[1]}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    settings = {'gamma': args.gamma, 'filter_index': ['static', 'dynamic'].index(args.filter),
+                'tonemapper': args.tonemapper, 'codec': args.codec}
+    coordinator = Coordinator(args.workers, args.input, args.output, settings, args.segment_seconds,
+                              shared_dir=args.shared_dir, token=args.token, source_host=args.source_host,
+                              progress_callback=lambda done, total: print(f"{done}/{total} segments", flush=True))
+    try:
+        print(f"Wrote {coordinator.run()}")
+    except RuntimeError as e:
+        print(f"Conversion failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import os
+import math
+import time
+import shutil
+import logging
+import tempfile
+import statistics
+from utils import run_ffmpeg_command
+from proof import get_proof_ranges
+
+ESTIMATE_SAMPLES = 3
+ESTIMATE_SAMPLE_SECONDS = 3
+# Two-sided 95% Student's t critical values by degrees of freedom; few samples need wide bounds
+T_CRITICAL_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262}
+
+
+def confidence_interval(values):
+    """
+    Return (mean, low, high) of the 95% confidence interval for the mean of values.
+    A single value has no spread to measure and gives a zero-width interval.
+    """
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, mean, mean
+    t = T_CRITICAL_95.get(len(values) - 1, 1.96)
+    margin = t * statistics.stdev(values) / math.sqrt(len(values))
+    return mean, max(mean - margin, 0.0), mean + margin
+
+
+def estimate_conversion(build_command, duration, samples=ESTIMATE_SAMPLES,
+                        sample_seconds=ESTIMATE_SAMPLE_SECONDS, cancel_event=None, extension='.mp4'):
+    """
+    Estimate the wall time and output size of a conversion by encoding short samples of it.
+
+    Samples are spread over the video like the proof clips and encoded one after another
+    with the conversion's own command, so the measured speed and bitrate include the
+    filter graph, the encoder settings and the copied audio and subtitles. With -crf the
+    bitrate depends on the content, which is why it is measured rather than derived from
+    -b:v. Sample wall times include process start-up and seeking, so the time estimate
+    errs long.
+    Args:
+        build_command (callable): build_command(output_path, start, end) returns the FFmpeg
+            command that converts the range to output_path.
+        duration (float): Length of the video in seconds.
+        samples (int): Number of samples.
+        sample_seconds (float): Length of each sample.
+        cancel_event (threading.Event, optional): Stops the estimate with FFmpegCancelled.
+        extension (str): Container of the samples; use the output's so muxing overhead matches.
+    Returns:
+        dict: 'seconds' and 'size' (bytes) with '_low'/'_high' 95% bounds, the mean 'speed'
+            (multiple of realtime) and 'bitrate' (bits per second), and 'samples', the
+            measured (start, end, elapsed, bytes) of each sample.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='hdr_estimate_')
+    measured = []
+    try:
+        for index, (start, end) in enumerate(get_proof_ranges(duration, None, sample_seconds, samples)):
+            output_path = os.path.join(temp_dir, f'sample_{index:02d}{extension}')
+            started = time.perf_counter()
+            run_ffmpeg_command(build_command(output_path, start, end), cancel_event)
+            elapsed = time.perf_counter() - started
+            measured.append((start, end, elapsed, os.path.getsize(output_path)))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Seconds of wall time per second of video, and bytes per second of video
+    time_ratios = [elapsed / (end - start) for start, end, elapsed, _ in measured]
+    byte_rates = [size / (end - start) for start, end, _, size in measured]
+    time_ratio, time_low, time_high = confidence_interval(time_ratios)
+    byte_rate, bytes_low, bytes_high = confidence_interval(byte_rates)
+
+    estimate = {
+        'seconds': time_ratio * duration,
+        'seconds_low': time_low * duration,
+        'seconds_high': time_high * duration,
+        'size': byte_rate * duration,
+        'size_low': bytes_low * duration,
+        'size_high': bytes_high * duration,
+        'speed': 1 / time_ratio if time_ratio else float('inf'),
+        'bitrate': byte_rate * 8,
+        'samples': measured,
+    }
+    logging.info(f"Estimate from {len(measured)} samples: {format_estimate(estimate)}")
+    return estimate
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_estimate(estimate):
+    """Return a one-line summary such as '0:41:10 (0:38:02-0:44:19), 3.2 GB (2.9 GB-3.5 GB)'."""
+    return (f"{format_duration(estimate['seconds'])} "
+            f"({format_duration(estimate['seconds_low'])}-{format_duration(estimate['seconds_high'])}), "
+            f"{format_size(estimate['size'])} "
+            f"({format_size(estimate['size_low'])}-{format_size(estimate['size_high'])})")
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import logging
+import platform
+import threading
+from contextlib import contextmanager
+from utils import get_cache_dir
+
+# Per-job resource policies. nice is the POSIX niceness (mapped to a priority class on Windows),
+# io_class/io_level the Linux I/O scheduling class and level, reserve_cores the CPUs left out of
+# FFmpeg's affinity set for the GUI and the desktop (at least half are always kept), and
+# io_slots the number of I/O-heavy phases allowed at once (None for no cap).
+RESOURCE_POLICIES = {
+    # Leave scheduling to the OS
+    'default': {},
+    # Keep the preview and the rest of the workstation responsive
+    'interactive': {'nice': 10, 'io_class': 'best-effort', 'io_level': 7, 'reserve_cores': 2, 'io_slots': 1},
+    # Only use what nothing else wants
+    'background': {'nice': 19, 'io_class': 'idle', 'reserve_cores': 1, 'io_slots': 1},
+    # Dedicated machine: every core and the highest unprivileged I/O priority
+    'farm': {'nice': 0, 'io_class': 'best-effort', 'io_level': 0, 'reserve_cores': 0, 'io_slots': None},
+}
+DEFAULT_RESOURCE_POLICY = 'default'
+POLICY_STATS_FILE = 'policy_stats.json'
+
+IOPRIO_CLASSES = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+# ioprio_set has no libc wrapper; its syscall number depends on the architecture
+IOPRIO_SET_SYSCALLS = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'riscv64': 30,
+                       'armv7l': 314, 'ppc64le': 273, 's390x': 282}
+PROCESS_SET_INFORMATION = 0x0200
+PROCESS_QUERY_INFORMATION = 0x0400
+
+_stats_lock = threading.Lock()
+
+
+def get_policy(name):
+    """Return the RESOURCE_POLICIES entry for name."""
+    try:
+        return RESOURCE_POLICIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown resource policy {name!r}; choose from {', '.join(RESOURCE_POLICIES)}")
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def policy_cores(policy, cores=None):
+    """
+    Return the CPUs FFmpeg may run on under policy, or None to leave affinity alone.
+    The lowest-numbered cores are the ones left free; interrupts and the GUI tend to land there.
+    """
+    reserve = policy.get('reserve_cores')
+    if not reserve:
+        return None
+    cores = available_cores() if cores is None else sorted(cores)
+    reserve = min(reserve, len(cores) // 2)
+    return cores[reserve:] if reserve else None
+
+
+def priority_creationflags(policy):
+    """Return the Windows priority class flag matching the policy's niceness."""
+    nice = policy.get('nice', 0)
+    if sys.platform != "win32" or nice <= 0:
+        return 0
+    import subprocess
+    return subprocess.IDLE_PRIORITY_CLASS if nice >= 15 else subprocess.BELOW_NORMAL_PRIORITY_CLASS
+
+
+def _thread_ids(pid):
+    """Scheduling settings are per thread on Linux, so cover any FFmpeg has started already."""
+    try:
+        return [int(tid) for tid in os.listdir(f'/proc/{pid}/task')]
+    except OSError:
+        return [pid]
+
+
+def _set_io_priority(tid, io_class, level):
+    import ctypes
+    number = IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if number is None:
+        raise OSError(f"ioprio_set is not known for {platform.machine()}")
+    value = (IOPRIO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT) | (level if io_class != 'idle' else 0)
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(number, IOPRIO_WHO_PROCESS, tid, value) != 0:
+        raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+
+def _set_windows_affinity(pid, cores):
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_SET_INFORMATION | PROCESS_QUERY_INFORMATION, False, pid)
+    if not handle:
+        raise ctypes.WinError()
+    try:
+        mask = sum(1 << core for core in cores)
+        if not kernel32.SetProcessAffinityMask(handle, ctypes.c_size_t(mask)):
+            raise ctypes.WinError()
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def apply_resource_policy(process, policy):
+    """
+    Apply a policy to a just-started process: CPU affinity, niceness and I/O priority.
+
+    Applied from the parent rather than in a preexec_fn, which can deadlock a threaded
+    parent such as the GUI. On Windows the priority class is set at creation through
+    priority_creationflags and only the affinity here. A setting the platform refuses is
+    logged and skipped; the conversion runs either way.
+    """
+    if not policy or process.poll() is not None:
+        return
+    cores = policy_cores(policy)
+    nice = policy.get('nice', 0)
+    io_class = policy.get('io_class')
+
+    if sys.platform == "win32":
+        if cores:
+            try:
+                _set_windows_affinity(process.pid, cores)
+            except OSError as e:
+                logging.warning(f"Could not set the CPU affinity of FFmpeg: {e}")
+        return
+
+    for tid in _thread_ids(process.pid):
+        try:
+            if cores and hasattr(os, 'sched_setaffinity'):
+                os.sched_setaffinity(tid, cores)
+            if nice > 0:
+                os.setpriority(os.PRIO_PROCESS, tid, nice)
+        except ProcessLookupError:
+            continue
+        except OSError as e:
+            logging.warning(f"Could not set the CPU priority of FFmpeg: {e}")
+        if io_class and sys.platform.startswith('linux'):
+            try:
+                _set_io_priority(tid, io_class, policy.get('io_level', 4))
+            except OSError as e:
+                logging.debug(f"Could not set the I/O priority of FFmpeg: {e}")
+
+
+class IOPhaseLimiter:
+    """
+    Caps how many I/O-heavy phases (the stream-copy joins of resumable segments and proof clips)
+    run at once, so parallel jobs don't turn one disk's sequential writes into seeks. The limit follows the
+    active policy's io_slots; None lifts it.
+    """
+
+    def __init__(self, slots=None):
+        self.slots = slots
+        self.active = 0
+        self.condition = threading.Condition()
+
+    def set_limit(self, slots):
+        with self.condition:
+            self.slots = slots
+            self.condition.notify_all()
+
+    @contextmanager
+    def phase(self, name):
+        with self.condition:
+            if self.slots is not None and self.active >= self.slots:
+                logging.info(f"Waiting for an I/O slot for {name}")
+            self.condition.wait_for(lambda: self.slots is None or self.active < self.slots)
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+
+io_phases = IOPhaseLimiter()
+
+
+def _stats_path():
+    return os.path.join(get_cache_dir(), POLICY_STATS_FILE)
+
+
+def load_policy_stats(stats_path=None):
+    try:
+        with open(stats_path or _stats_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_policy_throughput(policy_name, fps, output_size=None, stats_path=None):
+    """
+    Add a finished conversion's throughput to the running means of its policy. Megapixels per
+    second are recorded too, so conversions at different resolutions can be compared.
+    Returns the policy's updated entry.
+    """
+    stats_path = stats_path or _stats_path()
+    megapixels = fps * output_size[0] * output_size[1] / 1e6 if output_size else None
+    with _stats_lock:
+        stats = load_policy_stats(stats_path)
+        entry = stats.setdefault(policy_name, {'runs': 0, 'fps': 0.0, 'sized_runs': 0,
+                                               'megapixels_per_second': 0.0})
+        entry['runs'] += 1
+        entry['fps'] += (fps - entry['fps']) / entry['runs']
+        if megapixels is not None:
+            entry['sized_runs'] += 1
+            entry['megapixels_per_second'] += (megapixels - entry['megapixels_per_second']) / entry['sized_runs']
+        temp_path = stats_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2, sort_keys=True)
+        os.replace(temp_path, stats_path)
+    return entry
+
+
+def format_policy_stats(stats):
+    """Return one line per policy, such as 'farm: 3 runs, 41.2 fps, 85.4 MP/s'."""
+    lines = []
+    for name in sorted(stats):
+        entry = stats[name]
+        line = f"{name}: {entry['runs']} runs, {entry['fps']:.1f} fps"
+        if entry['sized_runs']:
+            line += f", {entry['megapixels_per_second']:.1f} MP/s"
+        lines.append(line)
+    return '\n'.join(lines)
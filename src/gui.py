@@ -4,12 +4,29 @@ from tkinter import filedialog, messagebox
 from tkinter import ttk
 import sv_ttk
 from conversion import conversion_manager  # Import the conversion_manager instance
-from utils import extract_frame_with_conversion, extract_frame, TONEMAP, get_video_properties  # Add get_video_properties
+from utils import extract_frame_with_conversion, extract_frame, TONEMAP, get_video_properties, FFmpegCancelled
+from utils import generate_thumbnail_sprite, detect_crop, format_crop_filter, get_crop_saving, RESOLUTION_PRESETS
+from utils import MUXING_MODES
+from estimator import format_estimate, format_duration
+from streaming import is_stream_output
+from governor import RESOURCE_POLICIES
+from tracing import traced
+from metrics import preview_latency
+from queue_panel import QueuePanel
 from PIL import Image, ImageTk, ImageOps  # Add this import
 from tkinterdnd2 import DND_FILES
 import logging
+import threading
+import time
+from collections import deque
 
 DEFAULT_MIN_SIZE = (550, 150)
+PREVIEW_MAX_WIDTH = 960  # Largest width of each preview pane
+PREVIEW_MIN_WIDTH = 240
+PREVIEW_SCREEN_MARGIN = 160  # Horizontal room for padding and the frame buttons
+PREVIEW_CONTROLS_HEIGHT = 420  # Vertical room for the controls, timeline and progress bar
+TIMELINE_MARKER_HEIGHT = 6  # Extra canvas height below the thumbnails for the position marker
+TIMELINE_HOVER_DELAY = 250  # ms the pointer has to rest on the timeline before previewing
 
 class HDRConverterGUI:
     """
@@ -31,14 +48,44 @@ class HDRConverterGUI:
         self.progress_var = tk.DoubleVar(value=0)
         self.open_after_conversion_var = tk.BooleanVar()
         self.display_image_var = tk.BooleanVar(value=True)
+        self.auto_crop_var = tk.BooleanVar(value=False)
+        self.keep_mezzanine_var = tk.BooleanVar(value=False)
+        self.detected_crop = None  # (path, crop) from the last finished crop detection
+        self.crop_detection_path = None  # File a crop detection is running or finished for
+        self.crop_waiters = {}  # Normalized path -> actions waiting for its crop detection
         self.original_image = None  # Cache for the original frame
         self.converted_image_base = None  # Cache for the converted SDR frame
+        self.converted_image_key = None  # (path, filter, tonemapper, time) of the cached converted frame
+        self.preview_generation = 0  # Bumped per refresh so stale refinements are discarded
+        self.refine_cancel_event = None  # Cancels the in-flight full-quality refinement
+        self.pending_preview_key = None  # Key of the frames currently being refined
+        self.fast_preview_images = None  # Approximations shown while refinement runs
+        self.preview_latencies = {'fast': deque(maxlen=50), 'full': deque(maxlen=50)}
+        self.timeline_time = None  # Time picked on the timeline; overrides the frame buttons
+        self.timeline_key = None  # (path, filter, tonemapper) of the sprite shown in the timeline
+        self.timeline_photo = None
+        self.timeline_width = 0
+        self.timeline_hover_job = None
+        self.preview_size = (PREVIEW_MAX_WIDTH, PREVIEW_MAX_WIDTH * 9 // 16)
+        self.preview_layout_key = None  # File the pane layout was computed for
+        self.original_photo = None  # Persistent PhotoImages the preview frames are pasted into
+        self.converted_photo = None
+        self.shown_original = None
+        self.working_copies = {}  # slot -> (source image, pane-sized copy)
         self.gpu_accel_var = tk.BooleanVar(value=False)
         self.codec_options = ['H.264 (CPU)', 'H.264 (GPU)', 'H.265 (CPU)']
         self.codec_var = tk.StringVar(value=self.codec_options[0]) # Default to H.264 (CPU)
         self.filter_options = ['Static', 'Dynamic']
         self.filter_var = tk.StringVar(value=self.filter_options[1])  # Set default to 'Dynamic'
         self.tonemap_var = tk.StringVar(value='Mobius')  # Set default to 'Mobius'
+        self.resolution_var = tk.StringVar(value='Source')  # Output resolution target
+        self.follow_input_var = tk.BooleanVar(value=False)  # Convert while the input is still arriving
+        self.resumable_var = tk.BooleanVar(value=False)  # Checkpoint segments so a restart resumes
+        self.verify_output_var = tk.BooleanVar(value=False)  # Decode-check the output after converting
+        self.muxing_var = tk.StringVar(value=MUXING_MODES[0])  # MP4 index placement, Auto by default
+        self.target_fps_var = tk.StringVar(value='')  # Speed the encoder autotune aims for
+        self.resource_policy_var = tk.StringVar(value='Default')  # CPU and I/O priority FFmpeg runs with
+        self.tuned_encoder = None  # (codec, use_gpu, resolution, autotune result) of the last autotune
         self.tooltip = None  # Add this line for tooltip tracking
         self.current_frame_index = 1  # Default to 1 (1/6 of the video)
         self.total_frames = 5
@@ -57,17 +104,32 @@ class HDRConverterGUI:
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.cancelled = False  # Flag to track cancellation
+        self.queue_panel = None  # QueuePanel, created when first opened
 
     def on_close(self):
         """Handle the window close event by cancelling ongoing conversions and cleaning up."""
-        if conversion_manager.process and conversion_manager.process.poll() is None:
-            if messagebox.askokcancel("Quit", "A conversion is in progress. Do you want to cancel and exit?"):
+        converting = conversion_manager.process and conversion_manager.process.poll() is None
+        queue_active = self.queue_panel is not None and any(
+            entry.job is not None and entry.state not in ('done', 'failed', 'cancelled')
+            for entry in self.queue_panel.entries.values())
+        if converting or queue_active:
+            if not messagebox.askokcancel("Quit", "A conversion is in progress. Do you want to cancel and exit?"):
+                return
+            if converting:
                 conversion_manager.cancel_conversion(
                     self, self.interactable_elements, self.cancel_button
                 )
-                self.root.destroy()
+        if self.queue_panel is not None:
+            self.queue_panel.close()
+        self.root.destroy()
+
+    def open_queue_panel(self):
+        """Show the batch queue window, creating it on first use."""
+        if self.queue_panel is None:
+            self.queue_panel = QueuePanel(self)
         else:
-            self.root.destroy()
+            self.queue_panel.show()
+        return self.queue_panel
 
     def create_widgets(self):
         """Create and arrange the widgets in the main window."""
@@ -85,6 +147,12 @@ class HDRConverterGUI:
             command=self.select_file
         )
         self.browse_button.grid(row=0, column=2, sticky=tk.W, padx=(5, 0))
+        self.queue_button = ttk.Button(
+            self.control_frame,
+            text="Batch Queue",
+            command=self.open_queue_panel
+        )
+        self.queue_button.grid(row=0, column=3, sticky=tk.W, padx=(5, 0))
 
         # Output File Widgets
         ttk.Label(self.control_frame, text="Output File:").grid(row=1, column=0, sticky=tk.W)
@@ -128,6 +196,22 @@ class HDRConverterGUI:
         self.codec_combobox.grid(row=3, column=2, sticky=tk.W, padx=(5, 0), pady=(5, 0))
         self.codec_combobox.bind('<<ComboboxSelected>>', self.on_codec_selected)
 
+        # Keep the tonemapped frames so other codecs can be delivered without re-tonemapping
+        self.keep_mezzanine_checkbutton = ttk.Checkbutton(
+            self.control_frame,
+            text="Keep Lossless Mezzanine",
+            variable=self.keep_mezzanine_var
+        )
+        self.keep_mezzanine_checkbutton.grid(row=4, column=0, sticky=tk.W, pady=(5, 0))
+
+        # Start converting while the input file is still being transferred
+        self.follow_input_checkbutton = ttk.Checkbutton(
+            self.control_frame,
+            text="Follow Growing Input",
+            variable=self.follow_input_var
+        )
+        self.follow_input_checkbutton.grid(row=4, column=2, sticky=tk.W, pady=(5, 0))
+
         # Add Filter Combobox with padding and event binding
         filter_frame = ttk.Frame(self.control_frame)
         filter_frame.grid(row=4, column=1, sticky=tk.W, padx=(5, 10), pady=(5, 0))
@@ -150,6 +234,30 @@ class HDRConverterGUI:
         )
         info_button.grid(row=0, column=1)
         
+        # Output resolution target
+        ttk.Label(filter_frame, text="Resolution:").grid(row=0, column=2, padx=(18, 5))
+        self.resolution_combobox = ttk.Combobox(
+            filter_frame,
+            textvariable=self.resolution_var,
+            values=list(RESOLUTION_PRESETS),
+            state='readonly',
+            width=8
+        )
+        self.resolution_combobox.grid(row=0, column=3)
+        self.resolution_combobox.bind('<<ComboboxSelected>>', lambda e: self.resolution_combobox.selection_clear())
+
+        # MP4 muxing strategy
+        ttk.Label(filter_frame, text="Muxing:").grid(row=0, column=4, padx=(18, 5))
+        self.muxing_combobox = ttk.Combobox(
+            filter_frame,
+            textvariable=self.muxing_var,
+            values=MUXING_MODES,
+            state='readonly',
+            width=10
+        )
+        self.muxing_combobox.grid(row=0, column=5)
+        self.muxing_combobox.bind('<<ComboboxSelected>>', lambda e: self.muxing_combobox.selection_clear())
+
         # Tooltip text
         tooltip_text = ("Static: Basic HDR to SDR conversion with fixed parameters\n"
                        "Dynamic: Adaptive conversion that analyzes video brightness")
@@ -201,6 +309,33 @@ class HDRConverterGUI:
         info_button_tonemap.bind('<Enter>', lambda e: self.show_tooltip(e, tooltip_text_tonemap))
         info_button_tonemap.bind('<Leave>', self.hide_tooltip)
 
+        # Auto-crop checkbox and the detected crop
+        self.auto_crop_checkbutton = ttk.Checkbutton(
+            display_frame,
+            text="Auto-crop Black Bars",
+            variable=self.auto_crop_var,
+            command=self.on_auto_crop_toggled
+        )
+        self.auto_crop_checkbutton.grid(row=0, column=3, padx=(18, 0), sticky=tk.W)
+        self.crop_label = ttk.Label(display_frame, text="")
+        self.crop_label.grid(row=0, column=4, padx=(5, 0), sticky=tk.W)
+
+        # Encode in checkpointed segments so a cancelled or crashed conversion picks up where it stopped
+        self.resumable_checkbutton = ttk.Checkbutton(
+            display_frame,
+            text="Resumable (Segmented)",
+            variable=self.resumable_var
+        )
+        self.resumable_checkbutton.grid(row=0, column=5, padx=(18, 0), sticky=tk.W)
+
+        # Decode samples of the finished output and check its duration and streams
+        self.verify_output_checkbutton = ttk.Checkbutton(
+            display_frame,
+            text="Verify Output",
+            variable=self.verify_output_var
+        )
+        self.verify_output_checkbutton.grid(row=0, column=6, padx=(18, 0), sticky=tk.W)
+
         # Update tooltip text to include tonemapper info
         tooltip_text = ("Static: Basic HDR to SDR conversion with fixed parameters\n"
                        "Dynamic: Adaptive conversion that analyzes video brightness")
@@ -250,6 +385,15 @@ class HDRConverterGUI:
         self.button_frame.grid(row=2, column=0, columnspan=3, pady=(5, 0), sticky=tk.N)
         self.button_frame.grid_remove()
 
+        # Timeline strip of tonemapped thumbnails for scrubbing through the video
+        self.timeline_canvas = tk.Canvas(self.button_frame, height=TIMELINE_MARKER_HEIGHT,
+                                         highlightthickness=0, cursor="hand2")
+        self.timeline_canvas.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.timeline_canvas.grid_remove()
+        self.timeline_canvas.bind('<Button-1>', self.on_timeline_click)
+        self.timeline_canvas.bind('<Motion>', self.on_timeline_hover)
+        self.timeline_canvas.bind('<Leave>', self.cancel_timeline_hover)
+
         # Action Frame
         self.action_frame = ttk.Frame(self.root)
         self.action_frame.grid(row=2, column=0, pady=(10, 0), sticky=tk.N)
@@ -271,6 +415,48 @@ class HDRConverterGUI:
         )
         self.convert_button.grid(row=1, column=1, padx=(5, 5), pady=(0, 10), sticky=tk.N)
 
+        # Proof Button
+        self.proof_button = ttk.Button(
+            self.action_frame,
+            text="Render Proof",
+            command=self.render_proof
+        )
+        self.proof_button.grid(row=1, column=3, padx=(5, 5), pady=(0, 10), sticky=tk.N)
+
+        # Estimate Button and result
+        self.estimate_button = ttk.Button(
+            self.action_frame,
+            text="Estimate",
+            command=self.estimate_conversion
+        )
+        self.estimate_button.grid(row=1, column=4, padx=(5, 5), pady=(0, 10), sticky=tk.N)
+        self.estimate_label = ttk.Label(self.action_frame, text="")
+        self.estimate_label.grid(row=2, column=0, columnspan=5, pady=(0, 5), sticky=tk.N)
+
+        # Encoder autotune
+        tune_frame = ttk.Frame(self.action_frame)
+        tune_frame.grid(row=3, column=0, columnspan=5, pady=(0, 5), sticky=tk.N)
+        ttk.Label(tune_frame, text="Target fps:").grid(row=0, column=0, padx=(0, 5))
+        self.target_fps_entry = ttk.Entry(tune_frame, textvariable=self.target_fps_var, width=6)
+        self.target_fps_entry.grid(row=0, column=1, padx=(0, 5))
+        self.autotune_button = ttk.Button(tune_frame, text="Autotune Encoder", command=self.autotune_encoder)
+        self.autotune_button.grid(row=0, column=2, padx=(0, 5))
+        self.autotune_label = ttk.Label(tune_frame, text="")
+        self.autotune_label.grid(row=0, column=3)
+
+        # CPU affinity, nice and I/O priority presets for FFmpeg
+        ttk.Label(tune_frame, text="Resources:").grid(row=0, column=4, padx=(18, 5))
+        self.resource_policy_combobox = ttk.Combobox(
+            tune_frame,
+            textvariable=self.resource_policy_var,
+            values=[name.capitalize() for name in RESOURCE_POLICIES],
+            state='readonly',
+            width=11
+        )
+        self.resource_policy_combobox.grid(row=0, column=5)
+        self.resource_policy_combobox.bind('<<ComboboxSelected>>',
+                                           lambda e: self.resource_policy_combobox.selection_clear())
+
         # Cancel Button
         self.cancel_button = ttk.Button(
             self.action_frame,
@@ -280,6 +466,15 @@ class HDRConverterGUI:
         self.cancel_button.grid(row=1, column=2, padx=(5, 5), pady=(0, 10), sticky=tk.N)
         self.cancel_button.grid_remove()
 
+        # Pause Button; suspends the conversion in place to free the machine for other work
+        self.pause_button = ttk.Button(
+            self.action_frame,
+            text="Pause",
+            command=self.toggle_pause
+        )
+        self.pause_button.grid(row=1, column=5, padx=(5, 5), pady=(0, 10), sticky=tk.N)
+        self.pause_button.grid_remove()
+
         # Progress Bar
         self.progress_bar = ttk.Progressbar(self.image_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E))
@@ -288,7 +483,10 @@ class HDRConverterGUI:
         self.interactable_elements = [
             self.browse_button, self.convert_button, self.gamma_slider,
             self.open_after_conversion_checkbutton, self.display_image_checkbutton,
-            self.input_entry, self.output_entry, self.gamma_entry, self.gpu_accel_checkbutton
+            self.input_entry, self.output_entry, self.gamma_entry, self.gpu_accel_checkbutton,
+            self.auto_crop_checkbutton, self.keep_mezzanine_checkbutton, self.proof_button,
+            self.estimate_button, self.target_fps_entry, self.autotune_button,
+            self.follow_input_checkbutton, self.resumable_checkbutton, self.verify_output_checkbutton
         ]
 
     def configure_grid(self):
@@ -314,6 +512,7 @@ class HDRConverterGUI:
         self.root.grid_rowconfigure(1, weight=1)
         self.root.grid_columnconfigure(0, weight=1)
 
+    @traced(action=True)
     def select_file(self):
         """Open a file dialog for the user to select a video file."""
         file_path = filedialog.askopenfilename(
@@ -336,6 +535,7 @@ class HDRConverterGUI:
             # Reset the cached images
             self.original_image = None
             self.converted_image_base = None
+            self.timeline_time = None
             self.button_frame.grid()
             self.image_frame.grid()
             self.action_frame.grid()
@@ -351,104 +551,65 @@ class HDRConverterGUI:
         lut = [int(round(v)) for v in lut]  # Ensure values are integers
         return image.point(lut)
 
-    def display_frames(self, video_path):
-        """Extract and display frames using cached images and adjusted gamma."""
-        if self.original_image is None:
-            # Extract the original HDR frame
-            self.original_image = extract_frame(video_path)
-        # Re-extract the converted SDR frame with the selected filter
-        selected_filter_index = self.filter_options.index(self.filter_var.get())
-        tonemapper = self.tonemap_var.get().lower()  # Convert tonemapper to lowercase
-        self.converted_image_base = extract_frame_with_conversion(
-            video_path, gamma=1.0, filter_index=selected_filter_index,
-            tonemapper=tonemapper  # Pass current tonemapper
-        )
-        original_image_resized = self.original_image.resize((960, 540), Image.LANCZOS)
-        original_photo = ImageTk.PhotoImage(original_image_resized)
-        self.original_image_label.config(image=original_photo)
-        self.original_image_label.image = original_photo
-
-        # Apply gamma adjustment to the cached converted SDR image
-        gamma = self.gamma_var.get()
-        adjusted_converted_image = self.adjust_gamma(self.converted_image_base, gamma)
-        converted_image_resized = adjusted_converted_image.resize((960, 540), Image.LANCZOS)
-        converted_photo = ImageTk.PhotoImage(converted_image_resized)
-        self.converted_image_label.config(image=converted_photo)
-        self.converted_image_label.image = converted_photo
-
-        self.adjust_window_size()  # Ensure window size is adjusted after displaying images
-
-    def update_frame_preview(self, event=None):
-        """Update the frame preview without blocking the UI."""
-        filter_value = self.filter_var.get()
-        
-        if self.display_image_var.get() and self.input_path_var.get():
-            try:
-                video_path = self.input_path_var.get()
-                self.display_frames(video_path)
-                self.error_label.config(text="")
-                self.original_title_label.grid()
-                self.converted_title_label.grid()
-                self.button_container.grid()  # Show frame buttons
-                self.adjust_window_size()
-                self.arrange_widgets(image_frame=True)
-            except Exception as e:
-                self.handle_preview_error(e)
-        else:
-            self.clear_preview()
-            self.original_title_label.grid_remove()
-            self.converted_title_label.grid_remove()
-            self.button_container.grid_remove()  # Hide frame buttons
-            self.arrange_widgets(image_frame=False)
-        self.filter_combobox.selection_clear()
-        self.tonemap_combobox.selection_clear()
-        self.codec_combobox.selection_clear()
-
     def clear_preview(self):
         """Clear the frame preview images and reset cached images."""
+        self.cancel_preview_refinement()
         self.original_image_label.config(image='')
         self.converted_image_label.config(image='')
         self.original_image = None
         self.converted_image_base = None
+        self.original_photo = None
+        self.converted_photo = None
+        self.preview_layout_key = None
+        self.working_copies = {}
         self.root.minsize(*DEFAULT_MIN_SIZE)
 
+    def compute_preview_layout(self, aspect):
+        """Return the size of each preview pane so that both panes fit on screen."""
+        screen_width = int(self.root.winfo_screenwidth())
+        screen_height = int(self.root.winfo_screenheight())
+        width = min(PREVIEW_MAX_WIDTH, (screen_width - PREVIEW_SCREEN_MARGIN) // 2)
+        width = max(width, PREVIEW_MIN_WIDTH)
+        height = round(width / aspect)
+        max_height = max(screen_height - PREVIEW_CONTROLS_HEIGHT, PREVIEW_MIN_WIDTH // 2)
+        if height > max_height:
+            height = max_height
+            width = round(height * aspect)
+        return (width, height)
+
+    def ensure_preview_layout(self, image):
+        """Compute the pane layout and create the persistent PhotoImages once per file."""
+        video_path = self.input_path_var.get()
+        layout_key = (video_path, self.get_preview_crop(video_path) is not None)
+        if self.preview_layout_key == layout_key and self.original_photo is not None:
+            return False
+        self.preview_size = self.compute_preview_layout(image.width / image.height)
+        self.original_photo = ImageTk.PhotoImage('RGB', self.preview_size)
+        self.converted_photo = ImageTk.PhotoImage('RGB', self.preview_size)
+        self.original_image_label.config(image=self.original_photo)
+        self.original_image_label.image = self.original_photo
+        self.converted_image_label.config(image=self.converted_photo)
+        self.converted_image_label.image = self.converted_photo
+        self.preview_layout_key = layout_key
+        self.working_copies = {}
+        return True
+
+    def get_working_copy(self, slot, image):
+        """Return `image` scaled to the pane size, reusing the previous result for the same image."""
+        cached = self.working_copies.get(slot)
+        if cached is not None and cached[0] is image:
+            return cached[1]
+        working = image.resize(self.preview_size, Image.LANCZOS)
+        if working.mode != 'RGB':
+            working = working.convert('RGB')
+        self.working_copies[slot] = (image, working)
+        return working
+
     def adjust_window_size(self):
-        """Adjust the window size to fit the displayed images."""
+        """Fit the window to the preview layout; only needed when the layout changes."""
         self.root.geometry("")  # Reset window size to fit images
         self.root.update_idletasks()
-        
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
-        new_width = self.root.winfo_width()
-        new_height = self.root.winfo_height()
-
-        if new_width > screen_width or new_height > screen_height:
-            # Reduce image size to fit within screen bounds
-            max_width = screen_width - 100  # Leave some margin
-            max_height = screen_height - 100  # Leave some margin
-            self.resize_images(max_width, max_height)
-            self.root.geometry("")  # Reset window size again after resizing images
-            self.root.update_idletasks()
-            new_width = self.root.winfo_width()
-            new_height = self.root.winfo_height()
-
-        self.root.minsize(new_width, new_height)
-
-    def resize_images(self, max_width, max_height):
-        """Resize images to fit within the specified maximum width and height."""
-        if self.original_image:
-            original_image_resized = self.original_image.resize((max_width // 2, max_height // 2), Image.LANCZOS)
-            original_photo = ImageTk.PhotoImage(original_image_resized)
-            self.original_image_label.config(image=original_photo)
-            self.original_image_label.image = original_photo
-
-        if self.converted_image_base:
-            gamma = self.gamma_var.get()
-            adjusted_converted_image = self.adjust_gamma(self.converted_image_base, gamma)
-            converted_image_resized = adjusted_converted_image.resize((max_width // 2, max_height // 2), Image.LANCZOS)
-            converted_photo = ImageTk.PhotoImage(converted_image_resized)
-            self.converted_image_label.config(image=converted_photo)
-            self.converted_image_label.image = converted_photo
+        self.root.minsize(self.root.winfo_width(), self.root.winfo_height())
 
     def arrange_widgets(self, image_frame):
         """Arrange the widgets in the appropriate frames."""
@@ -460,7 +621,10 @@ class HDRConverterGUI:
             self.progress_bar.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E))
         self.open_after_conversion_checkbutton.grid(row=1, column=0, padx=(5, 5), sticky=tk.N)
         self.convert_button.grid(row=1, column=1, padx=(5, 5), pady=(0, 10), sticky=tk.N)
+        self.proof_button.grid(row=1, column=3, padx=(5, 5), pady=(0, 10), sticky=tk.N)
+        self.estimate_button.grid(row=1, column=4, padx=(5, 5), pady=(0, 10), sticky=tk.N)
         self.cancel_button.grid_remove()  # Ensure cancel button is hidden
+        self.pause_button.grid_remove()
 
     def handle_preview_error(self, error):
         """Handle errors that occur during frame preview update."""
@@ -470,11 +634,18 @@ class HDRConverterGUI:
         self.converted_title_label.grid_remove()
 
     def handle_file_drop(self, event):
-        """Handle file drop events and update the input and output path variables."""
+        """
+        Handle file drop events and update the input and output path variables. Several
+        files or a folder go to the batch queue instead.
+        """
         try:
             if not self.drop_target_registered:
                 return  # Ignore drop if not registered
-            file_path = event.data.strip('{}')
+            paths = self.root.tk.splitlist(event.data)
+            if len(paths) > 1 or (paths and os.path.isdir(paths[0])):
+                self.open_queue_panel().add_paths(paths)
+                return
+            file_path = paths[0] if paths else ''
             if file_path:
                 self.input_path_var.set(file_path)
                 # Keep the same extension for output file
@@ -483,6 +654,7 @@ class HDRConverterGUI:
                 # Reset the cached images
                 self.original_image = None
                 self.converted_image_base = None
+                self.timeline_time = None
                 self.button_frame.grid()
                 self.image_frame.grid()
                 self.action_frame.grid()
@@ -492,26 +664,19 @@ class HDRConverterGUI:
             logging.error(f"Error handling file drop: {e}")
             messagebox.showerror("Error", f"Error handling file drop: {e}")
 
+    @traced(action=True)
     def convert_video(self):
         """Convert the video from HDR to SDR."""
         try:
             input_path = os.path.normpath(self.input_path_var.get())
-            output_path = os.path.normpath(self.output_path_var.get())
+            output_path = self.output_path_var.get()
+            if not is_stream_output(output_path):
+                output_path = os.path.normpath(output_path)
             gamma = self.gamma_var.get()
             use_gpu = self.gpu_accel_var.get()  # Get GPU acceleration state
             selected_filter_index = self.filter_options.index(self.filter_var.get())
             tonemapper = self.tonemap_var.get().lower()  # Convert tonemapper to lowercase
-            selected_codec_display = self.codec_var.get()
-            
-            # Map display string to internal codec string
-            if selected_codec_display == 'H.264 (CPU)':
-                selected_codec = 'h264'
-            elif selected_codec_display == 'H.264 (GPU)':
-                selected_codec = 'h264' # The use_gpu flag will differentiate this
-            elif selected_codec_display == 'H.265 (CPU)':
-                selected_codec = 'h265'
-            else:
-                selected_codec = 'h264' # Default to h264
+            selected_codec = self.get_selected_codec()
 
             if not input_path or not output_path:
                 messagebox.showwarning("Warning", "Please select both an input file and specify an output file.")
@@ -521,11 +686,21 @@ class HDRConverterGUI:
                 messagebox.showerror("Error", f"Input file not found: {input_path}")
                 return
 
-            if os.path.exists(output_path):
+            if os.path.exists(output_path) and not is_stream_output(output_path):
                 answer = messagebox.askyesno("File Exists", f"The file '{output_path}' already exists. Do you want to overwrite it?")
                 if not answer:
                     return
 
+            self.with_conversion_crop(input_path, lambda crop: self.start_conversion(
+                input_path, output_path, gamma, use_gpu, selected_filter_index, tonemapper, selected_codec, crop))
+        except Exception as e:
+            logging.error(f"Conversion error: {str(e)}", exc_info=True)
+            messagebox.showerror("Conversion Error", f"An error occurred during conversion: {e}")
+
+    def start_conversion(self, input_path, output_path, gamma, use_gpu, selected_filter_index, tonemapper,
+                         selected_codec, crop):
+        """Start the conversion convert_video checked, once its crop is known."""
+        try:
             # Unregister drop target before starting conversion
             if self.drop_target_registered:
                 self.unregister_drop_target()
@@ -541,12 +716,208 @@ class HDRConverterGUI:
                 self.progress_var, self.interactable_elements, self,
                 self.open_after_conversion_var.get(), self.cancel_button,
                 tonemapper=tonemapper, # Pass tonemapper to the conversion
-                selected_codec=selected_codec # Pass selected codec
+                selected_codec=selected_codec, # Pass selected codec
+                crop=crop,
+                resolution=self.resolution_var.get(),
+                keep_mezzanine=self.keep_mezzanine_var.get(),
+                encoder_settings=self.get_encoder_settings(),
+                muxing=self.muxing_var.get(),
+                follow=self.follow_input_var.get(),
+                resumable=self.resumable_var.get(),
+                resource_policy=self.resource_policy_var.get().lower(),
+                verify=self.verify_output_var.get()
             )
         except Exception as e:
             logging.error(f"Conversion error: {str(e)}", exc_info=True)
             messagebox.showerror("Conversion Error", f"An error occurred during conversion: {e}")
 
+    def get_selected_codec(self):
+        """Map the codec display string to the internal codec string."""
+        selected_codec_display = self.codec_var.get()
+        if selected_codec_display == 'H.265 (CPU)':
+            return 'h265'
+        # H.264 (CPU) and H.264 (GPU) differ only by the use_gpu flag
+        return 'h264'
+
+    def show_finalizing(self):
+        """Show that encoding is done and FFmpeg is rewriting the output for faststart."""
+        self.progress_var.set(100)
+        self.estimate_label.config(text="Finalizing: moving the MP4 index to the front of the file...")
+        self.progress_bar.config(mode='indeterminate')
+        self.progress_bar.start(20)
+
+    def hide_finalizing(self):
+        if str(self.progress_bar.cget('mode')) == 'indeterminate':
+            self.progress_bar.stop()
+            self.progress_bar.config(mode='determinate')
+            self.estimate_label.config(text="")
+
+    def show_pause_button(self):
+        self.pause_button.config(text="Pause")
+        self.pause_button.grid()
+
+    def hide_pause_button(self):
+        self.pause_button.grid_remove()
+        self.estimate_label.config(text="")  # Drop the remaining time or pause note
+
+    def toggle_pause(self):
+        """Pause or resume the running conversion."""
+        if conversion_manager.is_paused:
+            if conversion_manager.resume_conversion():
+                self.pause_button.config(text="Pause")
+                self.estimate_label.config(text="")
+        elif conversion_manager.pause_conversion():
+            self.pause_button.config(text="Resume")
+            self.estimate_label.config(text="Paused")
+
+    def show_remaining(self, seconds):
+        """Show the estimated time left; the estimate excludes time spent paused."""
+        if seconds is None or conversion_manager.is_paused:
+            return
+        if str(self.progress_bar.cget('mode')) == 'indeterminate':
+            return  # Finalizing
+        self.estimate_label.config(text=f"Remaining: {format_duration(seconds)}")
+
+    def get_encoder_settings(self):
+        """Return the autotuned preset and CRF if they were tuned for the current codec and resolution."""
+        if self.tuned_encoder is None:
+            return None
+        codec, use_gpu, resolution, result = self.tuned_encoder
+        if (codec, use_gpu, resolution) != (self.get_selected_codec(), self.gpu_accel_var.get(),
+                                            self.resolution_var.get()):
+            return None
+        return {'preset': result['preset'], 'crf': result['crf']}
+
+    def autotune_encoder(self):
+        """Search encoder presets and CRFs in the background for the target fps."""
+        input_path = os.path.normpath(self.input_path_var.get())
+        if not os.path.isfile(input_path):
+            messagebox.showerror("Error", f"Input file not found: {input_path}")
+            return
+        try:
+            target_fps = float(self.target_fps_var.get())
+        except ValueError:
+            messagebox.showwarning("Warning", "Enter the conversion speed to aim for, in frames per second.")
+            return
+
+        key = (self.get_selected_codec(), self.gpu_accel_var.get(), self.resolution_var.get())
+        settings = dict(
+            gamma=self.gamma_var.get(), use_gpu=key[1],
+            selected_filter_index=self.filter_options.index(self.filter_var.get()),
+            tonemapper=self.tonemap_var.get().lower(), selected_codec=key[0],
+            resolution=key[2], target_fps=target_fps
+        )
+        self.with_conversion_crop(input_path, lambda crop: self.start_autotune(input_path, key, dict(settings, crop=crop)))
+
+    def start_autotune(self, input_path, key, settings):
+        """Run the autotune autotune_encoder set up, once its crop is known."""
+        self.autotune_button.config(state="disabled")
+        self.autotune_label.config(text="Tuning...")
+
+        def worker():
+            try:
+                result = conversion_manager.autotune_encoder(input_path, **settings)
+                self.tuned_encoder = key + (result,)
+                text = (f"{result['preset']}, CRF {result['crf']}: {result['fps']:.1f} fps, "
+                        f"SSIM {result['ssim']:.4f}")
+                if not result['meets_target']:
+                    text += " (target not reachable)"
+            except Exception as e:
+                logging.error(f"Autotune failed: {e}", exc_info=True)
+                text = "Autotune failed; see the log for details."
+            self.root.after(0, lambda: self.show_autotune(text))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_autotune(self, text):
+        self.autotune_label.config(text=text)
+        if conversion_manager.process is None or conversion_manager.process.poll() is not None:
+            self.autotune_button.config(state="normal")
+
+    def get_proof_positions(self, input_path):
+        """Return the proof clip start times: the preview frame positions plus the timeline pick."""
+        duration = get_video_properties(input_path)['duration']
+        positions = [duration * i / (self.total_frames + 1) for i in range(1, self.total_frames + 1)]
+        if self.timeline_time is not None:
+            positions.append(self.timeline_time)
+        return positions
+
+    @traced(action=True)
+    def render_proof(self):
+        """Render short clips at the preview positions with the current settings for review."""
+        try:
+            input_path = os.path.normpath(self.input_path_var.get())
+            output_path = os.path.normpath(self.output_path_var.get())
+            if not os.path.isfile(input_path):
+                messagebox.showerror("Error", f"Input file not found: {input_path}")
+                return
+
+            self.with_conversion_crop(input_path, lambda crop: self.start_proof(input_path, output_path, crop))
+        except Exception as e:
+            logging.error(f"Proof render error: {str(e)}", exc_info=True)
+            messagebox.showerror("Proof Error", f"An error occurred while rendering the proof: {e}")
+
+    def start_proof(self, input_path, output_path, crop):
+        """Start the proof render render_proof checked, once its crop is known."""
+        try:
+            if self.drop_target_registered:
+                self.unregister_drop_target()
+
+            conversion_manager.start_proof(
+                input_path, output_path, self.gamma_var.get(), self.gpu_accel_var.get(),
+                self.filter_options.index(self.filter_var.get()),
+                self.progress_var, self.interactable_elements, self,
+                self.open_after_conversion_var.get(), self.cancel_button,
+                tonemapper=self.tonemap_var.get().lower(),
+                selected_codec=self.get_selected_codec(),
+                crop=crop,
+                resolution=self.resolution_var.get(),
+                positions=self.get_proof_positions(input_path),
+                encoder_settings=self.get_encoder_settings(),
+                resource_policy=self.resource_policy_var.get().lower()
+            )
+        except Exception as e:
+            logging.error(f"Proof render error: {str(e)}", exc_info=True)
+            messagebox.showerror("Proof Error", f"An error occurred while rendering the proof: {e}")
+
+    def estimate_conversion(self):
+        """Encode a few samples in the background and show the expected conversion time and size."""
+        input_path = os.path.normpath(self.input_path_var.get())
+        output_path = os.path.normpath(self.output_path_var.get())
+        if not os.path.isfile(input_path):
+            messagebox.showerror("Error", f"Input file not found: {input_path}")
+            return
+
+        settings = dict(
+            gamma=self.gamma_var.get(), use_gpu=self.gpu_accel_var.get(),
+            selected_filter_index=self.filter_options.index(self.filter_var.get()),
+            tonemapper=self.tonemap_var.get().lower(), selected_codec=self.get_selected_codec(),
+            resolution=self.resolution_var.get(), encoder_settings=self.get_encoder_settings()
+        )
+        self.with_conversion_crop(input_path, lambda crop: self.start_estimate(input_path, output_path,
+                                                                              dict(settings, crop=crop)))
+
+    def start_estimate(self, input_path, output_path, settings):
+        """Run the estimate estimate_conversion set up, once its crop is known."""
+        self.estimate_button.config(state="disabled")
+        self.estimate_label.config(text="Estimating...")
+
+        def worker():
+            try:
+                estimate = conversion_manager.estimate_conversion(input_path, output_path, **settings)
+                text = f"Estimated {format_estimate(estimate)} at {estimate['speed']:.2f}x realtime"
+            except Exception as e:
+                logging.error(f"Estimate failed: {e}", exc_info=True)
+                text = "Estimate failed; see the log for details."
+            self.root.after(0, lambda: self.show_estimate(text))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_estimate(self, text):
+        self.estimate_label.config(text=text)
+        if conversion_manager.process is None or conversion_manager.process.poll() is not None:
+            self.estimate_button.config(state="normal")
+
     def cancel_conversion(self):
         """Cancel the ongoing video conversion process."""
         # Use the conversion_manager to cancel the conversion
@@ -633,9 +1004,11 @@ class HDRConverterGUI:
             self.tooltip.destroy()
             self.tooltip = None
 
+    @traced(action=True)
     def on_frame_button_click(self, index):
         """Handle frame button clicks to update the displayed frames."""
         self.current_frame_index = index
+        self.timeline_time = None
         self.original_image = None  # Reset cached images
         self.converted_image_base = None
         self.highlight_frame_button(index)  # Update button highlight
@@ -649,54 +1022,193 @@ class HDRConverterGUI:
             else:
                 btn.configure(style='TButton')  # Reset to default style
 
-    def display_frames(self, video_path):
-        """Extract and display frames using the current frame index."""
+    def get_preview_time_position(self, video_path):
+        """Return the time position of the currently selected preview frame."""
+        if self.timeline_time is not None:
+            return self.timeline_time
         properties = get_video_properties(video_path)
         duration = properties['duration']
-        time_position = (self.current_frame_index / (self.total_frames + 1)) * duration
+        return (self.current_frame_index / (self.total_frames + 1)) * duration
 
-        if self.original_image is None or self.last_time_position != time_position:
-            # Extract original frame at specified time position
-            self.original_image = extract_frame(video_path, time_position=time_position)
-            self.last_time_position = time_position
+    @traced(category='preview')
+    def display_frames(self, video_path, progressive=False):
+        """
+        Extract and display frames using the current frame index.
 
-        # Re-extract the converted SDR frame with the selected filter
+        With progressive=True a keyframe-only, low-resolution approximation is shown
+        first and the full-quality frames are swapped in by a background refinement.
+        """
+        time_position = self.get_preview_time_position(video_path)
         selected_filter_index = self.filter_options.index(self.filter_var.get())
         tonemapper = self.tonemap_var.get().lower()  # Convert tonemapper to lowercase
-        self.converted_image_base = extract_frame_with_conversion(
-            video_path, gamma=1.0, filter_index=selected_filter_index,
-            tonemapper=tonemapper, time_position=time_position
-        )
+        crop = self.get_preview_crop(video_path)
+        converted_key = (video_path, selected_filter_index, tonemapper, time_position, crop)
 
-        # Resize and display original image
-        original_image_resized = self.original_image.resize((960, 540), Image.LANCZOS)
-        original_photo = ImageTk.PhotoImage(original_image_resized)
-        self.original_image_label.config(image=original_photo)
-        self.original_image_label.image = original_photo
+        original_cached = self.original_image is not None and self.last_time_position == time_position
+        converted_cached = self.converted_image_base is not None and self.converted_image_key == converted_key
+
+        if progressive and not (original_cached and converted_cached):
+            if self.pending_preview_key == converted_key:
+                # Only the gamma changed while the preview is still loading; the frames pick it up
+                if self.fast_preview_images:
+                    self.show_preview_images(*self.fast_preview_images)
+                return
+            self.start_progressive_preview(video_path, converted_key, original_cached)
+            return
 
-        # Apply gamma adjustment to the cached converted SDR image
-        gamma = self.gamma_var.get()
-        adjusted_converted_image = self.adjust_gamma(self.converted_image_base, gamma)
-        converted_image_resized = adjusted_converted_image.resize((960, 540), Image.LANCZOS)
-        converted_photo = ImageTk.PhotoImage(converted_image_resized)
-        self.converted_image_label.config(image=converted_photo)
-        self.converted_image_label.image = converted_photo
+        if not original_cached:
+            # Extract original frame at specified time position
+            self.original_image = extract_frame(video_path, time_position=time_position, crop=crop)
+            self.last_time_position = time_position
 
-        self.adjust_window_size()  # Ensure window size is adjusted after displaying images
+        if not converted_cached:
+            # Extract the converted SDR frame with the selected filter; gamma is applied locally
+            self.converted_image_base = extract_frame_with_conversion(
+                video_path, gamma=1.0, filter_index=selected_filter_index,
+                tonemapper=tonemapper, time_position=time_position, crop=crop
+            )
+            self.converted_image_key = converted_key
+
+        self.show_preview_images(self.original_image, self.converted_image_base)
+
+    @traced('PIL scale+paste', 'preview')
+    def show_preview_images(self, original_image, converted_image):
+        """Scale the given frames to the pane size, apply the current gamma and paste them into the preview."""
+        layout_changed = self.ensure_preview_layout(original_image)
+
+        original_working = self.get_working_copy('original', original_image)
+        if layout_changed or self.shown_original is not original_working:
+            self.original_photo.paste(original_working)
+            self.shown_original = original_working
+
+        # Gamma is applied to the pane-sized copy, never to the full-resolution frame
+        converted_working = self.get_working_copy('converted', converted_image)
+        self.converted_photo.paste(self.adjust_gamma(converted_working, self.gamma_var.get()))
+
+        if layout_changed:
+            self.adjust_window_size()
+
+    def start_progressive_preview(self, video_path, converted_key, original_cached):
+        """Load the fast approximation and then the full-quality frames in the background."""
+        self.cancel_preview_refinement()
+        self.preview_generation += 1
+        generation = self.preview_generation
+        self.pending_preview_key = converted_key
+        cancel_event = threading.Event()
+        self.refine_cancel_event = cancel_event
+        thread = threading.Thread(target=self.load_preview, args=(
+            generation, cancel_event, video_path, converted_key, original_cached, time.perf_counter()))
+        thread.daemon = True
+        thread.start()
+
+    @traced(category='preview')
+    def load_preview(self, generation, cancel_event, video_path, converted_key, original_cached, started):
+        """
+        Extract the keyframe approximation, then the full-quality frames, off the UI thread and
+        hand each back via root.after. Both FFmpeg runs stop once the user moves on.
+        """
+        _, filter_index, tonemapper, time_position, crop = converted_key
+        try:
+            original_fast = None
+            if not original_cached:
+                original_fast = extract_frame(video_path, time_position=time_position, fast=True,
+                                              cancel_event=cancel_event, crop=crop)
+                original_fast.load()
+            converted_fast = extract_frame_with_conversion(
+                video_path, gamma=1.0, filter_index=filter_index, tonemapper=tonemapper,
+                time_position=time_position, fast=True, cancel_event=cancel_event, crop=crop
+            )
+            converted_fast.load()
+        except FFmpegCancelled:
+            return
+        except Exception as e:
+            self.root.after(0, lambda error=e: self.apply_preview_error(generation, cancel_event, error))
+            return
+        self.root.after(0, lambda: self.apply_fast_preview(
+            generation, cancel_event, original_fast, converted_fast, started))
 
+        try:
+            original = None
+            if not original_cached:
+                original = extract_frame(video_path, time_position=time_position, cancel_event=cancel_event,
+                                         crop=crop)
+                original.load()
+            converted = extract_frame_with_conversion(
+                video_path, gamma=1.0, filter_index=filter_index,
+                tonemapper=tonemapper, time_position=time_position, cancel_event=cancel_event, crop=crop
+            )
+            converted.load()
+        except FFmpegCancelled:
+            return
+        except Exception as e:
+            logging.warning(f"Full-quality preview refinement failed: {e}")
+            return
+
+        self.root.after(0, lambda: self.apply_refined_preview(
+            generation, cancel_event, converted_key, original, converted, started))
+
+    def apply_fast_preview(self, generation, cancel_event, original_fast, converted_fast, started):
+        """Show the approximation, unless the user has moved on since it was requested."""
+        if generation != self.preview_generation or cancel_event.is_set():
+            return
+        self.fast_preview_images = (original_fast or self.original_image, converted_fast)
+        if self.display_image_var.get():
+            self.show_preview_images(*self.fast_preview_images)
+        self.record_preview_latency('fast', time.perf_counter() - started)
+
+    def apply_preview_error(self, generation, cancel_event, error):
+        """Report a failed preview extraction if it is still the current one."""
+        if generation != self.preview_generation or cancel_event.is_set():
+            return
+        self.refine_cancel_event = None
+        self.pending_preview_key = None
+        self.handle_preview_error(error)
+
+    def apply_refined_preview(self, generation, cancel_event, converted_key, original, converted, started):
+        """Swap the refined frames in, unless the user has moved on since they were requested."""
+        if generation != self.preview_generation or cancel_event.is_set():
+            return
+        if original is not None:
+            self.original_image = original
+            self.last_time_position = converted_key[3]
+        self.converted_image_base = converted
+        self.converted_image_key = converted_key
+        self.refine_cancel_event = None
+        self.pending_preview_key = None
+        self.fast_preview_images = None
+        if self.display_image_var.get():
+            self.show_preview_images(self.original_image, self.converted_image_base)
+        self.record_preview_latency('full', time.perf_counter() - started)
+
+    def cancel_preview_refinement(self):
+        """Cancel any in-flight full-quality preview refinement."""
+        if self.refine_cancel_event is not None:
+            self.refine_cancel_event.set()
+            self.refine_cancel_event = None
+        self.pending_preview_key = None
+        self.fast_preview_images = None
+
+    def record_preview_latency(self, stage, seconds):
+        """Record how long a preview stage took to reach the screen."""
+        latencies = self.preview_latencies[stage]
+        latencies.append(seconds)
+        preview_latency.observe(seconds, stage=stage)
+        logging.debug(f"Preview {stage} stage: {seconds * 1000:.0f} ms "
+                      f"(avg {sum(latencies) / len(latencies) * 1000:.0f} ms over {len(latencies)})")
+
+    @traced(action=True)
     def update_frame_preview(self, event=None):
         """Update the frame preview without blocking the UI."""
-        filter_value = self.filter_var.get()
-        
         if self.display_image_var.get() and self.input_path_var.get():
             try:
                 video_path = self.input_path_var.get()
-                self.display_frames(video_path)
+                self.refresh_crop_detection(video_path)
+                self.display_frames(video_path, progressive=True)
                 self.error_label.config(text="")
                 self.original_title_label.grid()
                 self.converted_title_label.grid()
                 self.button_container.grid()  # Show frame buttons
-                self.adjust_window_size()
+                self.refresh_timeline(video_path)
                 self.arrange_widgets(image_frame=True)
             except Exception as e:
                 self.handle_preview_error(e)
@@ -705,6 +1217,177 @@ class HDRConverterGUI:
             self.original_title_label.grid_remove()
             self.converted_title_label.grid_remove()
             self.button_container.grid_remove()  # Hide frame buttons
+            self.timeline_canvas.grid_remove()
+            self.timeline_key = None
             self.arrange_widgets(image_frame=False)
         self.filter_combobox.selection_clear()
         self.tonemap_combobox.selection_clear()
+
+    def get_preview_crop(self, video_path):
+        """Return the detected crop for video_path if auto-crop is enabled and detection has finished."""
+        if not self.auto_crop_var.get() or self.detected_crop is None:
+            return None
+        path, crop = self.detected_crop
+        return crop if path == video_path else None
+
+    def refresh_crop_detection(self, video_path):
+        """Start detecting the crop for video_path in the background if auto-crop is enabled."""
+        if not self.auto_crop_var.get() or self.crop_detection_path == video_path:
+            return
+        self.crop_detection_path = video_path
+        self.crop_label.config(text="Detecting bars...")
+        thread = threading.Thread(target=self.run_crop_detection, args=(video_path,))
+        thread.daemon = True
+        thread.start()
+
+    def run_crop_detection(self, video_path):
+        """Run detect_crop off the UI thread and hand the result back via root.after."""
+        try:
+            crop = detect_crop(video_path)
+        except Exception as e:
+            logging.warning(f"Crop detection failed: {e}")
+            crop = None
+        self.root.after(0, lambda: self.apply_detected_crop(video_path, crop))
+
+    def apply_detected_crop(self, video_path, crop):
+        """Store a finished crop detection, run the actions waiting for it and refresh the preview with it."""
+        waiters = self.crop_waiters.pop(os.path.normpath(video_path), [])
+        if waiters:
+            conversion_manager.enable_ui(self.interactable_elements)
+        for action in waiters:
+            action(crop)
+        if video_path != self.crop_detection_path:
+            return
+        self.detected_crop = (video_path, crop)
+        self.show_crop_label(video_path, crop)
+        if crop and self.auto_crop_var.get() and video_path == self.input_path_var.get():
+            self.original_image = None
+            self.converted_image_base = None
+            self.update_frame_preview()
+
+    def show_crop_label(self, video_path, crop):
+        """Show the detected crop and the share of pixels it saves next to the checkbox."""
+        if crop:
+            saving = get_crop_saving(crop, get_video_properties(video_path))
+            self.crop_label.config(text=f"{crop['width']}x{crop['height']} ({saving:.0%} fewer pixels)")
+        else:
+            self.crop_label.config(text="No bars found")
+
+    def on_auto_crop_toggled(self):
+        """Refresh the preview with or without the crop."""
+        video_path = self.input_path_var.get()
+        if not self.auto_crop_var.get():
+            self.crop_label.config(text="")
+        elif self.detected_crop is not None and self.detected_crop[0] == video_path:
+            self.show_crop_label(*self.detected_crop)
+        self.original_image = None
+        self.converted_image_base = None
+        self.update_frame_preview()
+
+    def with_conversion_crop(self, input_path, action):
+        """
+        Call action with the crop to convert input_path with. If the background detection
+        hasn't finished, the controls are disabled and action runs on the UI thread once it
+        does, rather than detecting again here and freezing the window meanwhile.
+        """
+        if not self.auto_crop_var.get():
+            action(None)
+            return
+        if self.detected_crop is not None and os.path.normpath(self.detected_crop[0]) == input_path:
+            action(self.detected_crop[1])
+            return
+        self.crop_waiters.setdefault(input_path, []).append(action)
+        conversion_manager.disable_ui(self.interactable_elements)
+        if self.crop_detection_path is None or os.path.normpath(self.crop_detection_path) != input_path:
+            self.refresh_crop_detection(input_path)
+
+    def refresh_timeline(self, video_path):
+        """Generate the thumbnail sprite for the timeline in the background if the settings changed."""
+        filter_index = self.filter_options.index(self.filter_var.get())
+        tonemapper = self.tonemap_var.get().lower()
+        key = (video_path, filter_index, tonemapper)
+        if key == self.timeline_key:
+            self.draw_timeline_marker()
+            return
+        self.timeline_key = key
+        thread = threading.Thread(target=self.load_timeline_sprite, args=(key,))
+        thread.daemon = True
+        thread.start()
+
+    def load_timeline_sprite(self, key):
+        """Build the sprite off the UI thread and hand it back via root.after."""
+        video_path, filter_index, tonemapper = key
+        try:
+            sprite = generate_thumbnail_sprite(video_path, filter_index, tonemapper)
+            sprite.load()
+        except Exception as e:
+            logging.warning(f"Failed to generate timeline thumbnails: {e}")
+            return
+        self.root.after(0, lambda: self.show_timeline_sprite(key, sprite))
+
+    def show_timeline_sprite(self, key, sprite):
+        """Draw the sprite in the timeline canvas unless the settings changed meanwhile."""
+        if key != self.timeline_key:
+            return
+        # Span both preview panes
+        target_width = self.preview_size[0] * 2
+        if sprite.width != target_width:
+            sprite = sprite.resize((target_width, max(1, round(sprite.height * target_width / sprite.width))),
+                                   Image.BILINEAR)
+        self.timeline_photo = ImageTk.PhotoImage(sprite)
+        self.timeline_width = sprite.width
+        self.timeline_canvas.config(width=sprite.width, height=sprite.height + TIMELINE_MARKER_HEIGHT)
+        self.timeline_canvas.delete('all')
+        self.timeline_canvas.create_image(0, 0, anchor=tk.NW, image=self.timeline_photo)
+        self.timeline_canvas.grid()
+        self.draw_timeline_marker()
+
+    def draw_timeline_marker(self):
+        """Mark the currently previewed position below the timeline thumbnails."""
+        video_path = self.input_path_var.get()
+        if not self.timeline_width or not video_path:
+            return
+        properties = get_video_properties(video_path)
+        if not properties or not properties['duration']:
+            return
+        x = self.get_preview_time_position(video_path) / properties['duration'] * self.timeline_width
+        height = int(self.timeline_canvas.cget('height'))
+        self.timeline_canvas.delete('marker')
+        self.timeline_canvas.create_rectangle(x - 2, height - TIMELINE_MARKER_HEIGHT, x + 2, height,
+                                              fill='#3daee9', outline='', tags='marker')
+
+    def timeline_time_at(self, x):
+        """Map an x coordinate on the timeline to a time position in the video."""
+        properties = get_video_properties(self.input_path_var.get())
+        if not properties or not self.timeline_width:
+            return None
+        fraction = min(max(x / self.timeline_width, 0.0), 1.0)
+        # Keep clear of the very end, where there is no frame left to seek to
+        return min(fraction * properties['duration'], properties['duration'] * 0.999)
+
+    def on_timeline_click(self, event):
+        """Preview the frame under the pointer."""
+        self.cancel_timeline_hover()
+        self.select_timeline_time(self.timeline_time_at(event.x))
+
+    def on_timeline_hover(self, event):
+        """Preview the frame under the pointer once it rests on the timeline."""
+        self.cancel_timeline_hover()
+        self.timeline_hover_job = self.root.after(
+            TIMELINE_HOVER_DELAY, lambda: self.select_timeline_time(self.timeline_time_at(event.x)))
+
+    def cancel_timeline_hover(self, event=None):
+        """Cancel a pending hover preview."""
+        if self.timeline_hover_job is not None:
+            self.root.after_cancel(self.timeline_hover_job)
+            self.timeline_hover_job = None
+
+    @traced(action=True)
+    def select_timeline_time(self, time_position):
+        """Show the preview at the given time position instead of a fixed frame button."""
+        self.timeline_hover_job = None
+        if time_position is None or time_position == self.timeline_time:
+            return
+        self.timeline_time = time_position
+        self.highlight_frame_button(None)
+        self.update_frame_preview()
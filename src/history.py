@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import statistics
+import threading
+from utils import get_cache_dir
+
+HISTORY_FILE = 'history.sqlite3'
+HISTORY_SCHEMA_VERSION = 2
+SIMILAR_JOBS = 20  # Recent successful jobs the expected speed is the median of
+ERROR_TAIL_LINES = 20
+PHASES = ('probe', 'analysis', 'encode', 'mux')
+# Columns the throughput query may group by
+GROUP_COLUMNS = ('codec', 'resolution', 'host', 'filter', 'tonemapper', 'resource_policy', 'outcome')
+# Height thresholds of the resolution classes jobs are grouped by, largest first
+RESOLUTION_CLASSES = [(2160, '2160p'), (1440, '1440p'), (1080, '1080p'), (720, '720p'), (0, 'SD')]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    host TEXT NOT NULL,
+    source TEXT NOT NULL,          -- 'gui' or 'server'
+    outcome TEXT NOT NULL,         -- queued, running, success, failed, cancelled or interrupted
+    input_path TEXT,
+    output_path TEXT,
+    params TEXT,                   -- JSON of the conversion settings
+    argv TEXT,                     -- JSON of the FFmpeg command
+    codec TEXT,
+    filter TEXT,
+    tonemapper TEXT,
+    resource_policy TEXT,
+    width INTEGER,                 -- Output size
+    height INTEGER,
+    resolution TEXT,
+    source_seconds REAL,           -- Length of the part of the source converted
+    probe_seconds REAL,
+    analysis_seconds REAL,
+    encode_seconds REAL,
+    mux_seconds REAL,
+    fps REAL,
+    speed REAL,                    -- Source seconds converted per second of encoding
+    output_bytes INTEGER,
+    error_tail TEXT,
+    verification TEXT              -- JSON of the verification.verify_output result
+);
+CREATE INDEX IF NOT EXISTS jobs_similar ON jobs (outcome, codec, resolution, host);
+"""
+# Columns added since version 1, for stores created before them
+MIGRATIONS = {2: "ALTER TABLE jobs ADD COLUMN verification TEXT"}
+
+
+def resolution_class(width, height):
+    """
+    Return the resolution class ('2160p', '1080p', ..., 'SD') of an output size, by the height of
+    the 16:9 frame it fills, so a 3840x1600 scope picture counts as 2160p.
+    """
+    if not width or not height:
+        return None
+    lines = max(min(width, height), max(width, height) * 9 / 16)
+    return next(name for threshold, name in RESOLUTION_CLASSES if lines >= threshold * 0.9)
+
+
+class JobHistory:
+    """
+    Persistent record of every conversion, in SQLite in the cache folder.
+
+    A job is recorded when it is queued or started and updated as it runs and ends, so the
+    queue and any job cut short by a crash or restart survive: jobs still queued or running
+    when a process exits are marked 'interrupted' by the next open(), and pending_jobs()
+    returns them for resubmission. Each call opens its own connection, so the store can be
+    used from the GUI, monitor and server threads alike.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.opened = False
+        self.interrupted = []
+
+    def _connect(self):
+        if self.path is None:
+            self.path = os.path.join(get_cache_dir(), HISTORY_FILE)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def open(self):
+        """Create the schema and mark jobs left queued or running by an earlier process as interrupted."""
+        with self.lock:
+            if self.opened:
+                return self
+            connection = self._connect()
+            try:
+                connection.execute('PRAGMA journal_mode=WAL')
+                version = connection.execute('PRAGMA user_version').fetchone()[0]
+                connection.executescript(SCHEMA)
+                with connection:
+                    if version:
+                        for migration_version in range(version + 1, HISTORY_SCHEMA_VERSION + 1):
+                            connection.execute(MIGRATIONS[migration_version])
+                    connection.execute(f'PRAGMA user_version={HISTORY_SCHEMA_VERSION}')
+                    rows = connection.execute(
+                        "SELECT id FROM jobs WHERE outcome IN ('queued', 'running') AND host = ?",
+                        (socket.gethostname(),)).fetchall()
+                    self.interrupted = [row['id'] for row in rows]
+                    connection.executemany("UPDATE jobs SET outcome = 'interrupted' WHERE id = ?",
+                                           [(job_id,) for job_id in self.interrupted])
+            finally:
+                connection.close()
+            self.opened = True
+        return self
+
+    def _execute(self, sql, parameters=()):
+        """Run a statement in its own transaction and return the id of the last inserted row."""
+        self.open()
+        connection = self._connect()
+        try:
+            with connection:
+                return connection.execute(sql, parameters).lastrowid
+        finally:
+            connection.close()
+
+    def _query(self, sql, parameters=()):
+        self.open()
+        connection = self._connect()
+        try:
+            return [dict(row) for row in connection.execute(sql, parameters).fetchall()]
+        finally:
+            connection.close()
+
+    def add_job(self, params, input_path=None, output_path=None, source='gui', outcome='running',
+                argv=None, output_size=None, source_seconds=None, probe_seconds=None, analysis_seconds=None,
+                encoder=None):
+        """
+        Record a new job and return its id. params holds the conversion settings; codec,
+        filter, tonemapper and resource_policy are also kept in columns of their own for queries.
+        encoder (e.g. 'h264_nvenc') goes in the codec column instead when given, so GPU and CPU
+        encodes of a codec are told apart.
+        """
+        width, height = output_size or (None, None)
+        now = time.time()
+        return self._execute(
+            "INSERT INTO jobs (submitted, started, host, source, outcome, input_path, output_path, params, argv,"
+            " codec, filter, tonemapper, resource_policy, width, height, resolution, source_seconds,"
+            " probe_seconds, analysis_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (now, now if outcome == 'running' else None, socket.gethostname(), source, outcome,
+             input_path, output_path, json.dumps(params, default=list), json.dumps(argv) if argv else None,
+             encoder or params.get('codec'), str(params.get('filter')) if params.get('filter') is not None else None,
+             params.get('tonemapper'), params.get('resource_policy'), width, height,
+             resolution_class(width, height), source_seconds, probe_seconds, analysis_seconds))
+
+    def update_job(self, job_id, **fields):
+        """Set columns of a job; output_size=(width, height) also sets its resolution class."""
+        if 'output_size' in fields:
+            width, height = fields.pop('output_size') or (None, None)
+            fields.update(width=width, height=height, resolution=resolution_class(width, height))
+        for name in ('argv', 'verification'):
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        if fields.get('outcome') == 'running' and 'started' not in fields:
+            fields['started'] = time.time()
+        if not fields:
+            return
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        self._execute(f"UPDATE jobs SET {columns} WHERE id = ?", list(fields.values()) + [job_id])
+
+    def finish_job(self, job_id, outcome, phases=None, fps=None, output_path=None, error_lines=None):
+        """
+        Record how a job ended. phases maps PHASES names to seconds; the speed factor follows
+        from the encode phase and the source seconds recorded when the job was added.
+        """
+        fields = {'outcome': outcome, 'finished': time.time(), 'fps': fps}
+        for phase, seconds in (phases or {}).items():
+            if phase not in PHASES:
+                raise ValueError(f"Unknown phase {phase!r}")
+            fields[f'{phase}_seconds'] = seconds
+        if output_path:
+            try:
+                fields['output_bytes'] = os.path.getsize(output_path)
+            except OSError:
+                pass
+        if error_lines:
+            fields['error_tail'] = '\n'.join(list(error_lines)[-ERROR_TAIL_LINES:])
+        self.update_job(job_id, **fields)
+        encode = (phases or {}).get('encode')
+        if outcome == 'success' and encode:
+            self._execute("UPDATE jobs SET speed = source_seconds / ? WHERE id = ? AND source_seconds IS NOT NULL",
+                          (encode, job_id))
+
+    def get_job(self, job_id):
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def last_success(self, output_path):
+        """The most recent successful job that wrote output_path, or None."""
+        rows = self._query("SELECT * FROM jobs WHERE output_path = ? AND outcome = 'success'"
+                           " ORDER BY finished DESC LIMIT 1", (output_path,))
+        return rows[0] if rows else None
+
+    def recent_jobs(self, limit=50):
+        return self._query("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+
+    def pending_jobs(self, source=None):
+        """Jobs an earlier process left queued or running, oldest first, with their params decoded."""
+        self.open()
+        if not self.interrupted:
+            return []
+        placeholders = ', '.join('?' * len(self.interrupted))
+        sql = f"SELECT * FROM jobs WHERE id IN ({placeholders})"
+        parameters = list(self.interrupted)
+        if source:
+            sql += " AND source = ?"
+            parameters.append(source)
+        rows = self._query(sql + " ORDER BY id", parameters)
+        for row in rows:
+            row['params'] = json.loads(row['params']) if row['params'] else {}
+        return rows
+
+    def throughput(self, group_by=('codec', 'resolution', 'host'), since=None):
+        """
+        Return the throughput of successful jobs grouped by the given GROUP_COLUMNS: the job
+        count, mean fps and speed factor, source hours converted and output gigabytes written.
+        since (a time.time() value) limits it to jobs finished after that.
+        """
+        unknown = set(group_by) - set(GROUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot group by {', '.join(sorted(unknown))}; choose from {', '.join(GROUP_COLUMNS)}")
+        columns = ', '.join(group_by)
+        where = "outcome = 'success'" + (" AND finished >= ?" if since else "")
+        select = (f"SELECT {columns + ', ' if columns else ''}COUNT(*) AS jobs, AVG(fps) AS fps, AVG(speed) AS speed,"
+                  f" SUM(source_seconds) / 3600.0 AS source_hours, SUM(output_bytes) / 1e9 AS output_gigabytes"
+                  f" FROM jobs WHERE {where}")
+        if columns:
+            select += f" GROUP BY {columns} ORDER BY {columns}"
+        return self._query(select, (since,) if since else ())
+
+    def expected_speed(self, codec, resolution, host=None, **settings):
+        """
+        Return the median speed factor of recent successful jobs like this one, or None without
+        any. Jobs on the same host are preferred; settings narrows further by filter, tonemapper
+        or resource_policy. Divide the source seconds to convert by it for a time estimate.
+        """
+        conditions = ["outcome = 'success'", "speed IS NOT NULL", "codec = ?", "resolution = ?"]
+        parameters = [codec, resolution]
+        for name, value in settings.items():
+            if name not in GROUP_COLUMNS:
+                raise ValueError(f"Unknown setting {name!r}")
+            conditions.append(f"{name} = ?")
+            parameters.append(str(value) if name == 'filter' else value)
+        for host_condition in ([host or socket.gethostname()], []):
+            sql = (f"SELECT speed FROM jobs WHERE {' AND '.join(conditions + ['host = ?'] * len(host_condition))}"
+                   f" ORDER BY finished DESC LIMIT ?")
+            speeds = [row['speed'] for row in self._query(sql, parameters + host_condition + [SIMILAR_JOBS])]
+            if speeds:
+                return statistics.median(speeds)
+        return None
+
+    def estimate_seconds(self, source_seconds, codec, width, height, **settings):
+        """Return the expected encode time of source_seconds from similar jobs, or None."""
+        speed = self.expected_speed(codec, resolution_class(width, height), **settings)
+        return source_seconds / speed if speed else None
+
+
+job_history = JobHistory()
+
+
+def safe_history(function, *args, **kwargs):
+    """Call a job_history method, logging rather than raising if the store is unavailable."""
+    try:
+        return function(*args, **kwargs)
+    except (sqlite3.Error, OSError, ValueError) as e:
+        logging.warning(f"Job history unavailable: {e}")
+        return None
@@ -0,0 +1,162 @@
+import os
+import re
+import time
+import queue
+import atexit
+import logging
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_MAX_BYTES = 10 * 1024 ** 2  # Size at which a log file is rotated
+LOG_BACKUPS = 3  # Rotated files kept per log
+JOB_LOG_DIR = 'logs'  # Folder of the per-job logs, next to the main log
+MAX_OPEN_JOB_LOGS = 8  # Per-job log files kept open; the least recently written is closed first
+PROGRESS_LOG_INTERVAL = 5.0  # Seconds between the FFmpeg progress lines kept in a job's log
+FILE_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+CONSOLE_FORMAT = '%(levelname)s - %(message)s'
+# FFmpeg stderr lines logged as errors and warnings whatever the level; the rest are debug
+FFMPEG_ERROR_PATTERN = re.compile(
+    r'\[(?:error|fatal|panic)\]|\berror\b|\bfailed\b|\binvalid\b|\bcannot\b|could not|unable to', re.IGNORECASE)
+FFMPEG_WARNING_PATTERN = re.compile(
+    r'\[warning\]|\bwarning\b|deprecated|past duration|non[- ]monoton', re.IGNORECASE)
+
+_listeners = []  # Running QueueListeners
+
+
+def ffmpeg_line_level(line):
+    """The logging level of an FFmpeg stderr line: ERROR, WARNING or DEBUG."""
+    if FFMPEG_ERROR_PATTERN.search(line):
+        return logging.ERROR
+    if FFMPEG_WARNING_PATTERN.search(line):
+        return logging.WARNING
+    return logging.DEBUG
+
+
+def _rotating_handler(path):
+    """A size-rotated log file; the previous session's log is rotated away rather than overwritten."""
+    handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+    if handler.stream.tell() > 0:
+        handler.doRollover()
+    handler.setFormatter(logging.Formatter(FILE_FORMAT))
+    return handler
+
+
+class JobFileHandler(logging.Handler):
+    """
+    Writes the records of each job (those with a 'job' attribute, see JobLog) to a rotated
+    file of its own in directory. Runs on the listener thread only, so needs no locking of
+    its own beyond Handler's.
+    """
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self.handlers = OrderedDict()  # job -> RotatingFileHandler, least recently written first
+
+    def handler_for(self, job):
+        handler = self.handlers.pop(job, None)
+        if handler is None:
+            os.makedirs(self.directory, exist_ok=True)
+            handler = _rotating_handler(os.path.join(self.directory, re.sub(r'[^\w.-]', '_', job) + '.log'))
+            if len(self.handlers) >= MAX_OPEN_JOB_LOGS:
+                _, oldest = self.handlers.popitem(last=False)
+                oldest.close()
+        self.handlers[job] = handler
+        return handler
+
+    def emit(self, record):
+        job = getattr(record, 'job', None)
+        if job is None:
+            return
+        try:
+            self.handler_for(job).handle(record)
+        except OSError:
+            self.handleError(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        self.handlers.clear()
+        super().close()
+
+
+class _MainLogFilter(logging.Filter):
+    """Keeps job records out of the main log unless they are warnings or errors."""
+
+    def filter(self, record):
+        return not hasattr(record, 'job') or record.levelno >= logging.WARNING
+
+
+def start_logging(log_path, level=logging.DEBUG, console_level=logging.DEBUG):
+    """
+    Route logging through a queue: callers only enqueue the record, and a listener thread
+    writes the main log at log_path, the per-job logs in a folder beside it and the console.
+    Both files rotate by size. Raises OSError if log_path can't be opened. Returns the
+    QueueListener, which is stopped (flushing the queue) at exit.
+    """
+    file_handler = _rotating_handler(log_path)
+    file_handler.addFilter(_MainLogFilter())
+    job_handler = JobFileHandler(os.path.join(os.path.dirname(os.path.abspath(log_path)), JOB_LOG_DIR))
+    console = logging.StreamHandler()
+    console.setLevel(console_level)
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    console.addFilter(_MainLogFilter())
+
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, file_handler, job_handler, console, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level)
+    listener.start()
+    _listeners.append(listener)
+    atexit.register(stop_logging, listener)
+    return listener
+
+
+def stop_logging(listener):
+    """Write out what is still queued and close the log files."""
+    if listener not in _listeners:
+        return
+    _listeners.remove(listener)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+class JobLog(logging.LoggerAdapter):
+    """
+    Logger of one job. Its records carry the job name, which sends them to the job's own
+    file, and ffmpeg_line() samples FFmpeg's progress lines: one is kept every
+    PROGRESS_LOG_INTERVAL seconds, while every other stderr line is kept. FFmpeg's errors
+    and warnings (see ffmpeg_line_level) are logged at those levels, so they also reach the
+    main log with debug logging off; a progress line then costs one level check.
+    """
+
+    def __init__(self, job, logger=None, interval=PROGRESS_LOG_INTERVAL):
+        super().__init__(logger or logging.getLogger('ffmpeg'), {'job': job})
+        self.interval = interval
+        self.last_progress = None
+        self.skipped = 0
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = dict(self.extra, **kwargs.get('extra', {}))
+        return msg, kwargs
+
+    def ffmpeg_line(self, line, progress=False):
+        """Log a line of FFmpeg's stderr; progress marks a frame=/time= status line."""
+        level = logging.DEBUG if progress else ffmpeg_line_level(line)
+        if not self.isEnabledFor(level):
+            return
+        if progress:
+            now = time.monotonic()
+            if self.last_progress is not None and now - self.last_progress < self.interval:
+                self.skipped += 1
+                return
+            self.last_progress = now
+            if self.skipped:
+                line = f"{line} ({self.skipped} progress lines skipped)"
+                self.skipped = 0
+        self.log(level, line)
@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinterdnd2 import TkinterDnD, DND_FILES
 from gui import HDRConverterGUI
+from tracing import enable_from_environment
+from metrics import start_from_environment
 from PIL import Image
 
 """
@@ -13,10 +15,14 @@ Functions:
 Execution:
     When run as the main module, this script creates the main TkinterDnD window,
     sets up the main window using the HDRConverterGUI class, and starts
-    the Tkinter main event loop.
+    the Tkinter main event loop. Set HDR_CONVERTER_TRACE to a file path to record a
+    Chrome trace of the session (see tracing.py). HDR_CONVERTER_METRICS_PORT and
+    HDR_CONVERTER_METRICS_FILE export Prometheus metrics (see metrics.py).
 """
 
 if __name__ == "__main__":
+    enable_from_environment()
+    start_from_environment()
     # Create the main TkinterDnD window
     root = TkinterDnD.Tk()
     app = HDRConverterGUI(root)
@@ -0,0 +1,286 @@
+import os
+import re
+import atexit
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT_ENV_VAR = 'HDR_CONVERTER_METRICS_PORT'  # Serve /metrics on this local port
+METRICS_FILE_ENV_VAR = 'HDR_CONVERTER_METRICS_FILE'  # Or write the metrics to this file, e.g. for node_exporter's textfile collector
+METRICS_FILE_INTERVAL = 15  # Seconds between rewrites of the metrics file
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PREVIEW_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Multipliers of the units FFmpeg reports the output size in; its kB are 1024 bytes
+SIZE_UNITS = {'B': 1, 'kB': 1024, 'KiB': 1024, 'mB': 1024 ** 2, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3}
+FRAME_PATTERN = re.compile(r'frame=\s*(\d+)')
+SIZE_PATTERN = re.compile(r'size=\s*(\d+)(B|kB|KiB|mB|MiB|GiB)')
+SPEED_PATTERN = re.compile(r'speed=\s*(\d+(?:\.\d+)?)x')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    """A named metric with optional labels; each label combination holds its own value."""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.label_names) or 'none'}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, (), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=PREVIEW_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            counts = [count + (value <= bound) for count, bound in zip(counts, self.buckets)]
+            self.values[key] = (counts, total + value)
+
+    def get(self, **labels):
+        """Return (count, sum) of the observations with these labels."""
+        with self.lock:
+            counts, total = self.values.get(self._key(labels), ([0] * len(self.buckets), 0.0))
+        return counts[-1], total
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                samples.append((f"{self.name}_bucket", key, (('le', _format_value(float(bound))),), count))
+            samples.append((f"{self.name}_sum", key, (), total))
+            samples.append((f"{self.name}_count", key, (), counts[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """The metrics of this process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is registered already")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=PREVIEW_LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = MetricsRegistry()
+conversion_frames = registry.counter('hdr_conversion_frames_total', "Frames encoded by conversions.")
+conversion_bytes = registry.counter('hdr_conversion_output_bytes_total', "Bytes written by conversions.")
+conversion_fps = registry.gauge('hdr_conversion_fps', "Encoding speed FFmpeg last reported, in frames per second.")
+conversion_speed = registry.gauge('hdr_conversion_speed_ratio',
+                                  "Encoding speed FFmpeg last reported, as a multiple of real time.")
+conversion_active = registry.gauge('hdr_conversion_active', "Conversions running.")
+conversion_jobs = registry.counter('hdr_conversion_jobs_total', "Finished conversions by outcome.", ['outcome'])
+gpu_fallbacks = registry.counter('hdr_gpu_fallbacks_total',
+                                 "GPU conversions that failed and were retried on the CPU.")
+queue_jobs = registry.gauge('hdr_queue_jobs', "Jobs of the priority scheduler by state.", ['state'])
+probe_cache_requests = registry.counter('hdr_probe_cache_requests_total', "Probe cache lookups by kind and result.",
+                                        ['kind', 'result'])
+preview_latency = registry.histogram('hdr_preview_latency_seconds',
+                                     "Time for a preview refresh stage to reach the screen.", ['stage'])
+
+
+class ConversionProgress:
+    """
+    Feeds the conversion metrics from FFmpeg's progress lines. FFmpeg reports running totals;
+    the counters get the increase since the previous line, so they keep adding up across jobs.
+    A conversion counts as running from its ConversionProgress until finish().
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.active = True
+        conversion_active.inc()
+
+    def finish(self):
+        """Stop counting the conversion as running; later calls do nothing."""
+        if self.active:
+            self.active = False
+            conversion_active.dec()
+
+    def update(self, line, fps=None):
+        """Record a progress line; fps is passed when the caller has parsed it already."""
+        frame_match = FRAME_PATTERN.search(line)
+        if frame_match:
+            frames = int(frame_match.group(1))
+            conversion_frames.inc(max(frames - self.frames, 0))
+            self.frames = max(frames, self.frames)
+        size_match = SIZE_PATTERN.search(line)
+        if size_match:
+            size = int(size_match.group(1)) * SIZE_UNITS[size_match.group(2)]
+            conversion_bytes.inc(max(size - self.bytes, 0))
+            self.bytes = max(size, self.bytes)
+        speed_match = SPEED_PATTERN.search(line)
+        if speed_match:
+            conversion_speed.set(float(speed_match.group(1)))
+        if fps is not None:
+            conversion_fps.set(fps)
+
+
+def record_job_outcome(outcome):
+    """Count a finished conversion as 'success', 'failed' or 'cancelled'."""
+    conversion_jobs.inc(outcome=outcome)
+
+
+def record_queue_depth(jobs):
+    """Set the queue gauge from a PriorityScheduler's jobs."""
+    counts = dict.fromkeys(('queued', 'running', 'preempted', 'paused'), 0)
+    for job in jobs:
+        if job.state in counts:
+            counts[job.state] += 1
+    for state, count in counts.items():
+        queue_jobs.set(count, state=state)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Metrics scrape from {self.address_string()}: {format % args}")
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """Serve the metrics at http://host:port/metrics from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def write_metrics_file(path):
+    """Write the metrics to path atomically, so a collector never reads a half-written file."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(temp_path, path)
+
+
+def start_metrics_file_writer(path, interval=METRICS_FILE_INTERVAL):
+    """Rewrite the metrics file every interval seconds and once more at exit."""
+    stopped = threading.Event()
+
+    def run():
+        while True:
+            try:
+                write_metrics_file(path)
+            except OSError as e:
+                logging.warning(f"Could not write metrics to {path}: {e}")
+            if stopped.wait(interval):
+                return
+
+    threading.Thread(target=run, daemon=True).start()
+    atexit.register(lambda: (stopped.set(), write_metrics_file(path)))
+    return stopped
+
+
+def start_from_environment():
+    """Start the exporters HDR_CONVERTER_METRICS_PORT and HDR_CONVERTER_METRICS_FILE ask for."""
+    port = os.environ.get(METRICS_PORT_ENV_VAR)
+    if port:
+        try:
+            serve_metrics(int(port))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not serve metrics on port {port}: {e}")
+    path = os.environ.get(METRICS_FILE_ENV_VAR)
+    if path:
+        start_metrics_file_writer(os.path.abspath(path))
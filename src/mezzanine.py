@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from utils import get_cache_dir, get_file_fingerprint
+
+MEZZANINE_QUOTA_BYTES = 100 * 1024 ** 3  # Disk budget for cached mezzanines before LRU eviction
+MEZZANINE_EXTENSION = '.mkv'
+PARTIAL_SUFFIX = '.partial' + MEZZANINE_EXTENSION
+PARTIAL_MAX_AGE = 24 * 3600  # Partials untouched this long were left behind by a crash or a locked file
+# Intra-only lossless FFV1; the tonemap chain ends in 8-bit, so yuv420p keeps every output bit
+MEZZANINE_ARGS = [
+    '-c:v', 'ffv1', '-level', '3', '-g', '1',
+    '-slices', '16', '-slicecrc', '1',
+    '-pix_fmt', 'yuv420p',
+    '-an', '-sn', '-dn',
+]
+
+
+class MezzanineCache:
+    """
+    On-disk cache of tonemapped video, keyed by source fingerprint and tonemap settings.
+
+    A conversion can write its tonemapped frames to a lossless mezzanine alongside the
+    delivery file; later conversions with the same settings then only decode the mezzanine
+    and encode, skipping decode at source resolution and the whole tonemap chain. Entries
+    are evicted least recently used first once the cache exceeds its quota; a lookup counts
+    as a use.
+    """
+
+    def __init__(self, directory=None, quota_bytes=MEZZANINE_QUOTA_BYTES):
+        self._directory = directory
+        self.quota_bytes = quota_bytes
+        self.lock = threading.Lock()
+
+    @property
+    def directory(self):
+        if self._directory is None:
+            self._directory = get_cache_dir('mezzanine')
+        return self._directory
+
+    def make_key(self, input_path, **settings):
+        """
+        Return the cache key for input_path tonemapped with the given settings.
+        Args:
+            input_path (str): The source video.
+            **settings: Everything that affects the tonemapped frames (filter, tonemapper,
+                gamma, crop, output size); values must be JSON serializable.
+        Returns:
+            str: A hex digest, or None if the source cannot be fingerprinted.
+        """
+        fingerprint = get_file_fingerprint(input_path)
+        if fingerprint is None:
+            return None
+        blob = json.dumps(settings, sort_keys=True, default=list)
+        return hashlib.sha1(f"{fingerprint}|{blob}".encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + MEZZANINE_EXTENSION)
+
+    def partial_path_for(self, key):
+        """Return where a conversion should write the mezzanine until it is committed."""
+        return os.path.join(self.directory, key + PARTIAL_SUFFIX)
+
+    def lookup(self, key):
+        """Return the mezzanine path for key and mark it as recently used, or None on a miss."""
+        if key is None:
+            return None
+        path = self.path_for(key)
+        with self.lock:
+            if not os.path.exists(path):
+                return None
+            now = time.time()
+            os.utime(path, (now, now))
+        logging.info(f"Mezzanine cache hit: {path}")
+        return path
+
+    def commit(self, key):
+        """Publish a finished partial mezzanine and evict older entries beyond the quota."""
+        partial = self.partial_path_for(key)
+        path = self.path_for(key)
+        with self.lock:
+            if not os.path.exists(partial):
+                return None
+            os.replace(partial, path)
+            logging.info(f"Stored mezzanine {path} ({os.path.getsize(path) / 1024 ** 2:.0f} MiB)")
+            self._evict()
+            return path if os.path.exists(path) else None
+
+    def discard(self, key):
+        """Remove the partial mezzanine of a failed or cancelled conversion."""
+        try:
+            os.remove(self.partial_path_for(key))
+        except OSError:
+            pass
+
+    def entries(self):
+        """Return (path, size, last used) of every committed mezzanine, least recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(MEZZANINE_EXTENSION) or name.endswith(PARTIAL_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def usage(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        with self.lock:
+            self._evict()
+
+    def _evict(self):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith(PARTIAL_SUFFIX) and time.time() - os.path.getmtime(path) > PARTIAL_MAX_AGE:
+                    os.remove(path)
+            except OSError:
+                continue
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.quota_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logging.info(f"Evicted mezzanine {path} ({size / 1024 ** 2:.0f} MiB)")
+            except OSError as e:
+                logging.warning(f"Failed to evict mezzanine {path}: {e}")
@@ -0,0 +1,416 @@
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+import subprocess
+from collections import deque
+import numpy as np
+from utils import FFMPEG_EXECUTABLE, format_crop_filter, range_args, MUXING_ARGS
+from streaming import follow_input_args, follow_input_url, is_stream_output, stream_output_args
+from scheduler import new_session_kwargs, suspend_process, resume_process
+from governor import apply_resource_policy, priority_creationflags
+
+PIPELINE_QUEUE_DEPTH = 8  # Frames buffered between stages before the previous stage blocks
+OUTPUT_LUT_SIZE = 4096  # Quantization steps of the linear-to-display output LUT
+PIPELINE_TRANSFERS = ('smpte2084',)  # Source transfers the operators decode; HLG would need its own EOTF and OOTF
+MIN_PEAK_RATIO = 2.0  # Lowest source peak the operators accept, relative to the target peak
+
+# PQ (SMPTE ST 2084) constants
+PQ_M1 = 2610 / 16384
+PQ_M2 = 2523 / 4096 * 128
+PQ_C1 = 3424 / 4096
+PQ_C2 = 2413 / 4096 * 32
+PQ_C3 = 2392 / 4096 * 32
+
+# Linear BT.2020 RGB to linear BT.709 RGB
+BT2020_TO_BT709 = np.array([
+    [1.6605, -0.5876, -0.0728],
+    [-0.1246, 1.1329, -0.0083],
+    [-0.0182, -0.1006, 1.1187]
+], dtype=np.float32)
+
+
+def pq_eotf(signal):
+    """Convert a normalized PQ signal to absolute luminance in nits."""
+    signal = np.clip(signal, 0.0, 1.0) ** (1 / PQ_M2)
+    return 10000.0 * (np.maximum(signal - PQ_C1, 0.0) / (PQ_C2 - PQ_C3 * signal)) ** (1 / PQ_M1)
+
+
+def pq_inverse_eotf(nits):
+    """Convert absolute luminance in nits to a normalized PQ signal."""
+    y = (np.clip(nits, 0.0, 10000.0) / 10000.0) ** PQ_M1
+    return ((PQ_C1 + PQ_C2 * y) / (1 + PQ_C3 * y)) ** PQ_M2
+
+
+class ToneMapOperator:
+    """
+    Base class for NumPy tonemap operators used by FramePipeline.
+
+    Operators receive PQ-encoded BT.2020 frames as (height, width, 3) uint16 arrays and
+    write BT.709 frames into preallocated (height, width, 3) uint8 arrays. The per-pixel
+    work is two LUT lookups and a 3x3 matrix, all written into per-worker scratch
+    buffers, so processing a frame allocates nothing.
+    """
+    name = None
+
+    def __init__(self, gamma=1.0, peak_nits=1000.0, target_nits=100.0):
+        self.gamma = gamma
+        # Peaks at or below the target would leave nothing to roll off
+        self.peak_nits = min(max(peak_nits, target_nits * MIN_PEAK_RATIO), 10000.0)
+        self.target_nits = target_nits
+        codes = np.arange(65536, dtype=np.float64) / 65535.0
+        self.linear_lut = self.tone_curve(codes).astype(np.float32)
+        self.matrix = np.ascontiguousarray(BT2020_TO_BT709.T)
+        self.output_lut = self.build_output_lut()
+
+    def tone_curve(self, signal):
+        """Map a normalized PQ signal to linear light relative to the target white (1.0)."""
+        raise NotImplementedError
+
+    def build_output_lut(self):
+        """Linear BT.709 light to 8-bit display code values, including the gamma adjustment."""
+        linear = np.linspace(0.0, 1.0, OUTPUT_LUT_SIZE)
+        display = linear ** (1 / 2.4)  # Inverse BT.1886
+        display = display ** (1 / self.gamma)  # Same direction as ffmpeg's eq=gamma
+        return np.round(display * 255).astype(np.uint8)
+
+    def prepare(self, width, height):
+        """Allocate the scratch buffers for one worker."""
+        return {
+            'linear': np.empty((height, width, 3), dtype=np.float32),
+            'mixed': np.empty((height, width, 3), dtype=np.float32),
+            # np.take converts any other index type to intp, and only writes straight into out
+            # with mode='clip', so both lookups go through this one intp buffer
+            'index': np.empty((height, width, 3), dtype=np.intp),
+        }
+
+    def process(self, src, dst, scratch):
+        """Tonemap `src` into `dst` using `scratch` from prepare()."""
+        linear, mixed, index = scratch['linear'], scratch['mixed'], scratch['index']
+        np.copyto(index, src)
+        np.take(self.linear_lut, index, out=linear, mode='clip')
+        np.matmul(linear, self.matrix, out=mixed)
+        np.clip(mixed, 0.0, 1.0, out=mixed)
+        np.multiply(mixed, OUTPUT_LUT_SIZE - 1, out=mixed)
+        np.rint(mixed, out=mixed)
+        np.copyto(index, mixed, casting='unsafe')
+        np.take(self.output_lut, index, out=dst, mode='clip')
+
+
+class BT2390Operator(ToneMapOperator):
+    """ITU-R BT.2390 EETF: hermite-spline roll-off in the PQ domain from the source peak to the target peak."""
+    name = 'bt2390'
+
+    def tone_curve(self, signal):
+        source_max = pq_inverse_eotf(self.peak_nits)
+        e1 = np.clip(signal / source_max, 0.0, 1.0)
+        max_lum = pq_inverse_eotf(self.target_nits) / source_max
+        knee = 1.5 * max_lum - 0.5
+        t = (e1 - knee) / (1 - knee)
+        spline = ((2 * t ** 3 - 3 * t ** 2 + 1) * knee
+                  + (t ** 3 - 2 * t ** 2 + t) * (1 - knee)
+                  + (-2 * t ** 3 + 3 * t ** 2) * max_lum)
+        e2 = np.where(e1 < knee, e1, spline)
+        return pq_eotf(e2 * source_max) / self.target_nits
+
+
+class ReinhardOperator(ToneMapOperator):
+    """Extended Reinhard on linear light, with the source peak mapped to the target white."""
+    name = 'reinhard_ext'
+
+    def tone_curve(self, signal):
+        x = pq_eotf(signal) / self.target_nits
+        white = self.peak_nits / self.target_nits
+        return x * (1 + x / white ** 2) / (1 + x)
+
+
+PIPELINE_OPERATORS = {
+    BT2390Operator.name: BT2390Operator,
+    ReinhardOperator.name: ReinhardOperator,
+}
+
+
+def register_operator(operator_class):
+    """Make a ToneMapOperator subclass available to FramePipeline by its name."""
+    PIPELINE_OPERATORS[operator_class.name] = operator_class
+    return operator_class
+
+
+def _hidden_window_kwargs():
+    if sys.platform == "win32":
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+        return {'startupinfo': startupinfo, 'creationflags': subprocess.CREATE_NO_WINDOW}
+    return dict(new_session_kwargs(), startupinfo=None, creationflags=0)
+
+
+class StageStats:
+    """Frames handled and time spent busy by one pipeline stage."""
+
+    def __init__(self, name, parallelism=1):
+        self.name = name
+        self.parallelism = parallelism
+        self.frames = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.frames += 1
+            self.busy += seconds
+
+    @property
+    def fps(self):
+        """Throughput the stage could sustain if it never waited on its neighbours."""
+        busy = self.busy / self.parallelism
+        return self.frames / busy if busy > 0 else 0.0
+
+
+class FramePipeline:
+    """
+    Streams frames from an FFmpeg decoder through a NumPy tonemap operator into an FFmpeg encoder.
+
+    decoder (rawvideo rgb48le on stdout) -> worker threads (operator) -> encoder (rawvideo rgb24
+    on stdin, audio and subtitles muxed from the source). Frames travel in preallocated buffers
+    filled with readinto; bounded queues between the stages provide backpressure. The object
+    exposes poll(), terminate() and returncode so ConversionManager can treat it like an FFmpeg
+    process.
+    """
+
+    def __init__(self, input_path, output_path, properties, operator, encoder_args,
+                 workers=None, queue_depth=PIPELINE_QUEUE_DEPTH, progress_callback=None, crop=None,
+                 output_size=None, start=None, end=None, muxing='faststart', follow=False,
+                 resource_policy=None):
+        self.input_path = input_path
+        self.resource_policy = resource_policy or {}  # A governor.RESOURCE_POLICIES entry
+        self.muxing = muxing
+        # Both processes read the source: the decoder for video, the encoder for audio and subtitles
+        self.input_args = range_args(start, end) + (follow_input_args() if follow else [])
+        self.input_url = follow_input_url(input_path) if follow else os.path.normpath(input_path)
+        self.output_path = output_path
+        self.crop = crop
+        source_size = (crop['width'], crop['height']) if crop else (properties['width'], properties['height'])
+        self.resize = output_size is not None and tuple(output_size) != source_size
+        self.width, self.height = output_size if self.resize else source_size
+        self.frame_rate = properties['frame_rate']
+        self.operator = operator
+        self.encoder_args = encoder_args
+        self.workers = workers or max(1, min(os.cpu_count() or 1, 8))
+        self.queue_depth = queue_depth
+        self.progress_callback = progress_callback
+        self.returncode = None
+        self.cancelled = False
+        self.error_lines = deque(maxlen=50)
+        self.stats = {
+            'decode': StageStats('decode'),
+            'tonemap': StageStats('tonemap', self.workers),
+            'encode': StageStats('encode'),
+        }
+        self.started_at = None
+        self.finished_at = None
+        self.decoder = None
+        self.encoder = None
+        self.threads = []
+
+    def decoder_command(self):
+        video_filter = 'scale=in_color_matrix=bt2020:in_range=tv'
+        if self.resize:
+            # Resize while converting to rgb48 so the workers only tonemap output pixels
+            video_filter += f':w={self.width}:h={self.height}:flags=spline'
+        if self.crop:
+            video_filter = f'{format_crop_filter(self.crop)},{video_filter}'
+        return [
+            FFMPEG_EXECUTABLE, '-loglevel', 'error',
+        ] + self.input_args + [
+            '-i', self.input_url,
+            '-map', '0:v:0',
+            '-vf', video_filter,
+            '-f', 'rawvideo', '-pix_fmt', 'rgb48le', '-'
+        ]
+
+    def encoder_command(self):
+        return [
+            FFMPEG_EXECUTABLE, '-loglevel', 'info',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+            '-s', f'{self.width}x{self.height}', '-r', str(self.frame_rate),
+            '-i', '-',
+        ] + self.input_args + [
+            '-i', self.input_url,
+            '-map', '0:v', '-map', '1:a?', '-map', '1:s?',
+            '-vf', 'scale=out_color_matrix=bt709:out_range=tv',
+        ] + self.encoder_args + [
+            '-pix_fmt', 'yuv420p',
+            '-color_primaries', 'bt709', '-color_trc', 'bt709', '-colorspace', 'bt709',
+            '-c:a', 'copy', '-c:s', 'copy',
+            '-map_metadata', '1',
+        ] + self.output_args()
+
+    def output_args(self):
+        if is_stream_output(self.output_path):
+            return stream_output_args(self.output_path) + ['-y']
+        return MUXING_ARGS[self.muxing] + [os.path.normpath(self.output_path), '-y']
+
+    def start(self):
+        """Spawn the decoder and encoder and start the stage threads."""
+        kwargs = _hidden_window_kwargs()
+        kwargs['creationflags'] |= priority_creationflags(self.resource_policy)
+        self.started_at = time.perf_counter()
+        self.decoder = subprocess.Popen(self.decoder_command(), stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, **kwargs)
+        self.encoder = subprocess.Popen(self.encoder_command(), stdin=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, **kwargs)
+        for process in (self.decoder, self.encoder):
+            apply_resource_policy(process, self.resource_policy)
+        logging.debug(f"Started pipeline with operator {self.operator.name} and {self.workers} workers")
+
+        shape = (self.height, self.width, 3)
+        self.free_inputs = queue.Queue()
+        for _ in range(self.queue_depth + self.workers):
+            self.free_inputs.put(np.empty(shape, dtype=np.uint16))
+        self.free_outputs = queue.Queue()
+        for _ in range(self.queue_depth + self.workers):
+            self.free_outputs.put(np.empty(shape, dtype=np.uint8))
+        self.work = queue.Queue(maxsize=self.queue_depth)
+        self.done = queue.Queue()
+
+        targets = [self._decode_loop, self._write_loop,
+                   lambda: self._drain(self.decoder.stderr), lambda: self._drain(self.encoder.stderr)]
+        targets += [self._tonemap_loop] * self.workers
+        for target in targets:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def _drain(self, stream):
+        for line in iter(stream.readline, b''):
+            self.error_lines.append(line.decode('utf-8', errors='replace').rstrip())
+
+    def _decode_loop(self):
+        stdout = self.decoder.stdout
+        frame_size = self.width * self.height * 3 * 2
+        index = 0
+        try:
+            while not self.cancelled:
+                buffer = self.free_inputs.get()
+                view = memoryview(buffer).cast('B')
+                started = time.perf_counter()
+                filled = 0
+                while filled < frame_size:
+                    count = stdout.readinto(view[filled:])
+                    if not count:
+                        break
+                    filled += count
+                if filled < frame_size:
+                    if filled:
+                        logging.warning(f"Decoder ended with a partial frame ({filled} of {frame_size} bytes)")
+                    break
+                self.stats['decode'].add(time.perf_counter() - started)
+                self.work.put((index, buffer))
+                index += 1
+        finally:
+            for _ in range(self.workers):
+                self.work.put(None)
+
+    def _tonemap_loop(self):
+        scratch = self.operator.prepare(self.width, self.height)
+        stats = self.stats['tonemap']
+        while True:
+            # Take the output buffer first, so whoever holds the oldest frame can always finish it
+            dst = self.free_outputs.get()
+            item = self.work.get()
+            if item is None:
+                self.free_outputs.put(dst)
+                self.done.put(None)
+                return
+            index, src = item
+            started = time.perf_counter()
+            self.operator.process(src, dst, scratch)
+            stats.add(time.perf_counter() - started)
+            self.free_inputs.put(src)
+            self.done.put((index, dst))
+
+    def _write_loop(self):
+        stdin = self.encoder.stdin
+        pending = {}
+        next_index = 0
+        finished = 0
+        writable = True
+        while finished < self.workers:
+            item = self.done.get()
+            if item is None:
+                finished += 1
+                continue
+            pending[item[0]] = item[1]
+            while next_index in pending:
+                dst = pending.pop(next_index)
+                if writable:
+                    started = time.perf_counter()
+                    try:
+                        stdin.write(memoryview(dst).cast('B'))
+                        self.stats['encode'].add(time.perf_counter() - started)
+                    except (BrokenPipeError, OSError) as e:
+                        # Keep draining so the other stages can unwind
+                        writable = False
+                        if not self.cancelled:
+                            logging.error(f"Encoder stopped accepting frames: {e}")
+                self.free_outputs.put(dst)
+                next_index += 1
+                if writable and self.progress_callback:
+                    self.progress_callback(next_index)
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+    def wait(self):
+        """Wait for all stages to finish and return the encoder's exit code."""
+        for thread in self.threads:
+            thread.join()
+        decoder_code = self.decoder.wait()
+        encoder_code = self.encoder.wait()
+        self.finished_at = time.perf_counter()
+        self.returncode = encoder_code if encoder_code != 0 else decoder_code
+        if self.cancelled and self.returncode == 0:
+            self.returncode = -1
+        logging.info(self.format_stats())
+        return self.returncode
+
+    def poll(self):
+        return self.returncode
+
+    def suspend(self):
+        """Pause both FFmpeg processes; the stage threads block on the idle pipes meanwhile."""
+        for process in (self.decoder, self.encoder):
+            if process:
+                suspend_process(process)
+
+    def resume(self):
+        for process in (self.decoder, self.encoder):
+            if process:
+                resume_process(process)
+
+    def terminate(self):
+        """Stop both FFmpeg processes; the stage threads unwind on the closed pipes."""
+        self.cancelled = True
+        for process in (self.decoder, self.encoder):
+            if process and process.poll() is None:
+                process.terminate()
+
+    @property
+    def fps(self):
+        """Overall frames per second achieved end to end."""
+        end = self.finished_at or time.perf_counter()
+        elapsed = end - self.started_at if self.started_at else 0
+        return self.stats['encode'].frames / elapsed if elapsed > 0 else 0.0
+
+    def format_stats(self):
+        """Summarize per-stage throughput; the slowest stage is the bottleneck."""
+        stages = ', '.join(f"{name} {stage.fps:.1f} fps" for name, stage in self.stats.items())
+        bottleneck = min(self.stats.values(), key=lambda stage: stage.fps if stage.frames else float('inf'))
+        return (f"Pipeline: {self.stats['encode'].frames} frames at {self.fps:.1f} fps overall "
+                f"({stages}); bottleneck: {bottleneck.name}")
@@ -0,0 +1,167 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import FFMPEG_EXECUTABLE
+from scheduler import suspend_process, resume_process
+from governor import io_phases
+
+PROOF_CLIPS = 5  # Same positions as the preview frame buttons
+PROOF_CLIP_SECONDS = 4
+PROOF_MAX_PARALLEL = 4  # Each clip encode is multithreaded already; more mostly adds contention
+
+
+def get_proof_path(output_path, index=None):
+    """
+    Return where a proof of output_path is written: <base>_proof<ext> for the combined review
+    file, or <base>_proof_NN<ext> for clip NN when the clips are kept separate.
+    """
+    base, ext = os.path.splitext(output_path)
+    suffix = '_proof' if index is None else f'_proof_{index:02d}'
+    return f"{base}{suffix}{ext}"
+
+
+def get_proof_ranges(duration, positions=None, clip_seconds=PROOF_CLIP_SECONDS, clips=PROOF_CLIPS):
+    """
+    Return the (start, end) of each proof clip.
+    Args:
+        duration (float): Length of the video in seconds.
+        positions (list, optional): Clip start times in seconds. Defaults to `clips` evenly
+            spaced positions, matching the preview frame buttons.
+        clip_seconds (float): Length of each clip.
+        clips (int): Number of default positions.
+    Returns:
+        list: Sorted (start, end) tuples, each kept inside the video.
+    """
+    if positions is None:
+        positions = [duration * i / (clips + 1) for i in range(1, clips + 1)]
+    ranges = []
+    for position in sorted(positions):
+        start = min(max(0.0, position), max(0.0, duration - clip_seconds))
+        ranges.append((round(start, 3), round(min(start + clip_seconds, duration), 3)))
+    return ranges
+
+
+class ProofRender:
+    """
+    Render short clips concurrently and optionally concatenate them into one review file.
+
+    Each clip command is started through `launch` (ConversionManager.start_ffmpeg_process),
+    at most `workers` at a time. If output_path is set, the clips are rendered into a
+    temporary directory and joined with FFmpeg's concat demuxer without re-encoding, which
+    works because every clip comes from the same command template. Exposes the
+    poll/terminate/wait/returncode interface ConversionManager expects of its process.
+    """
+
+    def __init__(self, clip_commands, clip_paths, launch, output_path=None,
+                 workers=PROOF_MAX_PARALLEL, progress_callback=None, temp_dir=None):
+        self.clip_commands = clip_commands
+        self.clip_paths = clip_paths
+        self.launch = launch
+        self.output_path = output_path
+        self.workers = max(1, workers)
+        self.progress_callback = progress_callback
+        self.temp_dir = temp_dir
+
+        self.returncode = None
+        self.error_lines = []
+        self.completed = 0
+        self.processes = []
+        self.cancelled = threading.Event()
+        self.running = threading.Event()  # Cleared while paused; holds back clips not started yet
+        self.running.set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(self._run_command, self.clip_commands))
+            if all(code == 0 for code in results) and self.output_path and not self.cancelled.is_set():
+                with io_phases.phase('proof join'):
+                    results.append(self._run_command(self.concat_command()))
+            self.returncode = next((code for code in results if code != 0), 0)
+        except Exception as e:
+            logging.error(f"Proof render failed: {e}", exc_info=True)
+            self.error_lines.append(str(e))
+            self.returncode = 1
+        finally:
+            if self.temp_dir:
+                shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _run_command(self, cmd):
+        process = None
+        while process is None:
+            self.running.wait()
+            with self.lock:
+                # Checked under the lock so terminate() and suspend() cannot miss a process started after them
+                if self.cancelled.is_set():
+                    return -1
+                if self.running.is_set():
+                    process = self.launch(cmd)
+                    self.processes.append(process)
+        _, stderr = process.communicate()
+        if process.returncode != 0 and not self.cancelled.is_set():
+            with self.lock:
+                self.error_lines.extend((stderr or '').strip().splitlines()[-10:])
+        with self.lock:
+            self.completed += 1
+            completed = self.completed
+        if self.progress_callback:
+            self.progress_callback(completed, self.total_steps)
+        return process.returncode if not self.cancelled.is_set() else -1
+
+    @property
+    def total_steps(self):
+        return len(self.clip_commands) + (1 if self.output_path else 0)
+
+    def concat_command(self):
+        """Return the FFmpeg command that joins the clips into output_path by stream copy."""
+        list_path = os.path.join(os.path.dirname(self.clip_paths[0]), 'clips.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in self.clip_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        cmd = [
+            FFMPEG_EXECUTABLE, '-loglevel', 'info',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-map', '0', '-c', 'copy',
+        ]
+        if os.path.splitext(self.output_path)[1].lower() in ('.mp4', '.m4v', '.mov'):
+            cmd += ['-movflags', '+faststart']
+        return cmd + [os.path.normpath(self.output_path), '-y']
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.thread:
+            self.thread.join(timeout)
+        return self.returncode
+
+    def suspend(self):
+        with self.lock:
+            self.running.clear()
+            for process in self.processes:
+                suspend_process(process)
+
+    def resume(self):
+        with self.lock:
+            for process in self.processes:
+                resume_process(process)
+            self.running.set()
+
+    def terminate(self):
+        self.cancelled.set()
+        self.resume()
+        with self.lock:
+            for process in self.processes:
+                if process.poll() is None:
+                    process.terminate()
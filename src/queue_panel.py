@@ -0,0 +1,352 @@
+import os
+import math
+import logging
+import threading
+import tkinter as tk
+from tkinter import filedialog, messagebox
+from tkinter import ttk
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from tkinterdnd2 import DND_FILES
+from utils import get_video_properties, TONEMAP
+from estimator import format_duration
+from scheduler import PriorityScheduler, estimate_remaining
+from server import ServerJob, parse_job_params
+
+QUEUE_REFRESH_MS = 250  # Interval of the batched refresh of changed rows
+QUEUE_INSERT_BATCH = 500  # Rows inserted into the tree per refresh, so a large drop doesn't freeze the window
+QUEUE_PROBE_WORKERS = 4  # Dropped files probed at once
+VIDEO_EXTENSIONS = ('.mkv', '.mp4', '.m4v', '.mov', '.ts', '.m2ts', '.mts', '.webm', '.hevc', '.avi')
+# Codec choices as shown in the main window, with the codec and GPU flag they stand for
+CODEC_CHOICES = {'H.264 (CPU)': ('h264', False), 'H.264 (GPU)': ('h264', True), 'H.265 (CPU)': ('h265', False)}
+QUEUE_COLUMNS = ('status', 'progress', 'remaining', 'tonemapper', 'gamma', 'codec')
+
+
+def expand_paths(paths):
+    """Return the video files among paths, with folders searched recursively, in sorted order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, names in os.walk(path):
+                subdirectories.sort()
+                files += [os.path.join(directory, name) for name in sorted(names)
+                          if name.lower().endswith(VIDEO_EXTENSIONS)]
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+class QueueEntry:
+    """A queued file and the settings it will be converted with; job is its ServerJob once started."""
+
+    def __init__(self, item_id, input_path, tonemapper, gamma, codec):
+        self.id = item_id
+        self.input_path = input_path
+        base, ext = os.path.splitext(input_path)
+        self.output_path = f"{base}_sdr{ext}"
+        self.tonemapper = tonemapper
+        self.gamma = gamma
+        self.codec = codec  # A CODEC_CHOICES key
+        self.status = 'probing'  # probing, ready or unreadable until started; then the job's state
+        self.duration = None
+        self.job = None
+
+    @property
+    def state(self):
+        if self.job is None:
+            return self.status
+        # A job 'probing' here has been probed already and is having its command built
+        return 'preparing' if self.job.state == 'probing' else self.job.state
+
+    @property
+    def editable(self):
+        return self.job is None
+
+
+class QueuePanel:
+    """
+    Batch conversion queue in a window of its own, on a ttk.Treeview.
+
+    Dropped files and folders are added at once and probed in the background. Entries run
+    one at a time through a scheduler.PriorityScheduler as server.ServerJobs, so they are
+    recorded in the job history like server jobs. Worker threads never touch the widgets:
+    they mark entries dirty, and a refresh every QUEUE_REFRESH_MS inserts new rows in
+    batches and redraws only the dirty rows that are on screen. The rest stay dirty until
+    scrolled into view, so thousands of entries cost no more per refresh than a screenful.
+    """
+
+    def __init__(self, gui):
+        self.gui = gui
+        self.entries = {}  # Item id -> QueueEntry
+        self.order = []  # Item ids of the rows in the tree, top to bottom
+        self.pending_rows = deque()  # Entries waiting to be inserted into the tree
+        self.dirty = set()  # Item ids whose row needs redrawing
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.probes = ThreadPoolExecutor(QUEUE_PROBE_WORKERS)
+        self.preparer = ThreadPoolExecutor(1)  # Builds commands in queue order
+        self.scheduler = PriorityScheduler(1, on_change=self.on_scheduled_change)
+        self.scheduler.start()
+        self.create_widgets()
+        self.refresh()
+
+    def create_widgets(self):
+        self.window = tk.Toplevel(self.gui.root)
+        self.window.title("Batch Queue")
+        self.window.protocol("WM_DELETE_WINDOW", self.window.withdraw)  # The queue keeps running hidden
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(1, weight=1)
+
+        toolbar = ttk.Frame(self.window, padding="5")
+        toolbar.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        for column, (text, command) in enumerate((
+                ("Add Files", self.add_files), ("Add Folder", self.add_folder),
+                ("Remove Selected", self.remove_selected), ("Cancel Selected", self.cancel_selected),
+                ("Start Queue", self.start_queue))):
+            ttk.Button(toolbar, text=text, command=command).grid(row=0, column=column, padx=(0, 5))
+        self.summary_label = ttk.Label(toolbar, text="")
+        self.summary_label.grid(row=0, column=5, padx=(10, 0), sticky=tk.W)
+
+        self.tree = ttk.Treeview(self.window, columns=QUEUE_COLUMNS, selectmode='extended', height=20)
+        self.tree.heading('#0', text="File")
+        self.tree.column('#0', width=320, stretch=True)
+        for name, width in zip(QUEUE_COLUMNS, (90, 70, 80, 90, 60, 100)):
+            self.tree.heading(name, text=name.capitalize())
+            self.tree.column(name, width=width, stretch=False, anchor=tk.W)
+        scrollbar = ttk.Scrollbar(self.window, orient=tk.VERTICAL, command=self.tree.yview)
+        # Rows scrolled into view may have changed while off screen
+        self.tree.configure(yscrollcommand=lambda first, last: (scrollbar.set(first, last), self.redraw_visible()))
+        self.tree.grid(row=1, column=0, sticky=(tk.N, tk.S, tk.W, tk.E))
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        self.tree.drop_target_register(DND_FILES)
+        self.tree.dnd_bind('<<Drop>>', lambda event: self.add_paths(self.window.tk.splitlist(event.data)))
+
+        # Bulk edit of the selected entries that haven't started
+        edit_frame = ttk.Frame(self.window, padding="5")
+        edit_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        self.tonemap_var = tk.StringVar(value=self.gui.tonemap_var.get())
+        self.gamma_var = tk.StringVar(value=str(self.gui.gamma_var.get()))
+        self.codec_var = tk.StringVar(value=self.gui.codec_var.get())
+        ttk.Label(edit_frame, text="Tonemapper:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Combobox(edit_frame, textvariable=self.tonemap_var, values=TONEMAP, state='readonly',
+                     width=10).grid(row=0, column=1, padx=(5, 10))
+        ttk.Label(edit_frame, text="Gamma:").grid(row=0, column=2, sticky=tk.W)
+        ttk.Entry(edit_frame, textvariable=self.gamma_var, width=6).grid(row=0, column=3, padx=(5, 10))
+        ttk.Label(edit_frame, text="Codec:").grid(row=0, column=4, sticky=tk.W)
+        ttk.Combobox(edit_frame, textvariable=self.codec_var, values=list(CODEC_CHOICES), state='readonly',
+                     width=14).grid(row=0, column=5, padx=(5, 10))
+        ttk.Button(edit_frame, text="Apply to Selected", command=self.apply_to_selected).grid(row=0, column=6)
+
+    def show(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    # Adding entries
+
+    def add_files(self):
+        paths = filedialog.askopenfilenames(parent=self.window, title="Add Videos")
+        if paths:
+            self.add_paths(paths)
+
+    def add_folder(self):
+        path = filedialog.askdirectory(parent=self.window, title="Add Folder")
+        if path:
+            self.add_paths([path])
+
+    def add_paths(self, paths):
+        """Queue the videos among paths (folders are searched) and probe them in the background."""
+        known = {entry.input_path for entry in self.entries.values()}
+        files = [os.path.abspath(path) for path in expand_paths(paths)]
+        tonemapper = self.gui.tonemap_var.get()
+        gamma = self.gui.gamma_var.get()
+        codec = self.gui.codec_var.get()
+        added = 0
+        for path in files:
+            if path in known:
+                continue
+            known.add(path)
+            self.next_id += 1
+            entry = QueueEntry(str(self.next_id), path, tonemapper, gamma, codec)
+            self.entries[entry.id] = entry
+            self.pending_rows.append(entry)
+            self.probes.submit(self.probe, entry)
+            added += 1
+        logging.info(f"Queued {added} of {len(files)} videos")
+        self.show()
+
+    def probe(self, entry):
+        properties = get_video_properties(entry.input_path)
+        if entry.job is None:
+            entry.status = 'ready' if properties else 'unreadable'
+        entry.duration = properties['duration'] if properties else None
+        self.mark_dirty(entry.id)
+
+    # Refreshing rows
+
+    def mark_dirty(self, item_id):
+        """Safe from any thread; the row is redrawn at the next refresh if it is on screen."""
+        with self.lock:
+            self.dirty.add(item_id)
+
+    def on_scheduled_change(self, scheduled):
+        for entry in self.entries.values():
+            if entry.job is not None and entry.job.scheduled is scheduled:
+                self.mark_dirty(entry.id)
+                return
+
+    def on_job_event(self, event, job):
+        self.mark_dirty(job.id)
+
+    def row_values(self, entry):
+        job = entry.job
+        progress = f"{job.progress:.0f}%" if job else ''
+        remaining = ''
+        if job is not None and job.state == 'running' and job.scheduled and job.scheduled.clock:
+            seconds = estimate_remaining(job.progress / 100 * job.duration, job.duration,
+                                         job.scheduled.clock.active_seconds())
+            seconds = seconds if seconds is not None else job.estimated_seconds
+            remaining = format_duration(seconds) if seconds is not None else ''
+        elif job is not None and job.state in ('queued', 'probing') and job.estimated_seconds:
+            remaining = format_duration(job.estimated_seconds)
+        return (entry.state, progress, remaining, entry.tonemapper, f"{float(entry.gamma):.2f}", entry.codec)
+
+    def visible_items(self):
+        """Item ids of the rows on screen, from the scroll position; the tree's rows are all the same height."""
+        if not self.order:
+            return []
+        first, last = self.tree.yview()
+        start = int(first * len(self.order))
+        end = min(len(self.order), int(math.ceil(last * len(self.order))) + 1)
+        return self.order[start:end]
+
+    def insert_pending(self):
+        for _ in range(min(QUEUE_INSERT_BATCH, len(self.pending_rows))):
+            entry = self.pending_rows.popleft()
+            self.tree.insert('', tk.END, iid=entry.id, text=os.path.basename(entry.input_path),
+                             values=self.row_values(entry))
+            self.order.append(entry.id)
+
+    def redraw_visible(self):
+        """Redraw the dirty rows on screen; the others keep their mark until scrolled into view."""
+        visible = self.visible_items()
+        with self.lock:
+            redraw = [item_id for item_id in visible if item_id in self.dirty]
+            self.dirty.difference_update(redraw)
+        for item_id in redraw:
+            entry = self.entries.get(item_id)
+            if entry is not None:
+                self.tree.item(item_id, values=self.row_values(entry))
+
+    def refresh(self):
+        """Insert a batch of new rows and redraw the visible changed ones, then come back."""
+        try:
+            if not self.window.winfo_exists():
+                return
+        except tk.TclError:
+            return
+        self.insert_pending()
+        self.redraw_visible()
+        self.update_summary()
+        self.window.after(QUEUE_REFRESH_MS, self.refresh)
+
+    def update_summary(self):
+        counts = {}
+        for entry in self.entries.values():
+            counts[entry.state] = counts.get(entry.state, 0) + 1
+        self.summary_label.config(text=', '.join(f"{count} {state}" for state, count in sorted(counts.items())))
+
+    # Editing and running
+
+    def selected_entries(self):
+        return [self.entries[item_id] for item_id in self.tree.selection() if item_id in self.entries]
+
+    def apply_to_selected(self):
+        """Set the tonemapper, gamma and codec of the selected entries that haven't started."""
+        try:
+            gamma = float(self.gamma_var.get())
+        except ValueError:
+            messagebox.showerror("Invalid Gamma", "Gamma must be a number.", parent=self.window)
+            return
+        for entry in self.selected_entries():
+            if entry.editable:
+                entry.tonemapper = self.tonemap_var.get()
+                entry.gamma = gamma
+                entry.codec = self.codec_var.get()
+                self.mark_dirty(entry.id)
+
+    def remove_selected(self):
+        """Drop the selected entries that aren't running, cancelling those waiting to run."""
+        removed = set()
+        for entry in self.selected_entries():
+            if entry.state in ('running', 'paused', 'preempted', 'verifying'):
+                continue
+            if entry.state in ('queued', 'preparing'):
+                self.cancel_entry(entry)
+            removed.add(entry.id)
+            del self.entries[entry.id]
+        if not removed:
+            return
+        # One pass over the rows, so removing thousands of entries stays linear
+        self.tree.delete(*[item_id for item_id in self.order if item_id in removed])
+        self.order = [item_id for item_id in self.order if item_id not in removed]
+        self.pending_rows = deque(entry for entry in self.pending_rows if entry.id not in removed)
+
+    def cancel_selected(self):
+        for entry in self.selected_entries():
+            self.cancel_entry(entry)
+
+    def cancel_entry(self, entry):
+        job = entry.job
+        if job is None:
+            return
+        if job.scheduled is None:
+            job.cancelled = True
+            job.record_finish('cancelled')
+        else:
+            self.scheduler.cancel(job.scheduled)
+            if job.scheduled.process is None:
+                job.record_finish('cancelled')  # Never launched, so no monitor records it
+        self.mark_dirty(entry.id)
+
+    def start_queue(self):
+        """Submit every ready entry, in queue order."""
+        filter_name = self.gui.filter_var.get().lower()
+        for item_id in self.order + [entry.id for entry in self.pending_rows]:
+            entry = self.entries[item_id]
+            if entry.status != 'ready' or entry.job is not None:
+                continue
+            codec, use_gpu = CODEC_CHOICES[entry.codec]
+            params = parse_job_params({
+                'input_path': entry.input_path, 'output_path': entry.output_path, 'gamma': entry.gamma,
+                'use_gpu': use_gpu, 'filter': filter_name, 'tonemapper': entry.tonemapper, 'codec': codec,
+                'resolution': self.gui.resolution_var.get(), 'muxing': self.gui.muxing_var.get(),
+                'verify': self.gui.verify_output_var.get(), 'name': os.path.basename(entry.input_path)})
+            entry.job = ServerJob(entry.id, params, self.scheduler, self.on_job_event, source='queue')
+            self.preparer.submit(self.prepare, entry.job)
+            self.mark_dirty(entry.id)
+
+    def prepare(self, job):
+        if job.cancelled:
+            return
+        try:
+            job.prepare()
+        except Exception as e:
+            logging.error(f"Could not prepare {job.name}: {e}")
+            job.error = str(e)
+            self.mark_dirty(job.id)
+            return
+        with self.scheduler.lock:
+            if not job.cancelled:
+                job.scheduled = self.scheduler.submit(job.launch, 0, job.name)
+        if job.cancelled:
+            job.record_finish('cancelled')
+        self.mark_dirty(job.id)
+
+    def close(self):
+        """Cancel every queued and running entry, e.g. when the application exits."""
+        for entry in list(self.entries.values()):
+            if entry.state not in ('done', 'failed', 'cancelled'):
+                self.cancel_entry(entry)
+        self.scheduler.stop()
+        self.probes.shutdown(wait=False, cancel_futures=True)
+        self.preparer.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,172 @@
+import os
+import csv
+import json
+import shutil
+import logging
+from utils import FFMPEG_EXECUTABLE, MUXING_ARGS, get_file_fingerprint
+
+RESUME_SEGMENT_SECONDS = 60
+RESUME_DIR_SUFFIX = '.resume'
+MANIFEST_NAME = 'manifest.json'
+SEGMENT_PATTERN = 'segment_%05d.mkv'
+MANIFEST_VERSION = 1
+
+
+class ResumeJob:
+    """
+    Segment-level checkpointing of one conversion.
+
+    The conversion writes GOP-aligned, video-only Matroska segments into <output>.resume/
+    through FFmpeg's segment muxer, which lists each segment in a CSV as soon as it is closed.
+    Audio and subtitles are copied from the source when the segments are joined, so segment
+    boundaries cannot leave gaps in them. A manifest records the conversion parameters and every
+    run, with the source time the run started at. A restarted conversion with the same parameters
+    seeks to the end of the last complete segment and only encodes what is missing; once
+    everything is encoded the segments are joined by stream copy.
+
+    Each segment repeats its parameter sets in-band (dump_extra), so segments from different
+    encoders of the same codec, as after a GPU-to-CPU fallback, still concatenate.
+    """
+
+    def __init__(self, input_path, output_path, params, segment_seconds=RESUME_SEGMENT_SECONDS,
+                 muxing='faststart'):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.muxing = muxing  # MP4 layout of the joined output; see utils.choose_muxing
+        self.directory = output_path + RESUME_DIR_SUFFIX
+        self.params = params
+        self.segment_seconds = segment_seconds
+        self.manifest = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _write_manifest(self):
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def prepare(self):
+        """Load a matching manifest, or start a fresh one if the parameters or source changed."""
+        manifest = self._load_manifest()
+        expected = {'version': MANIFEST_VERSION, 'params': self.params, 'segment_seconds': self.segment_seconds}
+        if manifest and all(manifest.get(key) == value for key, value in expected.items()):
+            self.manifest = manifest
+            logging.info(f"Found {len(self.completed_segments())} completed segments in {self.directory}")
+        else:
+            if manifest or os.path.isdir(self.directory):
+                logging.info(f"Discarding segments in {self.directory}; the conversion settings changed")
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+            self.manifest = dict(expected, runs=[], encoded=False)
+            self._write_manifest()
+        return self
+
+    @property
+    def encoded(self):
+        return bool(self.manifest and self.manifest.get('encoded'))
+
+    def completed_segments(self):
+        """
+        Return the segments finished without a gap from the start, as (path, start, end) in source
+        seconds. A segment cut short by a crash is not listed yet and is encoded again.
+        """
+        segments = {}
+        for run in self.manifest['runs']:
+            list_path = os.path.join(self.directory, run['list'])
+            try:
+                with open(list_path, 'r', encoding='utf-8', newline='') as f:
+                    rows = [row for row in csv.reader(f) if len(row) >= 3]
+            except OSError:
+                continue
+            for row in rows:
+                path = os.path.join(self.directory, row[0])
+                # Later runs replace whatever an earlier run left under the same number
+                segments[row[0]] = (path, run['offset'] + float(row[1]), run['offset'] + float(row[2]))
+
+        completed, position = [], 0.0
+        for name in sorted(segments):
+            path, start, end = segments[name]
+            if abs(start - position) > 0.5 or not os.path.exists(path):
+                break
+            completed.append((path, start, end))
+            position = end
+        return completed
+
+    def resume_point(self):
+        """Return (source seconds to resume from, number of the next segment)."""
+        completed = self.completed_segments()
+        return (completed[-1][2] if completed else 0.0), len(completed)
+
+    def start_run(self, offset, start_number):
+        """Record a run starting at offset seconds and return its segment list file name."""
+        list_name = f'segments_{len(self.manifest["runs"]) + 1:03d}.csv'
+        self.manifest['runs'].append({'list': list_name, 'offset': offset, 'first_segment': start_number})
+        self._write_manifest()
+        if offset:
+            logging.info(f"Resuming {os.path.basename(self.output_path)} at {offset:.1f} s "
+                         f"from segment {start_number}")
+        return list_name
+
+    def input_args(self):
+        """Keyframes on every segment boundary, so segments cut exactly and each starts clean."""
+        return ['-force_key_frames', f'expr:gte(t,n_forced*{self.segment_seconds})']
+
+    def output_args(self, list_name, start_number):
+        return [
+            '-an', '-sn',
+            '-bsf:v', 'dump_extra=freq=keyframe',
+            '-f', 'segment',
+            '-segment_format', 'matroska',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_start_number', str(start_number),
+            '-segment_list', os.path.join(self.directory, list_name),
+            '-segment_list_type', 'csv',
+            '-reset_timestamps', '1',
+            os.path.join(self.directory, SEGMENT_PATTERN),
+        ]
+
+    def mark_encoded(self):
+        self.manifest['encoded'] = True
+        self._write_manifest()
+
+    def concat_command(self):
+        """Return the command joining the segments by stream copy, with the source's audio and subtitles."""
+        return segment_concat_command([path for path, _, _ in self.completed_segments()],
+                                      os.path.join(self.directory, 'concat.txt'),
+                                      self.input_path, self.output_path, self.muxing)
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def make_resume_params(input_path, **settings):
+    """Return the manifest parameters: the source fingerprint and every setting that shapes the output."""
+    return json.loads(json.dumps(dict(settings, source=get_file_fingerprint(input_path)), default=list))
+
+
+def segment_concat_command(segment_paths, list_path, input_path, output_path, muxing='faststart'):
+    """
+    Write the concat list of video-only segments to list_path and return the command joining
+    them by stream copy into output_path, with the audio, subtitles and metadata of input_path.
+    """
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return [
+        FFMPEG_EXECUTABLE, '-loglevel', 'info',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', os.path.normpath(input_path),
+        '-map', '0:v', '-map', '1:a?', '-map', '1:s?',
+        '-c', 'copy', '-map_metadata', '1',
+    ] + MUXING_ARGS[muxing] + [os.path.normpath(output_path), '-y']
@@ -0,0 +1,275 @@
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import itertools
+from metrics import record_queue_depth
+
+SCHEDULER_POLL_SECONDS = 0.5
+PROCESS_SUSPEND_RESUME = 0x0800  # Windows access right for NtSuspendProcess/NtResumeProcess
+
+
+def new_session_kwargs():
+    """
+    Return the Popen options that start a child in its own process group (POSIX), so
+    suspending the group stops FFmpeg and anything it spawns without stopping this process.
+    """
+    return {} if sys.platform == "win32" else {'start_new_session': True}
+
+
+def _signal_process(process, signum):
+    try:
+        # Signal the whole group only if the child leads its own; otherwise the group is ours
+        if os.getpgid(process.pid) == process.pid:
+            os.killpg(process.pid, signum)
+        else:
+            os.kill(process.pid, signum)
+    except ProcessLookupError:
+        pass  # Exited in the meantime
+
+
+def _windows_suspend(process, suspend):
+    import ctypes
+    kernel32, ntdll = ctypes.windll.kernel32, ctypes.windll.ntdll
+    handle = kernel32.OpenProcess(PROCESS_SUSPEND_RESUME, False, process.pid)
+    if not handle:
+        raise ctypes.WinError()
+    try:
+        status = (ntdll.NtSuspendProcess if suspend else ntdll.NtResumeProcess)(handle)
+        if status != 0:
+            raise OSError(f"Could not {'suspend' if suspend else 'resume'} process {process.pid}: "
+                          f"NTSTATUS {status & 0xFFFFFFFF:#x}")
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def suspend_process(process):
+    """
+    Stop a running process where it is; it keeps its memory and open files until resumed.
+    Objects with their own suspend() (FramePipeline, ProofRender) handle their processes.
+    """
+    if hasattr(process, 'suspend'):
+        process.suspend()
+    elif process.poll() is None:
+        if sys.platform == "win32":
+            _windows_suspend(process, True)
+        else:
+            _signal_process(process, signal.SIGSTOP)
+
+
+def resume_process(process):
+    """Continue a process stopped by suspend_process."""
+    if hasattr(process, 'resume'):
+        process.resume()
+    elif process.poll() is None:
+        if sys.platform == "win32":
+            _windows_suspend(process, False)
+        else:
+            _signal_process(process, signal.SIGCONT)
+
+
+class PauseClock:
+    """Wall time of a job, with the time it spent suspended kept apart."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.paused_at = None
+        self.paused_total = 0.0
+
+    @property
+    def paused(self):
+        return self.paused_at is not None
+
+    def pause(self):
+        if self.paused_at is None:
+            self.paused_at = time.perf_counter()
+
+    def resume(self):
+        if self.paused_at is not None:
+            self.paused_total += time.perf_counter() - self.paused_at
+            self.paused_at = None
+
+    def paused_seconds(self, now=None):
+        now = time.perf_counter() if now is None else now
+        return self.paused_total + (now - self.paused_at if self.paused_at is not None else 0.0)
+
+    def active_seconds(self, now=None):
+        """Seconds the job has been running, not counting pauses."""
+        now = time.perf_counter() if now is None else now
+        return now - self.started - self.paused_seconds(now)
+
+
+def estimate_remaining(done, total, active_seconds):
+    """
+    Return the seconds left to process total units at the rate done units took, or None
+    before there is a rate. Pass PauseClock.active_seconds() so pauses don't slow the rate.
+    """
+    if done <= 0 or active_seconds <= 0:
+        return None
+    return max(total - done, 0) * active_seconds / done
+
+
+class ScheduledJob:
+    """
+    A job of a PriorityScheduler.
+
+    state is 'queued', 'running', 'preempted' (suspended by the scheduler for a higher
+    priority job), 'paused' (suspended by the user), 'done', 'cancelled' or 'failed' (launch()
+    raised; error holds the exception).
+    """
+
+    def __init__(self, launch, priority, sequence, name=None):
+        self.launch = launch
+        self.priority = priority
+        self.sequence = sequence
+        self.name = name or f"job {sequence}"
+        self.state = 'queued'
+        self.process = None
+        self.clock = None
+        self.returncode = None
+        self.error = None
+
+    def __repr__(self):
+        return f"<ScheduledJob {self.name} priority={self.priority} {self.state}>"
+
+
+class PriorityScheduler:
+    """
+    Runs up to `capacity` conversions at a time, by priority.
+
+    A job that arrives with a higher priority than a running one preempts it: the lower
+    priority process is suspended in place (SIGSTOP on its process group, NtSuspendProcess
+    on Windows) and continued when capacity frees up, so no encoded work is lost. Preempted
+    jobs resume before queued jobs of the same priority, since they already hold their
+    memory and partial output. A job paused by the user gives up its slot and stays paused
+    until resumed.
+
+    launch() returns a process-like object (poll/terminate/returncode, as ConversionManager
+    expects of self.process). schedule() runs on every change and, once start() is called,
+    every poll_seconds from a background thread to notice finished jobs.
+    """
+
+    def __init__(self, capacity=1, poll_seconds=SCHEDULER_POLL_SECONDS, on_change=None):
+        self.capacity = max(1, capacity)
+        self.poll_seconds = poll_seconds
+        self.on_change = on_change
+        self.jobs = []
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self._sequence = itertools.count()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.wait(self.poll_seconds):
+            self.schedule()
+
+    def submit(self, launch, priority=0, name=None):
+        """Queue a job; higher priorities run first and may preempt running jobs."""
+        with self.lock:
+            job = ScheduledJob(launch, priority, next(self._sequence), name)
+            self.jobs.append(job)
+            record_queue_depth(self.jobs)
+            logging.info(f"Queued {job.name} with priority {priority}")
+            self.schedule()
+            return job
+
+    def _set_state(self, job, state):
+        job.state = state
+        record_queue_depth(self.jobs)
+        if self.on_change:
+            self.on_change(job)
+
+    def _run_job(self, job):
+        """Start or continue job; returns False if it could not be launched and has failed."""
+        if job.state == 'queued':
+            try:
+                job.process = job.launch()
+            except Exception as e:
+                logging.error(f"Could not start {job.name}: {e}")
+                job.error = e
+                self._set_state(job, 'failed')
+                return False
+            job.clock = PauseClock()
+            logging.info(f"Started {job.name}")
+        else:
+            resume_process(job.process)
+            job.clock.resume()
+            logging.info(f"Resumed {job.name}")
+        self._set_state(job, 'running')
+        return True
+
+    def _suspend_job(self, job, state):
+        suspend_process(job.process)
+        job.clock.pause()
+        logging.info(f"{'Preempted' if state == 'preempted' else 'Paused'} {job.name}")
+        self._set_state(job, state)
+
+    def schedule(self):
+        """Reap finished jobs, then fill free capacity and preempt lower priority jobs."""
+        with self.lock:
+            for job in self.jobs:
+                if job.state == 'running' and job.process.poll() is not None:
+                    job.returncode = job.process.poll()
+                    self._set_state(job, 'done')
+
+            running = [job for job in self.jobs if job.state == 'running']
+            waiting = sorted((job for job in self.jobs if job.state in ('queued', 'preempted')),
+                             key=lambda job: (-job.priority, job.state != 'preempted', job.sequence))
+            for job in waiting:
+                if len(running) >= self.capacity:
+                    # Preempt the lowest priority running job, the most recently submitted among equals
+                    victim = min(running, key=lambda job: (job.priority, -job.sequence))
+                    if victim.priority >= job.priority:
+                        break
+                    self._suspend_job(victim, 'preempted')
+                    running.remove(victim)
+                if not self._run_job(job):
+                    # Start over, so a job preempted for this one gets its slot back first; failed
+                    # jobs are out of the queue, so this recursion ends
+                    return self.schedule()
+                running.append(job)
+
+    def pause(self, job):
+        """Suspend a running job until resume(); its slot goes to the next job."""
+        with self.lock:
+            if job.state == 'running':
+                self._suspend_job(job, 'paused')
+            elif job.state == 'preempted':
+                self._set_state(job, 'paused')
+            self.schedule()
+
+    def resume(self, job):
+        """Let a paused job continue, as soon as it is its turn."""
+        with self.lock:
+            if job.state == 'paused':
+                self._set_state(job, 'preempted')
+            self.schedule()
+
+    def set_priority(self, job, priority):
+        """Change a job's priority; it may preempt, or be preempted by, other jobs as a result."""
+        with self.lock:
+            job.priority = priority
+            if self.on_change:
+                self.on_change(job)
+            self.schedule()
+
+    def cancel(self, job):
+        with self.lock:
+            if job.state in ('preempted', 'paused'):
+                # A stopped process only acts on SIGTERM once continued
+                resume_process(job.process)
+            if job.state in ('running', 'preempted', 'paused'):
+                job.process.terminate()
+            if job.state not in ('done', 'cancelled', 'failed'):
+                self._set_state(job, 'cancelled')
+            self.schedule()
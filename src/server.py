@@ -0,0 +1,594 @@
+"""
+Local job-submission API for driving conversions without the GUI.
+
+Serves HTTP/JSON on 127.0.0.1 (or a Unix socket) from one asyncio event loop, so hundreds of
+queued jobs and event subscribers cost no thread each. Jobs run through a
+scheduler.PriorityScheduler, at most --capacity at a time:
+
+    POST /jobs                     submit a job; the body takes the start_conversion parameters
+                                   listed in JOB_PARAMS, e.g. {"input_path": ..., "output_path": ...}
+    GET  /jobs                     every job, optionally ?state=running
+    GET  /jobs/<id>                state, progress (percent), fps, exit code and the encode time
+                                   similar earlier jobs suggest (estimated_seconds) of one job
+    POST /jobs/<id>/cancel         stop a job, queued or running
+    POST /jobs/<id>/pause          suspend a job in place; /resume continues it
+    POST /jobs/<id>/priority       {"priority": 5}; higher runs first and preempts lower
+    GET  /events                   Server-Sent Events: 'state' and 'progress' events with the
+                                   job as JSON; ?job=<id> follows one job
+    GET  /metrics                  the Prometheus metrics of metrics.py
+
+A job submitted with "verify": true is checked by verification.verify_output after encoding;
+it is 'verifying' meanwhile and its result is reported as 'verification'.
+
+Usage:
+    python src/server.py [--host 127.0.0.1] [--port 8765] [--unix /tmp/hdr.sock] [--capacity 2] [--restore]
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import argparse
+import itertools
+import threading
+import subprocess
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from utils import get_video_properties, choose_muxing, plan_output_size, TONEMAP, MUXING_MODES, RESOLUTION_PRESETS
+from conversion import ConversionManager
+from autotune import get_encoder_name
+from history import job_history, safe_history
+from logqueue import JobLog
+from verification import verify_output
+from governor import DEFAULT_RESOURCE_POLICY, get_policy
+from scheduler import PriorityScheduler
+from metrics import ConversionProgress, record_job_outcome, registry
+
+SERVER_HOST = '127.0.0.1'  # Local only; the API runs arbitrary paths through FFmpeg
+SERVER_PORT = 8765
+SERVER_CAPACITY = 1  # Conversions running at once
+PROBE_CONCURRENCY = 4  # Submitted jobs probed at once
+SSE_KEEPALIVE_SECONDS = 15
+EVENT_QUEUE_SIZE = 1000  # Events held per subscriber; the oldest are dropped for slow readers
+MAX_BODY_BYTES = 1024 * 1024
+ERROR_LINES = 20  # FFmpeg stderr lines kept for a failed job
+FILTERS = ['static', 'dynamic']
+CODECS = ['h264', 'h265']
+# Parameters a job may carry and their defaults, matching start_conversion and the GUI's defaults
+JOB_PARAMS = {
+    'input_path': None,
+    'output_path': None,
+    'gamma': 1.0,
+    'use_gpu': False,
+    'filter': 'dynamic',
+    'tonemapper': 'mobius',
+    'codec': 'h264',
+    'crop': None,
+    'resolution': None,
+    'start': None,
+    'end': None,
+    'encoder_settings': None,
+    'muxing': 'auto',
+    'resource_policy': DEFAULT_RESOURCE_POLICY,
+    'priority': 0,
+    'name': None,
+    'verify': False,  # Check the output after a successful conversion; see verification.py
+}
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           409: 'Conflict', 413: 'Payload Too Large'}
+PROGRESS_PATTERN = re.compile(r'time=(\d+:\d+:\d+\.\d+)')
+FPS_PATTERN = re.compile(r'fps=\s*(\d+(?:\.\d+)?)')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_job_params(body):
+    """Validate a submitted job against JOB_PARAMS; returns the parameters with defaults filled in."""
+    if not isinstance(body, dict):
+        raise ValueError("The job must be a JSON object")
+    unknown = set(body) - set(JOB_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown job parameters: {', '.join(sorted(unknown))}")
+    params = dict(JOB_PARAMS, **body)
+    for name in ('input_path', 'output_path'):
+        if not isinstance(params[name], str) or not params[name]:
+            raise ValueError(f"{name} is required")
+
+    selected_filter = params['filter']
+    if isinstance(selected_filter, str) and selected_filter.lower() in FILTERS:
+        params['filter'] = FILTERS.index(selected_filter.lower())
+    elif selected_filter not in range(len(FILTERS)) or isinstance(selected_filter, bool):
+        raise ValueError(f"filter must be one of {', '.join(FILTERS)}")
+    params['tonemapper'] = str(params['tonemapper']).lower()
+    if params['tonemapper'] not in [name.lower() for name in TONEMAP]:
+        raise ValueError(f"tonemapper must be one of {', '.join(TONEMAP)}")
+    if params['codec'] not in CODECS:
+        raise ValueError(f"codec must be one of {', '.join(CODECS)}")
+    params['muxing'] = str(params['muxing']).lower()
+    if params['muxing'] not in [mode.lower() for mode in MUXING_MODES]:
+        raise ValueError(f"muxing must be one of {', '.join(MUXING_MODES)}")
+    get_policy(params['resource_policy'])
+
+    resolution = params['resolution']
+    if isinstance(resolution, list) and len(resolution) == 2 and all(isinstance(v, int) for v in resolution):
+        params['resolution'] = tuple(resolution)
+    elif resolution is not None and resolution not in RESOLUTION_PRESETS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTION_PRESETS)} or [width, height]")
+    if params['crop'] is not None and not (isinstance(params['crop'], dict)
+                                           and {'width', 'height', 'x', 'y'} <= set(params['crop'])):
+        raise ValueError("crop must have width, height, x and y")
+    try:
+        params['gamma'] = float(params['gamma'])
+        params['priority'] = int(params['priority'])
+        for name in ('start', 'end'):
+            if params[name] is not None:
+                params[name] = float(params[name])
+    except (TypeError, ValueError):
+        raise ValueError("gamma, start and end must be numbers and priority an integer")
+    params['use_gpu'] = bool(params['use_gpu'])
+    params['verify'] = bool(params['verify'])
+    return params
+
+
+class ServerJob:
+    """
+    One submitted conversion. prepare() probes the source and builds the FFmpeg command off the
+    event loop; launch() is what the scheduler calls to start it, and a thread follows its
+    progress from then on. Each job has its own ConversionManager, so jobs keep their own
+    resource policy. The GUI's queue_panel.QueuePanel runs its entries as ServerJobs too.
+    """
+
+    def __init__(self, job_id, params, scheduler, publish, source='server'):
+        self.id = job_id
+        self.params = params
+        self.name = params['name'] or f"job {job_id}"
+        self.scheduler = scheduler
+        self.publish = publish
+        self.source = source  # Recorded in the job history; --restore only resubmits 'server' jobs
+        self.manager = ConversionManager()
+        self.submitted = time.time()
+        self.command = None
+        self.duration = None
+        self.scheduled = None  # scheduler.ScheduledJob once probed
+        self.progress = 0.0
+        self.fps = None
+        self.returncode = None
+        self.error = None
+        self.cancelled = False  # Cancelled before it reached the scheduler
+        self.error_lines = deque(maxlen=ERROR_LINES)
+        self.history_id = None  # history.job_history row
+        self.estimated_seconds = None  # Encode time similar earlier jobs suggest
+        self.encode_started = None
+        self.finalize_started = None
+        self.properties = None
+        self.verification = None  # verification.verify_output result, once verified
+
+    @property
+    def state(self):
+        if self.cancelled or (self.scheduled and self.scheduled.state == 'cancelled'):
+            return 'cancelled'
+        if self.error is not None and self.returncode is None:
+            return 'failed'
+        if self.returncode is not None:
+            if self.returncode != 0:
+                return 'failed'
+            return 'verifying' if self.params['verify'] and self.verification is None else 'done'
+        return self.scheduled.state if self.scheduled else 'probing'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'priority': self.scheduled.priority if self.scheduled else self.params['priority'],
+            'progress': round(self.progress, 2),
+            'fps': self.fps,
+            'returncode': self.returncode,
+            'error': self.error,
+            'input_path': self.params['input_path'],
+            'output_path': self.params['output_path'],
+            'submitted': self.submitted,
+            'estimated_seconds': self.estimated_seconds,
+            'verification': self.verification,
+        }
+
+    def prepare(self):
+        """Probe the source and build the command; raises ValueError if the source can't be read."""
+        params = self.params
+        input_path = os.path.abspath(params['input_path'])
+        output_path = os.path.abspath(params['output_path'])
+        probe_started = time.perf_counter()
+        properties = get_video_properties(input_path)
+        if properties is None:
+            raise ValueError(f"Failed to retrieve video properties of {input_path}")
+        probe_seconds = time.perf_counter() - probe_started
+        self.properties = properties
+        analysis_started = time.perf_counter()
+        self.manager.set_resource_policy(params['resource_policy'])
+        self.duration = self.manager.get_range_duration(properties, params['start'], params['end'])
+        try:
+            expected_size = os.path.getsize(input_path) * self.duration / max(properties['duration'], 0.001)
+        except OSError:
+            expected_size = None
+        self.command = self.manager.construct_ffmpeg_command(
+            input_path, output_path, params['gamma'], properties, params['use_gpu'], params['filter'],
+            tonemapper=params['tonemapper'], selected_codec=params['codec'], crop=params['crop'],
+            resolution=params['resolution'], start=params['start'], end=params['end'],
+            encoder_settings=params['encoder_settings'],
+            muxing=choose_muxing(output_path, expected_size, params['muxing']))
+        crop = params['crop']
+        source_size = (crop['width'], crop['height']) if crop else (properties['width'], properties['height'])
+        output_size = plan_output_size(*source_size, params['resolution'])
+        encoder = get_encoder_name(params['codec'], params['use_gpu'])
+        self.history_id = safe_history(
+            job_history.add_job, params, input_path=input_path, output_path=output_path, source=self.source,
+            outcome='queued', argv=self.command, output_size=output_size, source_seconds=self.duration,
+            probe_seconds=probe_seconds, analysis_seconds=time.perf_counter() - analysis_started, encoder=encoder)
+        self.estimated_seconds = safe_history(job_history.estimate_seconds, self.duration, encoder, *output_size)
+
+    def record_finish(self, outcome):
+        """Record how the job ended in the job history, once; returns its history id."""
+        history_id, self.history_id = self.history_id, None
+        if history_id is None:
+            return None
+        phases = {}
+        if self.encode_started is not None:
+            finished = time.perf_counter()
+            encode_finished = self.finalize_started or finished
+            clock = self.scheduled.clock if self.scheduled else None
+            paused = clock.paused_seconds(encode_finished) if clock else 0.0
+            phases['encode'] = encode_finished - self.encode_started - paused
+            phases['mux'] = finished - self.finalize_started if self.finalize_started else 0.0
+        safe_history(job_history.finish_job, history_id, outcome, phases, fps=self.fps,
+                     output_path=self.params['output_path'] if outcome == 'success' else None,
+                     error_lines=self.error_lines if outcome == 'failed' else None)
+        return history_id
+
+    def verify(self, history_id):
+        """Check the finished output and add the result to the job and its history record."""
+        params = self.params
+        self.verification = verify_output(os.path.abspath(params['output_path']),
+                                          os.path.abspath(params['input_path']),
+                                          self.duration, self.properties['frame_rate'])
+        if history_id is not None:
+            safe_history(job_history.update_job, history_id, verification=self.verification)
+
+    def launch(self):
+        if self.history_id is not None:
+            safe_history(job_history.update_job, self.history_id, outcome='running')
+        self.encode_started = time.perf_counter()
+        try:
+            process = self.manager.start_ffmpeg_process(self.command, stdout=subprocess.DEVNULL)
+        except Exception as e:
+            # The scheduler marks the job failed and moves on
+            self.error = str(e)
+            record_job_outcome('failed')
+            self.record_finish('failed')
+            raise
+        threading.Thread(target=self.monitor, args=(process,), daemon=True).start()
+        return process
+
+    def monitor(self, process):
+        progress_metrics = ConversionProgress()
+        job_log = JobLog(f"{self.source}-{time.strftime('%Y%m%d-%H%M%S')}-{self.id}")
+        for line in process.stderr:
+            line = line.strip()
+            self.error_lines.append(line)
+            match = PROGRESS_PATTERN.search(line)
+            job_log.ffmpeg_line(line, progress=match is not None)
+            fps_match = FPS_PATTERN.search(line)
+            if fps_match:
+                self.fps = float(fps_match.group(1))
+            if match:
+                elapsed = self.manager.parse_time(match.group(1))
+                self.progress = min(elapsed / self.duration * 100, 100)
+                progress_metrics.update(line, self.fps)
+                self.publish('progress', self)
+            if 'moving the moov atom' in line:
+                self.finalize_started = time.perf_counter()
+        process.wait()
+        progress_metrics.finish()
+        # Under the scheduler's lock, so a cancel that terminated the process is seen as one
+        with self.scheduler.lock:
+            self.returncode = process.returncode
+            if self.state == 'cancelled':
+                outcome = 'cancelled'
+            elif self.returncode == 0:
+                self.progress = 100.0
+                outcome = 'success'
+            else:
+                self.error = '\n'.join(self.error_lines)
+                outcome = 'failed'
+            record_job_outcome(outcome)
+        history_id = self.record_finish(outcome)
+        self.publish('state', self)
+        # Start the next job now rather than at the scheduler's next poll
+        self.scheduler.schedule()
+        if outcome == 'success' and self.params['verify']:
+            self.verify(history_id)
+            self.publish('state', self)
+        logging.info(f"{self.name} finished as {self.state}")
+
+
+class JobServer:
+    """The API around a PriorityScheduler; see the module docstring for the routes."""
+
+    def __init__(self, capacity=SERVER_CAPACITY):
+        self.jobs = {}  # id -> ServerJob, in submission order
+        self.ids = itertools.count(1)
+        self.scheduler = PriorityScheduler(capacity, on_change=self.on_job_change)
+        self.by_scheduled = {}  # ScheduledJob -> ServerJob
+        self.subscribers = set()
+        self.probes = None
+        self.loop = None
+        self.server = None
+        self.keepalive = None
+
+    async def start(self, host=SERVER_HOST, port=SERVER_PORT, unix_path=None):
+        self.loop = asyncio.get_running_loop()
+        self.probes = asyncio.Semaphore(PROBE_CONCURRENCY)
+        self.scheduler.start()
+        self.keepalive = asyncio.ensure_future(self.send_keepalives())
+        if unix_path:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path=unix_path)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+        logging.info(f"Job server listening on {unix_path or self.server.sockets[0].getsockname()}")
+        return self.server
+
+    def close(self):
+        self.scheduler.stop()
+        if self.keepalive:
+            self.keepalive.cancel()
+        if self.server:
+            self.server.close()
+
+    # Events
+
+    def on_job_change(self, scheduled):
+        job = self.by_scheduled.get(scheduled)
+        if job is not None:
+            self.publish('state', job)
+
+    def publish(self, event, job):
+        """Send an event to every subscriber; safe to call from any thread."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        data = job.to_dict()
+        try:
+            self.loop.call_soon_threadsafe(self._broadcast, event, data)
+        except RuntimeError:
+            pass  # The loop closed meanwhile
+
+    async def send_keepalives(self):
+        """Comment lines keep idle event streams from being closed by proxies and client timeouts."""
+        while True:
+            await asyncio.sleep(SSE_KEEPALIVE_SECONDS)
+            self._broadcast('keepalive', None)
+
+    def _broadcast(self, event, data):
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+
+    async def stream_events(self, writer, job_id=None):
+        queue = asyncio.Queue(EVENT_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            # The current state first, so a subscriber joining late starts in sync
+            for job in list(self.jobs.values()):
+                if job_id is None or job.id == job_id:
+                    writer.write(format_event('state', job.to_dict()))
+            await writer.drain()
+            while True:
+                event, data = await queue.get()
+                if event == 'keepalive':
+                    writer.write(b": keepalive\n\n")
+                elif job_id is None or data['id'] == job_id:
+                    writer.write(format_event(event, data))
+                else:
+                    continue
+                await writer.drain()
+        finally:
+            self.subscribers.discard(queue)
+
+    # Jobs
+
+    async def submit(self, body):
+        params = parse_job_params(body)
+        job = ServerJob(str(next(self.ids)), params, self.scheduler, self.publish)
+        self.jobs[job.id] = job
+        self.publish('state', job)
+        asyncio.ensure_future(self.enqueue(job))
+        return job
+
+    async def enqueue(self, job):
+        """Probe the job, then hand it to the scheduler; both block, so they run off the loop."""
+        try:
+            async with self.probes:
+                if job.cancelled:
+                    return
+                await self.loop.run_in_executor(None, job.prepare)
+        except Exception as e:
+            logging.error(f"Could not prepare {job.name}: {e}")
+            job.error = str(e)
+            record_job_outcome('failed')
+            self.publish('state', job)
+            return
+        if job.cancelled:
+            job.record_finish('cancelled')
+            return
+
+        def submit():
+            with self.scheduler.lock:
+                job.scheduled = self.scheduler.submit(job.launch, job.params['priority'], job.name)
+                self.by_scheduled[job.scheduled] = job
+        await self.loop.run_in_executor(None, submit)
+        self.publish('state', job)
+
+    async def control(self, job, action, body):
+        if job.scheduled is None:
+            if action != 'cancel' or job.state != 'probing':
+                raise ApiError(409, f"{job.name} is {job.state}")
+            job.cancelled = True
+            self.publish('state', job)
+            return
+        if action == 'priority':
+            if not isinstance(body, dict) or not isinstance(body.get('priority'), int):
+                raise ApiError(400, "priority must be an integer")
+            call = lambda: self.scheduler.set_priority(job.scheduled, body['priority'])
+        else:
+            call = lambda: getattr(self.scheduler, action)(job.scheduled)
+        await self.loop.run_in_executor(None, call)
+        if action == 'cancel' and job.scheduled.process is None:
+            # Cancelled before it was launched, so no monitor records it
+            await self.loop.run_in_executor(None, job.record_finish, 'cancelled')
+
+    async def restore(self):
+        """Resubmit the server jobs an earlier run left queued or running; returns the new jobs."""
+        pending = await self.loop.run_in_executor(None, safe_history, job_history.pending_jobs, 'server')
+        jobs = []
+        for row in pending or []:
+            try:
+                jobs.append(await self.submit(row['params']))
+            except ValueError as e:
+                logging.warning(f"Could not restore job {row['id']} from the history: {e}")
+        if jobs:
+            logging.info(f"Restored {len(jobs)} interrupted jobs")
+        return jobs
+
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is None:
+                return
+            method, path, query, body = request
+            if method == 'GET' and path == '/events':
+                await self.stream_events(writer, query.get('job'))
+                return
+            try:
+                status, payload = await self.route(method, path, query, body)
+            except ApiError as e:
+                status, payload = e.status, {'error': str(e)}
+            except ValueError as e:
+                status, payload = 400, {'error': str(e)}
+            writer.write(format_response(status, payload))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ApiError as e:
+            writer.write(format_response(e.status, {'error': str(e)}))
+        finally:
+            writer.close()
+
+    async def route(self, method, path, query, body):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['metrics'] and method == 'GET':
+            return 200, registry.render()
+        if parts == ['jobs']:
+            if method == 'GET':
+                jobs = [job.to_dict() for job in self.jobs.values()]
+                if 'state' in query:
+                    jobs = [job for job in jobs if job['state'] == query['state']]
+                return 200, {'jobs': jobs}
+            if method == 'POST':
+                return 201, (await self.submit(decode_body(body))).to_dict()
+            raise ApiError(405, f"{method} is not allowed on /jobs")
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise ApiError(404, f"No job {parts[1]}")
+            if len(parts) == 2 and method == 'GET':
+                return 200, job.to_dict()
+            if len(parts) == 3 and method == 'POST' and parts[2] in ('cancel', 'pause', 'resume', 'priority'):
+                await self.control(job, parts[2], decode_body(body) if body else None)
+                return 200, job.to_dict()
+        raise ApiError(404, f"No route for {method} {path}")
+
+
+async def read_request(reader):
+    """Read one HTTP/1.1 request; returns (method, path, query, body) or None if the client left."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise ApiError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY_BYTES:
+        raise ApiError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    url = urlsplit(target)
+    query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+    return method.upper(), url.path, query, body
+
+
+def decode_body(body):
+    try:
+        return json.loads(body or b'null')
+    except ValueError:
+        raise ApiError(400, "The body must be JSON")
+
+
+def format_response(status, payload):
+    if isinstance(payload, str):
+        body, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+    else:
+        body, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT, unix_path=None, capacity=SERVER_CAPACITY, restore=False):
+    job_server = JobServer(capacity)
+    server = await job_server.start(host, port, unix_path)
+    if restore:
+        await job_server.restore()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        job_server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--unix', help="Listen on this Unix socket instead of TCP")
+    parser.add_argument('--capacity', type=int, default=SERVER_CAPACITY, help="Conversions running at once")
+    parser.add_argument('--restore', action='store_true',
+                        help="Resubmit the jobs a previous run left queued or running (see history.py)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.capacity, args.restore))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
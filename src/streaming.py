@@ -0,0 +1,152 @@
+import os
+import stat
+import time
+import logging
+import threading
+from utils import MUXING_ARGS
+
+FOLLOW_IDLE_SECONDS = 30  # A growing input that gains no bytes for this long is considered complete
+FOLLOW_POLL_SECONDS = 1.0
+# Muxers for outputs that cannot seek, by extension; MP4 only works fragmented
+STREAM_MUXERS = {'.mkv': 'matroska', '.mka': 'matroska', '.ts': 'mpegts', '.nut': 'nut',
+                 '.mp4': 'mp4', '.m4v': 'mp4', '.mov': 'mov'}
+DEFAULT_STREAM_MUXER = 'matroska'  # Carries every codec and subtitle format the sources can have
+STREAM_URL_PREFIXES = ('pipe:', 'tcp://', 'udp://', 'unix:')
+
+
+def follow_input_args(idle_seconds=FOLLOW_IDLE_SECONDS):
+    """
+    Return the input options that make FFmpeg's file protocol tail a growing file. At the end
+    of the data it retries instead of stopping, and gives up once nothing new arrives for
+    idle_seconds; FFmpeg then finishes the output normally.
+    """
+    return ['-follow', '1', '-rw_timeout', str(int(idle_seconds * 1000000))]
+
+
+def follow_input_url(path):
+    """Return path as a file protocol URL; -follow is an option of that protocol."""
+    return 'file:' + os.path.normpath(path)
+
+
+def is_fifo(path):
+    try:
+        return stat.S_ISFIFO(os.stat(path).st_mode)
+    except (OSError, ValueError):
+        return False
+
+
+def is_stream_url(output):
+    """Return True for '-' (stdout) and protocol URLs such as tcp://127.0.0.1:9000?listen=1."""
+    return output == '-' or output.startswith(STREAM_URL_PREFIXES)
+
+
+def is_stream_output(output):
+    """Return True if output cannot seek: stdout, a protocol URL or a FIFO."""
+    return bool(output) and (is_stream_url(output) or is_fifo(output))
+
+
+def normalize_output_path(output):
+    """Make file outputs absolute and leave URLs alone; normpath would collapse the '//' of tcp://."""
+    return output if is_stream_url(output) else os.path.abspath(output)
+
+
+def stream_output_args(output, muxer=None):
+    """
+    Return the options and URL that write a conversion to a non-seekable output.
+    Args:
+        output (str): '-' for stdout, a protocol URL, or a FIFO path.
+        muxer (str, optional): FFmpeg format; defaults from the extension, else Matroska.
+    Returns:
+        list: ['-f', muxer, ...muxer options, url].
+    """
+    url = 'pipe:1' if output == '-' else output
+    if muxer is None:
+        path = url.split('?', 1)[0]
+        muxer = STREAM_MUXERS.get(os.path.splitext(path)[1].lower(), DEFAULT_STREAM_MUXER)
+        if is_stream_url(output) and muxer in ('mp4', 'mov'):
+            muxer = DEFAULT_STREAM_MUXER  # URL suffixes are rarely meant as a container choice
+    args = ['-f', muxer]
+    if muxer in ('mp4', 'mov'):
+        args += MUXING_ARGS['fragmented']
+    return args + [url if is_stream_url(output) else os.path.normpath(url)]
+
+
+def make_fifo(path):
+    """Create a FIFO at path for a downstream stage to read the conversion from (POSIX only)."""
+    if not hasattr(os, 'mkfifo'):
+        raise OSError("FIFOs are not supported on this platform; use stdout or a tcp:// URL.")
+    if not is_fifo(path):
+        os.mkfifo(path)
+    return path
+
+
+class GrowingFile:
+    """
+    Watches an input that is still being transferred.
+
+    Tracks the size as it grows, notices when the transfer ends (the declared size is reached,
+    or the file stops growing for idle_seconds, when FFmpeg's -follow gives up too) and
+    extrapolates the full duration from the bytes per second of what was probed, so progress
+    can be shown against the declared size.
+    """
+
+    def __init__(self, path, properties, declared_size=None, idle_seconds=FOLLOW_IDLE_SECONDS,
+                 poll_seconds=FOLLOW_POLL_SECONDS):
+        self.path = path
+        self.declared_size = declared_size
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self.size = self._get_size()
+        self.last_growth = time.monotonic()
+        self.complete = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+        # Seconds of video per byte; the probe of a partial file may lack a duration
+        bit_rate = properties.get('bit_rate', 0) + properties.get('audio_bit_rate', 0)
+        if properties.get('duration') and self.size:
+            self.seconds_per_byte = properties['duration'] / self.size
+        elif bit_rate:
+            self.seconds_per_byte = 8 / bit_rate
+        else:
+            self.seconds_per_byte = None
+        self.fallback_duration = properties.get('duration') or 0
+
+    def _get_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _watch(self):
+        while not self.stopped.wait(self.poll_seconds):
+            size = self._get_size()
+            now = time.monotonic()
+            if size > self.size:
+                self.size, self.last_growth = size, now
+            if self.declared_size and self.size >= self.declared_size:
+                logging.info(f"Transfer of {self.path} complete at {self.size} bytes")
+                break
+            if now - self.last_growth >= self.idle_seconds:
+                logging.info(f"{self.path} stopped growing at {self.size} bytes; treating the transfer as complete")
+                break
+        self.complete.set()
+
+    @property
+    def truncated(self):
+        """True if the transfer ended short of the declared size."""
+        return bool(self.declared_size) and self.complete.is_set() and self.size < self.declared_size
+
+    def estimate_duration(self):
+        """Return the expected full duration in seconds, refined as the file grows."""
+        if self.seconds_per_byte is None:
+            return self.fallback_duration
+        return self.seconds_per_byte * max(self.declared_size or 0, self.size)
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import functools
+import subprocess
+from contextlib import contextmanager
+
+TRACE_ENV_VAR = 'HDR_CONVERTER_TRACE'  # Path of the trace file; tracing is off when unset
+
+_Popen = subprocess.Popen
+
+
+class Tracer:
+    """
+    Opt-in recorder of spans as Chrome trace events, viewable in Perfetto or chrome://tracing.
+
+    Spans of the application's own functions go on the track of the thread that ran them.
+    Once enabled, every subprocess (FFmpeg, FFprobe) records a span on a track of its own
+    with its argv, spawn latency, wall time until it was reaped, exit code, user and system
+    CPU time and peak RSS (POSIX), and the UI action that was last started, so a slow preview
+    or conversion can be attributed to the click that caused it. Disabled, span() and
+    traced() cost one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.events = []
+        self.thread_names = {}
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.last_action = None  # Name of the most recent UI action span
+
+    def now_us(self):
+        return (time.perf_counter() - self.origin) * 1e6
+
+    def add_span(self, name, category, start_us, duration_us, args=None, tid=None, thread_name=None):
+        if tid is None:
+            tid = threading.get_ident()
+            thread_name = threading.current_thread().name
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': round(start_us, 1),
+                 'dur': round(duration_us, 1), 'pid': os.getpid(), 'tid': tid, 'args': args or {}}
+        with self.lock:
+            self.events.append(event)
+            if thread_name:
+                self.thread_names.setdefault(tid, thread_name)
+
+    @contextmanager
+    def span(self, name, category='app', **args):
+        """Record the enclosed block; the yielded dict takes extra args to attach to the span."""
+        if not self.enabled:
+            yield args
+            return
+        start = self.now_us()
+        try:
+            yield args
+        finally:
+            self.add_span(name, category, start, self.now_us() - start, args)
+
+    @contextmanager
+    def action(self, name, **args):
+        """A UI handler span; subprocesses started until the next action are attributed to it."""
+        if self.enabled:
+            self.last_action = name
+        with self.span(name, 'ui', **args) as span_args:
+            yield span_args
+
+    def enable(self, path):
+        """Start tracing; the trace is written to path when the process exits, or on save()."""
+        self.path = path
+        self.enabled = True
+        subprocess.Popen = TracedPopen
+        atexit.register(self.save)
+        logging.info(f"Tracing to {path}")
+
+    def disable(self):
+        self.enabled = False
+        subprocess.Popen = _Popen
+
+    def trace_events(self):
+        with self.lock:
+            events = list(self.events)
+            names = dict(self.thread_names)
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                    for tid, name in names.items()]
+        return metadata + events
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f)
+        os.replace(temp_path, path)
+
+
+tracer = Tracer()
+
+
+def enable_from_environment():
+    """Enable tracing if HDR_CONVERTER_TRACE names a trace file."""
+    path = os.environ.get(TRACE_ENV_VAR)
+    if path and not tracer.enabled:
+        tracer.enable(os.path.abspath(path))
+
+
+def traced(name=None, category='app', action=False):
+    """Decorator recording a span for every call; action=True marks a UI handler (see Tracer.action)."""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with (tracer.action(span_name) if action else tracer.span(span_name, category)):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedPopen(_Popen):
+    """subprocess.Popen that records a span for the child when it is reaped."""
+
+    def __init__(self, args, *popen_args, **popen_kwargs):
+        self.trace_argv = [str(arg) for arg in args] if isinstance(args, (list, tuple)) else [str(args)]
+        self.trace_action = tracer.last_action
+        self.trace_thread = threading.current_thread().name
+        self.trace_start = tracer.now_us()
+        self.trace_recorded = False
+        self.rusage = None
+        super().__init__(args, *popen_args, **popen_kwargs)
+        self.trace_spawned = tracer.now_us()
+
+    if sys.platform != "win32":
+        # Reap with wait4 instead of waitpid to get the child's own resource usage
+        def _wait4(self, pid, flags):
+            reaped_pid, status, rusage = os.wait4(pid, flags)
+            if reaped_pid == pid:
+                self.rusage = rusage
+            return reaped_pid, status
+
+        def _try_wait(self, wait_flags):
+            try:
+                return self._wait4(self.pid, wait_flags)
+            except ChildProcessError:
+                return self.pid, 0
+
+        def _internal_poll(self, _deadstate=None, **kwargs):
+            return super()._internal_poll(_deadstate=_deadstate, _waitpid=self._wait4)
+
+    def _record(self):
+        if self.trace_recorded or self.returncode is None or not tracer.enabled:
+            return
+        self.trace_recorded = True
+        end = tracer.now_us()
+        args = {
+            'argv': ' '.join(self.trace_argv),
+            'spawn_ms': round((self.trace_spawned - self.trace_start) / 1000, 3),
+            'exit_code': self.returncode,
+            'action': self.trace_action,
+            'spawned_from': self.trace_thread,
+        }
+        if self.rusage is not None:
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            max_rss = self.rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else self.rusage.ru_maxrss
+            args.update(cpu_user_s=round(self.rusage.ru_utime, 3), cpu_system_s=round(self.rusage.ru_stime, 3),
+                        max_rss_kb=max_rss)
+        name = os.path.splitext(os.path.basename(self.trace_argv[0]))[0]
+        tracer.add_span(name, 'subprocess', self.trace_start, end - self.trace_start, args,
+                        tid=self.pid, thread_name=f"{name} {self.pid}")
+
+    def poll(self):
+        returncode = super().poll()
+        self._record()
+        return returncode
+
+    def wait(self, timeout=None):
+        returncode = super().wait(timeout)
+        self._record()
+        return returncode
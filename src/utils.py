@@ -9,16 +9,59 @@ import logging
 import sys
 import json
 import shutil
+import threading
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from tracing import traced
+from metrics import probe_cache_requests
+from logqueue import start_logging
 
 # Constants and initialization
 LOGGING_ENABLED = False
 TONEMAP = ["Reinhard", "Mobius", "Hable"]
 FFMPEG_FILTER = [
-    'zscale=primaries=bt709:transfer=bt709:matrix=bt709,tonemap={tonemapper},eq=gamma={gamma},scale={width}:{height}',
-    'zscale=t=linear:npl={npl},tonemap={tonemapper},zscale=t=bt709:m=bt709:r=tv:p=bt709,eq=gamma={gamma},scale={width}:{height}'
+    'zscale=primaries=bt709:transfer=bt709:matrix=bt709,tonemap={tonemapper},eq=gamma={gamma}',
+    'zscale=t=linear:npl={npl},tonemap={tonemapper},zscale=t=bt709:m=bt709:r=tv:p=bt709,eq=gamma={gamma}'
 ]
+# Output resolution targets as bounding boxes; None keeps the source size
+RESOLUTION_PRESETS = {
+    'Source': None,
+    '2160p': (3840, 2160),
+    '1440p': (2560, 1440),
+    '1080p': (1920, 1080),
+    '720p': (1280, 720),
+}
+DOWNSCALE_FILTER = 'spline36'
+DOWNSCALE_PIX_FMT = 'yuv420p16le'  # Intermediate for downscaling ahead of the tonemap, so 10/12-bit HDR keeps its precision
 FFMPEG_EXECUTABLE = None
 FFPROBE_EXECUTABLE = None
+PREVIEW_FAST_WIDTH = 480  # Width of the keyframe-only approximation shown before the full-quality preview
+TIMELINE_THUMBNAILS = 20  # Number of thumbnails in the preview timeline strip
+TIMELINE_THUMB_WIDTH = 96  # Width of each timeline thumbnail
+HDR_DEFAULT_PEAK_NITS = 1000.0  # Assumed grading peak of HDR sources without MaxCLL or mastering metadata
+CROPDETECT_SAMPLES = 8  # Segments sampled by detect_crop, spread over the middle of the video
+CROPDETECT_SAMPLE_SECONDS = 2  # Length of each sampled segment
+CROPDETECT_LIMIT = 0.094  # Black threshold as a fraction of full scale, so it holds for 10-bit sources
+CROPDETECT_MIN_SAVING = 0.01  # Crops removing less than this fraction of the pixels are ignored
+# MP4 muxing strategies. faststart rewrites the whole file after encoding to move the index to
+# the front; fragmented MP4 writes small indexes as it goes and needs no second pass.
+MUXING_MODES = ['Auto', 'Fragmented', 'Faststart', 'Plain']
+MUXING_ARGS = {
+    'fragmented': ['-movflags', '+frag_keyframe+empty_moov+default_base_moof'],
+    'faststart': ['-movflags', '+faststart'],
+    'plain': [],
+}
+MP4_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+FASTSTART_MAX_BYTES = 16 * 1024 ** 3  # Larger outputs are fragmented rather than rewritten
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'fuse.sshfs', 'sshfs', '9p', 'afs', 'davfs'}
+
+# Probe results keyed by file fingerprint, so repeated preview refreshes don't re-run ffprobe
+_probe_cache = {}
+_probe_cache_lock = threading.Lock()
+
+class FFmpegCancelled(RuntimeError):
+    """Raised when an FFmpeg command is cancelled before it finishes."""
 
 # Initialize logging
 def setup_logging():
@@ -38,17 +81,9 @@ def setup_logging():
         
         for log_path in log_paths:
             try:
-                logging.basicConfig(
-                    level=logging.DEBUG if LOGGING_ENABLED else logging.WARNING,
-                    filename=log_path,
-                    filemode='w',
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-                )
-                console = logging.StreamHandler()
-                console.setLevel(logging.DEBUG if LOGGING_ENABLED else logging.WARNING)
-                formatter = logging.Formatter('%(levelname)s - %(message)s')
-                console.setFormatter(formatter)
-                logging.getLogger('').addHandler(console)
+                # Records are queued and written by a listener thread, so FFmpeg's stderr
+                # readers never wait on the disk; per-job logs go to a logs folder beside it
+                start_logging(log_path, level=logging.DEBUG)
                 
                 logging.info(f"Logging initialized. Log file: {log_path}")
                 logging.info(f"Platform: {sys.platform}")
@@ -153,8 +188,17 @@ setup_logging()
 initialize_ffmpeg()
 
 # Rest of your existing functions...
-def run_ffmpeg_command(cmd):
-    """Run an FFmpeg command with proper path handling"""
+def run_ffmpeg_command(cmd, cancel_event=None, capture_stderr=False):
+    """
+    Run an FFmpeg command with proper path handling.
+    Args:
+        cmd (list): The command to run; cmd[0] is replaced with the FFmpeg executable.
+        cancel_event (threading.Event, optional): When set, the process is killed and
+            FFmpegCancelled is raised.
+        capture_stderr (bool): Also return the command's stderr, for filters that report there.
+    Returns:
+        bytes: The command's stdout, or a (stdout, stderr) tuple with capture_stderr.
+    """
     if sys.platform == "win32":
         startupinfo = subprocess.STARTUPINFO()
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
@@ -181,7 +225,18 @@ def run_ffmpeg_command(cmd):
             creationflags=creationflags
         )
         
-        out, err = process.communicate()
+        if cancel_event is None:
+            out, err = process.communicate()
+        else:
+            while True:
+                try:
+                    out, err = process.communicate(timeout=0.05)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel_event.is_set():
+                        process.kill()
+                        process.communicate()
+                        raise FFmpegCancelled("FFmpeg command was cancelled.")
         
         if process.returncode != 0:
             error_msg = err.decode('utf-8', errors='replace')
@@ -190,12 +245,63 @@ def run_ffmpeg_command(cmd):
                 raise RuntimeError("There was an error importing this video. Colorspace mismatch.")
             raise RuntimeError(f"FFmpeg error: {error_msg}")
         
+        if capture_stderr:
+            return out, err
         return out
         
+    except FFmpegCancelled:
+        raise
     except Exception as e:
         logging.error(f"Error running FFmpeg command: {str(e)}")
         raise RuntimeError(f"Error running FFmpeg command: {str(e)}")
 
+def get_file_fingerprint(path):
+    """
+    Build a cheap identity for a file from its absolute path, size and modification time.
+    Args:
+        path (str): Path to the file.
+    Returns:
+        str: A hex digest, or None if the file cannot be stat'ed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def get_cache_dir(*subdirs):
+    """
+    Return the application's on-disk cache directory, creating it if needed.
+    Args:
+        *subdirs (str): Optional subdirectories below the cache root.
+    Returns:
+        str: The absolute cache directory path.
+    """
+    if sys.platform == "win32":
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    path = os.path.join(base, 'hdr-to-sdr', *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _get_cached_probe(kind, path):
+    fingerprint = get_file_fingerprint(path)
+    if fingerprint is None:
+        return None, None
+    with _probe_cache_lock:
+        cached = _probe_cache.get((kind, fingerprint))
+    probe_cache_requests.inc(kind=kind, result='miss' if cached is None else 'hit')
+    return fingerprint, cached
+
+def _store_cached_probe(kind, fingerprint, value):
+    if fingerprint is None or value is None:
+        return
+    with _probe_cache_lock:
+        _probe_cache[(kind, fingerprint)] = value
+
+@traced('probe maxfall', 'probe')
 def get_maxfall(video_path):
     """
     Extract MAXFALL from video metadata using ffprobe.
@@ -204,6 +310,10 @@ def get_maxfall(video_path):
     Returns:
         float: The MAXFALL value.
     """
+    fingerprint, cached = _get_cached_probe('maxfall', video_path)
+    if cached is not None:
+        return cached
+
     cmd = [
         FFPROBE_EXECUTABLE,
         '-v', 'quiet',
@@ -238,10 +348,274 @@ def get_maxfall(video_path):
             if side_data.get('side_data_type') == 'Mastering display metadata':
                 max_fall = side_data.get('max_fall', None)
                 if (max_fall):
+                    _store_cached_probe('maxfall', fingerprint, float(max_fall))
                     return float(max_fall)
+    _store_cached_probe('maxfall', fingerprint, 100)
     return 100  # Default value if MAXFALL is not found
 
-def extract_frame_with_conversion(video_path, gamma, filter_index, tonemapper='reinhard', time_position=None):
+def _parse_nits(value):
+    """Parse an ffprobe side data value such as '10000000/10000' or 1000 into nits."""
+    if value in (None, ''):
+        return None
+    numerator, _, denominator = str(value).partition('/')
+    nits = float(numerator) / float(denominator or 1)
+    return nits if nits > 0 else None
+
+@traced('probe hdr peak', 'probe')
+def get_hdr_peak(video_path):
+    """
+    Extract the peak luminance an HDR video was graded to, from its first frame's metadata.
+    Args:
+        video_path (str): Path to the video file.
+    Returns:
+        float: MaxCLL or the mastering display's maximum luminance in nits, whichever is
+        lower, or HDR_DEFAULT_PEAK_NITS if the video carries neither.
+    """
+    fingerprint, cached = _get_cached_probe('peak', video_path)
+    if cached is not None:
+        return cached
+
+    cmd = [
+        FFPROBE_EXECUTABLE,
+        '-v', 'quiet',
+        '-select_streams', 'v:0',
+        '-show_frames',
+        '-read_intervals', '%+#1',
+        '-print_format', 'json',
+        video_path
+    ]
+
+    if sys.platform == "win32":
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+        creationflags = subprocess.CREATE_NO_WINDOW
+    else:
+        startupinfo = None
+        creationflags = 0
+
+    out = subprocess.check_output(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        startupinfo=startupinfo,
+        creationflags=creationflags
+    )
+    data = json.loads(out.decode('utf-8'))
+    peaks = []
+    for frame in data.get('frames', []):
+        for side_data in frame.get('side_data_list', []):
+            if side_data.get('side_data_type') == 'Content light level metadata':
+                peaks.append(_parse_nits(side_data.get('max_content')))
+            elif side_data.get('side_data_type') == 'Mastering display metadata':
+                peaks.append(_parse_nits(side_data.get('max_luminance')))
+    peaks = [peak for peak in peaks if peak]
+    peak = min(peaks) if peaks else HDR_DEFAULT_PEAK_NITS
+    _store_cached_probe('peak', fingerprint, peak)
+    return peak
+
+_CROPDETECT_PATTERN = re.compile(r'x1:(-?\d+) x2:(-?\d+) y1:(-?\d+) y2:(-?\d+)')
+
+def _detect_crop_segment(video_path, start, sample_seconds, cancel_event=None):
+    """Run cropdetect over one segment and return the (x1, x2, y1, y2) boxes it reported."""
+    cmd = [
+        FFMPEG_EXECUTABLE, '-ss', str(start), '-t', str(sample_seconds), '-i', video_path,
+        '-map', '0:v:0', '-vf', f'cropdetect=limit={CROPDETECT_LIMIT}:round=2:reset=1',
+        '-an', '-sn', '-f', 'null', '-'
+    ]
+    _, err = run_ffmpeg_command(cmd, cancel_event=cancel_event, capture_stderr=True)
+    boxes = []
+    for match in _CROPDETECT_PATTERN.finditer(err.decode('utf-8', errors='replace')):
+        x1, x2, y1, y2 = map(int, match.groups())
+        # All-black frames report an inverted box; they say nothing about the picture area
+        if x2 > x1 and y2 > y1:
+            boxes.append((x1, x2, y1, y2))
+    return boxes
+
+@traced('detect crop', 'probe')
+def detect_crop(video_path, samples=CROPDETECT_SAMPLES, sample_seconds=CROPDETECT_SAMPLE_SECONDS,
+                cancel_event=None):
+    """
+    Detect letterbox or pillarbox bars by running cropdetect over segments sampled across
+    the video in parallel. The crop is the union of every non-black frame's picture area,
+    so a bright scene anywhere in the samples widens it rather than being cut off, and its
+    offsets and size are even so it stays aligned with 4:2:0 chroma.
+    Args:
+        video_path (str): The path to the video file.
+        samples (int): The number of segments to sample.
+        sample_seconds (float): The length of each segment.
+        cancel_event (threading.Event, optional): Cancels the detection when set.
+    Returns:
+        dict: The crop as width, height, x and y, or None if the video has no bars worth cropping.
+    """
+    fingerprint, cached = _get_cached_probe('crop', video_path)
+    if cached is not None:
+        return dict(cached) if cached else None
+
+    properties = get_video_properties(video_path)
+    if not properties or properties['duration'] == 0:
+        raise ValueError("Invalid video properties or duration.")
+    width, height, duration = properties['width'], properties['height'], properties['duration']
+
+    # Skip the first and last 5%, where logos and credits sit on black
+    span = duration * 0.9
+    starts = [duration * 0.05 + span * (i + 0.5) / samples - sample_seconds / 2 for i in range(samples)]
+    starts = [max(0.0, start) for start in starts]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(samples, os.cpu_count() or 1))) as executor:
+        results = executor.map(
+            lambda start: _detect_crop_segment(video_path, start, sample_seconds, cancel_event), starts)
+        boxes = [box for segment in results for box in segment]
+
+    if not boxes:
+        logging.info(f"No picture area detected in {video_path}; not cropping.")
+        _store_cached_probe('crop', fingerprint, {})
+        return None
+
+    left = min(box[0] for box in boxes) // 2 * 2
+    top = min(box[2] for box in boxes) // 2 * 2
+    right = min(width, (max(box[1] for box in boxes) + 2) // 2 * 2)
+    bottom = min(height, (max(box[3] for box in boxes) + 2) // 2 * 2)
+    crop = {'width': right - left, 'height': bottom - top, 'x': left, 'y': top}
+
+    saving = get_crop_saving(crop, properties)
+    if saving < CROPDETECT_MIN_SAVING:
+        logging.info(f"Detected crop {format_crop_filter(crop)} saves {saving:.1%}; not cropping.")
+        _store_cached_probe('crop', fingerprint, {})
+        return None
+
+    logging.info(f"Detected crop {format_crop_filter(crop)} from {len(boxes)} frames, "
+                 f"{saving:.1%} fewer pixels than {width}x{height}.")
+    _store_cached_probe('crop', fingerprint, crop)
+    return dict(crop)
+
+def format_crop_filter(crop):
+    """Return the FFmpeg crop filter for a crop returned by detect_crop."""
+    return f"crop={crop['width']}:{crop['height']}:{crop['x']}:{crop['y']}"
+
+def get_crop_saving(crop, properties):
+    """Return the fraction of each frame's pixels that the crop removes."""
+    full = properties['width'] * properties['height']
+    if not crop or not full:
+        return 0.0
+    return 1 - (crop['width'] * crop['height']) / full
+
+def range_args(start=None, end=None):
+    """
+    Return the input options that limit decoding to a time range. Placed before -i, -ss seeks
+    to the nearest keyframe and then decodes and discards up to the exact start, so ranges
+    are frame accurate when transcoding.
+    Args:
+        start (float, optional): Range start in seconds.
+        end (float, optional): Range end in seconds.
+    Returns:
+        list: The options, empty for the whole video.
+    """
+    args = []
+    if start:
+        args += ['-ss', str(start)]
+    if end is not None:
+        args += ['-to', str(end)]
+    return args
+
+def is_network_path(path):
+    """Return True if path is on a network share, where rewriting the output costs twice the transfer."""
+    path = os.path.abspath(path)
+    if sys.platform == "win32":
+        if path.startswith('\\\\'):
+            return True
+        try:
+            import ctypes
+            DRIVE_REMOTE = 4
+            return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(path)[0] + '\\') == DRIVE_REMOTE
+        except (AttributeError, OSError):
+            return False
+    try:
+        with open('/proc/mounts', 'r', encoding='utf-8') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return False
+    # The longest mount point containing path is the one it lives on
+    best, fs_type = '', None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > len(best):
+            best, fs_type = mount_point, mount_type
+    return fs_type in NETWORK_FILESYSTEMS
+
+def choose_muxing(output_path, expected_size=None, mode='auto'):
+    """
+    Resolve a MUXING_MODES choice to 'fragmented', 'faststart' or 'plain'.
+    Auto muxes non-MP4 containers plainly and fragments MP4 outputs that are large or headed
+    to a network share, where the faststart rewrite is a long extra I/O pass; other MP4
+    outputs get faststart for instant playback start.
+    Args:
+        output_path (str): The output file.
+        expected_size (int, optional): Expected output size in bytes.
+        mode (str): A MUXING_MODES entry, case-insensitive.
+    Returns:
+        str: A key of MUXING_ARGS.
+    """
+    mode = (mode or 'auto').lower()
+    if mode != 'auto':
+        return mode
+    if os.path.splitext(output_path)[1].lower() not in MP4_EXTENSIONS:
+        return 'plain'
+    if expected_size is not None and expected_size >= FASTSTART_MAX_BYTES:
+        return 'fragmented'
+    if is_network_path(os.path.dirname(os.path.abspath(output_path))):
+        return 'fragmented'
+    return 'faststart'
+
+def plan_output_size(width, height, resolution=None):
+    """
+    Fit the source size into a resolution target without upscaling.
+    Args:
+        width (int): The source (or cropped) width.
+        height (int): The source (or cropped) height.
+        resolution (str or tuple, optional): A RESOLUTION_PRESETS key or a (width, height) box.
+            Portrait sources are fitted into the box turned on its side.
+    Returns:
+        tuple: The output (width, height); even whenever it differs from the source.
+    """
+    box = RESOLUTION_PRESETS.get(resolution) if isinstance(resolution, str) else resolution
+    if not box:
+        return (width, height)
+    box_width, box_height = box if width >= height else (box[1], box[0])
+    factor = min(box_width / width, box_height / height)
+    if factor >= 1:
+        return (width, height)
+    return (max(2, round(width * factor / 2) * 2), max(2, round(height * factor / 2) * 2))
+
+def build_filter_graph(filter_index, gamma, tonemapper, npl=None, crop=None, source_size=None, output_size=None):
+    """
+    Plan the video filter chain for a conversion: crop, then any downscale, then the
+    FFMPEG_FILTER tonemap chain. Downscaling ahead of zscale/tonemap means those stages only
+    process output pixels; it runs in a 16-bit intermediate so no precision is lost before
+    tonemapping. No scale filter is added when the size doesn't change.
+    Args:
+        filter_index (int): The index of the filter to use.
+        gamma (float): The gamma correction value.
+        tonemapper (str): The tonemapping algorithm to use.
+        npl (float, optional): The nominal peak luminance for the dynamic filter.
+        crop (dict, optional): A crop from detect_crop.
+        source_size (tuple, optional): The (width, height) after cropping.
+        output_size (tuple, optional): The (width, height) from plan_output_size.
+    Returns:
+        str: The filter chain.
+    """
+    stages = []
+    if crop:
+        stages.append(format_crop_filter(crop))
+    if output_size and source_size and tuple(output_size) != tuple(source_size):
+        stages.append(f'zscale=w={output_size[0]}:h={output_size[1]}:filter={DOWNSCALE_FILTER},'
+                      f'format={DOWNSCALE_PIX_FMT}')
+    stages.append(FFMPEG_FILTER[filter_index].format(gamma=gamma, npl=npl, tonemapper=tonemapper.lower()))
+    return ','.join(stages)
+
+@traced('seek+decode+filter', 'preview')
+def extract_frame_with_conversion(video_path, gamma, filter_index, tonemapper='reinhard', time_position=None,
+                                  fast=False, cancel_event=None, crop=None):
     """
     Extracts a frame from the video and applies tonemapping conversion.
     Args:
@@ -250,6 +624,10 @@ def extract_frame_with_conversion(video_path, gamma, filter_index, tonemapper='r
         filter_index (int): The index of the filter to use.
         tonemapper (str): The tonemapping algorithm to use.
         time_position (float, optional): The time position to extract the frame from.
+        fast (bool): Decode the nearest keyframe only and tonemap a PREVIEW_FAST_WIDTH wide
+            approximation instead of the full-resolution frame.
+        cancel_event (threading.Event, optional): Cancels the extraction when set.
+        crop (dict, optional): A crop from detect_crop, applied before anything else.
     Returns:
         PIL.Image: The extracted and converted frame as a PIL image.
     """
@@ -268,31 +646,112 @@ def extract_frame_with_conversion(video_path, gamma, filter_index, tonemapper='r
     if filter_index == 1:
         maxfall = get_maxfall(video_path)
         filter_str = FFMPEG_FILTER[filter_index].format(
-            gamma=gamma, width='iw', height='ih', npl=maxfall, tonemapper=tonemapper
+            gamma=gamma, npl=maxfall, tonemapper=tonemapper
         )
     else:
         filter_str = FFMPEG_FILTER[filter_index].format(
-            gamma=gamma, width='iw', height='ih', tonemapper=tonemapper
+            gamma=gamma, tonemapper=tonemapper
         )
+
+    if fast:
+        # Shrink before tonemapping so the expensive stages only touch a thumbnail
+        filter_str = f'scale={PREVIEW_FAST_WIDTH}:-2:flags=fast_bilinear,{filter_str}'
+    if crop:
+        filter_str = f'{format_crop_filter(crop)},{filter_str}'
+
+    if fast:
+        cmd = [
+            FFMPEG_EXECUTABLE, '-noaccurate_seek', '-skip_frame', 'nokey',
+            '-ss', str(target_time), '-i', video_path,
+            '-vf', filter_str,
+            '-vframes', '1', '-f', 'image2pipe', '-'
+        ]
+    else:
+        cmd = [
+            FFMPEG_EXECUTABLE, '-ss', str(target_time), '-i', video_path,
+            '-vf', filter_str,
+            '-vframes', '1', '-f', 'image2pipe', '-'
+        ]
+
+    out = run_ffmpeg_command(cmd, cancel_event=cancel_event)
+    try:
+        return Image.open(io.BytesIO(out))
+    except UnidentifiedImageError as e:
+        logging.error(f"Failed to extract and convert frame: {e}")
+        raise RuntimeError("Failed to extract and convert frame.")
+
+@traced('timeline sprite', 'preview')
+def generate_thumbnail_sprite(video_path, filter_index, tonemapper='reinhard',
+                              count=TIMELINE_THUMBNAILS, thumb_width=TIMELINE_THUMB_WIDTH):
+    """
+    Generates a strip of tonemapped thumbnails spread evenly over the video in a single
+    FFmpeg pass, decoding keyframes only. Sprites are cached on disk per file fingerprint,
+    filter and tonemapper.
+    Args:
+        video_path (str): The path to the video file.
+        filter_index (int): The index of the filter to use.
+        tonemapper (str): The tonemapping algorithm to use.
+        count (int): The number of thumbnails in the strip.
+        thumb_width (int): The width of each thumbnail.
+    Returns:
+        PIL.Image: The sprite, `count` thumbnails wide and one thumbnail high.
+    """
+    properties = get_video_properties(video_path)
+    if not properties or properties['duration'] == 0:
+        raise ValueError("Invalid video properties or duration.")
+
+    tonemapper = tonemapper.lower()
+    fingerprint = get_file_fingerprint(video_path)
+    cache_path = None
+    if fingerprint:
+        cache_name = f"{fingerprint}_{filter_index}_{tonemapper}_{count}x{thumb_width}.png"
+        cache_path = os.path.join(get_cache_dir('thumbnails'), cache_name)
+        if os.path.exists(cache_path):
+            logging.debug(f"Using cached thumbnail sprite: {cache_path}")
+            return Image.open(cache_path)
+
+    if filter_index == 1:
+        maxfall = get_maxfall(video_path)
+        filter_str = FFMPEG_FILTER[filter_index].format(
+            gamma=1.0, npl=maxfall, tonemapper=tonemapper
+        )
+    else:
+        filter_str = FFMPEG_FILTER[filter_index].format(
+            gamma=1.0, tonemapper=tonemapper
+        )
+
+    # fps picks one (key)frame per interval; scaling first keeps the tonemap stages tiny
+    interval_rate = count / properties['duration']
     cmd = [
-        FFMPEG_EXECUTABLE, '-ss', str(target_time), '-i', video_path,
-        '-vf', filter_str,
-        '-vframes', '1', '-f', 'image2pipe', '-'
+        FFMPEG_EXECUTABLE, '-skip_frame', 'nokey', '-i', video_path,
+        '-vf', f'fps={interval_rate},scale={thumb_width}:-2:flags=fast_bilinear,{filter_str},tile={count}x1',
+        '-frames:v', '1', '-f', 'image2pipe', '-vcodec', 'png', '-'
     ]
 
     out = run_ffmpeg_command(cmd)
+    if cache_path:
+        try:
+            with open(cache_path + '.tmp', 'wb') as f:
+                f.write(out)
+            os.replace(cache_path + '.tmp', cache_path)
+        except OSError as e:
+            logging.warning(f"Failed to cache thumbnail sprite: {e}")
     try:
         return Image.open(io.BytesIO(out))
     except UnidentifiedImageError as e:
-        logging.error(f"Failed to extract and convert frame: {e}")
-        raise RuntimeError("Failed to extract and convert frame.")
+        logging.error(f"Failed to generate thumbnail sprite: {e}")
+        raise RuntimeError("Failed to generate thumbnail sprite.")
 
-def extract_frame(video_path, time_position=None):
+@traced('seek+decode', 'preview')
+def extract_frame(video_path, time_position=None, fast=False, cancel_event=None, crop=None):
     """
     Extracts a frame from the video.
     Args:
         video_path (str): The path to the video file.
         time_position (float, optional): The time position to extract the frame from.
+        fast (bool): Decode the nearest keyframe only at PREVIEW_FAST_WIDTH.
+        cancel_event (threading.Event, optional): Cancels the extraction when set.
+        crop (dict, optional): A crop from detect_crop, applied before scaling.
     Returns:
         PIL.Image: The extracted frame as a PIL image.
     """
@@ -306,19 +765,34 @@ def extract_frame(video_path, time_position=None):
     else:
         target_time = time_position
 
-    cmd = [
-        FFMPEG_EXECUTABLE, '-ss', str(target_time), '-i', video_path,
-        '-vframes', '1', '-f', 'image2pipe', '-'
-    ]
+    filters = [format_crop_filter(crop)] if crop else []
+    if fast:
+        filters.append(f'scale={PREVIEW_FAST_WIDTH}:-2:flags=fast_bilinear')
+        cmd = [
+            FFMPEG_EXECUTABLE, '-noaccurate_seek', '-skip_frame', 'nokey',
+            '-ss', str(target_time), '-i', video_path,
+            '-vf', ','.join(filters),
+            '-vframes', '1', '-f', 'image2pipe', '-'
+        ]
+    else:
+        cmd = [FFMPEG_EXECUTABLE, '-ss', str(target_time), '-i', video_path]
+        if filters:
+            cmd += ['-vf', ','.join(filters)]
+        cmd += ['-vframes', '1', '-f', 'image2pipe', '-']
 
-    out = run_ffmpeg_command(cmd)
+    out = run_ffmpeg_command(cmd, cancel_event=cancel_event)
     try:
         return Image.open(io.BytesIO(out))
     except UnidentifiedImageError as e:
         logging.error(f"Failed to extract frame: {e}")
         raise RuntimeError("Failed to extract frame.")
 
+@traced('probe', 'probe')
 def get_video_properties(input_file):
+    fingerprint, cached = _get_cached_probe('properties', input_file)
+    if cached is not None:
+        return dict(cached)
+
     if sys.platform == "win32":
         startupinfo = subprocess.STARTUPINFO()
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
@@ -377,7 +851,7 @@ def get_video_properties(input_file):
         
         duration = float(data['format'].get('duration', 0))
             
-        return {
+        properties = {
             "width": int(video_stream.get('width', 0)),
             "height": int(video_stream.get('height', 0)),
             "bit_rate": int(video_stream.get('bit_rate', 0)),
@@ -386,8 +860,13 @@ def get_video_properties(input_file):
             "duration": duration,
             "audio_codec": audio_stream.get('codec_name', '') if audio_stream else '',
             "audio_bit_rate": int(audio_stream.get('bit_rate', 0)) if audio_stream else 0,
-            "subtitle_streams": subtitle_streams
+            "subtitle_streams": subtitle_streams,
+            # 'smpte2084' (PQ) or 'arib-std-b67' (HLG) mark HDR sources; see is_hdr
+            "color_transfer": video_stream.get('color_transfer', ''),
+            "color_primaries": video_stream.get('color_primaries', '')
         }
+        _store_cached_probe('properties', fingerprint, properties)
+        return dict(properties)
         
     except (subprocess.SubprocessError, json.JSONDecodeError, ValueError) as e:
         print(f"Error getting video properties: {str(e)}")
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from utils import FFMPEG_EXECUTABLE, FFPROBE_EXECUTABLE
+
+VERIFY_SEGMENTS = 8  # Segments of the output decoded in full, spread over its length
+VERIFY_SEGMENT_SECONDS = 2
+# FFmpeg processes decoding at once; half the cores, so a following conversion isn't starved
+VERIFY_WORKERS = max(1, min(VERIFY_SEGMENTS, (os.cpu_count() or 2) // 2))
+DURATION_TOLERANCE_SECONDS = 0.5  # Allowed gap between the output's and the expected duration
+FRAME_TOLERANCE = 2  # Allowed gap in frames, or 0.1% of them for long outputs
+ERROR_DETAIL_CHARS = 300
+
+
+def run_ffprobe(path, count_packets=False):
+    """Return ffprobe's streams and format of path as a dict; raises RuntimeError if it fails."""
+    command = [FFPROBE_EXECUTABLE, '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format']
+    if count_packets:
+        # Demuxes the whole file without decoding, for a packet count even where the container has none
+        command += ['-count_packets']
+    try:
+        result = subprocess.run(command + [os.path.normpath(path)], capture_output=True, text=True)
+    except OSError as e:
+        raise RuntimeError(f"Could not run ffprobe: {e}")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[:ERROR_DETAIL_CHARS] or f"ffprobe exited with {result.returncode}")
+    return json.loads(result.stdout)
+
+
+def segment_starts(duration, segments=VERIFY_SEGMENTS, seconds=VERIFY_SEGMENT_SECONDS):
+    """Return the start times of the decoded segments, evenly spread and including both ends."""
+    if duration <= segments * seconds:
+        return [0.0]  # Short enough to decode whole
+    step = (duration - seconds) / (segments - 1)
+    return [round(index * step, 3) for index in range(segments)]
+
+
+def decode_segment(path, start, seconds):
+    """
+    Decode seconds of path from start, stopping at the first error (-xerror). Returns None if
+    it decoded cleanly, or the error FFmpeg reported.
+    """
+    command = [FFMPEG_EXECUTABLE, '-v', 'error', '-xerror', '-ss', str(start), '-i', os.path.normpath(path)]
+    if seconds is not None:
+        command += ['-t', str(seconds)]
+    command += ['-map', '0:v', '-map', '0:a?', '-f', 'null', '-']
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except OSError as e:
+        return f"Could not run FFmpeg: {e}"
+    errors = result.stderr.strip()
+    if result.returncode != 0 or errors:
+        return errors[:ERROR_DETAIL_CHARS] or f"FFmpeg exited with {result.returncode}"
+    return None
+
+
+def count_streams(probe, codec_type):
+    return sum(1 for stream in probe.get('streams', []) if stream.get('codec_type') == codec_type)
+
+
+def video_stream_of(probe):
+    return next((stream for stream in probe.get('streams', []) if stream.get('codec_type') == 'video'), {})
+
+
+def check_duration(probe, expected_duration):
+    video = video_stream_of(probe)
+    # Streams of Matroska outputs carry no duration of their own
+    duration = float(video.get('duration') or probe.get('format', {}).get('duration') or 0)
+    ok = abs(duration - expected_duration) <= DURATION_TOLERANCE_SECONDS
+    return {'ok': ok, 'detail': f"{duration:.3f} s, expected {expected_duration:.3f} s"}
+
+
+def check_frames(probe, expected_duration, frame_rate):
+    video = video_stream_of(probe)
+    frames = video.get('nb_read_packets') or video.get('nb_frames')
+    if frames is None:
+        return {'ok': False, 'detail': "The frame count could not be read"}
+    frames = int(frames)
+    expected = round(expected_duration * frame_rate)
+    tolerance = max(FRAME_TOLERANCE, expected // 1000)
+    return {'ok': abs(frames - expected) <= tolerance, 'detail': f"{frames} frames, expected {expected}"}
+
+
+def check_streams(probe, source_probe):
+    """The output needs one video stream and every audio and subtitle stream of the source."""
+    counts = {codec_type: (count_streams(probe, codec_type), count_streams(source_probe, codec_type))
+              for codec_type in ('audio', 'subtitle')}
+    videos = count_streams(probe, 'video')
+    ok = videos == 1 and all(output == source for output, source in counts.values())
+    detail = f"{videos} video, " + ', '.join(f"{output} {codec_type} of {source}"
+                                              for codec_type, (output, source) in counts.items())
+    return {'ok': ok, 'detail': detail}
+
+
+def verify_output(output_path, source_path, expected_duration, frame_rate, segments=VERIFY_SEGMENTS,
+                  segment_seconds=VERIFY_SEGMENT_SECONDS, workers=VERIFY_WORKERS):
+    """
+    Check a finished conversion: decode sampled segments of output_path with -xerror, compare
+    its duration and frame count with expected_duration (seconds) at frame_rate, and check it
+    kept every audio and subtitle stream of source_path. The decodes and probes run as
+    parallel FFmpeg processes, up to workers at a time.
+
+    Returns {'ok': bool, 'seconds': float, 'checks': {name: {'ok': bool, 'detail': str}}}.
+    """
+    started = time.perf_counter()
+    starts = segment_starts(expected_duration, segments, segment_seconds)
+    seconds = None if starts == [0.0] else segment_seconds
+    with ThreadPoolExecutor(max_workers=workers + 2) as pool:
+        # Each task only waits on its FFmpeg process, so threads are enough to run them side by side
+        output_probe = pool.submit(run_ffprobe, output_path, True)
+        source_probe = pool.submit(run_ffprobe, source_path)
+        decodes = [pool.submit(decode_segment, output_path, start, seconds) for start in starts]
+        errors = [(start, decode.result()) for start, decode in zip(starts, decodes)]
+        checks = {}
+        failed = [(start, error) for start, error in errors if error]
+        checks['decode'] = {
+            'ok': not failed,
+            'detail': (f"{len(starts)} segments decoded cleanly" if not failed else
+                       f"{len(failed)} of {len(starts)} segments failed; at {failed[0][0]:.1f} s: {failed[0][1]}")
+        }
+        try:
+            probe = output_probe.result()
+            checks['duration'] = check_duration(probe, expected_duration)
+            checks['frames'] = check_frames(probe, expected_duration, frame_rate)
+            checks['streams'] = check_streams(probe, source_probe.result())
+        except RuntimeError as e:
+            checks['probe'] = {'ok': False, 'detail': str(e)}
+    result = {'ok': all(check['ok'] for check in checks.values()),
+              'seconds': round(time.perf_counter() - started, 3), 'checks': checks}
+    if result['ok']:
+        logging.info(f"Verified {output_path} in {result['seconds']:.1f} s")
+    else:
+        logging.warning(f"Verification of {output_path} failed: " + '; '.join(
+            f"{name}: {check['detail']}" for name, check in checks.items() if not check['ok']))
+    return result
@@ -0,0 +1,370 @@
+"""
+Watch-folder daemon: converts HDR videos as they land in hot folders.
+
+Each watched folder has a destination and a preset of job settings (any server.JOB_PARAMS
+entry except the paths), given in a JSON config:
+
+    {"folders": [{"path": "/ingest/hdr", "destination": "/ingest/sdr",
+                  "preset": {"filter": "dynamic", "tonemapper": "hable", "codec": "h265"},
+                  "recursive": true}]}
+
+or as --folder SOURCE DESTINATION pairs, which use the defaults of JOB_PARAMS. Folders are
+watched with inotify on Linux and rescanned every --poll seconds elsewhere. A file is
+only taken once its size and modification time have held for --stable seconds, so
+copies still in progress are left alone. It is then probed (through the probe cache, by
+at most --probe-workers ffprobe processes at a time however many files arrive), and
+HDR sources (PQ or HLG) are converted at most --capacity at a time to the same relative
+path under the destination. A source is not converted again while its output is newer than
+it and was last written by a successful conversion in the job history, so outputs left
+behind by failed, cancelled or interrupted runs are redone.
+
+Usage:
+    python src/watch.py --config watch.json [--capacity 1] [--stable 10] [--poll 5] [--no-inotify]
+    python src/watch.py --folder /ingest/hdr /ingest/sdr [--folder SOURCE DESTINATION ...]
+"""
+import os
+import sys
+import json
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_video_properties
+from history import job_history, safe_history
+from metrics import record_job_outcome
+from scheduler import PriorityScheduler
+from server import ServerJob, JOB_PARAMS, parse_job_params
+
+WATCH_POLL_SECONDS = 5  # Between rescans without inotify, and between stability checks
+WATCH_STABLE_SECONDS = 10  # A file is complete once its size and mtime have held this long
+WATCH_PROBE_WORKERS = 2  # ffprobe processes at once, however many files arrive
+WATCH_CAPACITY = 1  # Conversions running at once
+WATCH_EXTENSIONS = ('.mkv', '.mp4', '.m4v', '.mov', '.ts', '.m2ts', '.mts', '.webm', '.hevc')
+HDR_TRANSFERS = ('smpte2084', 'arib-std-b67')  # PQ and HLG
+PRESET_KEYS = set(JOB_PARAMS) - {'input_path', 'output_path', 'name'}
+
+# inotify(7) event flags
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+def is_hdr(properties):
+    """Whether probed properties (utils.get_video_properties) describe a PQ or HLG source."""
+    return properties.get('color_transfer') in HDR_TRANSFERS
+
+
+class WatchFolder:
+    """A hot folder, where its outputs go and the job settings they are converted with."""
+
+    def __init__(self, path, destination, preset=None, recursive=True):
+        self.path = os.path.abspath(path)
+        self.destination = os.path.abspath(destination)
+        self.preset = dict(preset or {})
+        self.recursive = recursive
+        unknown = set(self.preset) - PRESET_KEYS
+        if unknown:
+            raise ValueError(f"Unknown preset settings for {path}: {', '.join(sorted(unknown))}")
+        try:
+            # Checked with stand-in paths now rather than failing every file that lands later
+            parse_job_params(dict(self.preset, input_path='input', output_path='output'))
+        except ValueError as e:
+            raise ValueError(f"Invalid preset for {path}: {e}")
+        if self.destination == self.path or (recursive and self.destination.startswith(self.path + os.sep)):
+            raise ValueError(f"The destination of {path} must be outside the watched folder")
+
+    def contains(self, file_path):
+        directory = os.path.dirname(file_path)
+        return directory == self.path or (self.recursive and directory.startswith(self.path + os.sep))
+
+    def output_path(self, input_path):
+        return os.path.join(self.destination, os.path.relpath(input_path, self.path))
+
+    def files(self):
+        """Every video in the folder."""
+        for directory, subdirectories, names in os.walk(self.path):
+            if not self.recursive:
+                subdirectories.clear()
+            for name in names:
+                if name.lower().endswith(WATCH_EXTENSIONS):
+                    yield os.path.join(directory, name)
+
+
+def load_config(path):
+    """Read the WatchFolders of a JSON config; see the module docstring for its layout."""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    return [WatchFolder(folder['path'], folder['destination'], folder.get('preset'), folder.get('recursive', True))
+            for folder in config.get('folders', [])]
+
+
+def file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def is_up_to_date(output_path, source_state):
+    """
+    Whether output_path is newer than the source (size, mtime) and was last written by a
+    successful conversion; a partial output has no success finished after its last write.
+    """
+    output_state = file_state(output_path)
+    if output_state is None or output_state[1] < source_state[1]:
+        return False
+    job = safe_history(job_history.last_success, os.path.abspath(output_path))
+    return job is not None and job['finished'] is not None and job['finished'] * 1e9 >= output_state[1]
+
+
+class StabilityTracker:
+    """
+    Candidate files and how long their size and mtime have held. check() stats each
+    candidate and returns those unchanged for stable_seconds; files that vanish are dropped.
+    """
+
+    def __init__(self, stable_seconds=WATCH_STABLE_SECONDS):
+        self.stable_seconds = stable_seconds
+        self.candidates = {}  # path -> ((size, mtime), monotonic time it was first seen like that)
+
+    def touch(self, path):
+        if path not in self.candidates:
+            self.candidates[path] = (None, time.monotonic())
+
+    def check(self, now=None):
+        now = time.monotonic() if now is None else now
+        stable = []
+        for path, (state, since) in list(self.candidates.items()):
+            current = file_state(path)
+            if current is None:
+                del self.candidates[path]
+            elif current != state:
+                self.candidates[path] = (current, now)
+            elif now - since >= self.stable_seconds:
+                del self.candidates[path]
+                stable.append(path)
+        return stable
+
+
+class InotifyWatcher:
+    """Changed paths under directories, from Linux inotify through libc; raises OSError elsewhere."""
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}  # Watch descriptor -> directory
+        self.overflowed = False  # Events were lost; the caller should rescan
+
+    def add(self, directory, recursive=True):
+        """Watch directory (and, recursive, its subdirectories); returns the directories added."""
+        added = []
+        for path, subdirectories, _ in os.walk(directory):
+            descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(path), INOTIFY_MASK)
+            if descriptor < 0:
+                raise OSError(ctypes.get_errno(), f"Could not watch {path}")
+            self.directories[descriptor] = path
+            added.append(path)
+            if not recursive:
+                break
+        return added
+
+    def read(self, timeout):
+        """Return the paths of files changed, created or moved in, waiting up to timeout seconds."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            directory = self.directories.get(descriptor)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have landed in it before it was watched
+                    for added in self.add(path):
+                        paths += [os.path.join(added, entry) for entry in os.listdir(added)]
+            else:
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WatchDaemon:
+    """Takes stable videos from the WatchFolders and converts the HDR ones; see the module docstring."""
+
+    def __init__(self, folders, capacity=WATCH_CAPACITY, stable_seconds=WATCH_STABLE_SECONDS,
+                 poll_seconds=WATCH_POLL_SECONDS, probe_workers=WATCH_PROBE_WORKERS, use_inotify=True):
+        self.folders = folders
+        self.poll_seconds = poll_seconds
+        self.tracker = StabilityTracker(stable_seconds)
+        self.handled = {}  # path -> (size, mtime) it was taken at, so it isn't taken twice
+        self.probes = ThreadPoolExecutor(probe_workers)
+        self.scheduler = PriorityScheduler(capacity)
+        self.jobs = []
+        self.job_ids = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = InotifyWatcher()
+                for folder in folders:
+                    self.inotify.add(folder.path, folder.recursive)
+            except OSError as e:
+                logging.info(f"Polling the watched folders instead of using inotify: {e}")
+                self.inotify = None
+
+    def folder_of(self, path):
+        return next((folder for folder in self.folders if folder.contains(path)), None)
+
+    def scan(self):
+        """Make every unhandled or changed video in the folders a candidate."""
+        for folder in self.folders:
+            for path in folder.files():
+                if self.handled.get(path) != file_state(path):
+                    self.tracker.touch(path)
+
+    def run(self):
+        """Watch until stop(); the folders are scanned once at the start for files already there."""
+        self.scheduler.start()
+        self.scan()
+        next_scan = time.monotonic() + self.poll_seconds
+        while not self.stopped.is_set():
+            if self.inotify is not None:
+                for path in self.inotify.read(self.poll_seconds):
+                    if path.lower().endswith(WATCH_EXTENSIONS) and self.folder_of(path):
+                        self.tracker.touch(path)
+                if self.inotify.overflowed:
+                    self.inotify.overflowed = False
+                    self.scan()
+            else:
+                self.stopped.wait(max(next_scan - time.monotonic(), 0))
+                next_scan = time.monotonic() + self.poll_seconds
+                self.scan()
+            for path in self.tracker.check():
+                self.take(path)
+
+    def take(self, path):
+        state = file_state(path)
+        if state is None or self.handled.get(path) == state:
+            return
+        self.handled[path] = state
+        folder = self.folder_of(path)
+        output_path = folder.output_path(path)
+        if is_up_to_date(output_path, state):
+            logging.info(f"Skipping {path}: {output_path} is up to date")
+            return
+        # Queued for the probe workers; the pool's size caps the ffprobe processes
+        self.probes.submit(self.probe_and_enqueue, folder, path, output_path)
+
+    def probe_and_enqueue(self, folder, path, output_path):
+        if self.stopped.is_set():
+            return
+        properties = get_video_properties(path)
+        if properties is None:
+            logging.warning(f"Skipping {path}: it could not be probed")
+            return
+        if not is_hdr(properties):
+            logging.info(f"Skipping {path}: not HDR (transfer {properties.get('color_transfer') or 'unknown'})")
+            return
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            params = parse_job_params(dict(folder.preset, input_path=path, output_path=output_path,
+                                           name=os.path.relpath(path, folder.path)))
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not queue {path}: {e}")
+            record_job_outcome('failed')
+            return
+        with self.lock:
+            self.job_ids += 1
+            job = ServerJob(str(self.job_ids), params, self.scheduler, lambda event, job: None, source='watch')
+            self.jobs.append(job)
+        try:
+            job.prepare()  # Probes through the cache and builds the command
+        except Exception as e:
+            logging.error(f"Could not prepare {job.name}: {e}")
+            job.error = str(e)
+            record_job_outcome('failed')
+            return
+        with self.scheduler.lock:
+            job.scheduled = self.scheduler.submit(job.launch, params['priority'], job.name)
+        logging.info(f"Queued {job.name} -> {output_path}")
+
+    def stop(self):
+        """Stop watching and cancel the conversions still queued or running."""
+        self.stopped.set()
+        self.probes.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            jobs = list(self.jobs)
+        for job in jobs:
+            if job.scheduled is not None and job.scheduled.state not in ('done', 'cancelled'):
+                self.scheduler.cancel(job.scheduled)
+        self.scheduler.stop()
+        if self.inotify is not None:
+            self.inotify.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', help="JSON file of the watched folders and their presets")
+    parser.add_argument('--folder', nargs=2, action='append', default=[], metavar=('SOURCE', 'DESTINATION'),
+                        help="Watch SOURCE and write to DESTINATION with the default settings")
+    parser.add_argument('--capacity', type=int, default=WATCH_CAPACITY, help="Conversions running at once")
+    parser.add_argument('--stable', type=float, default=WATCH_STABLE_SECONDS,
+                        help="Seconds a file must stop changing before it is taken")
+    parser.add_argument('--poll', type=float, default=WATCH_POLL_SECONDS, help="Seconds between checks")
+    parser.add_argument('--probe-workers', type=int, default=WATCH_PROBE_WORKERS,
+                        help="ffprobe processes at once")
+    parser.add_argument('--no-inotify', action='store_true', help="Poll even where inotify is available")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO)
+
+    try:
+        folders = load_config(args.config) if args.config else []
+        folders += [WatchFolder(source, destination) for source, destination in args.folder]
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(str(e))
+    if not folders:
+        parser.error("Give --config or at least one --folder")
+    daemon = WatchDaemon(folders, args.capacity, args.stable, args.poll, args.probe_workers,
+                         use_inotify=not args.no_inotify)
+    logging.info(f"Watching {', '.join(folder.path for folder in folders)}")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from unittest.mock import patch
+from src.autotune import (search_for_speed, search_for_quality, autotune_encoder, get_cache_key,
+                          store_cached_settings, load_cached_settings, map_encoder_settings)
+
+LADDER = {'presets': ['fast0', 'fast1', 'fast2', 'fast3'], 'crf': [18, 23, 28]}
+
+def synthetic_measure(calls):
+    """Speed falls with slower presets and lower CRF; quality rises with both."""
+    def measure(preset, crf):
+        calls.append((preset, crf))
+        index = LADDER['presets'].index(preset)
+        return {'preset': preset, 'crf': crf,
+                'fps': 100 / (index + 1) + crf,
+                'ssim': 0.90 + 0.01 * index + (28 - crf) * 0.002,
+                'psnr': 40.0}
+    return measure
+
+class TestAutotune(unittest.TestCase):
+
+    def test_speed_search_picks_best_quality_meeting_target(self):
+        calls = []
+        result = search_for_speed(synthetic_measure(calls), LADDER, target_fps=50)
+        # fast2 reaches 56 fps at CRF 23 and 51 at 18; fast1 at CRF 18 scores lower
+        self.assertEqual((result['preset'], result['crf']), ('fast2', 18))
+        self.assertTrue(result['meets_target'])
+        self.assertLess(len(set(calls)), len(LADDER['presets']) * len(LADDER['crf']))
+
+    def test_speed_search_falls_back_to_fastest(self):
+        result = search_for_speed(synthetic_measure([]), LADDER, target_fps=1000)
+        self.assertEqual((result['preset'], result['crf']), ('fast0', 28))
+        self.assertFalse(result['meets_target'])
+
+    def test_quality_search_picks_fastest_meeting_target(self):
+        result = search_for_quality(synthetic_measure([]), LADDER, min_ssim=0.915)
+        self.assertEqual((result['preset'], result['crf']), ('fast0', 18))
+        self.assertTrue(result['meets_target'])
+
+    def test_settings_map_to_the_same_ladder_step(self):
+        self.assertEqual(map_encoder_settings({'preset': 'p5', 'crf': 28}, 'h264_nvenc', 'libx264'),
+                         {'preset': 'fast', 'crf': 26})
+        self.assertEqual(map_encoder_settings({'preset': 'p1', 'crf': 17}, 'h264_nvenc', 'libx264'),
+                         {'preset': 'ultrafast'})
+        self.assertIsNone(map_encoder_settings({'preset': 'custom'}, 'h264_nvenc', 'libx264'))
+        settings = {'preset': 'slow', 'crf': 25}
+        self.assertIs(map_encoder_settings(settings, 'libx265', 'libx265'), settings)
+
+    def test_results_are_cached_per_target(self):
+        cache_path = os.path.join(tempfile.mkdtemp(), 'autotune.json')
+        key = get_cache_key((1920, 1080), 'libx264', target_fps=60)
+        self.assertNotEqual(key, get_cache_key((1920, 1080), 'libx264', target_fps=30))
+        store_cached_settings(key, {'preset': 'fast', 'crf': 20, 'meets_target': True}, cache_path)
+        self.assertEqual(load_cached_settings(key, cache_path)['preset'], 'fast')
+
+        with patch('src.autotune.EncoderTuner') as mock_tuner:
+            result = autotune_encoder(None, None, 'libx264', 60, 24, (1920, 1080), target_fps=60,
+                                      cache_path=cache_path)
+        self.assertEqual(result['crf'], 20)
+        mock_tuner.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
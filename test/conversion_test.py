@@ -4,10 +4,13 @@ import subprocess  # Added import
 import multiprocessing  # Added import
 import ctypes  # Added import for SW_HIDE
 import threading  # Added import for threading
+import json
+import shutil
+import tempfile
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 import unittest
 from unittest.mock import patch, MagicMock, ANY  # Import ANY
-from src.conversion import ConversionManager
+from src.conversion import ConversionManager, job_history
 from src.utils import get_video_properties
 from tkinter import Tk, DoubleVar  # Added DoubleVar import
 from tkinter import ttk
@@ -27,6 +30,15 @@ def run_ffmpeg_command(command):
 
 class TestConversionManager(unittest.TestCase):
 
+    def setUp(self):
+        self.history_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.history_directory, True)
+        # Keep test jobs out of the real job history
+        for name, value in (('path', os.path.join(self.history_directory, 'history.sqlite3')), ('opened', False)):
+            patcher = patch.object(job_history, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
     @patch('src.conversion.get_video_properties')
     @patch('src.conversion.subprocess.Popen')
     def test_start_conversion_success(self, mock_popen, mock_get_props):
@@ -153,6 +165,195 @@ class TestConversionManager(unittest.TestCase):
 
         # Additional assertions can be added here as needed
 
+    @patch('src.conversion.get_hdr_peak', return_value=4000.0)
+    @patch('src.conversion.FramePipeline')
+    @patch('src.conversion.get_video_properties')
+    def test_start_conversion_pipeline_operator(self, mock_get_props, mock_pipeline, mock_get_peak):
+        """Test that a pipeline operator routes the conversion through FramePipeline."""
+        mock_get_props.return_value = {
+            "width": 3840,
+            "height": 2160,
+            "bit_rate": 40000000,
+            "codec_name": 'hevc',
+            "frame_rate": 24.0,
+            "audio_codec": 'aac',
+            "audio_bit_rate": 128000,
+            "duration": 60.0,
+            "subtitle_streams": []
+        }
+        mock_gui = MagicMock()
+        pipeline = mock_pipeline.return_value
+        pipeline.decoder_command.return_value = ['ffmpeg', '-i', 'input.mkv', '-']
+        pipeline.encoder_command.return_value = ['ffmpeg', '-i', '-', 'output.mp4']
+        manager = ConversionManager()
+        manager.start_conversion(
+            'input.mkv', 'output.mp4', 1.0, False, 0, MagicMock(), [], mock_gui, False, MagicMock(),
+            pipeline_operator='bt2390'
+        )
+
+        args = mock_pipeline.call_args[0]
+        self.assertEqual(args[0], os.path.abspath('input.mkv'))
+        self.assertEqual(args[3].name, 'bt2390')
+        self.assertEqual(args[3].peak_nits, 4000.0)
+        self.assertEqual(args[4][:2], ['-c:v', 'libx264'])
+        self.assertIs(manager.process, pipeline.start.return_value)
+
+        # Recorded in the job history like an FFmpeg conversion
+        history_id = manager.history_id
+        job = job_history.get_job(history_id)
+        self.assertEqual(job['outcome'], 'running')
+        self.assertEqual(job['codec'], 'libx264')
+        self.assertEqual(job['tonemapper'], 'bt2390')
+        self.assertEqual(json.loads(job['params'])['pipeline_operator'], 'bt2390')
+        manager.process = pipeline
+        pipeline.returncode = 0
+        pipeline.error_lines = []
+        pipeline.stats = {}
+        pipeline.fps = 30.0
+        with patch.object(manager, 'handle_completion') as handle_completion:
+            manager.monitor_pipeline(pipeline, mock_gui, [], MagicMock(), 'output.mp4', False)
+        handle_completion.assert_called_once()
+        job = job_history.get_job(history_id)
+        self.assertEqual(job['outcome'], 'success')
+        self.assertEqual(job['fps'], 30.0)
+
+    @patch('src.conversion.messagebox.showwarning')
+    @patch('src.conversion.FramePipeline')
+    @patch('src.conversion.get_video_properties')
+    def test_pipeline_operator_rejects_hlg(self, mock_get_props, mock_pipeline, mock_warning):
+        """HLG sources aren't decoded through the PQ curve of the pipeline operators."""
+        mock_get_props.return_value = {"width": 3840, "height": 2160, "frame_rate": 24.0, "duration": 60.0,
+                                       "color_transfer": 'arib-std-b67'}
+        interactable_elements = [MagicMock()]
+        ConversionManager().start_conversion(
+            'input.mkv', 'output.mp4', 1.0, False, 0, MagicMock(), interactable_elements, MagicMock(), False,
+            MagicMock(), pipeline_operator='bt2390'
+        )
+        mock_pipeline.assert_not_called()
+        self.assertIn('arib-std-b67', mock_warning.call_args[0][1])
+        interactable_elements[0].config.assert_not_called()
+
+    @patch('src.conversion.messagebox')
+    @patch('src.conversion.job_history')
+    @patch('src.conversion.threading.Thread')
+    @patch('src.conversion.ConversionManager.is_gpu_available', return_value=True)
+    @patch('src.conversion.ConversionManager.start_ffmpeg_process')
+    @patch('src.conversion.get_video_properties')
+    def test_gpu_fallback_encodes_only_missing_segments(self, mock_get_props, mock_start_process, mock_is_gpu,
+                                                        mock_thread, mock_history, mock_messagebox):
+        """Test that the CPU retry of a resumable conversion keeps the settings and resumes from the GPU's segments."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        input_path = os.path.join(directory, 'input.mkv')
+        output_path = os.path.join(directory, 'output.mp4')
+        with open(input_path, 'wb') as f:
+            f.write(b'video')
+        mock_get_props.return_value = {"width": 1920, "height": 1080, "bit_rate": 4000000, "frame_rate": 24.0,
+                                       "duration": 600.0, "subtitle_streams": []}
+        mock_history.expected_speed.return_value = None
+        gpu_process = MagicMock(stderr=iter(['[h264_nvenc @ 0x0] CUDA error: out of memory']), returncode=1)
+        mock_start_process.side_effect = [gpu_process, MagicMock()]
+        gui = MagicMock()
+        manager = ConversionManager()
+        # Autotuned for NVENC, as gui.get_encoder_settings returns them
+        manager.start_conversion(input_path, output_path, 1.0, True, 0, MagicMock(), [], gui, False, MagicMock(),
+                                 tonemapper='Mobius', selected_codec='h264',
+                                 encoder_settings={'preset': 'p5', 'crf': 20}, resumable=True)
+        gpu_cmd = mock_start_process.call_args_list[0][0][0]
+        self.assertEqual(gpu_cmd[gpu_cmd.index('-c:v') + 1], 'h264_nvenc')
+        self.assertEqual(gpu_cmd[gpu_cmd.index('-preset') + 1], 'p5')
+        self.assertIn('-segment_start_number', gpu_cmd)
+
+        # The GPU run finished three segments before failing
+        job = manager.resume_job
+        with open(os.path.join(job.directory, job.manifest['runs'][0]['list']), 'w', encoding='utf-8') as f:
+            for number in range(3):
+                name = f'segment_{number:05d}.mkv'
+                open(os.path.join(job.directory, name), 'wb').close()
+                f.write(f"{name},{number * 60.0},{(number + 1) * 60.0}\n")
+        manager.monitor_progress(MagicMock(), 600.0, gui, [], MagicMock(), os.path.normpath(output_path), False, 1.0)
+
+        cpu_cmd = mock_start_process.call_args_list[1][0][0]
+        self.assertEqual(manager.progress_offset, 180.0)
+        self.assertEqual(cpu_cmd[cpu_cmd.index('-segment_start_number') + 1], '3')
+        self.assertEqual(cpu_cmd[cpu_cmd.index('-c:v') + 1], 'libx264')
+        # The same step of the x264 ladder; libx264 rejects the NVENC preset names
+        self.assertEqual(cpu_cmd[cpu_cmd.index('-preset') + 1], 'fast')
+        self.assertEqual(cpu_cmd[cpu_cmd.index('-crf') + 1], '20')
+        self.assertTrue(any('tonemap=mobius' in arg for arg in cpu_cmd))
+        self.assertNotIn('cuda', cpu_cmd)
+        self.assertTrue(os.path.exists(os.path.join(job.directory, 'segment_00002.mkv')))
+
+    @patch('src.conversion.messagebox')
+    @patch('src.conversion.job_history')
+    @patch('src.conversion.threading.Thread')
+    @patch('src.conversion.ConversionManager.is_gpu_available', return_value=True)
+    @patch('src.conversion.ConversionManager.start_ffmpeg_process')
+    @patch('src.conversion.get_video_properties')
+    def test_gpu_fallback_without_resumable_runs_whole_file(self, mock_get_props, mock_start_process, mock_is_gpu,
+                                                            mock_thread, mock_history, mock_messagebox):
+        """Test that a GPU conversion is only segmented when resumable is set."""
+        mock_get_props.return_value = {"width": 1920, "height": 1080, "bit_rate": 4000000, "frame_rate": 24.0,
+                                       "duration": 600.0, "subtitle_streams": []}
+        mock_history.expected_speed.return_value = None
+        gpu_process = MagicMock(stderr=iter(['[h264_nvenc @ 0x0] CUDA error: out of memory']), returncode=1)
+        mock_start_process.side_effect = [gpu_process, MagicMock()]
+        gui = MagicMock()
+        manager = ConversionManager()
+        manager.start_conversion('input.mkv', 'output.mp4', 1.0, True, 0, MagicMock(), [], gui, False, MagicMock(),
+                                 encoder_settings={'preset': 'p7', 'crf': 28})
+        self.assertIsNone(manager.resume_job)
+        self.assertNotIn('-segment_start_number', mock_start_process.call_args_list[0][0][0])
+        manager.monitor_progress(MagicMock(), 600.0, gui, [], MagicMock(), os.path.abspath('output.mp4'), False, 1.0)
+
+        cpu_cmd = mock_start_process.call_args_list[1][0][0]
+        self.assertNotIn('-segment_start_number', cpu_cmd)
+        self.assertEqual(cpu_cmd[cpu_cmd.index('-preset') + 1], 'slow')
+        self.assertEqual(cpu_cmd[cpu_cmd.index('-crf') + 1], '26')
+        self.assertEqual(cpu_cmd[-2], os.path.abspath('output.mp4'))
+
+    @patch('src.conversion.ConversionManager.start_ffmpeg_process')
+    @patch('src.conversion.get_video_properties')
+    def test_start_conversion_from_mezzanine(self, mock_get_props, mock_start_process):
+        """Test that a cached mezzanine with matching tonemap settings skips tonemapping."""
+        mock_get_props.return_value = {
+            "width": 1920, "height": 1080, "bit_rate": 4000000, "frame_rate": 24.0, "duration": 60.0
+        }
+        manager = ConversionManager()
+        manager.mezzanine_cache = MagicMock()
+        manager.mezzanine_cache.lookup.return_value = 'cached.mkv'
+        with patch('src.conversion.threading.Thread'):
+            manager.start_conversion(
+                'input.mkv', 'output.mp4', 1.0, False, 1, MagicMock(), [], MagicMock(), False, MagicMock(),
+                tonemapper='Mobius', keep_mezzanine=True
+            )
+
+        settings = manager.mezzanine_cache.make_key.call_args[1]
+        self.assertEqual(settings['tonemapper'], 'mobius')
+        self.assertEqual(settings['output_size'], (1920, 1080))
+        cmd = mock_start_process.call_args[0][0]
+        self.assertEqual(cmd[cmd.index('-i') + 1], 'cached.mkv')
+        self.assertNotIn('-filter_complex', cmd)
+        self.assertEqual(cmd[cmd.index('-map_metadata') + 1], '1')
+        self.assertIsNone(manager.mezzanine_key)
+
+    @patch('src.conversion.get_maxfall')
+    def test_construct_ffmpeg_command_with_mezzanine(self, mock_get_maxfall):
+        """Test that the tonemapped stream is split into a lossless intra-only second output."""
+        mock_get_maxfall.return_value = 100.0
+        manager = ConversionManager()
+        properties = {"width": 1920, "height": 1080, "bit_rate": 4000000, "frame_rate": 24.0}
+
+        cmd = manager.construct_ffmpeg_command('input.mp4', 'output.mkv', 1.0, properties, False, 1,
+                                               mezzanine_path='mezzanine.partial.mkv')
+
+        self.assertTrue(cmd[cmd.index('-filter_complex') + 1].endswith(',split=2[vout][vmez]'))
+        mezzanine_args = cmd[cmd.index('[vmez]'):]
+        self.assertEqual(mezzanine_args[mezzanine_args.index('-c:v') + 1], 'ffv1')
+        self.assertEqual(mezzanine_args[mezzanine_args.index('-g') + 1], '1')
+        self.assertEqual(mezzanine_args[-1], 'mezzanine.partial.mkv')
+        self.assertLess(cmd.index('output.mkv'), cmd.index('[vmez]'))
+
     @patch('src.conversion.messagebox.showwarning')
     @patch('src.conversion.get_video_properties')
     def test_start_conversion_invalid_paths(self, mock_get_props, mock_showwarning):  # Swapped argument order
@@ -266,6 +467,70 @@ class TestConversionManager(unittest.TestCase):
         ]
         self.assertEqual(cmd, expected_cmd)
 
+    def test_construct_ffmpeg_command_with_crop(self):
+        """Test that the crop leads the filter graph and the output keeps the cropped size."""
+        manager = ConversionManager()
+        properties = {"width": 3840, "height": 2160, "bit_rate": 4000000, "frame_rate": 24.0}
+        crop = {'width': 3840, 'height': 1604, 'x': 0, 'y': 278}
+
+        cmd = manager.construct_ffmpeg_command('input.mp4', 'output.mkv', 1.0, properties, False, 0,
+                                               tonemapper='reinhard', crop=crop)
+
+        filter_graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertTrue(filter_graph.startswith('[0:v:0]crop=3840:1604:0:278,zscale=primaries='))
+        self.assertTrue(filter_graph.endswith('eq=gamma=1.0[vout]'))
+
+        cmd = manager.construct_ffmpeg_command('input.mp4', 'output.mkv', 1.0, properties, False, 0,
+                                               tonemapper='reinhard', crop=crop, resolution='1080p')
+        filter_graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertTrue(filter_graph.startswith('[0:v:0]crop=3840:1604:0:278,zscale=w=1920:h=802:'))
+
+    def test_encoder_args_with_tuned_settings(self):
+        """Test that autotuned settings replace the default preset and CRF."""
+        manager = ConversionManager()
+        properties = {"bit_rate": 4000000}
+
+        args = manager.encoder_args(properties, False, 'h264', {'preset': 'fast', 'crf': 20})
+        self.assertEqual(args[args.index('-preset') + 1], 'fast')
+        self.assertEqual(args[args.index('-crf') + 1], '20')
+        args = manager.encoder_args(properties, True, 'h264', {'preset': 'p6', 'crf': 24})
+        self.assertEqual(args[args.index('-cq') + 1], '24')
+
+    def test_construct_ffmpeg_command_fragmented(self):
+        """Test that fragmented muxing replaces faststart so no rewrite pass follows the encode."""
+        manager = ConversionManager()
+        properties = {"width": 1920, "height": 1080, "bit_rate": 4000000, "frame_rate": 24.0}
+
+        cmd = manager.construct_ffmpeg_command('input.mp4', 'output.mp4', 1.0, properties, False, 0,
+                                               muxing='fragmented')
+
+        self.assertEqual(cmd[cmd.index('-movflags') + 1], '+frag_keyframe+empty_moov+default_base_moof')
+        self.assertEqual(cmd.count('-movflags'), 1)
+
+    def test_construct_ffmpeg_command_follow_to_stdout(self):
+        """Test that a followed input is tailed through the file protocol and stdout gets a streamable muxer."""
+        manager = ConversionManager()
+        properties = {"width": 1920, "height": 1080, "bit_rate": 4000000, "frame_rate": 24.0}
+
+        cmd = manager.construct_ffmpeg_command(os.path.abspath('input.mkv'), '-', 1.0, properties, False, 0,
+                                               follow=True)
+
+        self.assertEqual(cmd[cmd.index('-follow') + 1], '1')
+        self.assertEqual(cmd[cmd.index('-i') + 1], 'file:' + os.path.abspath('input.mkv'))
+        self.assertEqual(cmd[-4:], ['-f', 'matroska', 'pipe:1', '-y'])
+        self.assertNotIn('-movflags', cmd)
+
+    def test_construct_ffmpeg_command_with_range(self):
+        """Test that a range is passed as input options so FFmpeg seeks before decoding."""
+        manager = ConversionManager()
+        properties = {"width": 1920, "height": 1080, "bit_rate": 4000000, "frame_rate": 24.0}
+
+        cmd = manager.construct_ffmpeg_command('input.mp4', 'output.mp4', 1.0, properties, False, 0,
+                                               start=600, end=604.5)
+
+        input_index = cmd.index('-i')
+        self.assertEqual(cmd[input_index - 4:input_index], ['-ss', '600', '-to', '604.5'])
+
     @patch('src.conversion.get_maxfall')  # Mock get_maxfall
     @patch('src.conversion.subprocess.Popen')
     def test_construct_ffmpeg_command_with_subtitles(self, mock_get_props, mock_get_maxfall):
@@ -449,7 +714,8 @@ class TestConversionManager(unittest.TestCase):
                 startupinfo=None,
                 encoding='utf-8',  # Added encoding
                 errors='replace',    # Added errors
-                creationflags=ANY  # Allow any creationflags
+                creationflags=ANY,  # Allow any creationflags
+                start_new_session=True  # Own process group, so pausing can suspend it
             )
             self.assertEqual(process, mock_process)
 
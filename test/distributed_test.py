@@ -0,0 +1,110 @@
+import sys
+import os
+import re
+import shutil
+import tempfile
+import threading
+import subprocess
+import socketserver
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.distributed import Coordinator, WorkerServer, is_loopback_host, plan_segments, read_message, send_message
+
+PROPERTIES = {'width': 320, 'height': 180, 'bit_rate': 0, 'codec_name': 'ffv1', 'frame_rate': 24.0,
+              'duration': 6.0, 'audio_codec': 'aac', 'audio_bit_rate': 0, 'subtitle_streams': []}
+SETTINGS = {'filter_index': 0, 'tonemapper': 'mobius', 'codec': 'h264'}
+SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/distributed.py'))
+
+class FailingHandler(socketserver.StreamRequestHandler):
+    """Accepts segments and always fails them, like a node with a broken FFmpeg."""
+
+    def handle(self):
+        request = read_message(self.rfile)
+        if request['type'] == 'hello':
+            send_message(self.wfile, {'slots': 1})
+        else:
+            self.server.attempts += 1
+            send_message(self.wfile, {'returncode': 1, 'error': 'Broken FFmpeg'})
+
+class TestSegmentPlan(unittest.TestCase):
+
+    def test_boundaries_snap_to_keyframes(self):
+        self.assertEqual(plan_segments(10, 24, 4), [(0, 96), (96, 144)])
+        self.assertEqual(plan_segments(12, 24, 4, keyframes=[0, 3.5, 8.5]), [(0, 84), (84, 120), (204, 84)])
+        self.assertEqual(sum(frames for _, frames in plan_segments(3601.5, 23.976, 30)), round(3601.5 * 23.976))
+
+class TestWorkerServer(unittest.TestCase):
+
+    def test_token_required_off_loopback(self):
+        self.assertTrue(is_loopback_host('127.0.0.1'))
+        self.assertTrue(is_loopback_host('localhost'))
+        self.assertFalse(is_loopback_host('0.0.0.0'))
+        self.assertFalse(is_loopback_host(''))
+        with self.assertRaises(ValueError):
+            WorkerServer('0.0.0.0', 0)
+        server = WorkerServer('127.0.0.1', 0)
+        server.server_close()
+        server = WorkerServer('0.0.0.0', 0, token='secret')
+        server.server_close()
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "Encodes a generated clip with FFmpeg")
+class TestDistributedEncoding(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.input_path = os.path.join(cls.directory, 'hdr.mkv')
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=24:duration=6',
+                        '-f', 'lavfi', '-i', 'sine=duration=6', '-vf', 'format=yuv420p10le', '-c:v', 'ffv1',
+                        '-g', '24', '-color_primaries', 'bt2020', '-color_trc', 'smpte2084', '-colorspace', 'bt2020nc',
+                        '-c:a', 'aac', cls.input_path, '-y'], check=True)
+
+    def setUp(self):
+        self.processes = []
+        self.workers = []
+        for _ in range(2):
+            process = subprocess.Popen([sys.executable, SCRIPT, 'worker', '--port', '0', '--token', 'secret'],
+                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            self.processes.append(process)
+            self.workers.append(process.stdout.readline().split()[-1])
+        self.failing = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FailingHandler)
+        self.failing.attempts = 0
+        threading.Thread(target=self.failing.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        for process in self.processes:
+            process.kill()
+            process.wait()
+        self.failing.shutdown()
+        self.failing.server_close()
+
+    def count_frames(self, path):
+        result = subprocess.run(['ffmpeg', '-i', path, '-map', '0:v', '-f', 'null', '-'],
+                                capture_output=True, text=True)
+        return int(re.findall(r'frame=\s*(\d+)', result.stderr)[-1]), 'Audio' in result.stderr
+
+    def encode(self, shared_dir=None):
+        output_path = os.path.join(self.directory, f"out_{'shared' if shared_dir else 'streamed'}.mp4")
+        progress = []
+        failing = f'127.0.0.1:{self.failing.server_address[1]}'
+        # One worker that fails every segment and one node that is down
+        coordinator = Coordinator([failing] + self.workers + ['127.0.0.1:1'], self.input_path, output_path,
+                                  SETTINGS, segment_seconds=2, shared_dir=shared_dir, token='secret',
+                                  properties=dict(PROPERTIES),
+                                  progress_callback=lambda done, total: progress.append((done, total)))
+        coordinator.run()
+        self.assertEqual(progress[-1], (3, 3))
+        self.assertEqual(self.count_frames(output_path), (144, True))
+        return coordinator
+
+    def test_streamed_with_retries(self):
+        self.encode()
+        self.assertGreater(self.failing.attempts, 0)
+
+    def test_shared_storage(self):
+        shared_dir = tempfile.mkdtemp()
+        self.encode(shared_dir)
+        self.assertEqual(os.listdir(shared_dir), [])
+
+if __name__ == '__main__':
+    unittest.main()
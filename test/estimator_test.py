@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from unittest.mock import patch
+from src.estimator import estimate_conversion, confidence_interval, format_estimate
+
+class TestEstimator(unittest.TestCase):
+
+    def test_confidence_interval(self):
+        mean, low, high = confidence_interval([1.0, 2.0, 3.0])
+        self.assertAlmostEqual(mean, 2.0)
+        # t(2) = 4.303, stdev 1, three samples
+        self.assertAlmostEqual(high - mean, 4.303 / 3 ** 0.5, places=3)
+        self.assertEqual(low, 0.0)
+        self.assertEqual(confidence_interval([5.0]), (5.0, 5.0, 5.0))
+
+    @patch('src.estimator.time.perf_counter')
+    @patch('src.estimator.run_ffmpeg_command')
+    def test_estimate_extrapolates_samples(self, mock_run, mock_clock):
+        """Two-second samples taking one second and 1 MB each extrapolate linearly to the full length."""
+        def encode(cmd, cancel_event=None):
+            with open(cmd[-1], 'wb') as f:
+                f.write(b'\0' * 1000000)
+        mock_run.side_effect = encode
+        mock_clock.side_effect = [0.0, 1.0, 10.0, 11.0]
+        commands = []
+
+        def build_command(output_path, start, end):
+            commands.append((start, end))
+            return ['ffmpeg', '-ss', str(start), '-to', str(end), '-i', 'input.mkv', output_path]
+
+        estimate = estimate_conversion(build_command, 3600, samples=2, sample_seconds=2)
+
+        self.assertEqual(commands, [(1200.0, 1202.0), (2400.0, 2402.0)])
+        self.assertAlmostEqual(estimate['seconds'], 1800)
+        self.assertAlmostEqual(estimate['size'], 1800 * 1000000)
+        self.assertAlmostEqual(estimate['speed'], 2.0)
+        self.assertEqual(estimate['seconds_low'], estimate['seconds_high'])
+        self.assertTrue(format_estimate(estimate).startswith('0:30:00 (0:30:00-0:30:00), 1.7 GB'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import sys
+import os
+import time
+import tempfile
+import threading
+import subprocess
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.governor import (RESOURCE_POLICIES, IOPhaseLimiter, apply_resource_policy, format_policy_stats,
+                          get_policy, load_policy_stats, policy_cores, record_policy_throughput)
+
+class TestResourcePolicies(unittest.TestCase):
+
+    def test_policy_cores_keep_at_least_half(self):
+        self.assertEqual(policy_cores(get_policy('interactive'), range(8)), [2, 3, 4, 5, 6, 7])
+        self.assertEqual(policy_cores(get_policy('interactive'), range(2)), [1])
+        self.assertIsNone(policy_cores(get_policy('interactive'), [0]))
+        self.assertIsNone(policy_cores(get_policy('farm'), range(8)))
+        with self.assertRaises(ValueError):
+            get_policy('turbo')
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), "Reads niceness through os.getpriority")
+    def test_apply_policy_to_process(self):
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        try:
+            apply_resource_policy(process, RESOURCE_POLICIES['background'])
+            self.assertEqual(os.getpriority(os.PRIO_PROCESS, process.pid), 19)
+            cores = policy_cores(RESOURCE_POLICIES['background'])
+            if cores:
+                self.assertEqual(sorted(os.sched_getaffinity(process.pid)), cores)
+        finally:
+            process.kill()
+            process.wait()
+
+    def test_io_phases_are_capped(self):
+        limiter = IOPhaseLimiter(slots=1)
+        peak, active, lock = [0], [0], threading.Lock()
+
+        def join():
+            with limiter.phase('join'):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=join) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(peak[0], 1)
+
+    def test_throughput_is_recorded_per_policy(self):
+        stats_path = os.path.join(tempfile.mkdtemp(), 'policy_stats.json')
+        record_policy_throughput('farm', 40.0, (1920, 1080), stats_path=stats_path)
+        entry = record_policy_throughput('farm', 60.0, (1920, 1080), stats_path=stats_path)
+        record_policy_throughput('interactive', 30.0, stats_path=stats_path)
+
+        self.assertEqual(entry['runs'], 2)
+        self.assertAlmostEqual(entry['fps'], 50.0)
+        self.assertAlmostEqual(entry['megapixels_per_second'], 50.0 * 1920 * 1080 / 1e6)
+        summary = format_policy_stats(load_policy_stats(stats_path))
+        self.assertIn('farm: 2 runs, 50.0 fps, 103.7 MP/s', summary)
+        self.assertIn('interactive: 1 runs, 30.0 fps', summary)
+
+if __name__ == '__main__':
+    unittest.main()
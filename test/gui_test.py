@@ -99,8 +99,11 @@ class TestHDRConverterGUI(TestCase):
         
         # Setup mock images
         mock_image = MagicMock(spec=Image.Image)
+        mock_image.width, mock_image.height, mock_image.mode = 3840, 2160, 'RGB'
         mock_image.resize = MagicMock(return_value=mock_image)
         mock_photo = MagicMock()
+        self.gui.root.winfo_screenwidth.return_value = 2560
+        self.gui.root.winfo_screenheight.return_value = 1440
         mock_extract.return_value = mock_image
         mock_convert.return_value = mock_image
         mock_photo_image.return_value = mock_photo
@@ -150,17 +153,148 @@ class TestHDRConverterGUI(TestCase):
         # Verify adjust_gamma is called with correct gamma value
         self.gui.adjust_gamma.assert_called_once_with(mock_image, 2.2)
 
-        # Verify image resize calls
+        # Verify each pane gets a single resize to the computed layout
         mock_image.resize.assert_has_calls([
             call((960, 540), Image.Resampling.LANCZOS),
             call((960, 540), Image.Resampling.LANCZOS)
         ])
+        self.assertEqual(mock_image.resize.call_count, 2)
 
-        # Verify PhotoImage creation and label updates
-        mock_photo_image.assert_has_calls([call(mock_image), call(mock_image)])
+        # Verify persistent PhotoImages are created once and the frames pasted into them
+        mock_photo_image.assert_has_calls([call('RGB', (960, 540)), call('RGB', (960, 540))])
+        mock_photo.paste.assert_has_calls([call(mock_image), call(mock_image)])
         self.gui.original_image_label.config.assert_called_with(image=mock_photo)
         self.gui.converted_image_label.config.assert_called_with(image=mock_photo)
 
+        # A gamma-only refresh reuses the buffers and the pane-sized copies
+        self.gui.gamma_var.get.return_value = 1.5
+        self.gui.display_frames('test_input.mp4')
+        self.assertEqual(mock_photo_image.call_count, 2)
+        self.assertEqual(mock_image.resize.call_count, 2)
+        self.assertEqual(mock_convert.call_count, 1)
+        self.gui.adjust_gamma.assert_called_with(mock_image, 1.5)
+
+    @patch('src.gui.ImageTk.PhotoImage')
+    @patch('src.gui.threading.Thread')
+    @patch('src.gui.extract_frame_with_conversion')
+    @patch('src.gui.extract_frame')
+    @patch('src.gui.get_video_properties')
+    def test_progressive_preview(self, mock_get_properties, mock_extract, mock_convert, mock_thread, mock_photo_image):
+        """Test that a fast approximation is shown first and the full-quality frame swapped in."""
+        mock_get_properties.return_value = {'duration': 100.0}
+        fast_image = MagicMock(spec=Image.Image)
+        fast_image.width, fast_image.height, fast_image.mode = 480, 270, 'RGB'
+        fast_image.resize = MagicMock(return_value=fast_image)
+        full_image = MagicMock(spec=Image.Image)
+        full_image.width, full_image.height, full_image.mode = 3840, 2160, 'RGB'
+        full_image.resize = MagicMock(return_value=full_image)
+        self.gui.root.winfo_screenwidth.return_value = 2560
+        self.gui.root.winfo_screenheight.return_value = 1440
+        mock_extract.side_effect = [fast_image, full_image]
+        mock_convert.side_effect = [fast_image, full_image]
+
+        # Run the refinement thread inline and execute scheduled callbacks immediately
+        mock_thread.side_effect = lambda target, args: MagicMock(start=lambda: target(*args))
+        self.gui.root.after = MagicMock(side_effect=lambda delay, func: func())
+
+        self.gui.display_image_var = MagicMock(get=MagicMock(return_value=True))
+        self.gui.gamma_var = MagicMock(get=MagicMock(return_value=1.0))
+        self.gui.tonemap_var = MagicMock(get=MagicMock(return_value='Mobius'))
+        self.gui.input_path_var = MagicMock(get=MagicMock(return_value='test_input.mp4'))
+        self.gui.original_image_label = MagicMock()
+        self.gui.converted_image_label = MagicMock()
+        self.gui.adjust_gamma = MagicMock(side_effect=lambda image, gamma: image)
+        self.mock_string_var.get.return_value = 'Static'
+
+        self.gui.display_frames('test_input.mp4', progressive=True)
+
+        self.assertTrue(mock_convert.call_args_list[0][1]['fast'])
+        self.assertTrue(mock_extract.call_args_list[0][1]['fast'])
+        self.assertIn('cancel_event', mock_convert.call_args_list[0][1])
+        self.assertIn('cancel_event', mock_convert.call_args_list[1][1])
+        self.assertIs(self.gui.original_image, full_image)
+        self.assertIs(self.gui.converted_image_base, full_image)
+        self.assertIsNone(self.gui.pending_preview_key)
+        self.assertEqual(len(self.gui.preview_latencies['fast']), 1)
+        self.assertEqual(len(self.gui.preview_latencies['full']), 1)
+
+    @patch('src.gui.threading.Thread')
+    @patch('src.gui.extract_frame_with_conversion')
+    @patch('src.gui.extract_frame')
+    @patch('src.gui.get_video_properties')
+    def test_progressive_preview_does_not_block(self, mock_get_properties, mock_extract, mock_convert, mock_thread):
+        """Test that no frame is decoded on the UI thread and a stale approximation is dropped."""
+        mock_get_properties.return_value = {'duration': 100.0}
+        self.gui.tonemap_var = MagicMock(get=MagicMock(return_value='Mobius'))
+        self.mock_string_var.get.return_value = 'Static'
+        self.gui.show_preview_images = MagicMock()
+
+        self.gui.display_frames('test_input.mp4', progressive=True)
+        mock_extract.assert_not_called()
+        mock_convert.assert_not_called()
+        mock_thread.return_value.start.assert_called_once()
+        generation, cancel_event = mock_thread.call_args[1]['args'][:2]
+
+        # A gamma change while loading waits for the frames instead of starting over
+        self.gui.display_frames('test_input.mp4', progressive=True)
+        self.assertEqual(mock_thread.call_count, 1)
+
+        self.gui.preview_generation += 1  # The user moved on
+        self.gui.apply_fast_preview(generation, cancel_event, MagicMock(), MagicMock(), 0.0)
+        self.gui.show_preview_images.assert_not_called()
+        self.assertEqual(len(self.gui.preview_latencies['fast']), 0)
+
+    def test_stale_preview_refinement_discarded(self):
+        """Test that a refinement finishing after the user moved on is ignored."""
+        self.gui.preview_generation = 3
+        cancel_event = MagicMock(is_set=MagicMock(return_value=False))
+        stale_image = MagicMock(spec=Image.Image)
+
+        self.gui.apply_refined_preview(2, cancel_event, ('test_input.mp4', 0, 'mobius', 10.0),
+                                       stale_image, stale_image, 0.0)
+
+        self.assertIsNone(self.gui.converted_image_base)
+        self.assertEqual(len(self.gui.preview_latencies['full']), 0)
+
+    @patch('src.gui.get_video_properties')
+    @patch('src.gui.threading.Thread')
+    @patch('src.gui.detect_crop')
+    def test_conversion_waits_for_background_crop(self, mock_detect_crop, mock_thread, mock_get_properties):
+        """Test that a conversion started during crop detection runs once it finishes, without detecting again."""
+        crop = {'width': 3840, 'height': 1600, 'x': 0, 'y': 280}
+        mock_get_properties.return_value = {'width': 3840, 'height': 2160}
+        self.gui.auto_crop_var = MagicMock(get=MagicMock(return_value=True))
+        self.gui.input_path_var = MagicMock(get=MagicMock(return_value='test_input.mp4'))
+        self.gui.crop_label = MagicMock()
+        self.gui.refresh_crop_detection('test_input.mp4')
+        action = MagicMock()
+
+        self.gui.with_conversion_crop('test_input.mp4', action)
+        action.assert_not_called()
+        mock_thread.assert_called_once()  # Only the background detection
+        self.gui.apply_detected_crop('test_input.mp4', crop)
+
+        action.assert_called_once_with(crop)
+        mock_detect_crop.assert_not_called()
+        self.gui.with_conversion_crop('test_input.mp4', action)
+        self.assertEqual(action.call_count, 2)
+
+    @patch('src.gui.get_video_properties')
+    def test_timeline_click_selects_time(self, mock_get_properties):
+        """Test that clicking the timeline previews the frame under the pointer."""
+        mock_get_properties.return_value = {'duration': 100.0}
+        self.gui.input_path_var = MagicMock(get=MagicMock(return_value='test_input.mp4'))
+        self.gui.timeline_width = 1000
+        self.gui.frame_buttons = [MagicMock() for _ in range(5)]
+
+        self.gui.on_timeline_click(MagicMock(x=250))
+
+        self.assertEqual(self.gui.timeline_time, 25.0)
+        self.assertEqual(self.gui.get_preview_time_position('test_input.mp4'), 25.0)
+        self.gui.update_frame_preview.assert_called_once()
+        for btn in self.gui.frame_buttons:
+            btn.configure.assert_called_with(style='TButton')
+
     @patch('src.gui.messagebox.askyesno')
     @patch('src.gui.HDRConverterGUI.unregister_drop_target')
     @patch('src.gui.conversion_manager.start_conversion')
@@ -215,6 +349,7 @@ class TestHDRConverterGUI(TestCase):
         self.gui.open_after_conversion_var.get.return_value = True
         self.gui.gamma_var.get.return_value = 2.2
         self.gui.gpu_accel_var = MagicMock(get=MagicMock(return_value=False))
+        self.gui.auto_crop_var = MagicMock(get=MagicMock(return_value=False))
 
         mock_confirm.return_value = True
         self.gui.drop_target_registered = True
@@ -0,0 +1,79 @@
+import sys
+import os
+import shutil
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.history import JobHistory, resolution_class
+
+PARAMS = {'codec': 'h264', 'filter': 1, 'tonemapper': 'mobius', 'resource_policy': 'balanced',
+          'input_path': 'in.mkv', 'output_path': 'out.mp4', 'priority': 0}
+
+class TestJobHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history.sqlite3')
+        self.history = JobHistory(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_job(self, history, encoder, output_size, source_seconds, encode_seconds, outcome='success'):
+        job_id = history.add_job(PARAMS, argv=['ffmpeg', '-i', 'in.mkv'], output_size=output_size,
+                                 source_seconds=source_seconds, probe_seconds=0.2, analysis_seconds=1.0,
+                                 encoder=encoder)
+        history.finish_job(job_id, outcome, {'encode': encode_seconds, 'mux': 0.5}, fps=48.0,
+                           error_lines=['line'] * 30 if outcome == 'failed' else None)
+        return job_id
+
+    def test_finished_job_records_phases_and_speed(self):
+        job_id = self.run_job(self.history, 'libx264', (1920, 1080), 60.0, 30.0)
+        job = self.history.get_job(job_id)
+        self.assertEqual(job['outcome'], 'success')
+        self.assertEqual(job['resolution'], '1080p')
+        self.assertEqual(job['argv'], '["ffmpeg", "-i", "in.mkv"]')
+        self.assertEqual((job['probe_seconds'], job['analysis_seconds'], job['encode_seconds'], job['mux_seconds']),
+                         (0.2, 1.0, 30.0, 0.5))
+        self.assertAlmostEqual(job['speed'], 2.0)
+        self.history.update_job(job_id, verification={'ok': True, 'checks': {}})
+        self.assertEqual(self.history.get_job(job_id)['verification'], '{"ok": true, "checks": {}}')
+
+        failed = self.history.get_job(self.run_job(self.history, 'libx264', (1920, 1080), 60.0, 5.0, 'failed'))
+        self.assertIsNone(failed['speed'])
+        self.assertEqual(len(failed['error_tail'].splitlines()), 20)
+
+    def test_throughput_and_expected_speed_of_similar_jobs(self):
+        for encode_seconds in (30.0, 20.0, 60.0):
+            self.run_job(self.history, 'libx264', (3840, 1600), 60.0, encode_seconds)
+        self.run_job(self.history, 'h264_nvenc', (1280, 720), 60.0, 10.0)
+
+        rows = self.history.throughput(group_by=('codec', 'resolution'))
+        self.assertEqual([(row['codec'], row['resolution'], row['jobs']) for row in rows],
+                         [('h264_nvenc', '720p', 1), ('libx264', '2160p', 3)])
+        self.assertEqual(self.history.expected_speed('libx264', '2160p'), 2.0)  # Median of 2, 3 and 1
+        self.assertEqual(self.history.estimate_seconds(120.0, 'h264_nvenc', 1280, 720), 20.0)
+        self.assertIsNone(self.history.expected_speed('libx265', '2160p'))
+        with self.assertRaises(ValueError):
+            self.history.throughput(group_by=('argv',))
+
+    def test_unfinished_jobs_are_interrupted_on_reopen(self):
+        queued = self.history.add_job(PARAMS, source='server', outcome='queued')
+        self.history.add_job(PARAMS, source='gui')
+        self.run_job(self.history, 'libx264', (1920, 1080), 60.0, 30.0)
+
+        reopened = JobHistory(self.path)
+        pending = reopened.pending_jobs(source='server')
+        self.assertEqual([row['id'] for row in pending], [queued])
+        self.assertEqual(pending[0]['params'], PARAMS)
+        self.assertEqual(reopened.get_job(queued)['outcome'], 'interrupted')
+        self.assertEqual(len(reopened.pending_jobs()), 2)
+
+    def test_resolution_class(self):
+        self.assertEqual(resolution_class(3840, 2160), '2160p')
+        self.assertEqual(resolution_class(1080, 1920), '1080p')
+        self.assertEqual(resolution_class(640, 360), 'SD')
+        self.assertIsNone(resolution_class(None, None))
+
+if __name__ == '__main__':
+    unittest.main()
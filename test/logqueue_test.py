@@ -0,0 +1,96 @@
+import sys
+import os
+import shutil
+import logging
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from unittest.mock import patch
+from src.logqueue import JobLog, start_logging, stop_logging, ffmpeg_line_level, JOB_LOG_DIR
+
+class TestLogQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.directory, 'debug.log')
+        root = logging.getLogger()
+        self.saved = (list(root.handlers), root.level)
+
+    def tearDown(self):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in self.saved[0]:
+            root.addHandler(handler)
+        root.setLevel(self.saved[1])
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def test_job_lines_go_to_the_job_log_and_errors_to_both(self):
+        listener = start_logging(self.log_path, console_level=logging.CRITICAL)
+        job_log = JobLog('job 1')
+        logging.info("main message")
+        job_log.ffmpeg_line("Stream #0:0: Video: hevc")
+        job_log.error("Conversion failed")
+        stop_logging(listener)
+
+        main_log = self.read(self.log_path)
+        job_file = self.read(os.path.join(self.directory, JOB_LOG_DIR, 'job_1.log'))
+        self.assertIn("main message", main_log)
+        self.assertNotIn("Stream #0:0", main_log)
+        self.assertIn("Conversion failed", main_log)
+        self.assertIn("Stream #0:0", job_file)
+        self.assertIn("Conversion failed", job_file)
+        self.assertNotIn("main message", job_file)
+
+    def test_previous_log_is_rotated(self):
+        with open(self.log_path, 'w') as f:
+            f.write("previous session\n")
+        stop_logging(start_logging(self.log_path, console_level=logging.CRITICAL))
+        self.assertIn("previous session", self.read(self.log_path + '.1'))
+        self.assertNotIn("previous session", self.read(self.log_path))
+
+    def test_progress_lines_are_sampled(self):
+        logger = logging.getLogger('logqueue_test')
+        logger.setLevel(logging.DEBUG)
+        job_log = JobLog('job', logger=logger, interval=5.0)
+        with patch('src.logqueue.time.monotonic', side_effect=[0.0, 1.0, 2.0, 6.0]), \
+                self.assertLogs(logger, logging.DEBUG) as logs:
+            for number in range(4):
+                job_log.ffmpeg_line(f"frame={number}", progress=True)
+            job_log.ffmpeg_line("[hevc] error while decoding")
+        self.assertEqual([record.getMessage() for record in logs.records],
+                         ["frame=0", "frame=3 (2 progress lines skipped)", "[hevc] error while decoding"])
+
+        logger.setLevel(logging.INFO)
+        with patch.object(job_log, 'log') as log:
+            job_log.ffmpeg_line("frame=4", progress=True)
+        log.assert_not_called()
+
+    def test_ffmpeg_errors_and_warnings_are_kept_without_debug(self):
+        self.assertEqual(ffmpeg_line_level("[hevc @ 0x55d0] error while decoding MB 12 4"), logging.ERROR)
+        self.assertEqual(ffmpeg_line_level("Invalid data found when processing input"), logging.ERROR)
+        self.assertEqual(ffmpeg_line_level("[h264_nvenc @ 0x1] Cannot load libnvidia-encode.so.1"), logging.ERROR)
+        self.assertEqual(ffmpeg_line_level("Conversion failed!"), logging.ERROR)
+        self.assertEqual(ffmpeg_line_level("[mp4 @ 0x2] Non-monotonous DTS in output stream 0:1"), logging.WARNING)
+        self.assertEqual(ffmpeg_line_level("Stream #0:0: Video: hevc (Main 10)"), logging.DEBUG)
+
+        listener = start_logging(self.log_path, level=logging.INFO, console_level=logging.CRITICAL)
+        job_log = JobLog('job 2')
+        job_log.ffmpeg_line("Stream #0:0: Video: hevc")
+        job_log.ffmpeg_line("[mp4 @ 0x2] Non-monotonous DTS in output stream 0:1")
+        job_log.ffmpeg_line("[hevc @ 0x55d0] error while decoding MB 12 4")
+        stop_logging(listener)
+
+        main_log = self.read(self.log_path)
+        job_file = self.read(os.path.join(self.directory, JOB_LOG_DIR, 'job_2.log'))
+        for log in (main_log, job_file):
+            self.assertIn("WARNING - [mp4 @ 0x2] Non-monotonous DTS", log)
+            self.assertIn("ERROR - [hevc @ 0x55d0] error while decoding", log)
+            self.assertNotIn("Stream #0:0", log)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import sys
+import os
+import tempfile
+import urllib.request
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.metrics import (MetricsRegistry, ConversionProgress, conversion_frames, conversion_bytes, conversion_speed,
+                         conversion_active, record_job_outcome, record_queue_depth, serve_metrics,
+                         write_metrics_file)
+from src.scheduler import ScheduledJob
+
+class TestMetrics(unittest.TestCase):
+
+    def test_text_format(self):
+        registry = MetricsRegistry()
+        jobs = registry.counter('jobs_total', "Jobs.", ['outcome'])
+        latency = registry.histogram('latency_seconds', "Latency.", ['stage'], buckets=(0.1, 1.0))
+        jobs.inc(outcome='success')
+        jobs.inc(2, outcome='fail"ed')
+        latency.observe(0.05, stage='fast')
+        latency.observe(0.5, stage='fast')
+
+        text = registry.render()
+        self.assertIn('# TYPE jobs_total counter\n', text)
+        self.assertIn('jobs_total{outcome="success"} 1\n', text)
+        self.assertIn('jobs_total{outcome="fail\\"ed"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{stage="fast",le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{stage="fast",le="1.0"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{stage="fast",le="+Inf"} 2\n', text)
+        self.assertIn('latency_seconds_count{stage="fast"} 2\n', text)
+        with self.assertRaises(ValueError):
+            jobs.inc()
+
+    def test_progress_lines_add_up_across_jobs(self):
+        frames, written = conversion_frames.get(), conversion_bytes.get()
+        for _ in range(2):
+            progress = ConversionProgress()
+            progress.update("frame=   10 fps= 20 q=28.0 size=     256KiB time=00:00:00.41 bitrate=N/A speed=0.8x", 20.0)
+            progress.update("frame=   25 fps= 24 q=28.0 size=    1024kB time=00:00:01.04 bitrate=N/A speed=1.01x", 24.0)
+            progress.finish()
+        self.assertEqual(conversion_frames.get() - frames, 50)
+        self.assertEqual(conversion_bytes.get() - written, 2 * 1024 * 1024)
+        self.assertEqual(conversion_speed.get(), 1.01)
+
+    def test_active_conversions_overlap(self):
+        active = conversion_active.get()
+        first, second = ConversionProgress(), ConversionProgress()
+        self.assertEqual(conversion_active.get() - active, 2)
+        first.finish()
+        first.finish()
+        record_job_outcome('failed')  # A job that never started leaves the gauge alone
+        self.assertEqual(conversion_active.get() - active, 1)
+        second.finish()
+        self.assertEqual(conversion_active.get(), active)
+
+    def test_local_scrape_and_file(self):
+        jobs = [ScheduledJob(None, priority, sequence) for sequence, priority in enumerate((1, 0, 0))]
+        jobs[0].state = 'running'
+        jobs[2].state = 'done'
+        record_queue_depth(jobs)
+
+        server = serve_metrics(0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+                body = response.read().decode('utf-8')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('hdr_queue_jobs{state="running"} 1\n', body)
+        self.assertIn('hdr_queue_jobs{state="queued"} 1\n', body)
+        self.assertIn('# TYPE hdr_preview_latency_seconds histogram', body)
+
+        path = os.path.join(tempfile.mkdtemp(), 'hdr_converter.prom')
+        write_metrics_file(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            self.assertIn('hdr_queue_jobs{state="running"} 1', f.read())
+
+if __name__ == '__main__':
+    unittest.main()
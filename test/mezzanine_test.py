@@ -0,0 +1,64 @@
+import sys
+import os
+import time
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.mezzanine import MezzanineCache
+
+class TestMezzanineCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        with tempfile.NamedTemporaryFile(suffix='.mkv', delete=False) as f:
+            f.write(b'video')
+        self.video_path = f.name
+        self.cache = MezzanineCache(self.cache_dir, quota_bytes=250)
+
+    def tearDown(self):
+        os.remove(self.video_path)
+        for name in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, name))
+        os.rmdir(self.cache_dir)
+
+    def store(self, key, size):
+        with open(self.cache.partial_path_for(key), 'wb') as f:
+            f.write(b'\0' * size)
+        return self.cache.commit(key)
+
+    def test_key_depends_on_tonemap_settings(self):
+        key = self.cache.make_key(self.video_path, filter=1, tonemapper='mobius', gamma=1.0)
+        self.assertEqual(key, self.cache.make_key(self.video_path, gamma=1.0, tonemapper='mobius', filter=1))
+        self.assertNotEqual(key, self.cache.make_key(self.video_path, filter=1, tonemapper='mobius', gamma=1.2))
+        self.assertIsNone(self.cache.make_key('missing.mkv', filter=1))
+
+    def test_commit_and_lookup(self):
+        self.assertIsNone(self.cache.lookup('a'))
+        path = self.store('a', 10)
+        self.assertEqual(self.cache.lookup('a'), path)
+        self.assertFalse(os.path.exists(self.cache.partial_path_for('a')))
+
+    def test_discard_removes_partial(self):
+        with open(self.cache.partial_path_for('b'), 'wb') as f:
+            f.write(b'partial')
+        self.cache.discard('b')
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_least_recently_used_evicted_over_quota(self):
+        """Once over quota the entry used longest ago goes first; a lookup counts as a use."""
+        self.store('a', 100)
+        self.store('b', 100)
+        past = time.time() - 60
+        os.utime(self.cache.path_for('a'), (past - 10, past - 10))
+        os.utime(self.cache.path_for('b'), (past, past))
+        self.cache.lookup('a')
+
+        self.store('c', 100)
+
+        self.assertIsNotNone(self.cache.lookup('a'))
+        self.assertIsNone(self.cache.lookup('b'))
+        self.assertIsNotNone(self.cache.lookup('c'))
+        self.assertLessEqual(self.cache.usage(), 250)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import sys
+import os
+import io
+import tracemalloc
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from src.pipeline import (FramePipeline, ToneMapOperator, BT2390Operator, ReinhardOperator,
+                          PIPELINE_OPERATORS, register_operator, pq_eotf, pq_inverse_eotf)
+
+class CollectingPipe(io.BytesIO):
+    """stdin stand-in that keeps what was written after close()."""
+
+    def close(self):
+        self.collected = self.getvalue()
+        super().close()
+
+class TestToneMapOperators(unittest.TestCase):
+
+    def test_pq_round_trip(self):
+        nits = np.array([0.0, 1.0, 100.0, 1000.0, 10000.0])
+        np.testing.assert_allclose(pq_eotf(pq_inverse_eotf(nits)), nits, rtol=1e-6, atol=1e-6)
+
+    def test_bt2390_passes_low_luminance_through(self):
+        """Below the knee the EETF is the identity, so 10 nits stays 10 nits."""
+        operator = BT2390Operator(peak_nits=1000.0, target_nits=100.0)
+        code = int(round(pq_inverse_eotf(10.0) * 65535))
+        self.assertAlmostEqual(float(operator.linear_lut[code]), 0.1, places=2)
+        self.assertAlmostEqual(float(operator.linear_lut[-1]), 1.0, places=3)
+
+    def test_bt2390_rolls_off_from_the_source_peak(self):
+        """The source peak maps to the target white, so a brighter grade compresses 1000 nits further."""
+        code = int(round(pq_inverse_eotf(1000.0) * 65535))
+        graded_1000 = BT2390Operator(peak_nits=1000.0)
+        graded_4000 = BT2390Operator(peak_nits=4000.0)
+        self.assertAlmostEqual(float(graded_1000.linear_lut[code]), 1.0, places=2)
+        self.assertLess(float(graded_4000.linear_lut[code]), float(graded_1000.linear_lut[code]) - 0.02)
+        self.assertAlmostEqual(float(graded_4000.linear_lut[-1]), 1.0, places=3)
+        self.assertEqual(BT2390Operator(peak_nits=100.0).peak_nits, 200.0)
+
+    def test_process_keeps_grey_neutral(self):
+        operator = ReinhardOperator()
+        src = np.full((4, 6, 3), 30000, dtype=np.uint16)
+        dst = np.zeros((4, 6, 3), dtype=np.uint8)
+        operator.process(src, dst, operator.prepare(6, 4))
+        self.assertTrue(np.all(dst == dst[0, 0, 0]))
+        self.assertGreater(dst[0, 0, 0], 0)
+
+    def test_process_allocates_nothing(self):
+        """After the first frame, a 1080p frame goes through the scratch buffers without allocating."""
+        operator = BT2390Operator()
+        src = np.random.default_rng(0).integers(0, 65536, (1080, 1920, 3), dtype=np.uint16)
+        dst = np.empty((1080, 1920, 3), dtype=np.uint8)
+        scratch = operator.prepare(1920, 1080)
+        operator.process(src, dst, scratch)
+        tracemalloc.start()
+        try:
+            operator.process(src, dst, scratch)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 64 * 1024)
+
+    def test_register_operator(self):
+        @register_operator
+        class ClipOperator(ToneMapOperator):
+            name = 'test_clip'
+
+            def tone_curve(self, signal):
+                return np.clip(pq_eotf(signal) / self.target_nits, 0.0, 1.0)
+
+        try:
+            self.assertIs(PIPELINE_OPERATORS['test_clip'], ClipOperator)
+        finally:
+            del PIPELINE_OPERATORS['test_clip']
+
+class TestFramePipeline(unittest.TestCase):
+
+    @patch('src.pipeline.subprocess.Popen')
+    def test_frames_stay_in_order(self, mock_popen):
+        """Frames tonemapped by several workers reach the encoder in decode order."""
+        width, height, count = 8, 4, 12
+        frames = [np.full((height, width, 3), 4000 * i, dtype=np.uint16) for i in range(count)]
+        decoder = MagicMock()
+        decoder.stdout = io.BytesIO(b''.join(frame.tobytes() for frame in frames))
+        decoder.stderr = io.BytesIO(b'')
+        decoder.wait.return_value = 0
+        encoder = MagicMock()
+        encoder.stdin = CollectingPipe()
+        encoder.stderr = io.BytesIO(b'')
+        encoder.wait.return_value = 0
+        mock_popen.side_effect = [decoder, encoder]
+
+        progress = []
+        operator = ReinhardOperator()
+        pipeline = FramePipeline('input.mkv', 'output.mp4',
+                                 {'width': width, 'height': height, 'frame_rate': 24.0},
+                                 operator, ['-c:v', 'libx264'], workers=3, queue_depth=2,
+                                 progress_callback=progress.append)
+        pipeline.start()
+        self.assertEqual(pipeline.wait(), 0)
+
+        written = np.frombuffer(encoder.stdin.collected, dtype=np.uint8).reshape(count, height, width, 3)
+        for i, frame in enumerate(frames):
+            expected = np.zeros((height, width, 3), dtype=np.uint8)
+            operator.process(frame, expected, operator.prepare(width, height))
+            np.testing.assert_array_equal(written[i], expected)
+        self.assertEqual(progress, list(range(1, count + 1)))
+        self.assertEqual(pipeline.stats['tonemap'].frames, count)
+        self.assertIn('bottleneck', pipeline.format_stats())
+
+    def test_encoder_command_muxes_source_streams(self):
+        pipeline = FramePipeline('input.mkv', 'output.mp4',
+                                 {'width': 1920, 'height': 1080, 'frame_rate': 24.0},
+                                 BT2390Operator(), ['-c:v', 'libx264', '-crf', '23'])
+        cmd = pipeline.encoder_command()
+        self.assertEqual(cmd[cmd.index('-s') + 1], '1920x1080')
+        self.assertIn('1:a?', cmd)
+        self.assertIn('1:s?', cmd)
+        self.assertEqual(cmd[cmd.index('-c:v') + 1], 'libx264')
+        decoder_cmd = pipeline.decoder_command()
+        self.assertEqual(decoder_cmd[decoder_cmd.index('-pix_fmt') + 1], 'rgb48le')
+
+    def test_crop_shrinks_frames(self):
+        pipeline = FramePipeline('input.mkv', 'output.mp4',
+                                 {'width': 3840, 'height': 2160, 'frame_rate': 24.0},
+                                 BT2390Operator(), ['-c:v', 'libx264'],
+                                 crop={'width': 3840, 'height': 1604, 'x': 0, 'y': 278})
+        decoder_cmd = pipeline.decoder_command()
+        self.assertTrue(decoder_cmd[decoder_cmd.index('-vf') + 1].startswith('crop=3840:1604:0:278,'))
+        encoder_cmd = pipeline.encoder_command()
+        self.assertEqual(encoder_cmd[encoder_cmd.index('-s') + 1], '3840x1604')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from unittest.mock import MagicMock
+from src.proof import ProofRender, get_proof_path, get_proof_ranges
+
+def make_process(returncode=0, stderr=''):
+    process = MagicMock()
+    process.communicate.return_value = ('', stderr)
+    process.returncode = returncode
+    process.poll.return_value = returncode
+    return process
+
+class TestProofRender(unittest.TestCase):
+
+    def test_proof_ranges_stay_inside_video(self):
+        self.assertEqual(get_proof_ranges(60, clip_seconds=4, clips=2), [(20.0, 24.0), (40.0, 44.0)])
+        self.assertEqual(get_proof_ranges(60, positions=[58, -3], clip_seconds=4), [(0.0, 4.0), (56.0, 60.0)])
+        self.assertEqual(get_proof_ranges(2, positions=[1], clip_seconds=4), [(0.0, 2.0)])
+
+    def test_proof_paths(self):
+        self.assertEqual(get_proof_path(os.path.join('out', 'movie_sdr.mp4')),
+                         os.path.join('out', 'movie_sdr_proof.mp4'))
+        self.assertEqual(get_proof_path('movie_sdr.mkv', 3), 'movie_sdr_proof_03.mkv')
+
+    def test_clips_are_concatenated_in_order(self):
+        temp_dir = tempfile.mkdtemp()
+        clip_paths = [os.path.join(temp_dir, f'clip_{i}.mp4') for i in range(3)]
+        commands = [['ffmpeg', '-i', 'in.mkv', path] for path in clip_paths]
+        launch = MagicMock(side_effect=lambda cmd: make_process())
+        progress = []
+
+        proof = ProofRender(commands, clip_paths, launch, output_path='review.mp4', workers=2,
+                            progress_callback=lambda done, total: progress.append((done, total)),
+                            temp_dir=temp_dir)
+        proof.start()
+
+        self.assertEqual(proof.wait(), 0)
+        concat = launch.call_args_list[-1][0][0]
+        self.assertIn('concat', concat)
+        self.assertEqual(concat[-2:], ['review.mp4', '-y'])
+        self.assertEqual(progress[-1], (4, 4))
+        self.assertFalse(os.path.exists(temp_dir))
+
+    def test_failed_clip_skips_concat(self):
+        launch = MagicMock(side_effect=[make_process(), make_process(1, 'Invalid argument')])
+        proof = ProofRender([['a'], ['b']], ['a.mp4', 'b.mp4'], launch, output_path='review.mp4', workers=1)
+        proof.start()
+
+        self.assertEqual(proof.wait(), 1)
+        self.assertEqual(launch.call_count, 2)
+        self.assertEqual(proof.error_lines, ['Invalid argument'])
+
+if __name__ == '__main__':
+    unittest.main()
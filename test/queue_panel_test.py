@@ -0,0 +1,89 @@
+import sys
+import os
+import shutil
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from unittest.mock import MagicMock, patch
+from src.queue_panel import QueuePanel, QueueEntry, expand_paths
+from src.server import job_history
+
+class TestQueuePanel(unittest.TestCase):
+
+    def setUp(self):
+        self.history_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.history_directory, True)
+        # Keep test jobs out of the real job history
+        for name, value in (('path', os.path.join(self.history_directory, 'history.sqlite3')), ('opened', False)):
+            patcher = patch.object(job_history, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        gui = MagicMock()
+        gui.tonemap_var.get.return_value = 'Mobius'
+        gui.gamma_var.get.return_value = 1.0
+        gui.codec_var.get.return_value = 'H.264 (CPU)'
+        # The bookkeeping only; the widgets need a display
+        with patch.object(QueuePanel, 'create_widgets'), patch.object(QueuePanel, 'refresh'):
+            self.panel = QueuePanel(gui)
+        self.panel.tree = MagicMock()
+        self.panel.window = MagicMock()
+        self.panel.summary_label = MagicMock()
+
+    def tearDown(self):
+        self.panel.close()
+
+    def add_entries(self, count):
+        for index in range(count):
+            entry = QueueEntry(str(index), f'/videos/{index}.mkv', 'Mobius', 1.0, 'H.264 (CPU)')
+            entry.status = 'ready'
+            self.panel.entries[entry.id] = entry
+            self.panel.pending_rows.append(entry)
+
+    def test_rows_are_inserted_in_batches_and_only_visible_rows_redrawn(self):
+        self.add_entries(5000)
+        self.panel.insert_pending()
+        self.assertEqual(len(self.panel.order), 500)
+        while self.panel.pending_rows:
+            self.panel.insert_pending()
+
+        self.panel.tree.yview.return_value = (0.5, 0.504)  # Rows 2500 to 2520 on screen
+        self.panel.tree.item.reset_mock()
+        for item_id in self.panel.entries:
+            self.panel.mark_dirty(item_id)
+        self.panel.redraw_visible()
+        redrawn = [call.args[0] for call in self.panel.tree.item.call_args_list]
+        self.assertEqual(redrawn, [str(index) for index in range(2500, 2521)])
+        self.assertEqual(len(self.panel.dirty), 5000 - 21)
+
+        # Scrolling to the top redraws the rows that changed while they were off screen
+        self.panel.tree.yview.return_value = (0.0, 0.004)
+        self.panel.redraw_visible()
+        self.assertEqual(len(self.panel.dirty), 5000 - 42)
+
+    def test_bulk_edit_skips_started_entries(self):
+        self.add_entries(3)
+        self.panel.entries['2'].job = MagicMock()
+        self.panel.tree.selection.return_value = ('0', '2')
+        self.panel.tonemap_var = MagicMock(get=MagicMock(return_value='Hable'))
+        self.panel.gamma_var = MagicMock(get=MagicMock(return_value='2.2'))
+        self.panel.codec_var = MagicMock(get=MagicMock(return_value='H.265 (CPU)'))
+        self.panel.apply_to_selected()
+        entries = self.panel.entries
+        self.assertEqual((entries['0'].tonemapper, entries['0'].gamma, entries['0'].codec), ('Hable', 2.2, 'H.265 (CPU)'))
+        self.assertEqual(entries['1'].tonemapper, 'Mobius')
+        self.assertEqual(entries['2'].tonemapper, 'Mobius')
+        self.assertEqual(self.panel.dirty, {'0'})
+
+    def test_folders_are_expanded_to_videos(self):
+        directory = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(directory, 'season'))
+            for name in ('season/b.mkv', 'season/a.MP4', 'notes.txt', 'c.mov'):
+                open(os.path.join(directory, name), 'w').close()
+            self.assertEqual([os.path.relpath(path, directory) for path in expand_paths([directory])],
+                             ['c.mov', os.path.join('season', 'a.MP4'), os.path.join('season', 'b.mkv')])
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
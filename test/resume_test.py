@@ -0,0 +1,62 @@
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.resume import ResumeJob
+
+class TestResumeJob(unittest.TestCase):
+
+    def setUp(self):
+        self.output_path = os.path.join(tempfile.mkdtemp(), 'movie.mp4')
+        self.params = {'codec': 'h264', 'gamma': 1.0, 'source': [1000, 1]}
+
+    def write_segments(self, job, list_name, rows):
+        with open(os.path.join(job.directory, list_name), 'w', encoding='utf-8') as f:
+            for name, start, end in rows:
+                open(os.path.join(job.directory, name), 'wb').close()
+                f.write(f"{name},{start},{end}\n")
+
+    def test_resume_point_across_runs(self):
+        job = ResumeJob('movie.mkv', self.output_path, self.params, segment_seconds=60).prepare()
+        self.assertEqual(job.resume_point(), (0.0, 0))
+
+        list_name = job.start_run(0.0, 0)
+        self.write_segments(job, list_name, [('segment_00000.mkv', 0.0, 60.0),
+                                             ('segment_00001.mkv', 60.0, 120.0)])
+        # Segment 2 was being written when the run died and is not listed
+        open(os.path.join(job.directory, 'segment_00002.mkv'), 'wb').close()
+        self.assertEqual(job.resume_point(), (120.0, 2))
+
+        # The next run restarts timestamps at its seek position
+        list_name = job.start_run(120.0, 2)
+        self.write_segments(job, list_name, [('segment_00002.mkv', 0.0, 45.5)])
+        resumed = ResumeJob('movie.mkv', self.output_path, self.params, segment_seconds=60).prepare()
+        self.assertEqual(resumed.resume_point(), (165.5, 3))
+        self.assertEqual([start for _, start, _ in resumed.completed_segments()], [0.0, 60.0, 120.0])
+
+    def test_changed_settings_discard_segments(self):
+        job = ResumeJob('movie.mkv', self.output_path, self.params).prepare()
+        list_name = job.start_run(0.0, 0)
+        self.write_segments(job, list_name, [('segment_00000.mkv', 0.0, 60.0)])
+
+        changed = ResumeJob('movie.mkv', self.output_path, dict(self.params, gamma=1.2)).prepare()
+        self.assertEqual(changed.resume_point(), (0.0, 0))
+        self.assertFalse(os.path.exists(os.path.join(job.directory, 'segment_00000.mkv')))
+
+    def test_concat_command(self):
+        job = ResumeJob('movie.mkv', self.output_path, self.params, muxing='fragmented').prepare()
+        list_name = job.start_run(0.0, 0)
+        self.write_segments(job, list_name, [('segment_00000.mkv', 0.0, 60.0),
+                                             ('segment_00001.mkv', 60.0, 90.0)])
+        cmd = job.concat_command()
+        with open(os.path.join(job.directory, 'concat.txt'), encoding='utf-8') as f:
+            self.assertEqual(f.read().count('file '), 2)
+        # Video from the segments, everything else from the source
+        self.assertIn('0:v', cmd)
+        self.assertIn('1:a?', cmd)
+        self.assertIn('+frag_keyframe+empty_moov+default_base_moof', cmd)
+        self.assertEqual(cmd[-2], os.path.normpath(self.output_path))
+
+if __name__ == '__main__':
+    unittest.main()
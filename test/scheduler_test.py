@@ -0,0 +1,131 @@
+import sys
+import os
+import time
+import subprocess
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.scheduler import (PriorityScheduler, PauseClock, estimate_remaining, new_session_kwargs,
+                           suspend_process, resume_process)
+
+class FakeProcess:
+    """Stands in for a conversion; suspend/resume are recorded instead of signalled."""
+
+    def __init__(self):
+        self.returncode = None
+        self.suspended = False
+
+    def poll(self):
+        return self.returncode
+
+    def suspend(self):
+        self.suspended = True
+
+    def resume(self):
+        self.suspended = False
+
+    def terminate(self):
+        self.returncode = -15
+
+class TestPriorityScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.processes = {}
+        self.scheduler = PriorityScheduler(capacity=1)
+
+    def submit(self, name, priority=0):
+        def launch():
+            self.processes[name] = FakeProcess()
+            return self.processes[name]
+        return self.scheduler.submit(launch, priority, name)
+
+    def test_high_priority_preempts_and_low_priority_resumes(self):
+        batch = self.submit('batch', priority=0)
+        queued = self.submit('queued', priority=0)
+        self.assertEqual((batch.state, queued.state), ('running', 'queued'))
+
+        urgent = self.submit('urgent', priority=10)
+        self.assertEqual((batch.state, urgent.state), ('preempted', 'running'))
+        self.assertTrue(self.processes['batch'].suspended)
+
+        # The preempted job continues before the one that never started
+        self.processes['urgent'].returncode = 0
+        self.scheduler.schedule()
+        self.assertEqual((urgent.state, batch.state, queued.state), ('done', 'running', 'queued'))
+        self.assertFalse(self.processes['batch'].suspended)
+
+    def test_failed_launch_does_not_block_the_queue(self):
+        batch = self.submit('batch', priority=0)
+        queued = self.submit('queued', priority=0)
+        changes = []
+        self.scheduler.on_change = lambda job: changes.append((job.name, job.state))
+
+        def launch():
+            raise OSError("ffmpeg not found")
+        broken = self.scheduler.submit(launch, 10, 'broken')
+        self.assertEqual(broken.state, 'failed')
+        self.assertIsInstance(broken.error, OSError)
+        # The job preempted for it has its slot back
+        self.assertEqual((batch.state, queued.state), ('running', 'queued'))
+        self.assertIn(('broken', 'failed'), changes)
+
+        self.processes['batch'].returncode = 0
+        self.scheduler.schedule()
+        self.assertEqual(queued.state, 'running')
+        self.scheduler.cancel(broken)
+        self.assertEqual(broken.state, 'failed')
+
+    def test_equal_priority_does_not_preempt(self):
+        first = self.submit('first', priority=5)
+        second = self.submit('second', priority=5)
+        self.assertEqual((first.state, second.state), ('running', 'queued'))
+
+    def test_user_pause_frees_the_slot(self):
+        first = self.submit('first')
+        second = self.submit('second')
+        self.scheduler.pause(first)
+        self.assertEqual((first.state, second.state), ('paused', 'running'))
+
+        self.scheduler.resume(first)
+        self.assertEqual(first.state, 'preempted')  # Waits for the slot
+        self.processes['second'].returncode = 0
+        self.scheduler.schedule()
+        self.assertEqual(first.state, 'running')
+
+        self.scheduler.cancel(first)
+        self.assertEqual(first.state, 'cancelled')
+        self.assertEqual(self.processes['first'].returncode, -15)
+
+class TestPauseClock(unittest.TestCase):
+
+    def test_remaining_time_excludes_pauses(self):
+        clock = PauseClock()
+        clock.started = 100.0
+        clock.paused_at = 110.0
+        # 10 s running, then paused for 50 s: a quarter done means 30 s left, not 180 s
+        self.assertEqual(clock.active_seconds(now=160.0), 10.0)
+        self.assertAlmostEqual(estimate_remaining(25, 100, clock.active_seconds(now=160.0)), 30.0)
+        self.assertIsNone(estimate_remaining(0, 100, 5.0))
+
+    @unittest.skipIf(sys.platform == "win32", "Process states are read from /proc")
+    def test_suspend_and_resume_process_group(self):
+        if not os.path.exists('/proc/self/stat'):
+            self.skipTest("Needs /proc")
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'],
+                                   **new_session_kwargs())
+
+        def state():
+            with open(f'/proc/{process.pid}/stat') as f:
+                return f.read().rsplit(')', 1)[1].split()[0]
+        try:
+            suspend_process(process)
+            time.sleep(0.1)
+            self.assertEqual(state(), 'T')
+            resume_process(process)
+            time.sleep(0.1)
+            self.assertIn(state(), ('S', 'R'))
+        finally:
+            process.kill()
+            process.wait()
+
+if __name__ == '__main__':
+    unittest.main()
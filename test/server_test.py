@@ -0,0 +1,146 @@
+import sys
+import os
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import threading
+import subprocess
+import http.client
+from unittest.mock import patch
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.server import JobServer, parse_job_params, job_history
+
+PROPERTIES = {'width': 320, 'height': 180, 'bit_rate': 0, 'codec_name': 'ffv1', 'frame_rate': 24.0,
+              'duration': 2.0, 'audio_codec': '', 'audio_bit_rate': 0, 'subtitle_streams': []}
+
+class TestJobParams(unittest.TestCase):
+
+    def test_defaults_and_validation(self):
+        params = parse_job_params({'input_path': 'in.mkv', 'output_path': 'out.mp4', 'filter': 'Static',
+                                   'resolution': [1280, 720], 'priority': '3'})
+        self.assertEqual(params['filter'], 0)
+        self.assertEqual(params['tonemapper'], 'mobius')
+        self.assertEqual(params['resolution'], (1280, 720))
+        self.assertEqual(params['priority'], 3)
+        for body in ({'input_path': 'in.mkv'}, {'input_path': 'a', 'output_path': 'b', 'codec': 'vp9'},
+                     {'input_path': 'a', 'output_path': 'b', 'speed': 2}, ['a', 'b']):
+            with self.assertRaises(ValueError):
+                parse_job_params(body)
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "Converts a generated clip with FFmpeg")
+class TestJobServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.input_path = os.path.join(cls.directory, 'hdr.mkv')
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=24:duration=2',
+                        '-vf', 'format=yuv420p10le', '-c:v', 'ffv1', '-color_primaries', 'bt2020',
+                        '-color_trc', 'smpte2084', '-colorspace', 'bt2020nc', cls.input_path, '-y'], check=True)
+
+    def setUp(self):
+        self.history_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.history_directory, True)
+        # Keep test jobs out of the real job history
+        for name, value in (('path', os.path.join(self.history_directory, 'history.sqlite3')), ('opened', False)):
+            patcher = patch.object(job_history, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.probe = patch('src.server.get_video_properties', return_value=dict(PROPERTIES))
+        self.probe.start()
+        self.loop = asyncio.new_event_loop()
+        self.job_server = JobServer(capacity=1)
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.job_server.start(port=0))
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait(5)
+        self.port = self.job_server.server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        for job in self.job_server.jobs.values():
+            if job.scheduled is not None:
+                self.job_server.scheduler.cancel(job.scheduled)
+        async def shutdown():
+            self.job_server.close()
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        self.probe.stop()
+
+    def request(self, method, path, body=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        payload = response.read().decode('utf-8')
+        connection.close()
+        return response.status, json.loads(payload)
+
+    def submit(self, name, **params):
+        body = dict(input_path=self.input_path, output_path=os.path.join(self.directory, f'{name}.mp4'),
+                    filter='static', name=name, **params)
+        status, job = self.request('POST', '/jobs', body)
+        self.assertEqual(status, 201)
+        return job
+
+    def wait_for(self, job_id, states, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            _, job = self.request('GET', f'/jobs/{job_id}')
+            if job['state'] in states:
+                return job
+            time.sleep(0.05)
+        self.fail(f"Job {job_id} stayed {job['state']}")
+
+    def test_submit_and_follow_events(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        connection.request('GET', '/events')
+        events = connection.getresponse()
+        self.assertEqual(events.headers['Content-Type'], 'text/event-stream')
+
+        job = self.submit('first')
+        finished = None
+        while finished is None:
+            line = events.readline().decode('utf-8').strip()
+            if line.startswith('data: '):
+                data = json.loads(line[6:])
+                if data['id'] == job['id'] and data['state'] in ('done', 'failed'):
+                    finished = data
+        connection.close()
+        self.assertEqual(finished['state'], 'done', finished['error'])
+        self.assertEqual(finished['progress'], 100.0)
+        self.assertTrue(os.path.getsize(os.path.join(self.directory, 'first.mp4')) > 0)
+
+    def test_cancel_pause_and_priority(self):
+        blocker = self.submit('blocker', start=0, end=2, priority=10)  # Stays ahead of the raised priority
+        queued = self.submit('queued')
+        self.wait_for(blocker['id'], ('running', 'done'))
+        self.wait_for(queued['id'], ('queued', 'running', 'done'))
+
+        status, job = self.request('POST', f"/jobs/{queued['id']}/priority", {'priority': 7})
+        self.assertEqual(status, 200)
+        self.assertEqual(job['priority'], 7)
+        self.assertEqual(self.request('POST', f"/jobs/{queued['id']}/cancel")[1]['state'], 'cancelled')
+        self.assertEqual(self.request('GET', '/jobs?state=cancelled')[1]['jobs'][0]['id'], queued['id'])
+
+        self.assertEqual(self.request('GET', '/jobs/999')[0], 404)
+        self.assertEqual(self.request('POST', '/jobs', {'input_path': 'x'})[0], 400)
+        self.wait_for(blocker['id'], ('done',))
+
+if __name__ == '__main__':
+    unittest.main()
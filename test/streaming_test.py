@@ -0,0 +1,53 @@
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.streaming import (GrowingFile, stream_output_args, is_stream_output, normalize_output_path,
+                           make_fifo)
+
+class TestStreamOutputs(unittest.TestCase):
+
+    def test_stream_output_args(self):
+        self.assertEqual(stream_output_args('-'), ['-f', 'matroska', 'pipe:1'])
+        self.assertEqual(stream_output_args('tcp://127.0.0.1:9000?listen=1'),
+                         ['-f', 'matroska', 'tcp://127.0.0.1:9000?listen=1'])
+        self.assertEqual(stream_output_args('next_stage.ts'), ['-f', 'mpegts', 'next_stage.ts'])
+        self.assertIn('+frag_keyframe+empty_moov+default_base_moof', stream_output_args('out.mp4'))
+        self.assertEqual(normalize_output_path('tcp://127.0.0.1:9000'), 'tcp://127.0.0.1:9000')
+
+    @unittest.skipUnless(hasattr(os, 'mkfifo'), "FIFOs need POSIX")
+    def test_fifo_is_stream_output(self):
+        path = os.path.join(tempfile.mkdtemp(), 'out.mkv')
+        self.assertFalse(is_stream_output(path))
+        make_fifo(path)
+        self.assertTrue(is_stream_output(path))
+
+class TestGrowingFile(unittest.TestCase):
+
+    def test_progress_against_declared_size(self):
+        path = os.path.join(tempfile.mkdtemp(), 'master.mkv')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 1000)
+        # The probe saw 10 seconds in the first 1000 bytes
+        growing = GrowingFile(path, {'duration': 10.0}, declared_size=4000, poll_seconds=0.01).start()
+        self.assertAlmostEqual(growing.estimate_duration(), 40.0)
+
+        with open(path, 'ab') as f:
+            f.write(b'\0' * 3000)
+        self.assertTrue(growing.complete.wait(5))
+        self.assertFalse(growing.truncated)
+        self.assertEqual(growing.size, 4000)
+
+    def test_stalled_transfer_is_truncated(self):
+        path = os.path.join(tempfile.mkdtemp(), 'master.mkv')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 1000)
+        growing = GrowingFile(path, {'bit_rate': 8000}, declared_size=4000, idle_seconds=0.05,
+                              poll_seconds=0.01).start()
+        self.assertAlmostEqual(growing.estimate_duration(), 4.0)
+        self.assertTrue(growing.complete.wait(5))
+        self.assertTrue(growing.truncated)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import sys
+import os
+import json
+import tempfile
+import subprocess
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from src.tracing import tracer, traced, TracedPopen
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.trace_path = os.path.join(tempfile.mkdtemp(), 'trace.json')
+        tracer.events.clear()
+        tracer.enable(self.trace_path)
+
+    def tearDown(self):
+        tracer.disable()
+        tracer.events.clear()
+        tracer.last_action = None
+
+    def load_events(self):
+        tracer.save()
+        with open(self.trace_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['traceEvents']
+
+    def test_subprocess_span_is_attributed_to_action(self):
+        self.assertIs(subprocess.Popen, TracedPopen)
+
+        @traced('convert_video', action=True)
+        def handler():
+            burn = 'import time\nend = time.process_time() + 0.05\nwhile time.process_time() < end: pass'
+            return subprocess.run([sys.executable, '-c', burn], capture_output=True).returncode
+
+        self.assertEqual(handler(), 0)
+        events = self.load_events()
+        child = next(e for e in events if e.get('cat') == 'subprocess')
+        self.assertIn('-c', child['args']['argv'])
+        self.assertEqual(child['args']['exit_code'], 0)
+        self.assertEqual(child['args']['action'], 'convert_video')
+        self.assertGreaterEqual(child['args']['spawn_ms'], 0)
+        if sys.platform != "win32":
+            self.assertGreaterEqual(child['args']['cpu_user_s'] + child['args']['cpu_system_s'], 0.04)
+            self.assertGreater(child['args']['max_rss_kb'], 0)
+
+        action = next(e for e in events if e.get('cat') == 'ui')
+        self.assertEqual(action['name'], 'convert_video')
+        self.assertLessEqual(action['ts'], child['ts'])
+        self.assertGreaterEqual(action['ts'] + action['dur'], child['ts'] + child['dur'] - 1)
+        self.assertIn({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': child['tid'],
+                       'args': {'name': f"{child['name']} {child['tid']}"}}, events)
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer.disable()
+        self.assertIsNot(subprocess.Popen, TracedPopen)
+        with tracer.span('probe') as args:
+            args['frames'] = 1
+        subprocess.run([sys.executable, '-c', 'pass'])
+        self.assertEqual(tracer.events, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,19 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 import unittest
 from unittest.mock import patch, MagicMock, ANY
 from src.utils import get_video_properties, run_ffmpeg_command, extract_frame, extract_frame_with_conversion
+from src.utils import FFmpegCancelled, PREVIEW_FAST_WIDTH, generate_thumbnail_sprite, detect_crop
+from src.utils import plan_output_size, build_filter_graph, choose_muxing, FASTSTART_MAX_BYTES
+from src.utils import get_hdr_peak, HDR_DEFAULT_PEAK_NITS
 import subprocess  
 from PIL import Image  # Added import
 import json  # Ensure json is imported
+import io
+import os
+import tempfile
+import threading
 
 # Constants
 FFMPEG_EXECUTABLE = 'c:\\Users\\Torin\\Desktop\\HDR to SDR\\src\\ffmpeg.exe'
@@ -50,7 +60,9 @@ class TestGetVideoProperties(unittest.TestCase):
             "audio_codec": "aac",
             "audio_bit_rate": 128000,
             "duration": 600.0,
-            "subtitle_streams": []  # Added this line
+            "subtitle_streams": [],  # Added this line
+            "color_transfer": "",
+            "color_primaries": ""
         }
 
         properties = get_video_properties(input_file)
@@ -109,10 +121,35 @@ class TestGetVideoProperties(unittest.TestCase):
                     "codec_name": "srt",
                     "index": 2
                 }
-            ]
+            ],
+            "color_transfer": "",
+            "color_primaries": ""
         }
         self.assertEqual(properties, expected_properties)
 
+    @patch('src.utils.subprocess.Popen')
+    def test_get_video_properties_cached_per_fingerprint(self, mock_popen):
+        """A second probe of an unchanged file is served from the cache."""
+        mock_process = mock_popen.return_value
+        mock_process.communicate.return_value = (json.dumps({
+            "streams": [{"codec_type": "video", "width": 3840, "height": 2160,
+                         "codec_name": "hevc", "avg_frame_rate": "24/1"}],
+            "format": {"duration": "60.0"}
+        }).encode('utf-8'), b'')
+        mock_process.returncode = 0
+
+        with tempfile.NamedTemporaryFile(suffix='.mkv', delete=False) as f:
+            f.write(b'video')
+        try:
+            first = get_video_properties(f.name)
+            second = get_video_properties(f.name)
+        finally:
+            os.remove(f.name)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first['width'], 3840)
+        mock_popen.assert_called_once()
+
 class TestRunFfmpegCommand(unittest.TestCase):
 
     @patch('subprocess.Popen')
@@ -135,6 +172,21 @@ class TestRunFfmpegCommand(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             run_ffmpeg_command(['ffmpeg', '-i', 'input.mp4', 'output.mkv'])
 
+    @patch('subprocess.Popen')
+    def test_run_ffmpeg_command_cancelled(self, mock_popen):
+        mock_process = MagicMock()
+        mock_process.communicate.side_effect = [
+            subprocess.TimeoutExpired('ffmpeg', 0.05),
+            (b'', b'')
+        ]
+        mock_popen.return_value = mock_process
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        with self.assertRaises(FFmpegCancelled):
+            run_ffmpeg_command(['ffmpeg', '-i', 'input.mp4', '-'], cancel_event=cancel_event)
+        mock_process.kill.assert_called_once()
+
 class TestExtractFrame(unittest.TestCase):
 
     @patch('src.utils.run_ffmpeg_command')
@@ -169,7 +221,7 @@ class TestExtractFrame(unittest.TestCase):
         mock_run_ffmpeg.assert_called_once_with([
             ANY, '-ss', str(expected_time), '-i', 'input.mp4',
             '-vframes', '1', '-f', 'image2pipe', '-'
-        ])
+        ], cancel_event=None)
 
     @patch('subprocess.Popen')
     def test_extract_frame_failure(self, mock_popen):
@@ -228,7 +280,7 @@ class TestExtractFrameWithConversion(unittest.TestCase):
             frame = extract_frame_with_conversion('input.mp4', gamma, filter_index=1)  # Added filter_index
             
             # Update the expected_vf string to match actual format
-            expected_vf = 'zscale=t=linear:npl=100.0,tonemap=reinhard,zscale=t=bt709:m=bt709:r=tv:p=bt709,eq=gamma=2.2,scale=iw:ih'
+            expected_vf = 'zscale=t=linear:npl=100.0,tonemap=reinhard,zscale=t=bt709:m=bt709:r=tv:p=bt709,eq=gamma=2.2'
             
             self.assertIsInstance(frame, Image.Image)
     
@@ -244,6 +296,27 @@ class TestExtractFrameWithConversion(unittest.TestCase):
                 '-vf', expected_vf, '-vframes', '1', '-f', 'image2pipe', '-'
             ])
 
+    @patch('src.utils.run_ffmpeg_command')
+    @patch('src.utils.get_video_properties')
+    def test_extract_frame_with_conversion_fast(self, mock_get_props, mock_run_ffmpeg):
+        """The fast preview decodes keyframes only and tonemaps a small approximation."""
+        mock_get_props.return_value = {"duration": 90.0}
+        mock_run_ffmpeg.return_value = (
+            b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01'
+            b'\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde\x00'
+            b'\x00\x00\nIDATx\xdac\xf8\x0f\x00\x01\x01\x01\x00'
+            b'\x18\xdd\x8d\x1b\x00\x00\x00\x00IEND\xaeB`\x82'
+        )
+
+        frame = extract_frame_with_conversion('input.mp4', 1.0, filter_index=0, time_position=10.0, fast=True)
+
+        self.assertIsInstance(frame, Image.Image)
+        actual_args = mock_run_ffmpeg.call_args[0][0]
+        self.assertEqual(actual_args[1:6], ['-noaccurate_seek', '-skip_frame', 'nokey', '-ss', '10.0'])
+        vf = actual_args[actual_args.index('-vf') + 1]
+        self.assertTrue(vf.startswith(f'scale={PREVIEW_FAST_WIDTH}:-2:flags=fast_bilinear,'))
+        self.assertIn('tonemap=reinhard', vf)
+
     @patch('src.utils.run_ffmpeg_command')
     @patch('src.utils.get_maxfall')  # Added patch for get_maxfall
     def test_extract_frame_with_conversion_failure(self, mock_run_ffmpeg, mock_get_maxfall):
@@ -270,6 +343,152 @@ class TestExtractFrameWithConversion(unittest.TestCase):
             with self.assertRaises(RuntimeError):
                 extract_frame_with_conversion('input.mp4', gamma=2.2, filter_index=1)  # Added gamma and filter_index
 
+class TestGetHdrPeak(unittest.TestCase):
+
+    @staticmethod
+    def probe_output(*side_data):
+        return json.dumps({'frames': [{'side_data_list': list(side_data)}]}).encode('utf-8')
+
+    @patch('src.utils.subprocess.check_output')
+    def test_peak_from_metadata(self, mock_check_output):
+        """MaxCLL wins over a brighter mastering display; either alone is used; neither gives the default."""
+        mastering = {'side_data_type': 'Mastering display metadata', 'max_luminance': '40000000/10000'}
+        light_level = {'side_data_type': 'Content light level metadata', 'max_content': 1500, 'max_average': 400}
+        mock_check_output.return_value = self.probe_output(mastering, light_level)
+        self.assertEqual(get_hdr_peak('missing.mkv'), 1500.0)
+        mock_check_output.return_value = self.probe_output(mastering)
+        self.assertEqual(get_hdr_peak('missing.mkv'), 4000.0)
+        mock_check_output.return_value = self.probe_output(dict(light_level, max_content=0))
+        self.assertEqual(get_hdr_peak('missing.mkv'), HDR_DEFAULT_PEAK_NITS)
+
+class TestGenerateThumbnailSprite(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        with tempfile.NamedTemporaryFile(suffix='.mkv', delete=False) as f:
+            f.write(b'video')
+        self.video_path = f.name
+
+    def tearDown(self):
+        os.remove(self.video_path)
+        for name in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, name))
+        os.rmdir(self.cache_dir)
+
+    @patch('src.utils.get_cache_dir')
+    @patch('src.utils.run_ffmpeg_command')
+    @patch('src.utils.get_video_properties')
+    def test_single_pass_and_cached(self, mock_get_props, mock_run_ffmpeg, mock_cache_dir):
+        """All thumbnails come from one tiled FFmpeg pass and are reused from disk afterwards."""
+        mock_get_props.return_value = {"duration": 100.0}
+        mock_cache_dir.return_value = self.cache_dir
+        sprite_bytes = io.BytesIO()
+        Image.new('RGB', (40, 6)).save(sprite_bytes, format='PNG')
+        mock_run_ffmpeg.return_value = sprite_bytes.getvalue()
+
+        sprite = generate_thumbnail_sprite(self.video_path, 0, 'Mobius', count=4, thumb_width=10)
+        cached = generate_thumbnail_sprite(self.video_path, 0, 'Mobius', count=4, thumb_width=10)
+
+        self.assertEqual(sprite.size, (40, 6))
+        self.assertEqual(cached.size, (40, 6))
+        mock_run_ffmpeg.assert_called_once()
+        cmd = mock_run_ffmpeg.call_args[0][0]
+        self.assertEqual(cmd[1:3], ['-skip_frame', 'nokey'])
+        vf = cmd[cmd.index('-vf') + 1]
+        self.assertTrue(vf.startswith('fps=0.04,scale=10:-2'))
+        self.assertIn('tonemap=mobius', vf)
+        self.assertTrue(vf.endswith('tile=4x1'))
+
+class TestDetectCrop(unittest.TestCase):
+
+    @staticmethod
+    def cropdetect_log(*boxes):
+        lines = [f'[Parsed_cropdetect_0 @ 0x0] x1:{x1} x2:{x2} y1:{y1} y2:{y2} w:0 h:0 x:0 y:0 pts:0 t:0 crop=0:0:0:0'
+                 for x1, x2, y1, y2 in boxes]
+        return '\n'.join(lines).encode('utf-8')
+
+    @patch('src.utils.run_ffmpeg_command')
+    @patch('src.utils.get_video_properties')
+    def test_union_of_samples_aligned_for_chroma(self, mock_get_props, mock_run_ffmpeg):
+        """The crop covers every sampled picture area, ignores black frames and has even offsets and size."""
+        mock_get_props.return_value = {"width": 1920, "height": 1080, "duration": 100.0}
+        logs = [
+            self.cropdetect_log((0, 1919, 140, 939)),
+            self.cropdetect_log((1919, 0, 1079, 0)),  # fully black frame
+            self.cropdetect_log((0, 1919, 139, 940), (0, 1919, 141, 938)),
+            self.cropdetect_log(),
+        ]
+        mock_run_ffmpeg.side_effect = [(b'', log) for log in logs]
+
+        crop = detect_crop('missing.mkv', samples=4, sample_seconds=2)
+
+        self.assertEqual(crop, {'width': 1920, 'height': 804, 'x': 0, 'y': 138})
+        self.assertEqual(mock_run_ffmpeg.call_count, 4)
+        cmd = mock_run_ffmpeg.call_args[0][0]
+        self.assertTrue(cmd[cmd.index('-vf') + 1].startswith('cropdetect='))
+        self.assertTrue(mock_run_ffmpeg.call_args[1]['capture_stderr'])
+
+    @patch('src.utils.run_ffmpeg_command')
+    @patch('src.utils.get_video_properties')
+    def test_full_frame_returns_none(self, mock_get_props, mock_run_ffmpeg):
+        mock_get_props.return_value = {"width": 1920, "height": 1080, "duration": 100.0}
+        mock_run_ffmpeg.return_value = (b'', self.cropdetect_log((0, 1919, 2, 1077)))
+
+        self.assertIsNone(detect_crop('missing.mkv', samples=2))
+
+    @patch('src.utils.run_ffmpeg_command')
+    @patch('src.utils.get_video_properties')
+    def test_crop_applied_first_in_preview(self, mock_get_props, mock_run_ffmpeg):
+        mock_get_props.return_value = {"width": 1920, "height": 1080, "duration": 90.0}
+        png = io.BytesIO()
+        Image.new('RGB', (4, 2)).save(png, format='PNG')
+        mock_run_ffmpeg.return_value = png.getvalue()
+        crop = {'width': 1920, 'height': 800, 'x': 0, 'y': 140}
+
+        extract_frame_with_conversion('input.mp4', 1.0, filter_index=0, time_position=10.0, fast=True, crop=crop)
+        vf = mock_run_ffmpeg.call_args[0][0][mock_run_ffmpeg.call_args[0][0].index('-vf') + 1]
+        self.assertTrue(vf.startswith('crop=1920:800:0:140,scale='))
+
+        extract_frame('input.mp4', time_position=10.0, crop=crop)
+        cmd = mock_run_ffmpeg.call_args[0][0]
+        self.assertEqual(cmd[cmd.index('-vf') + 1], 'crop=1920:800:0:140')
+
+class TestChooseMuxing(unittest.TestCase):
+
+    @patch('src.utils.is_network_path', return_value=False)
+    def test_auto_muxing(self, mock_network):
+        self.assertEqual(choose_muxing('out.mp4', 2 * 1024 ** 3), 'faststart')
+        self.assertEqual(choose_muxing('out.mp4', FASTSTART_MAX_BYTES), 'fragmented')
+        self.assertEqual(choose_muxing('out.mkv', FASTSTART_MAX_BYTES), 'plain')
+        self.assertEqual(choose_muxing('out.mp4', FASTSTART_MAX_BYTES, 'Faststart'), 'faststart')
+        mock_network.return_value = True
+        self.assertEqual(choose_muxing('out.mp4', 1024), 'fragmented')
+
+class TestFilterGraphPlanner(unittest.TestCase):
+
+    def test_plan_output_size(self):
+        self.assertEqual(plan_output_size(3840, 2160, '1080p'), (1920, 1080))
+        self.assertEqual(plan_output_size(3840, 1604, '1080p'), (1920, 802))
+        self.assertEqual(plan_output_size(2160, 3840, '1080p'), (1080, 1920))
+        self.assertEqual(plan_output_size(1920, 1080, '2160p'), (1920, 1080))  # never upscales
+        self.assertEqual(plan_output_size(1920, 1080, 'Source'), (1920, 1080))
+        self.assertEqual(plan_output_size(1920, 1080, (1280, 720)), (1280, 720))
+
+    def test_downscale_precedes_tonemap(self):
+        graph = build_filter_graph(1, 2.2, 'Mobius', npl=100.0, crop={'width': 3840, 'height': 1604, 'x': 0, 'y': 278},
+                                   source_size=(3840, 1604), output_size=(1920, 802))
+        stages = graph.split(',')
+        self.assertEqual(stages[0], 'crop=3840:1604:0:278')
+        self.assertEqual(stages[1], 'zscale=w=1920:h=802:filter=spline36')
+        self.assertEqual(stages[2], 'format=yuv420p16le')
+        self.assertEqual(stages[3], 'zscale=t=linear:npl=100.0')
+        self.assertIn('tonemap=mobius', stages)
+        self.assertNotIn('scale=', stages[-1])
+
+    def test_unchanged_size_has_no_scale(self):
+        graph = build_filter_graph(0, 1.0, 'reinhard', source_size=(1920, 1080), output_size=(1920, 1080))
+        self.assertEqual(graph, 'zscale=primaries=bt709:transfer=bt709:matrix=bt709,tonemap=reinhard,eq=gamma=1.0')
+
 if __name__ == '__main__':
     unittest.main()
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import sys
+import os
+import shutil
+import tempfile
+import subprocess
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from unittest.mock import patch
+from src.verification import verify_output, segment_starts, check_frames, check_streams
+
+def make_probe(duration, frames, audio=1, subtitles=0):
+    streams = [{'codec_type': 'video', 'duration': str(duration), 'nb_read_packets': str(frames)}]
+    streams += [{'codec_type': 'audio'}] * audio + [{'codec_type': 'subtitle'}] * subtitles
+    return {'streams': streams, 'format': {'duration': str(duration)}}
+
+class TestVerificationChecks(unittest.TestCase):
+
+    def test_segment_starts_cover_both_ends(self):
+        self.assertEqual(segment_starts(10.0, segments=8, seconds=2), [0.0])
+        self.assertEqual(segment_starts(62.0, segments=4, seconds=2), [0.0, 20.0, 40.0, 60.0])
+
+    def test_missing_frames_and_streams_are_reported(self):
+        self.assertTrue(check_frames(make_probe(10.0, 240), 10.0, 24.0)['ok'])
+        self.assertFalse(check_frames(make_probe(9.0, 216), 10.0, 24.0)['ok'])
+        source = make_probe(10.0, 240, audio=2, subtitles=1)
+        self.assertTrue(check_streams(make_probe(10.0, 240, audio=2, subtitles=1), source)['ok'])
+        result = check_streams(make_probe(10.0, 240, audio=1, subtitles=1), source)
+        self.assertFalse(result['ok'])
+        self.assertIn("1 audio of 2", result['detail'])
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "Decodes a generated clip with FFmpeg")
+class TestVerifyOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.directory, 'output.mkv')
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=24:duration=20',
+                        '-f', 'lavfi', '-i', 'sine=duration=20', '-c:v', 'libx264', '-preset', 'ultrafast',
+                        '-c:a', 'aac', '-shortest', self.output_path], check=True)
+        probe = make_probe(20.0, 480)
+        self.patcher = patch('src.verification.run_ffprobe', side_effect=lambda path, count_packets=False: probe)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def test_clean_output_passes(self):
+        result = verify_output(self.output_path, 'source.mkv', 20.0, 24.0, segments=4, workers=2)
+        self.assertTrue(result['ok'], result['checks'])
+        self.assertEqual(set(result['checks']), {'decode', 'duration', 'frames', 'streams'})
+        self.assertIn("4 segments decoded cleanly", result['checks']['decode']['detail'])
+
+    def test_corrupt_segment_fails_decode(self):
+        size = os.path.getsize(self.output_path)
+        with open(self.output_path, 'r+b') as f:
+            f.seek(size // 2)
+            f.write(os.urandom(size // 8))
+        result = verify_output(self.output_path, 'source.mkv', 20.0, 24.0, segments=4, workers=2)
+        self.assertFalse(result['ok'])
+        self.assertFalse(result['checks']['decode']['ok'])
+        self.assertTrue(result['checks']['duration']['ok'])
+
+if __name__ == '__main__':
+    unittest.main()
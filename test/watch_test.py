@@ -0,0 +1,126 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import unittest
+from unittest.mock import patch
+from src.watch import WatchFolder, WatchDaemon, StabilityTracker, InotifyWatcher, load_config, is_hdr, job_history
+
+class TestWatchFolders(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'ingest')
+        self.destination = os.path.join(self.directory, 'out')
+        os.makedirs(os.path.join(self.source, 'show'))
+        # Keep test jobs out of the real job history
+        for name, value in (('path', os.path.join(self.directory, 'history.sqlite3')), ('opened', False)):
+            patcher = patch.object(job_history, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, path, data=b'video'):
+        with open(path, 'ab') as f:
+            f.write(data)
+
+    def test_files_are_taken_once_they_stop_changing(self):
+        path = os.path.join(self.source, 'movie.mkv')
+        self.write(path)
+        tracker = StabilityTracker(stable_seconds=10)
+        tracker.touch(path)
+        self.assertEqual(tracker.check(now=100), [])
+        self.write(path)  # Still being copied
+        self.assertEqual(tracker.check(now=105), [])
+        self.assertEqual(tracker.check(now=114), [])
+        self.assertEqual(tracker.check(now=115), [path])
+        self.assertEqual(tracker.candidates, {})
+
+        tracker.touch(path)
+        os.remove(path)
+        self.assertEqual(tracker.check(now=200), [])
+        self.assertEqual(tracker.candidates, {})
+
+    def test_config_presets_and_output_mapping(self):
+        config_path = os.path.join(self.directory, 'watch.json')
+        with open(config_path, 'w') as f:
+            json.dump({'folders': [{'path': self.source, 'destination': self.destination,
+                                    'preset': {'tonemapper': 'hable', 'codec': 'h265'}}]}, f)
+        folder, = load_config(config_path)
+        self.assertEqual(folder.preset, {'tonemapper': 'hable', 'codec': 'h265'})
+        input_path = os.path.join(self.source, 'show', 'episode.mkv')
+        self.assertTrue(folder.contains(input_path))
+        self.assertEqual(folder.output_path(input_path), os.path.join(self.destination, 'show', 'episode.mkv'))
+        self.assertFalse(WatchFolder(self.source, self.destination, recursive=False).contains(input_path))
+
+        with self.assertRaises(ValueError):
+            WatchFolder(self.source, self.destination, {'input_path': 'other.mkv'})
+        with self.assertRaises(ValueError):
+            WatchFolder(self.source, os.path.join(self.source, 'out'))
+        with self.assertRaises(ValueError):
+            WatchFolder(self.source, self.destination, {'codec': 'mpeg2'})
+
+    def test_only_new_hdr_sources_are_enqueued(self):
+        for name in ('hdr.mkv', 'sdr.mkv', 'done.mkv', 'partial.mkv', 'notes.txt'):
+            self.write(os.path.join(self.source, 'show', name))
+        os.makedirs(os.path.join(self.destination, 'show'))
+        # Both newer than their sources, but only done.mkv was written by a successful conversion
+        for name in ('done.mkv', 'partial.mkv'):
+            output_path = os.path.join(self.destination, 'show', name)
+            self.write(output_path)
+            job_id = job_history.add_job({'codec': 'h264'}, input_path=os.path.join(self.source, 'show', name),
+                                         output_path=output_path, source='watch')
+            job_history.finish_job(job_id, 'success' if name == 'done.mkv' else 'failed')
+
+        def probe(path):
+            transfer = 'bt709' if path.endswith('sdr.mkv') else 'smpte2084'
+            return {'color_transfer': transfer, 'duration': 10.0, 'width': 3840, 'height': 2160}
+        daemon = WatchDaemon([WatchFolder(self.source, self.destination)], stable_seconds=0, use_inotify=False)
+        try:
+            with patch('src.watch.get_video_properties', side_effect=probe), \
+                    patch('src.watch.ServerJob.prepare') as prepare, \
+                    patch.object(daemon.scheduler, 'submit') as submit:
+                daemon.scan()
+                self.assertEqual(len(daemon.tracker.candidates), 4)
+                daemon.tracker.check()
+                for path in daemon.tracker.check():
+                    daemon.take(path)
+                daemon.probes.shutdown(wait=True)
+                daemon.scan()  # Nothing has changed since
+            self.assertEqual(daemon.tracker.candidates, {})
+            self.assertEqual(prepare.call_count, 2)
+            self.assertEqual(sorted(job.params['output_path'] for job in daemon.jobs),
+                             [os.path.join(self.destination, 'show', name) for name in ('hdr.mkv', 'partial.mkv')])
+            self.assertEqual({job.source for job in daemon.jobs}, {'watch'})
+            self.assertEqual(submit.call_count, 2)
+        finally:
+            daemon.stop()
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), "inotify is Linux only")
+    def test_inotify_reports_new_files_and_folders(self):
+        watcher = InotifyWatcher()
+        try:
+            watcher.add(self.source)
+            path = os.path.join(self.source, 'show', 'episode.mkv')
+            self.write(path)
+            self.assertIn(path, watcher.read(1))
+            os.makedirs(os.path.join(self.source, 'new'))
+            self.assertEqual(watcher.read(1), [])
+            nested = os.path.join(self.source, 'new', 'movie.mkv')
+            self.write(nested)
+            self.assertIn(nested, watcher.read(1))
+        finally:
+            watcher.close()
+
+    def test_is_hdr(self):
+        self.assertTrue(is_hdr({'color_transfer': 'smpte2084'}))
+        self.assertTrue(is_hdr({'color_transfer': 'arib-std-b67'}))
+        self.assertFalse(is_hdr({'color_transfer': 'bt709'}))
+        self.assertFalse(is_hdr({}))
+
+if __name__ == '__main__':
+    unittest.main()